@@ -1,16 +1,63 @@
-import os
-from datetime import datetime, timezone
+import logging
+import random
+import threading
+from datetime import date, datetime, timedelta, timezone
+from itertools import chain
 
-from flask import Flask, request, jsonify
-from flask_cors import CORS
-from flask_sqlalchemy import SQLAlchemy
+from flask import (
+    Flask, current_app, has_app_context, request, jsonify, url_for
+)
+from sqlalchemy import (
+    String, cast, delete, event, func, literal, select, tuple_, union_all,
+    update
+)
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, object_session
 
-app = Flask(__name__)
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///activities.db'
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+from cache import SingleFlight, VersionedCache
+from compression import etag_matches, init_compression
 
-db = SQLAlchemy(app)
-CORS(app)
+from config import get_config
+from extensions import cors, db
+from logging_config import get_logger, init_logging, mask_dni
+from metrics import (
+    ITINERARY_REQUESTS, REGISTRATION_OUTCOMES, REGISTRATIONS_CANCELLED,
+    init_metrics
+)
+from occupancy import count_registrations, get_occupancy, init_occupancy
+from occupancy import stage as stage_occupancy
+from checkin import Booking, get_checkin_index, init_checkin
+from checkin import stage as stage_checkin
+from profiling import init_profiling
+from jobs import enqueue, init_jobs, job_handler
+from eventlog import (
+    ACTIVITY_CREATED, ACTIVITY_DELETED, ACTIVITY_UPDATED, CANCELLED,
+    REGISTERED, init_eventlog, load_counts as load_logged_counts
+)
+from eventlog import stage as stage_event
+from park_calendar import (
+    generate_slots, get_calendar, init_calendar, to_minutes
+)
+from planner import ActivityOption, find_conflict, plan_itinerary
+from rollups import (
+    SlotCapacity, init_rollups, record_cancellations, record_registration
+)
+from rollups import recompute as recompute_rollups, rollup_day, summarize
+from rules import (
+    ActivityRules, RulesCache, invalidate_all_rules, resolve_capacity
+)
+from schemas import (
+    RegistrationRequest, ValidationError, decode_cancellations,
+    decode_catalog_query, decode_itinerary, decode_registration
+)
+from serialization import (
+    dumps, encode_activities, encode_visitor_rows, init_serialization,
+    json_response, jsonify_fast
+)
+from server_timing import init_server_timing, stage_timer
+from sql_instrumentation import init_sql_instrumentation
+
+logger = get_logger('service')
 
 # Utilidades de horarios
 def generate_time_slots(
@@ -28,32 +75,23 @@ def generate_time_slots(
     Returns:
         Lista de strings en formato HH:MM
     """
-    from datetime import datetime as dt, timedelta
-
-    base_date = "2000-01-01 "
-    start_dt = dt.strptime(base_date + start_time, "%Y-%m-%d %H:%M")
-    end_dt = dt.strptime(base_date + end_time, "%Y-%m-%d %H:%M")
-    slots: list[str] = []
-    cursor = start_dt
-    while cursor + timedelta(minutes=interval_minutes) <= end_dt:
-        slots.append(cursor.strftime("%H:%M"))
-        cursor += timedelta(minutes=interval_minutes)
-    return slots
-
-VALID_SLOTS_SET = set(generate_time_slots())
-
-def is_valid_slot(time_str: str) -> bool:
-    """Valida que el string esté en formato HH:MM y sea un múltiplo de 30.
+    return generate_slots(to_minutes(start_time), to_minutes(end_time),
+                          interval_minutes)
+
+def is_valid_slot(time_str: str, day=None, activity=None) -> bool:
+    """Valida que el horario sea un turno del calendario del parque.
     
     Args:
         time_str: String en formato HH:MM
+        day: Fecha a validar; ``None`` acepta turnos de cualquier día
+        activity: Nombre de la actividad (define la duración del turno)
         
     Returns:
         True si es un slot válido, False en caso contrario
     """
     if not isinstance(time_str, str) or len(time_str) != 5 or time_str[2] != ":":
         return False
-    return time_str in VALID_SLOTS_SET
+    return get_calendar().is_valid(time_str, day, activity)
 
 # Reglas por actividad
 def get_turn_capacity(activity_name: str) -> int:
@@ -93,7 +131,7 @@ def get_min_age(activity_name: str) -> int:
 # Modelos
 class Activity(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String(100), nullable=False)
+    name = db.Column(db.String(100), nullable=False, index=True)
     capacity = db.Column(db.Integer, nullable=False)
     schedules = db.Column(db.JSON, nullable=False)  # Lista de horarios
     requirements = db.Column(db.JSON, nullable=False)  # Requisitos como dict
@@ -120,10 +158,15 @@ class Activity(db.Model):
         if not self.schedules or len(self.schedules) == 0:
             errors.append("La actividad debe tener al menos un horario")
         else:
-            # validar que todos los horarios cumplan el rango 09:00-18:00 cada 30 minutos
-            invalid = [s for s in self.schedules if not is_valid_slot(s)]
+            # validar contra los turnos del calendario para la duración
+            # de la actividad
+            invalid = [s for s in self.schedules
+                       if not is_valid_slot(s, activity=self.name)]
             if invalid:
-                errors.append(f"Horarios inválidos (deben ser cada 30 minutos entre 09:00 y 18:00): {invalid}")
+                minutes = get_calendar().interval_for(self.name)
+                errors.append(
+                    f"Horarios inválidos (deben ser turnos de {minutes} "
+                    f"minutos dentro del horario del parque): {invalid}")
         
         return errors
 
@@ -140,7 +183,7 @@ class Activity(db.Model):
 class Visitor(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
-    dni = db.Column(db.String(20), nullable=False)
+    dni = db.Column(db.String(20), nullable=False, index=True)
     age = db.Column(db.Integer, nullable=False)
     clothing_size = db.Column(db.String(10))
     terms_accepted = db.Column(db.Boolean, default=False)
@@ -181,182 +224,1312 @@ class Visitor(db.Model):
         }
 
 class Registration(db.Model):
+    # Ocupación por turno (capacidad, catálogo filtrado)
+    __table_args__ = (db.Index('ix_registration_activity_schedule',
+                               'activity_id', 'schedule'),)
     id = db.Column(db.Integer, primary_key=True)
     activity_id = db.Column(db.Integer, db.ForeignKey('activity.id'), nullable=False)
-    visitor_id = db.Column(db.Integer, db.ForeignKey('visitor.id'), nullable=False)
+    # Cancelación masiva por DNI
+    visitor_id = db.Column(db.Integer, db.ForeignKey('visitor.id'),
+                           nullable=False, index=True)
     schedule = db.Column(db.String(50), nullable=False)
-    registered_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+    registered_at = db.Column(
+        db.DateTime, default=lambda: datetime.now(timezone.utc), index=True)
 
     activity = db.relationship('Activity', backref=db.backref('registrations', lazy=True))
     visitor = db.relationship('Visitor', backref=db.backref('registrations', lazy=True))
 
+class CheckIn(db.Model):
+    """Ingreso registrado en la entrada para un registro del día."""
+    __tablename__ = 'check_in'
+    id = db.Column(db.Integer, primary_key=True)
+    registration_id = db.Column(db.Integer, db.ForeignKey('registration.id'),
+                                nullable=False, unique=True)
+    checked_in_at = db.Column(
+        db.DateTime, default=lambda: datetime.now(timezone.utc))
+
+class OutboxJob(db.Model):
+    """Trabajo en segundo plano confirmado junto con el cambio que lo crea."""
+    __tablename__ = 'outbox_job'
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(50), nullable=False)
+    payload = db.Column(db.JSON, nullable=False)
+    status = db.Column(db.String(10), nullable=False, default='pending')
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    available_at = db.Column(db.DateTime, nullable=False)
+    locked_until = db.Column(db.DateTime)
+    claimed_by = db.Column(db.String(32), index=True)
+    last_error = db.Column(db.Text)
+    created_at = db.Column(
+        db.DateTime, default=lambda: datetime.now(timezone.utc))
+    completed_at = db.Column(db.DateTime)
+
+    __table_args__ = (db.Index('ix_outbox_job_status_available',
+                               'status', 'available_at'),)
+
+class OccupancyRollup(db.Model):
+    """Personas y grupos por día × actividad × turno × tamaño de grupo.
+
+    Se mantiene en la transacción de cada registro y cancelación
+    (``rollups.py``); la analítica se responde desde acá.
+    """
+    __tablename__ = 'occupancy_rollup'
+    day = db.Column(db.Date, primary_key=True)
+    activity_id = db.Column(db.Integer, primary_key=True)
+    schedule = db.Column(db.String(50), primary_key=True)
+    group_size = db.Column(db.Integer, primary_key=True)
+    groups = db.Column(db.Integer, nullable=False, default=0)
+    people = db.Column(db.Integer, nullable=False, default=0)
+
+class SlotOverride(db.Model):
+    """Cupo particular de un turno de una actividad.
+
+    Reemplaza la regla por turno (``get_turn_capacity``) en ese horario;
+    la capacidad de la actividad sigue siendo el tope (``resolve_capacity``).
+    """
+    __tablename__ = 'slot_override'
+    __table_args__ = (db.UniqueConstraint('activity_id', 'schedule'),)
+    id = db.Column(db.Integer, primary_key=True)
+    activity_id = db.Column(db.Integer, db.ForeignKey('activity.id'),
+                            nullable=False)
+    schedule = db.Column(db.String(50), nullable=False)
+    capacity = db.Column(db.Integer, nullable=False)
+
+def ensure_indexes():
+    """Crea los índices del modelo que falten en tablas ya existentes.
+
+    ``create_all`` no agrega índices a tablas creadas por una versión
+    anterior (p. ej. ``visitor.dni`` o ``registration.registered_at``).
+    """
+    for table in db.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(db.engine, checkfirst=True)
+
+def _load_checkin_rows(day_start, after_id: int) -> list:
+    """Registros del día con id mayor a ``after_id`` para el índice."""
+    return db.session.execute(
+        select(Registration.id, Visitor.dni, Registration.activity_id,
+               Registration.schedule)
+        .join(Visitor, Visitor.id == Registration.visitor_id)
+        .where(Registration.registered_at >= day_start,
+               Registration.id > after_id)
+        .order_by(Registration.id)
+    ).all()
+
+def _load_checkin_stats(day_start) -> tuple:
+    count, max_id = db.session.execute(
+        select(func.count(Registration.id), func.max(Registration.id))
+        .where(Registration.registered_at >= day_start)
+    ).one()
+    return count, max_id or 0
+
+def load_slot_overrides(activity_ids=None) -> dict:
+    """Cupos particulares como ``{(actividad, horario): cupo}``."""
+    query = select(SlotOverride.activity_id, SlotOverride.schedule,
+                   SlotOverride.capacity)
+    if activity_ids is not None:
+        query = query.where(SlotOverride.activity_id.in_(activity_ids))
+    return {(activity_id, schedule): capacity
+            for activity_id, schedule, capacity in db.session.execute(query)}
+
+class DataVersion(db.Model):
+    """Versión de los datos; cambia en cada transacción que los modifica.
+
+    Las cachés de respuestas (``cache.py``) guardan la versión con la que se
+    calcularon. La fila ``data`` se incrementa una vez por transacción que
+    crea, modifica o borra actividades, visitantes, registros o cupos
+    particulares.
+    """
+    __tablename__ = 'data_version'
+    name = db.Column(db.String(50), primary_key=True)
+    version = db.Column(db.Integer, nullable=False)
+
+DATA_VERSION = 'data'
+_VERSIONED_MODELS = (Activity, Visitor, Registration, SlotOverride)
+_BUMPED_KEY = 'data_version_bumped'
+
+@event.listens_for(DataVersion.__table__, 'after_create')
+def _insert_initial_versions(target, connection, **kw):
+    # Valor inicial al azar: una base recreada no reutiliza versiones
+    # que puedan seguir en caché
+    connection.execute(target.insert().values(
+        name=DATA_VERSION, version=random.SystemRandom().randrange(1, 2**30)
+    ))
+
+def bump_data_version(connection, name: str = DATA_VERSION):
+    """Incrementa la versión ``name`` dentro de la transacción actual."""
+    connection.execute(
+        update(DataVersion.__table__)
+        .where(DataVersion.__table__.c.name == name)
+        .values(version=DataVersion.__table__.c.version + 1)
+    )
+
+def read_data_version(name: str = DATA_VERSION):
+    """Versión actual de ``name`` (``None`` si no existe la fila)."""
+    return db.session.execute(
+        select(DataVersion.version).where(DataVersion.name == name)
+    ).scalar()
+
+def mark_data_changed(session):
+    """Incrementa la versión una sola vez en la transacción de ``session``.
+
+    El ORM lo hace solo en cada flush; las sentencias masivas
+    (``delete()``/``update()``) que no pasan por el flush deben llamarlo.
+    """
+    if not session.info.get(_BUMPED_KEY):
+        bump_data_version(session.connection())
+        session.info[_BUMPED_KEY] = True
+
+@event.listens_for(Session, 'before_flush')
+def _bump_version_on_change(session, flush_context, instances):
+    # Un solo UPDATE por transacción aunque haya varios flush
+    if session.info.get(_BUMPED_KEY):
+        return
+    if any(isinstance(instance, _VERSIONED_MODELS)
+           for instance in chain(session.new, session.dirty, session.deleted)):
+        mark_data_changed(session)
+
+@event.listens_for(Session, 'after_commit')
+@event.listens_for(Session, 'after_rollback')
+def _reset_version_bump(session):
+    session.info.pop(_BUMPED_KEY, None)
+
+# Servicios
+def _load_activity_rules(activity_id):
+    """Carga las reglas de una actividad y sus cupos particulares.
+
+    Una sola consulta trae la actividad junto con sus ``SlotOverride``.
+    """
+    rows = db.session.execute(
+        select(Activity, SlotOverride.schedule, SlotOverride.capacity)
+        .outerjoin(SlotOverride, SlotOverride.activity_id == Activity.id)
+        .where(Activity.id == activity_id)
+    ).all()
+    if not rows:
+        return None
+    activity = rows[0][0]
+    overrides = {schedule: capacity for _, schedule, capacity in rows
+                 if schedule is not None}
+    return ActivityRules(
+        activity.id, activity.name, activity.capacity, activity.schedules,
+        activity.requires_clothing, get_turn_capacity(activity.name),
+        get_min_age(activity.name), overrides
+    )
+
+@event.listens_for(Activity, 'after_update')
+@event.listens_for(Activity, 'after_delete')
+def _invalidate_activity_rules(mapper, connection, target):
+    if has_app_context() and 'activity_rules' in current_app.extensions:
+        current_app.extensions['activity_rules'].invalidate(target.id)
+
+@event.listens_for(SlotOverride, 'after_insert')
+@event.listens_for(SlotOverride, 'after_update')
+@event.listens_for(SlotOverride, 'after_delete')
+def _invalidate_slot_override_rules(mapper, connection, target):
+    if has_app_context() and 'activity_rules' in current_app.extensions:
+        current_app.extensions['activity_rules'].invalidate(target.activity_id)
+
+# Cambios de catálogo en el log de eventos (ver eventlog.py)
+def _activity_data(activity):
+    return {'name': activity.name, 'capacity': activity.capacity,
+            'schedules': activity.schedules,
+            'requires_clothing': bool(activity.requires_clothing)}
+
+@event.listens_for(Activity, 'after_insert')
+def _log_activity_created(mapper, connection, target):
+    stage_event(object_session(target), ACTIVITY_CREATED, target.id,
+                data=_activity_data(target))
+
+@event.listens_for(Activity, 'after_update')
+def _log_activity_updated(mapper, connection, target):
+    stage_event(object_session(target), ACTIVITY_UPDATED, target.id,
+                data=_activity_data(target))
+
+@event.listens_for(Activity, 'after_delete')
+def _log_activity_deleted(mapper, connection, target):
+    stage_event(object_session(target), ACTIVITY_DELETED, target.id)
+
+@event.listens_for(SlotOverride, 'after_insert')
+@event.listens_for(SlotOverride, 'after_update')
+def _log_slot_override(mapper, connection, target):
+    stage_event(object_session(target), ACTIVITY_UPDATED, target.activity_id,
+                target.schedule, data={'slot_override': target.capacity})
+
+@event.listens_for(SlotOverride, 'after_delete')
+def _log_slot_override_deleted(mapper, connection, target):
+    stage_event(object_session(target), ACTIVITY_UPDATED, target.activity_id,
+                target.schedule, data={'slot_override': None})
+
+# Recrear las tablas reutiliza ids: descartar todas las reglas cacheadas
+event.listen(Activity.__table__, 'after_drop',
+             lambda *args, **kw: invalidate_all_rules())
+
+# Trabajos en segundo plano de cada registro
+REGISTRATION_JOBS = ('registration.confirmation', 'roster.refresh',
+                     'registration.audit')
+
+def _activity_name(activity_id) -> str:
+    rules = current_app.extensions['activity_rules'].get(activity_id)
+    return rules.name if rules else f'Actividad {activity_id}'
+
+@job_handler('registration.confirmation')
+def _send_confirmation(payload, sink):
+    name = _activity_name(payload['activity_id'])
+    sink.deliver('confirmation', {
+        'subject': f"Reserva confirmada: {name} {payload['schedule']}",
+        'activity': name,
+        'schedule': payload['schedule'],
+        'participants': [{'name': p['name'], 'dni': mask_dni(p['dni'])}
+                         for p in payload['participants']],
+    })
+
+@job_handler('roster.refresh')
+def _refresh_roster(payload, sink):
+    rows = db.session.execute(
+        select(Registration.id, Visitor.name)
+        .join(Visitor, Visitor.id == Registration.visitor_id)
+        .where(Registration.activity_id == payload['activity_id'],
+               Registration.schedule == payload['schedule'])
+        .order_by(Registration.id)
+    ).all()
+    sink.deliver('roster', {
+        'activity': _activity_name(payload['activity_id']),
+        'activity_id': payload['activity_id'],
+        'schedule': payload['schedule'],
+        'registered': len(rows),
+        'participants': [name for _, name in rows],
+    })
+
+@job_handler('registration.audit')
+def _write_audit(payload, sink):
+    sink.deliver('audit', {
+        'event': 'registration.created',
+        'activity_id': payload['activity_id'],
+        'schedule': payload['schedule'],
+        'registration_ids': payload['registration_ids'],
+        'dnis': [mask_dni(p['dni']) for p in payload['participants']],
+    })
+
+def _failure(stage: str, code: str, error: str) -> dict:
+    return {'success': False, 'error': error, 'code': code, 'stage': stage}
+
 # Servicios
 class ActivityService:
+    """Registro de visitantes en tres etapas, de la más barata a la más cara.
+
+    1. ``payload``: decodificación y chequeos sin estado (sin consultas)
+    2. ``rules``: reglas de la actividad desde la caché (``RulesCache``)
+    3. ``database``: una sola consulta para ocupación y DNIs duplicados,
+       con el lock de escritura tomado, y luego los inserts
+
+    Cada rechazo informa en ``stage`` la etapa que lo produjo.
+    """
+
+    @staticmethod
+    def register_visitor(activity_id, visitor_data, schedule=None):
+        """Registra uno o más visitantes en una actividad.
+
+        Args:
+            activity_id: ID de la actividad
+            visitor_data: Payload crudo (``participants`` o el formato
+                antiguo ``visitor``) o un ``RegistrationRequest`` ya
+                decodificado
+            schedule: Horario; si es ``None`` se toma del payload
+
+        Returns:
+            Diccionario con ``success`` y ``message`` o ``error``, ``code``
+            y ``stage``
+        """
+        result = ActivityService._register_visitor(
+            activity_id, visitor_data, schedule)
+        REGISTRATION_OUTCOMES.inc(result.get('code', 'success'))
+        return result
+
     @staticmethod
-    def register_visitor(activity_id, visitor_data, schedule):
-        """Registra un visitante en una actividad"""
+    def _register_visitor(activity_id, visitor_data, schedule):
+        timer = stage_timer()
+        registration, failure = ActivityService._check_payload(
+            visitor_data, schedule)
+        timer.mark('payload')
+        if failure:
+            return failure
+
+        debug_enabled = logger.isEnabledFor(logging.DEBUG)
+        if debug_enabled:
+            logger.debug(
+                'register_visitor activity_id=%s schedule=%s',
+                activity_id, registration.schedule,
+                extra={'fields': {
+                    'participants_count': len(registration.participants),
+                    'terms_accepted': registration.terms_accepted,
+                }}
+            )
+
+        rules = current_app.extensions['activity_rules'].get(activity_id)
+        failure = ActivityService._check_rules(rules, registration)
+        timer.mark('rules')
+        if failure:
+            return failure
+
         try:
-            print(f"DEBUG: register_visitor called with activity_id={activity_id}, visitor_data={visitor_data}, schedule={schedule}")
-            # Buscar la actividad
-            activity = db.session.get(Activity, activity_id)
-            if not activity:
-                return {'success': False, 'error': 'Actividad no encontrada'}
-
-            # Validar horario
-            if schedule not in activity.schedules:
-                return {'success': False, 'error': 'Horario no disponible'}
-
-            # Validar que el horario no sea pasado
-            from datetime import datetime as dt
-            current_time_str = visitor_data.get('current_time')
-            
-            # Si no se proporciona current_time, usar la hora actual del servidor
-            if not current_time_str:
-                now = dt.now()
-                current_time_str = now.strftime('%H:%M')
-            
-            if is_valid_slot(schedule):
-                try:
-                    base_date = dt.now().strftime('%Y-%m-%d ')
-                    now_dt = dt.strptime(base_date + current_time_str, '%Y-%m-%d %H:%M')
-                    sched_dt = dt.strptime(base_date + schedule, '%Y-%m-%d %H:%M')
-                    if now_dt >= sched_dt:
-                        return {'success': False, 'error': f'El horario {schedule} ya pasó (hora actual: {current_time_str})'}
-                except Exception:
-                    pass
-
-            # Obtener participantes
-            participants = visitor_data.get('participants', [])
-            participants_count = len(participants)
-            
-            # Validar capacidad disponible
-            current_registrations = Registration.query.filter_by(
+            failure = ActivityService._check_database(rules, registration)
+            timer.mark('database')
+            if failure:
+                # Liberar el lock de escritura cuanto antes
+                db.session.rollback()
+                return failure
+
+            ActivityService._create_registrations(
+                activity_id, registration, timer)
+
+            db.session.commit()
+            timer.mark('commit')
+
+            return {'success': True, 'message': 'Registro exitoso'}
+
+        except Exception as e:
+            db.session.rollback()
+            logger.exception('Error interno registrando visitante')
+            return _failure(
+                'database', 'internal_error', f'Error interno: {str(e)}')
+
+    @staticmethod
+    def _create_registrations(activity_id, registration, timer):
+        """Inserta visitantes y registros de ``registration`` (sin commit)."""
+        debug_enabled = logger.isEnabledFor(logging.DEBUG)
+        schedule = registration.schedule
+        created_visitors = []
+        for i, participant in enumerate(registration.participants, start=1):
+            if debug_enabled:
+                logger.debug(
+                    'Procesando participante %d', i,
+                    extra={'fields': {'dni': participant.dni}}
+                )
+            visitor = Visitor(
+                name=participant.name,
+                dni=participant.dni,
+                age=participant.age,
+                clothing_size=participant.clothing_size,
+                terms_accepted=registration.terms_accepted
+            )
+            db.session.add(visitor)
+            db.session.flush()  # Para obtener el ID del visitante
+            created_visitors.append(visitor)
+        timer.mark('visitors')
+
+        # Crear registros para cada participante
+        registrations = []
+        for visitor in created_visitors:
+            registration_row = Registration(
                 activity_id=activity_id,
+                visitor_id=visitor.id,
                 schedule=schedule
-            ).count()
-            
-            available_capacity = activity.capacity - current_registrations
-            if participants_count > available_capacity:
-                return {'success': False, 'error': 'No hay cupos disponibles'}
-            
-            if participants_count < 1 or participants_count > 10:
-                return {'success': False, 'error': 'Cantidad de participantes debe estar entre 1 y 10'}
-
-            # Verificar cupos disponibles por horario (turno)
-            turn_capacity = get_turn_capacity(activity.name)
-            current_registrations = Registration.query.filter_by(activity_id=activity_id, schedule=schedule).count()
-            remaining = turn_capacity - current_registrations
-            if remaining < participants_count:
-                return {'success': False, 'error': f'No hay cupos disponibles en el horario {schedule}. Quedan {max(0, remaining)} cupos'}
-
-            # Validar términos
-            if not visitor_data.get('terms_accepted', False):
-                return {'success': False, 'error': 'Debe aceptar los términos y condiciones'}
-
-            # Validar que no haya DNIs duplicados en el mismo horario
-            participant_dnis = [p.get('dni') for p in participants if p.get('dni')]
-            for dni in participant_dnis:
-                # Verificar si este DNI ya está registrado en este horario (cualquier actividad)
-                existing_registration = db.session.query(Registration).join(Visitor).filter(
-                    Visitor.dni == dni,
-                    Registration.schedule == schedule
-                ).first()
-                
-                if existing_registration:
-                    return {'success': False, 'error': f'El DNI {dni} ya está registrado en el horario {schedule}'}
-
-            # Validar y crear visitantes
-            created_visitors = []
-            for i, participant_data in enumerate(participants):
-                print(f"DEBUG: Processing participant {i + 1}: {participant_data}")
-                # Validar que los datos requeridos estén presentes
-                if not participant_data:
-                    return {'success': False, 'error': f'Datos del participante {i + 1} están vacíos'}
-                
-                if not participant_data.get('name'):
-                    return {'success': False, 'error': f'El nombre del participante {i + 1} es obligatorio'}
-                
-                if not participant_data.get('dni'):
-                    return {'success': False, 'error': f'El DNI del participante {i + 1} es obligatorio'}
-                
-                if not participant_data.get('age'):
-                    return {'success': False, 'error': f'La edad del participante {i + 1} es obligatoria'}
-                
-                # Validar talla si es requerida
-                if activity.requires_clothing and not participant_data.get('clothing_size'):
-                    return {'success': False, 'error': f'La actividad requiere especificar talla de vestimenta para el participante {i + 1}'}
-
-                # Validar edad mínima por actividad
-                min_age = get_min_age(activity.name)
-                if participant_data.get('age') is None or participant_data.get('age') < min_age:
-                    return {'success': False, 'error': f'La edad mínima para {activity.name} es {min_age} años (participante {i + 1})'}
-
-                # Crear visitante
-                visitor = Visitor(
-                    name=participant_data['name'],
-                    dni=participant_data['dni'],
-                    age=participant_data['age'],
-                    clothing_size=participant_data.get('clothing_size'),
-                    terms_accepted=visitor_data.get('terms_accepted', False)
-                )
+            )
+            db.session.add(registration_row)
+            registrations.append(registration_row)
+        db.session.flush()  # Ids para el índice de ingreso
+        stage_occupancy(db.session, activity_id, schedule,
+                        len(created_visitors))
+        stage_event(db.session, REGISTERED, activity_id, schedule,
+                    len(registrations),
+                    [(row.id, row.visitor_id) for row in registrations])
+        record_registration(db.session, OccupancyRollup, activity_id, schedule,
+                            len(registrations))
+        stage_checkin(db.session, added=[
+            Booking(row.id, visitor.dni, activity_id, schedule)
+            for row, visitor in zip(registrations, created_visitors)
+        ])
+        # Efectos secundarios fuera de la petición (ver jobs.py)
+        payload = {
+            'activity_id': activity_id,
+            'schedule': schedule,
+            'registration_ids': [row.id for row in registrations],
+            'participants': [{'name': visitor.name, 'dni': visitor.dni}
+                             for visitor in created_visitors],
+        }
+        enqueue(db.session, REGISTRATION_JOBS, payload)
+
+    @staticmethod
+    def _check_payload(visitor_data, schedule):
+        """Etapa ``payload``: todo lo que no depende de la base.
+
+        Returns:
+            ``(RegistrationRequest, None)`` o ``(None, falla)``
+        """
+        if isinstance(visitor_data, RegistrationRequest):
+            registration = visitor_data
+            if schedule is not None:
+                registration.schedule = schedule
+        else:
+            try:
+                registration = decode_registration(visitor_data, schedule)
+            except ValidationError as error:
+                result = error.to_result()
+                result['stage'] = 'payload'
+                return None, result
+        schedule = registration.schedule
+
+        # Validar que el horario no sea pasado
+        from datetime import datetime as dt
+        current_time_str = registration.current_time
+
+        # Si no se proporciona current_time, usar la hora actual del servidor
+        if not current_time_str:
+            current_time_str = dt.now().strftime('%H:%M')
+
+        if is_valid_slot(schedule):
+            try:
+                base_date = dt.now().strftime('%Y-%m-%d ')
+                now_dt = dt.strptime(
+                    base_date + current_time_str, '%Y-%m-%d %H:%M')
+                sched_dt = dt.strptime(base_date + schedule, '%Y-%m-%d %H:%M')
+                if now_dt >= sched_dt:
+                    return None, _failure(
+                        'payload', 'past_slot',
+                        f'El horario {schedule} ya pasó '
+                        f'(hora actual: {current_time_str})')
+            except ValueError:
+                pass
+
+        # Validar términos
+        if not registration.terms_accepted:
+            return None, _failure(
+                'payload', 'terms_not_accepted',
+                'Debe aceptar los términos y condiciones')
+        return registration, None
+
+    @staticmethod
+    def _check_rules(rules, registration):
+        """Etapa ``rules``: reglas de la actividad, sin consultas en caché."""
+        if rules is None:
+            return _failure(
+                'rules', 'activity_not_found', 'Actividad no encontrada')
+        schedule = registration.schedule
+        if schedule not in rules.schedules:
+            return _failure(
+                'rules', 'schedule_unavailable', 'Horario no disponible')
+        # Turnos del calendario de hoy (feriados, horario del día o temporada)
+        calendar = get_calendar()
+        if calendar.is_closed(schedule, calendar.today(), rules.name):
+            return _failure('rules', 'slot_closed',
+                            f'El horario {schedule} no está habilitado hoy')
+
+        # Rechazo temprano con la ocupación compartida; el conteo en la
+        # base sigue siendo la verificación definitiva
+        occupancy = get_occupancy()
+        taken = None
+        if occupancy:
+            taken = occupancy.get(rules.activity_id, schedule)
+        if taken is not None:
+            failure = ActivityService._check_capacity(
+                'rules', rules, schedule, taken,
+                len(registration.participants))
+            if failure:
+                return failure
+
+        for i, participant in enumerate(registration.participants, start=1):
+            # Validar talla si es requerida
+            if rules.requires_clothing and not participant.clothing_size:
+                return _failure(
+                    'rules', 'clothing_size_required',
+                    'La actividad requiere especificar talla de vestimenta '
+                    f'para el participante {i}')
+            # Validar edad mínima por actividad
+            if participant.age < rules.min_age:
+                return _failure(
+                    'rules', 'min_age',
+                    f'La edad mínima para {rules.name} es {rules.min_age} '
+                    f'años (participante {i})')
+        return None
+
+    @staticmethod
+    def _check_capacity(stage, rules, schedule, taken, participants_count):
+        """Compara la ocupación contra el cupo efectivo del turno."""
+        remaining = rules.slot_capacity(schedule) - taken
+        if remaining < participants_count:
+            return _failure(
+                stage, 'no_capacity',
+                f'No hay cupos disponibles en el horario {schedule}. '
+                f'Quedan {max(0, remaining)} cupos')
+        return None
+
+    @staticmethod
+    def _check_database(rules, registration):
+        """Etapa ``database``: ocupación y DNIs duplicados en una consulta.
+
+        Serializa los registros concurrentes (varios hilos o workers): el
+        UPDATE sin cambios toma el lock de escritura en SQLite y bloquea la
+        fila de la actividad en otros motores hasta el commit, así el
+        conteo de cupos y los inserts van en la misma transacción.
+        """
+        activity_id = rules.activity_id
+        schedule = registration.schedule
+        locked = db.session.execute(
+            update(Activity).where(Activity.id == activity_id)
+            .values(id=Activity.id)
+            .execution_options(synchronize_session=False)
+        )
+        if locked.rowcount == 0:
+            current_app.extensions['activity_rules'].invalidate(activity_id)
+            return _failure(
+                'database', 'activity_not_found', 'Actividad no encontrada')
+
+        dnis = registration.dnis
+        taken_query = select(
+            literal('taken').label('kind'),
+            cast(func.count(Registration.id), String).label('value')
+        ).where(Registration.activity_id == activity_id,
+                Registration.schedule == schedule)
+        # Un DNI no puede repetirse en el mismo horario (cualquier actividad)
+        duplicates_query = select(literal('dni'), Visitor.dni).join(
+            Registration, Registration.visitor_id == Visitor.id
+        ).where(Registration.schedule == schedule, Visitor.dni.in_(dnis))
+        taken, duplicates = 0, set()
+        rows = db.session.execute(union_all(taken_query, duplicates_query))
+        for kind, value in rows:
+            if kind == 'taken':
+                taken = int(value)
+            else:
+                duplicates.add(value)
+
+        failure = ActivityService._check_capacity(
+            'database', rules, schedule, taken, len(registration.participants))
+        if failure:
+            return failure
+        for dni in dnis:
+            if dni in duplicates:
+                return _failure(
+                    'database', 'duplicate_dni',
+                    f'El DNI {dni} ya está registrado en el horario '
+                    f'{schedule}')
+        return None
+
+class CancellationService:
+    """Cancelación de registros y liberación de cupos.
+
+    Cada cancelación es un solo ``DELETE ... RETURNING`` (o ``SELECT`` +
+    ``DELETE`` si el motor no lo soporta) en la misma transacción que la
+    actualización de todo lo derivado: la ocupación compartida (aplicada al
+    confirmar y revertida si falla), el índice de ingreso, los ingresos del
+    registro y la versión de los datos que invalida las cachés del catálogo
+    y del listado. Los visitantes se conservan.
+    """
+
+    # Pares por sentencia en la cancelación masiva
+    BATCH_SIZE = 500
+
+    @staticmethod
+    def cancel_registration(registration_id: int) -> dict:
+        """Cancela un registro por id.
+
+        Returns:
+            Diccionario con ``success`` y ``cancelled``, o ``error`` y
+            ``code`` (``registration_not_found``)
+        """
+        cancelled = CancellationService._cancel(
+            [Registration.id == registration_id])
+        if not cancelled:
+            return {'success': False, 'error': 'Registro no encontrado',
+                    'code': 'registration_not_found'}
+        REGISTRATIONS_CANCELLED.inc('single')
+        return {'success': True, 'message': 'Registro cancelado',
+                'cancelled': 1}
+
+    @staticmethod
+    def cancel_by_dni(payload) -> dict:
+        """Cancela en bloque por pares (DNI, horario).
+
+        Args:
+            payload: ``{"cancellations": [{"dni": ..., "schedule": ...}]}``
+
+        Returns:
+            Diccionario con ``success``, ``cancelled`` y ``not_found``
+            (pares sin registro), o el error de validación
+        """
+        try:
+            pairs = decode_cancellations(payload)
+        except ValidationError as error:
+            return error.to_result()
+
+        pairs = list(dict.fromkeys(pairs))
+        cancelled, matched = 0, set()
+        for start in range(0, len(pairs), CancellationService.BATCH_SIZE):
+            batch = pairs[start:start + CancellationService.BATCH_SIZE]
+            # Visitantes por DNI (índice) y, con ellos, los registros por
+            # visitor_id (índice); nunca se recorre toda la tabla
+            dni_of = dict(db.session.execute(
+                select(Visitor.id, Visitor.dni)
+                .where(Visitor.dni.in_({dni for dni, _ in batch}))
+            ).all())
+            schedules = {}
+            for dni, schedule in batch:
+                schedules.setdefault(dni, []).append(schedule)
+            targets = [(visitor_id, schedule)
+                       for visitor_id, dni in dni_of.items()
+                       for schedule in schedules[dni]]
+            if not targets:
+                continue
+            rows = CancellationService._cancel(
+                [Registration.visitor_id.in_(
+                    {visitor_id for visitor_id, _ in targets}),
+                 tuple_(Registration.visitor_id, Registration.schedule)
+                 .in_(targets)],
+                commit=False)
+            cancelled += len(rows)
+            matched.update((dni_of[row.visitor_id], row.schedule)
+                           for row in rows)
+        db.session.commit()
+        REGISTRATIONS_CANCELLED.inc('bulk', amount=cancelled)
+        return {
+            'success': True,
+            'message': f'Se cancelaron {cancelled} registros',
+            'cancelled': cancelled,
+            'not_found': len(pairs) - len(matched),
+        }
+
+    @staticmethod
+    def _cancel(criteria, commit: bool = True) -> list:
+        """Borra los registros que cumplen ``criteria`` y libera sus cupos.
+
+        Returns:
+            Filas ``(id, activity_id, schedule, visitor_id, registered_at)``
+            de los registros borrados
+        """
+        try:
+            statement = delete(Registration).where(*criteria)
+            columns = (Registration.id, Registration.activity_id,
+                       Registration.schedule, Registration.visitor_id,
+                       Registration.registered_at)
+            if db.engine.dialect.delete_returning:
+                rows = db.session.execute(
+                    statement.returning(*columns)
+                    .execution_options(synchronize_session=False)
+                ).all()
+            else:
+                rows = db.session.execute(
+                    select(*columns).where(*criteria).with_for_update()
+                ).all()
+                db.session.execute(
+                    statement.execution_options(synchronize_session=False))
 
-                # Validar visitante
-                visitor_errors = visitor.validate()
-                if visitor_errors:
-                    return {'success': False, 'error': f'Datos del participante {i + 1} inválidos', 'details': visitor_errors}
-
-                db.session.add(visitor)
-                db.session.flush()  # Para obtener el ID del visitante
-                created_visitors.append(visitor)
-
-            # Crear registros para cada participante
-            for visitor in created_visitors:
-                registration = Registration(
-                    activity_id=activity_id,
-                    visitor_id=visitor.id,
-                    schedule=schedule
+            if rows:
+                registration_ids = [row[0] for row in rows]
+                # SQLite puede reutilizar ids: no dejar ingresos huérfanos
+                db.session.execute(
+                    delete(CheckIn)
+                    .where(CheckIn.registration_id.in_(registration_ids))
+                    .execution_options(synchronize_session=False)
                 )
-                db.session.add(registration)
-            
+                freed, freed_days = {}, {}
+                for (registration_id, activity_id, schedule, visitor_id,
+                     registered_at) in rows:
+                    freed.setdefault((activity_id, schedule), []).append(
+                        (registration_id, visitor_id))
+                    key = (rollup_day(registered_at), activity_id, schedule)
+                    freed_days[key] = freed_days.get(key, 0) + 1
+                for (activity_id, schedule), ids in freed.items():
+                    stage_occupancy(db.session, activity_id, schedule,
+                                    -len(ids))
+                    stage_event(db.session, CANCELLED, activity_id, schedule,
+                                len(ids), ids)
+                record_cancellations(db.session, OccupancyRollup, freed_days)
+                stage_checkin(db.session, removed=registration_ids)
+                mark_data_changed(db.session)
+            if commit:
+                db.session.commit()
+            return rows
+        except Exception:
+            db.session.rollback()
+            raise
+
+class AnalyticsService:
+    """Analítica de ocupación desde los rollups (``rollups.py``).
+
+    Nunca lee ``Registration`` salvo en ``recompute``: el costo de una
+    consulta depende del rango de días y del catálogo, no del volumen de
+    registros.
+    """
+
+    @staticmethod
+    def parse_range(args):
+        """Rango ``from``/``to`` (ISO, inclusive) de los parámetros.
+
+        Returns:
+            ``(inicio, fin, None)`` o ``(None, None, error)``
+        """
+        config = current_app.config
+        try:
+            if args.get('to'):
+                end = date.fromisoformat(args['to'])
+            else:
+                end = get_calendar().today()
+            if args.get('from'):
+                start = date.fromisoformat(args['from'])
+            else:
+                days = config['ANALYTICS_DEFAULT_DAYS']
+                start = end - timedelta(days=days - 1)
+        except ValueError:
+            return None, None, _failure(
+                'payload', 'invalid_range',
+                'Fechas inválidas (formato AAAA-MM-DD)')
+        if start > end:
+            return None, None, _failure(
+                'payload', 'invalid_range',
+                'La fecha inicial es posterior a la final')
+        max_days = config['ANALYTICS_MAX_DAYS']
+        if (end - start).days + 1 > max_days:
+            return None, None, _failure(
+                'payload', 'invalid_range',
+                f'El rango no puede superar {max_days} días')
+        return start, end, None
+
+    @staticmethod
+    def occupancy(start, end) -> dict:
+        """Ocupación, horas pico y tamaños de grupo de ``start`` a ``end``."""
+        rows = db.session.query(
+            OccupancyRollup.day, OccupancyRollup.activity_id,
+            OccupancyRollup.schedule, OccupancyRollup.group_size,
+            OccupancyRollup.groups, OccupancyRollup.people
+        ).filter(OccupancyRollup.day.between(start, end)).all()
+        overrides = {}
+        for activity_id, schedule, capacity in db.session.query(
+                SlotOverride.activity_id, SlotOverride.schedule,
+                SlotOverride.capacity):
+            overrides[activity_id, schedule] = capacity
+        activities = [
+            SlotCapacity(activity_id, name, {
+                schedule: resolve_capacity(
+                    capacity, get_turn_capacity(name),
+                    overrides.get((activity_id, schedule)))
+                for schedule in schedules
+            })
+            for activity_id, name, capacity, schedules in db.session.query(
+                Activity.id, Activity.name, Activity.capacity,
+                Activity.schedules)
+        ]
+        calendar = get_calendar()
+        result = summarize(rows, activities, start, end,
+                           lambda day, name: calendar.slots(day, name).valid)
+        result['success'] = True
+        return result
+
+    @staticmethod
+    def recompute() -> dict:
+        """Reconstruye los rollups desde ``Registration`` (backfill)."""
+        try:
+            stats = recompute_rollups(
+                db.session, OccupancyRollup, Registration)
+            mark_data_changed(db.session)
             db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        return dict(stats, success=True)
 
-            return {'success': True, 'message': 'Registro exitoso'}
+class CheckinService:
+    """Control de ingreso por DNI con el índice en memoria (``checkin.py``)."""
+
+    @staticmethod
+    def lookup(dni: str) -> dict:
+        """Reservas de hoy de un DNI con su estado de ingreso.
+
+        Returns:
+            Diccionario con ``success`` y ``bookings``, o ``error`` y
+            ``code`` (``invalid_dni``, ``not_registered``)
+        """
+        if not dni.isdigit():
+            return {'success': False,
+                    'error': 'El DNI debe contener solo números',
+                    'code': 'invalid_dni'}
+        bookings = get_checkin_index().lookup(dni)
+        if not bookings:
+            return CheckinService._not_registered(dni)
+        checked_in = CheckinService._checked_in(bookings)
+        return {
+            'success': True,
+            'dni': dni,
+            'bookings': [
+                CheckinService._booking_dict(
+                    booking, checked_in.get(booking.registration_id))
+                for booking in bookings
+            ],
+        }
+
+    @staticmethod
+    def check_in(dni: str, payload=None) -> dict:
+        """Registra el ingreso de un DNI.
+
+        Args:
+            dni: DNI escaneado
+            payload: Opcional, ``{"registration_id": ...}`` o
+                ``{"schedule": ...}`` para elegir la reserva; sin él se
+                registran todas las reservas de hoy
+
+        Returns:
+            Diccionario con ``success`` y ``bookings`` ingresadas, o
+            ``error`` y ``code`` (``invalid_dni``, ``invalid_payload``,
+            ``not_registered``, ``already_checked_in``)
+        """
+        if not dni.isdigit():
+            return {'success': False,
+                    'error': 'El DNI debe contener solo números',
+                    'code': 'invalid_dni'}
+        payload = payload or {}
+        if not isinstance(payload, dict):
+            return {'success': False,
+                    'error': 'El cuerpo de la solicitud debe ser un objeto '
+                             'JSON',
+                    'code': 'invalid_payload'}
+        bookings = get_checkin_index().lookup(dni)
+        if 'registration_id' in payload:
+            bookings = [b for b in bookings
+                        if b.registration_id == payload['registration_id']]
+        if 'schedule' in payload:
+            bookings = [b for b in bookings
+                        if b.schedule == payload['schedule']]
+        if not bookings:
+            return CheckinService._not_registered(dni)
+
+        checked_in = CheckinService._checked_in(bookings)
+        pending = [b for b in bookings if b.registration_id not in checked_in]
+        if not pending:
+            return {'success': False, 'error': f'El DNI {dni} ya ingresó',
+                    'code': 'already_checked_in'}
+        now = datetime.now(timezone.utc)
+        try:
+            db.session.add_all([
+                CheckIn(registration_id=booking.registration_id,
+                        checked_in_at=now)
+                for booking in pending
+            ])
+            db.session.commit()
+        except IntegrityError:
+            # Otro puesto registró el mismo ingreso a la vez
+            db.session.rollback()
+            return {'success': False, 'error': f'El DNI {dni} ya ingresó',
+                    'code': 'already_checked_in'}
+        return {
+            'success': True,
+            'message': 'Ingreso registrado',
+            'bookings': [CheckinService._booking_dict(b, now)
+                         for b in pending],
+        }
+
+    @staticmethod
+    def _not_registered(dni: str) -> dict:
+        return {'success': False,
+                'error': f'El DNI {dni} no tiene reservas para hoy',
+                'code': 'not_registered'}
+
+    @staticmethod
+    def _checked_in(bookings) -> dict:
+        rows = db.session.execute(
+            select(CheckIn.registration_id, CheckIn.checked_in_at)
+            .where(CheckIn.registration_id.in_(
+                [b.registration_id for b in bookings]))
+        )
+        return dict(rows.all())
+
+    @staticmethod
+    def _booking_dict(booking, checked_in_at) -> dict:
+        rules = current_app.extensions['activity_rules'].get(
+            booking.activity_id)
+        return {
+            'registration_id': booking.registration_id,
+            'activity_id': booking.activity_id,
+            'activity': rules.name if rules else None,
+            'schedule': booking.schedule,
+            'checked_in_at': (checked_in_at.isoformat()
+                              if checked_in_at else None),
+        }
+
+class ItineraryService:
+    """Planes de varias actividades para un grupo y su reserva atómica."""
+
+    @staticmethod
+    def plan(payload) -> dict:
+        """Busca itinerarios factibles (ver ``planner.py``).
+
+        Returns:
+            Diccionario con ``success`` y ``plans`` (mejores primero), o
+            ``error`` y ``code`` (``activity_not_found``,
+            ``no_feasible_plan`` con ``reasons`` por actividad, o de
+            validación)
+        """
+        result = ItineraryService._plan(payload)
+        ITINERARY_REQUESTS.inc('plan', result.get('code', 'success'))
+        return result
+
+    @staticmethod
+    def _plan(payload) -> dict:
+        try:
+            request_ = decode_itinerary(payload)
+        except ValidationError as error:
+            return error.to_result()
+        participants = request_.participants
+        youngest = min(participant.age for participant in participants)
+        now = request_.current_time or datetime.now().strftime('%H:%M')
+
+        rules_cache = current_app.extensions['activity_rules']
+        all_rules, reasons = [], {}
+        for activity_id in request_.activity_ids:
+            rules = rules_cache.get(activity_id)
+            if rules is None:
+                return {'success': False,
+                        'error': f'Actividad {activity_id} no encontrada',
+                        'code': 'activity_not_found'}
+            if youngest < rules.min_age:
+                reasons[activity_id] = (f'La edad mínima para {rules.name} '
+                                        f'es {rules.min_age} años')
+            elif rules.requires_clothing and not all(
+                    p.clothing_size for p in participants):
+                reasons[activity_id] = (f'{rules.name} requiere talla de '
+                                        'vestimenta para todos')
+            all_rules.append(rules)
+        if reasons:
+            return ItineraryService._no_plan(reasons)
+
+        occupancy = get_occupancy()
+        calendar = get_calendar()
+        today = calendar.today()
+        ids = list(request_.activity_ids)
+        grouped = None
+        options = []
+        for rules in all_rules:
+            slots = {}
+            for schedule in rules.schedules:
+                if schedule <= now \
+                        or (request_.start and schedule < request_.start) \
+                        or (request_.end and schedule > request_.end) \
+                        or calendar.is_closed(schedule, today, rules.name):
+                    continue
+                taken = None
+                if occupancy:
+                    taken = occupancy.get(rules.activity_id, schedule)
+                if taken is None:
+                    if grouped is None:
+                        grouped = _count_slots(
+                            ids, request_.start, request_.end)
+                    taken = grouped.get((rules.activity_id, schedule), 0)
+                slots[schedule] = rules.slot_capacity(schedule) - taken
+            options.append(ActivityOption(rules.activity_id, rules.name, slots,
+                                          calendar.interval_for(rules.name)))
+
+        # Turnos que algún DNI del grupo ya tiene reservados, con la
+        # duración de su actividad
+        busy = {
+            (schedule, calendar.interval_for(name))
+            for schedule, name in db.session.execute(
+                select(Registration.schedule, Activity.name).distinct()
+                .join(Visitor, Visitor.id == Registration.visitor_id)
+                .join(Activity, Activity.id == Registration.activity_id)
+                .where(Visitor.dni.in_(request_.dnis))
+            )
+        }
+
+        result = plan_itinerary(
+            options, len(participants), busy, request_.min_gap,
+            request_.prefer, request_.max_plans,
+            current_app.config['ITINERARY_MAX_NODES'])
+        if not result.plans:
+            return ItineraryService._no_plan({
+                option.activity_id: f'Sin turnos con {len(participants)} '
+                                    'cupos libres compatibles'
+                for option in options
+            })
+        names = {option.activity_id: option.name for option in options}
+        free = {option.activity_id: option.slots for option in options}
+        return {
+            'success': True,
+            'plans': [
+                {'assignments': [
+                    {'activity_id': activity_id,
+                     'activity': names[activity_id],
+                     'schedule': schedule,
+                     'available_capacity': free[activity_id][schedule]}
+                    for activity_id, schedule in sorted(
+                        plan.items(), key=lambda item: item[1])
+                ]}
+                for plan in result.plans
+            ],
+            'nodes': result.nodes,
+            'complete': result.exhausted,
+        }
+
+    @staticmethod
+    def _no_plan(reasons: dict) -> dict:
+        return {'success': False,
+                'error': 'No hay combinación de turnos posible para el grupo',
+                'code': 'no_feasible_plan',
+                'reasons': {str(activity_id): reason
+                            for activity_id, reason in reasons.items()}}
+
+    @staticmethod
+    def commit(payload) -> dict:
+        """Reserva todas las asignaciones en una sola transacción.
+
+        Aplica al grupo en cada turno las mismas etapas que
+        ``ActivityService`` (payload, reglas, base); los locks de las
+        actividades se toman en orden de id. Si una asignación falla no se
+        reserva ninguna y la respuesta indica cuál en ``assignment``.
+        """
+        result = ItineraryService._commit(payload)
+        ITINERARY_REQUESTS.inc('commit', result.get('code', 'success'))
+        return result
+
+    @staticmethod
+    def _commit(payload) -> dict:
+        timer = stage_timer()
+        try:
+            request_ = decode_itinerary(payload, commit=True)
+        except ValidationError as error:
+            result = error.to_result()
+            result['stage'] = 'payload'
+            return result
+
+        bookings = []
+        assignments = enumerate(request_.assignments, start=1)
+        for index, (activity_id, schedule) in assignments:
+            registration, failure = ActivityService._check_payload(
+                request_.registration(schedule), None)
+            if failure:
+                return dict(failure, assignment=index)
+            bookings.append((index, activity_id, registration))
+        timer.mark('payload')
+
+        rules_cache = current_app.extensions['activity_rules']
+        checked = []
+        for index, activity_id, registration in bookings:
+            rules = rules_cache.get(activity_id)
+            failure = ActivityService._check_rules(rules, registration)
+            if failure:
+                return dict(failure, assignment=index)
+            checked.append((index, rules, registration))
+        calendar = get_calendar()
+        conflict = find_conflict(
+            [(registration.schedule, calendar.interval_for(rules.name))
+             for _, rules, registration in checked], request_.min_gap)
+        if conflict:
+            first, second = (checked[i][1].name for i in conflict)
+            error = f'Los turnos de {first} y {second} se superponen'
+            if request_.min_gap:
+                error += f' o no dejan {request_.min_gap} minutos entre sí'
+            return dict(_failure('rules', 'overlapping_schedules', error),
+                        assignment=checked[conflict[1]][0])
+        timer.mark('rules')
 
+        try:
+            # Locks en orden de id: dos itinerarios no se esperan en círculo
+            ordered = sorted(checked, key=lambda item: item[1].activity_id)
+            for index, rules, registration in ordered:
+                failure = ActivityService._check_database(rules, registration)
+                if failure:
+                    db.session.rollback()
+                    return dict(failure, assignment=index)
+            timer.mark('database')
+            for index, rules, registration in checked:
+                ActivityService._create_registrations(
+                    rules.activity_id, registration, timer)
+            db.session.commit()
+            timer.mark('commit')
         except Exception as e:
             db.session.rollback()
-            return {'success': False, 'error': f'Error interno: {str(e)}'}
+            logger.exception('Error interno reservando itinerario')
+            return _failure(
+                'database', 'internal_error', f'Error interno: {str(e)}')
+
+        return {
+            'success': True,
+            'message': 'Itinerario reservado',
+            'assignments': [
+                {'activity_id': rules.activity_id, 'activity': rules.name,
+                 'schedule': registration.schedule}
+                for _, rules, registration in checked
+            ],
+        }
 
 # Rutas de la API
-@app.route('/api/activities', methods=['GET'])
-def get_activities():
-    activities = Activity.query.all()
-    activities_payload = []
+def _not_modified(etag: str):
+    response = current_app.response_class(status=304)
+    response.set_etag(etag)
+    response.vary.add('Accept-Encoding')
+    return response
+
+def _versioned_json(key: str, version, etag: str, build):
+    """Respuesta JSON cacheada por versión de los datos.
+
+    Responde 304 si ``If-None-Match`` coincide; si el cuerpo no está en
+    caché lo calcula ``build`` una sola vez aunque lleguen varias peticiones
+    a la vez (``SingleFlight``).
+    """
+    if etag_matches(etag):
+        return _not_modified(etag)
+    response_cache = current_app.extensions['response_cache']
+    body = response_cache.get(key, version)
+    if body is None:
+        def build_and_store():
+            built = build()
+            response_cache.set(key, version, built)
+            return built
+
+        body = current_app.extensions['single_flight'].do(
+            (key, version), build_and_store)
+    response = json_response(body)
+    response.set_etag(etag)
+    response.cache_control.no_cache = True
+    return response
+
+def _catalog_entries(activities, overrides, occupancy, load_counts,
+                     start=None, end=None) -> list:
+    """Arma ``(actividad, conteos, cupos, cupo)`` para ``encode_activities``.
+
+    Args:
+        activities: Actividades a incluir
+        overrides: Cupos particulares ``{(actividad, horario): cupo}``
+        occupancy: Ocupación compartida o ``None``
+        load_counts: Devuelve los registrados ``{(actividad, horario): n}``;
+            se llama a lo sumo una vez, solo si falta algún turno en la
+            ocupación compartida
+        start, end: Ventana horaria (inclusive); los turnos fuera se omiten
+    """
+    entries = []
+    grouped = None
     for activity in activities:
         turn_capacity = get_turn_capacity(activity.name)
-        # Cupos por turno
-        per_schedule = {}
+        # Registrados y cupo efectivo por turno
+        counts, limits = {}, {}
         for s in activity.schedules:
-            reg = Registration.query.filter_by(activity_id=activity.id, schedule=s).count()
-            per_schedule[s] = {
-                'registered_count': reg,
-                'available_capacity': max(0, turn_capacity - reg),
-                'turn_capacity': turn_capacity
-            }
+            if (start and s < start) or (end and s > end):
+                continue
+            reg = occupancy.get(activity.id, s) if occupancy else None
+            if reg is None:
+                if grouped is None:
+                    # Una sola consulta agrupada para todos los turnos
+                    grouped = load_counts()
+                reg = grouped.get((activity.id, s), 0)
+            counts[s] = reg
+            limits[s] = resolve_capacity(activity.capacity, turn_capacity,
+                                         overrides.get((activity.id, s)))
+        entries.append((activity, counts, limits,
+                        resolve_capacity(activity.capacity, turn_capacity)))
+    return entries
+
+def _count_slots(activity_ids, start=None, end=None) -> dict:
+    """Registrados por turno de ``activity_ids`` dentro de la ventana."""
+    query = select(
+        Registration.activity_id, Registration.schedule,
+        func.count(Registration.id)
+    ).where(Registration.activity_id.in_(activity_ids))
+    if start:
+        query = query.where(Registration.schedule >= start)
+    if end:
+        query = query.where(Registration.schedule <= end)
+    query = query.group_by(Registration.activity_id, Registration.schedule)
+    return {(activity_id, schedule): count
+            for activity_id, schedule, count in db.session.execute(query)}
 
-        activity_dict = activity.to_dict()
-        activity_dict['per_schedule_capacity'] = per_schedule
-        activity_dict['turn_capacity'] = turn_capacity
-        activities_payload.append(activity_dict)
+def _filtered_catalog(query, occupancy, timer):
+    """Página del catálogo filtrada, con paginación por clave (``id``).
 
-    return jsonify(activities_payload)
+    Nombre (por rango sobre el índice), talla y cursor se resuelven en SQL;
+    edad mínima, ventana horaria y cupos libres sobre cada lote leído, con
+    una consulta agrupada de registrados por lote.
+
+    Returns:
+        ``(cuerpo JSON, cursor siguiente o None)``
+    """
+    statement = select(Activity).order_by(Activity.id)
+    if query.requires_clothing is not None:
+        statement = statement.where(
+            Activity.requires_clothing == query.requires_clothing)
+    if query.name_prefix:
+        statement = statement.where(
+            Activity.name >= query.name_prefix,
+            Activity.name < query.name_prefix + '\U0010ffff')
+    batch_size = max(query.limit, 50)
+    cursor, page, next_cursor = query.after, [], None
+    while next_cursor is None:
+        batch = db.session.execute(
+            statement.where(Activity.id > cursor).limit(batch_size)
+        ).scalars().all()
+        if not batch:
+            break
+        candidates = [a for a in batch
+                      if query.age is None or get_min_age(a.name) <= query.age]
+        if candidates:
+            ids = [a.id for a in candidates]
+            entries = _catalog_entries(
+                candidates, load_slot_overrides(ids), occupancy,
+                lambda: _count_slots(ids, query.start, query.end),
+                query.start, query.end)
+            for activity, counts, limits, turn_capacity in entries:
+                # Solo los turnos con los cupos libres pedidos
+                kept = [s for s in counts if query.min_seats is None
+                        or limits[s] - counts[s] >= query.min_seats]
+                if not kept:
+                    continue
+                page.append((activity, {s: counts[s] for s in kept},
+                             {s: limits[s] for s in kept}, turn_capacity))
+                if len(page) == query.limit:
+                    next_cursor = activity.id
+                    break
+        cursor = batch[-1].id
+        if len(batch) < batch_size:
+            break
+    timer.mark('occupancy')
+    return encode_activities(page), next_cursor
+
+def get_activities():
+    timer = stage_timer()
+    occupancy = get_occupancy()
+    try:
+        query = decode_catalog_query(request.args)
+    except ValidationError as error:
+        return jsonify_fast(error.to_result(), 400)
+    if query is not None:
+        body, next_cursor = _filtered_catalog(query, occupancy, timer)
+        response = json_response(body)
+        if next_cursor is not None:
+            response.headers['X-Next-Cursor'] = str(next_cursor)
+            args = request.args.to_dict()
+            args['after'] = str(next_cursor)
+            next_url = url_for('get_activities', **args)
+            response.headers['Link'] = f'<{next_url}>; rel="next"'
+        timer.mark('serialize')
+        return response
+
+    def build():
+        activities = Activity.query.all()
+        overrides = load_slot_overrides()
+        timer.mark('activities')
+        entries = _catalog_entries(
+            activities, overrides, occupancy,
+            lambda: count_registrations(db, Registration))
+        timer.mark('occupancy')
+        return encode_activities(entries)
+
+    # El catálogo se recalcula solo cuando cambia la versión de los datos
+    # (o la ocupación compartida)
+    data_version = read_data_version()
+    if data_version is None:
+        response = json_response(build())
+    else:
+        generation = occupancy.generation if occupancy else None
+        etag = f'c{data_version}'
+        if occupancy is not None:
+            etag = f'{etag}.{generation}'
+        response = _versioned_json(
+            'activities', (data_version, generation), etag, build)
+    timer.mark('serialize')
+    return response
 
-@app.route('/api/activities', methods=['POST'])
 def create_activity():
     data = request.json
     
     # Si no se proporcionan horarios, generar todos los de 30 minutos
     provided_schedules = data.get('schedules')
-    default_schedules = generate_time_slots()
+    default_schedules = list(
+        get_calendar().slots(activity=data.get('name')).ordered)
 
     activity = Activity(
         name=data['name'],
@@ -375,42 +1548,203 @@ def create_activity():
     
     return jsonify(activity.to_dict()), 201
 
-@app.route('/api/activities/<int:activity_id>/register', methods=['POST'])
 def register_visitor(activity_id):
-    data = request.json
-    
-    # Adaptar formato: si viene con 'visitor' (formato antiguo), convertir a nuevo formato
-    if 'visitor' in data:
-        # Formato antiguo: convertir a nuevo formato
-        visitor_data = {
-            'participants': [data['visitor']],
-            'terms_accepted': data['visitor'].get('terms_accepted', True),
-            'participants_count': 1
-        }
-        schedule = data['schedule']
-    else:
-        # Formato nuevo: usar directamente
-        visitor_data = data
-        schedule = data.get('schedule', '09:00')
-    
+    # El servicio decodifica ambos formatos (``participants`` y ``visitor``)
     result = ActivityService.register_visitor(
         activity_id=activity_id,
-        visitor_data=visitor_data,
-        schedule=schedule
+        visitor_data=request.get_json(silent=True)
     )
     
     if result['success']:
-        return jsonify(result), 200
+        return jsonify_fast(result, 200)
     else:
-        status_code = 404 if 'no encontrada' in result['error'] else 400
-        return jsonify(result), status_code
+        not_found = result.get('code') == 'activity_not_found'
+        status_code = 404 if not_found else 400
+        return jsonify_fast(result, status_code)
 
-@app.route('/api/visitors', methods=['GET'])
 def get_visitors():
-    visitors = Visitor.query.all()
-    return jsonify([visitor.to_dict() for visitor in visitors])
+    def build():
+        # Columnas directas: sin instanciar modelos ni armar diccionarios
+        rows = db.session.query(
+            Visitor.id, Visitor.name, Visitor.dni, Visitor.age,
+            Visitor.clothing_size, Visitor.terms_accepted
+        )
+        return encode_visitor_rows(rows)
+
+    data_version = read_data_version()
+    if data_version is None:
+        return json_response(build())
+    return _versioned_json('visitors', data_version, f'v{data_version}', build)
+
+def cancel_registration(registration_id):
+    result = CancellationService.cancel_registration(registration_id)
+    if result['success']:
+        return jsonify_fast(result, 200)
+    return jsonify_fast(result, 404)
+
+def cancel_registrations():
+    result = CancellationService.cancel_by_dni(request.get_json(silent=True))
+    return jsonify_fast(result, 200 if result['success'] else 400)
+
+_CHECKIN_STATUS = {'invalid_dni': 400, 'invalid_payload': 400,
+                   'not_registered': 404, 'already_checked_in': 409}
+
+def _checkin_response(result):
+    status = 200 if result['success'] else _CHECKIN_STATUS[result['code']]
+    return jsonify_fast(result, status)
+
+def get_checkin(dni):
+    return _checkin_response(CheckinService.lookup(dni))
+
+def post_checkin(dni):
+    return _checkin_response(
+        CheckinService.check_in(dni, request.get_json(silent=True)))
+
+def get_occupancy_analytics():
+    start, end, error = AnalyticsService.parse_range(request.args)
+    if error:
+        return jsonify_fast(error, 400)
+    data_version = read_data_version()
+    if data_version is None:
+        return jsonify_fast(AnalyticsService.occupancy(start, end), 200)
+    # Una sola entrada en caché (el último rango pedido), no una por rango
+    return _versioned_json(
+        'analytics', (data_version, start, end),
+        f'a{data_version}-{start}-{end}',
+        lambda: dumps(AnalyticsService.occupancy(start, end)))
+
+def recompute_occupancy_rollups():
+    return jsonify_fast(AnalyticsService.recompute(), 200)
+
+def _itinerary_response(result):
+    if result['success']:
+        return jsonify_fast(result, 200)
+    not_found = result['code'] == 'activity_not_found'
+    return jsonify_fast(result, 404 if not_found else 400)
+
+def plan_itinerary_route():
+    return _itinerary_response(
+        ItineraryService.plan(request.get_json(silent=True)))
+
+def commit_itinerary():
+    return _itinerary_response(
+        ItineraryService.commit(request.get_json(silent=True)))
+
+def register_routes(app):
+    """Registra las rutas de la API (los endpoints conservan su nombre)."""
+    app.add_url_rule('/api/activities', view_func=get_activities,
+                     methods=['GET'])
+    app.add_url_rule('/api/activities', view_func=create_activity,
+                     methods=['POST'])
+    app.add_url_rule('/api/activities/<int:activity_id>/register',
+                     view_func=register_visitor, methods=['POST'])
+    app.add_url_rule('/api/visitors', view_func=get_visitors, methods=['GET'])
+    app.add_url_rule('/api/registrations/<int:registration_id>',
+                     view_func=cancel_registration, methods=['DELETE'])
+    app.add_url_rule('/api/registrations/cancel',
+                     view_func=cancel_registrations, methods=['POST'])
+    app.add_url_rule('/api/checkin/<dni>',
+                     view_func=get_checkin, methods=['GET'])
+    app.add_url_rule('/api/checkin/<dni>',
+                     view_func=post_checkin, methods=['POST'])
+    app.add_url_rule('/api/itineraries/plan',
+                     view_func=plan_itinerary_route, methods=['POST'])
+    app.add_url_rule('/api/itineraries/commit',
+                     view_func=commit_itinerary, methods=['POST'])
+    app.add_url_rule('/api/analytics/occupancy',
+                     view_func=get_occupancy_analytics, methods=['GET'])
+    app.add_url_rule('/api/analytics/rollups/recompute',
+                     view_func=recompute_occupancy_rollups, methods=['POST'])
+
+def _configure_sqlite(app):
+    """Activa WAL y el tiempo de espera de bloqueo en cada conexión SQLite."""
+    if not app.config['SQLITE_WAL']:
+        return
+    with app.app_context():
+        engine = db.engine
+    if (engine.dialect.name != 'sqlite'
+            or engine.url.database in (None, '', ':memory:')):
+        return
+    busy_timeout = int(app.config['SQLITE_BUSY_TIMEOUT_MS'])
+
+    @event.listens_for(engine, 'connect')
+    def _set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute('PRAGMA journal_mode=WAL')
+        cursor.execute('PRAGMA synchronous=NORMAL')
+        cursor.execute(f'PRAGMA busy_timeout={busy_timeout}')
+        cursor.close()
+
+def create_app(config_name: str = None, overrides: dict = None) -> Flask:
+    """Crea y configura una instancia de la aplicación.
+
+    Args:
+        config_name: ``development``, ``production`` o ``testing``
+            (por defecto la variable de entorno ``APP_ENV``)
+        overrides: Claves de configuración que se aplican al final
+
+    Returns:
+        Aplicación Flask lista para servir
+    """
+    app = Flask(__name__)
+    app.config.from_object(get_config(config_name))
+    # Permite configurar desde el entorno, p. ej. ECOHARMONY_LOG_LEVEL=DEBUG
+    app.config.from_prefixed_env('ECOHARMONY')
+    if overrides:
+        app.config.update(overrides)
+
+    db.init_app(app)
+    cors.init_app(app)
+    _configure_sqlite(app)
+    init_logging(app)
+    init_serialization(app)
+    init_compression(app)
+    app.config.setdefault('SINGLE_FLIGHT_TIMEOUT', 5.0)
+    app.config.setdefault('ACTIVITY_RULES_TTL', 30.0)
+    app.config.setdefault('ITINERARY_MAX_NODES', 100000)
+    app.extensions['activity_rules'] = RulesCache(
+        _load_activity_rules, app.config['ACTIVITY_RULES_TTL'])
+    app.extensions['response_cache'] = VersionedCache()
+    app.extensions['single_flight'] = SingleFlight(
+        app.config['SINGLE_FLIGHT_TIMEOUT'])
+    init_metrics(app)
+    init_sql_instrumentation(app)
+    init_server_timing(app)
+    init_profiling(app)
+    calendar = init_calendar(app)
+    init_eventlog(app)
+    # Con el log de eventos la ocupación de arranque sale de él (ver
+    # ``eventlog.load_counts``); sin log, de la consulta agrupada
+    init_occupancy(app, db, Activity, Registration, calendar.all_slots(),
+                   load_logged_counts if 'event_log' in app.extensions
+                   else count_registrations)
+    init_checkin(app, _load_checkin_rows, _load_checkin_stats,
+                 read_data_version)
+    init_jobs(app, db, OutboxJob)
+    init_rollups(app)
+    register_routes(app)
+    return app
+
+# Aplicación por defecto, creada recién cuando se accede a ``app.app`` (tests,
+# seed_data.py y el servidor de desarrollo). Los servidores WSGI usan
+# ``create_app`` a través de ``wsgi.py``.
+_default_app = None
+_default_app_lock = threading.Lock()
+
+def __getattr__(name):
+    global _default_app
+    if name != 'app':
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    with _default_app_lock:
+        if _default_app is None:
+            _default_app = create_app()
+    return _default_app
 
 if __name__ == '__main__':
+    app = create_app()
     with app.app_context():
         db.create_all()
-    app.run(debug=True, port=5000)
\ No newline at end of file
+    app.extensions['job_queue'].start()
+    if 'occupancy_reconciler' in app.extensions:
+        app.extensions['occupancy_reconciler'].start()
+    app.run(debug=True, port=5000)
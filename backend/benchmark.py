@@ -0,0 +1,364 @@
+#!/usr/bin/env python3
+"""
+Benchmarks reproducibles de los endpoints de registro y catálogo.
+
+Crea una base SQLite temporal con el volumen de datos pedido (usando el
+generador de ``seed_data.py``), mide
+``register_visitor``, ``get_activities`` (con la caché de respuestas caliente
+y, como ``get_activities_cold``, vaciándola en cada operación),
+``get_visitors`` y ``plan_itinerary`` (grupo de cuatro, seis actividades
+repartidas por el catálogo) con el cliente de pruebas de Flask (sin red) y
+escribe throughput, percentiles de latencia y
+consultas SQL por operación en JSON. Opcionalmente compara contra una línea
+base guardada y termina con código 1 si hay regresiones; si la línea base se
+generó con otros parámetros no compara y termina con código 2.
+
+Uso:
+    python benchmark.py --activities 20 --slots 18 --iterations 100
+    python benchmark.py --baseline benchmark_baseline.json --tolerance 0.3
+    python benchmark.py --save-baseline benchmark_baseline.json
+"""
+import argparse
+import json
+import math
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+ENDPOINTS = ('register_visitor', 'get_activities', 'get_activities_cold',
+             'get_visitors', 'plan_itinerary')
+
+# Métricas de tiempo comparadas con tolerancia (p99 es demasiado ruidoso
+# con pocas iteraciones); las consultas por operación son deterministas y
+# cualquier aumento es una regresión
+LOWER_IS_BETTER = ('p50_ms', 'p95_ms')
+HIGHER_IS_BETTER = ('throughput_ops',)
+EXACT_LOWER_IS_BETTER = ('queries_per_op',)
+# Parámetros que no cambian lo medido y no impiden comparar
+IGNORED_PARAMS = ('tolerance',)
+
+
+def percentile(samples, pct: float) -> float:
+    """Percentil por rango más cercano de una lista de muestras.
+
+    Args:
+        samples: Muestras (no necesariamente ordenadas)
+        pct: Percentil entre 0 y 100
+
+    Returns:
+        Valor del percentil, o 0.0 si no hay muestras
+    """
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def summarize(latencies, elapsed: float, queries: int = 0,
+              errors: int = 0) -> dict:
+    """Resume una serie de latencias (en segundos) de una operación."""
+    operations = len(latencies)
+    return {
+        'operations': operations,
+        'errors': errors,
+        'throughput_ops': round(operations / elapsed, 2) if elapsed else 0.0,
+        'mean_ms': round(sum(latencies) / operations * 1000, 3)
+        if operations else 0.0,
+        'p50_ms': round(percentile(latencies, 50) * 1000, 3),
+        'p95_ms': round(percentile(latencies, 95) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 3),
+        'max_ms': round(max(latencies) * 1000, 3) if latencies else 0.0,
+        'queries_per_op': round(queries / operations, 2)
+        if operations else 0.0,
+    }
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    """Compara resultados contra una línea base.
+
+    Args:
+        results: Resultados por endpoint (``run_benchmarks``)
+        baseline: Resultados guardados previamente
+        tolerance: Variación relativa admitida en los tiempos (0.3 = 30 %)
+
+    Returns:
+        Lista de regresiones encontradas (vacía si no hay)
+    """
+    regressions = []
+    for endpoint, reference in baseline.items():
+        current = results.get(endpoint)
+        if current is None:
+            continue
+        for metric in LOWER_IS_BETTER:
+            if metric not in reference:
+                continue
+            limit = reference[metric] * (1 + tolerance)
+            if current[metric] > limit:
+                regressions.append(
+                    f'{endpoint}.{metric}: {current[metric]} > '
+                    f'{reference[metric]} (+{tolerance:.0%})'
+                )
+        for metric in EXACT_LOWER_IS_BETTER:
+            if metric in reference and current[metric] > reference[metric]:
+                regressions.append(
+                    f'{endpoint}.{metric}: {current[metric]} > '
+                    f'{reference[metric]}'
+                )
+        for metric in HIGHER_IS_BETTER:
+            if metric not in reference:
+                continue
+            limit = reference[metric] * (1 - tolerance)
+            if current[metric] < limit:
+                regressions.append(
+                    f'{endpoint}.{metric}: {current[metric]} < '
+                    f'{reference[metric]} (-{tolerance:.0%})'
+                )
+    return regressions
+
+
+def param_mismatches(params: dict, reference: dict) -> list:
+    """Parámetros de la corrida que difieren de los de la línea base.
+
+    Las consultas por operación dependen de ``iterations`` y del volumen de
+    datos, así que dos corridas solo son comparables con los mismos
+    parámetros (salvo ``IGNORED_PARAMS``).
+
+    Args:
+        params: Parámetros de la corrida actual
+        reference: ``meta.params`` de la línea base
+
+    Returns:
+        Diferencias encontradas (vacía si las corridas son comparables)
+    """
+    mismatches = []
+    for key in sorted(set(params) | set(reference)):
+        if key in IGNORED_PARAMS:
+            continue
+        if params.get(key) != reference.get(key):
+            mismatches.append(f'{key}: {params.get(key)} '
+                              f'(línea base: {reference.get(key)})')
+    return mismatches
+
+
+def free_slots(app_module, activities: int, schedules) -> list:
+    """Lista los (actividad, horario) con cupo libre, uno por asiento."""
+    from sqlalchemy import func
+
+    Registration = app_module.Registration
+    counts = dict(
+        ((activity_id, schedule), count)
+        for activity_id, schedule, count in app_module.db.session.query(
+            Registration.activity_id, Registration.schedule,
+            func.count(Registration.id)
+        ).group_by(Registration.activity_id, Registration.schedule)
+    )
+    activity_rows = {
+        activity_id: (name, capacity)
+        for activity_id, name, capacity in app_module.db.session.query(
+            app_module.Activity.id, app_module.Activity.name,
+            app_module.Activity.capacity
+        )
+    }
+    overrides = app_module.load_slot_overrides()
+    seats = []
+    for schedule in schedules:
+        for activity_id in range(1, activities + 1):
+            name, activity_capacity = activity_rows[activity_id]
+            capacity = app_module.resolve_capacity(
+                activity_capacity, app_module.get_turn_capacity(name),
+                overrides.get((activity_id, schedule))
+            )
+            free = capacity - counts.get((activity_id, schedule), 0)
+            seats.extend([(activity_id, schedule)] * max(0, free))
+    # Intercalar para no llenar un turno tras otro
+    return seats[::2] + seats[1::2]
+
+
+def _measure(client, count_queries, operations, call):
+    latencies, errors = [], 0
+    with count_queries() as stats:
+        started = time.perf_counter()
+        for index in range(operations):
+            op_started = time.perf_counter()
+            ok = call(index)
+            latencies.append(time.perf_counter() - op_started)
+            errors += 0 if ok else 1
+        elapsed = time.perf_counter() - started
+    return summarize(latencies, elapsed, stats.count, errors)
+
+
+def run_benchmarks(app_module, schedules, activities: int, iterations: int,
+                   warmup: int = 10) -> dict:
+    """Ejecuta los benchmarks y devuelve los resultados por endpoint."""
+    from sql_instrumentation import count_queries
+
+    client = app_module.app.test_client()
+    seats = free_slots(app_module, activities, schedules)
+    next_dni = [90000000]
+
+    def register(index):
+        if index >= len(seats):
+            return False
+        activity_id, schedule = seats[index]
+        next_dni[0] += 1
+        response = client.post(
+            f'/api/activities/{activity_id}/register',
+            json={
+                'participants': [{
+                    'name': 'Benchmark', 'dni': str(next_dni[0]),
+                    'age': 30, 'clothing_size': 'M',
+                }],
+                'terms_accepted': True,
+                'schedule': schedule,
+                'current_time': '08:00',
+            },
+        )
+        return response.status_code == 200
+
+    def get(path):
+        return lambda index: client.get(path).status_code == 200
+
+    def get_cold(path):
+        cache = app_module.app.extensions['response_cache']
+
+        def call(index):
+            cache.clear()
+            return client.get(path).status_code == 200
+        return call
+
+    group = [
+        {'name': 'Benchmark', 'dni': str(80000000 + index), 'age': 30,
+         'clothing_size': 'M'}
+        for index in range(4)
+    ]
+
+    def plan(index):
+        wanted = min(6, activities)
+        response = client.post('/api/itineraries/plan', json={
+            'participants': group,
+            'activities': [(index * wanted + offset) % activities + 1
+                           for offset in range(wanted)],
+            'current_time': '08:00',
+        })
+        # Sin plan factible también es una respuesta válida
+        return response.status_code in (200, 400)
+
+    calls = {
+        'register_visitor': register,
+        'get_activities': get('/api/activities'),
+        'get_activities_cold': get_cold('/api/activities'),
+        'get_visitors': get('/api/visitors'),
+        'plan_itinerary': plan,
+    }
+    results = {}
+    for endpoint in ENDPOINTS:
+        for index in range(warmup):
+            if endpoint != 'register_visitor':
+                calls[endpoint](index)
+        results[endpoint] = _measure(
+            client, count_queries, iterations, calls[endpoint]
+        )
+    return results
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--activities', type=int, default=20)
+    parser.add_argument('--slots', type=int, default=18,
+                        help='Horarios por actividad (máx. 18)')
+    parser.add_argument('--days', type=int, default=1,
+                        help='Días de registros existentes a generar')
+    parser.add_argument('--fill-ratio', type=float, default=0.4,
+                        help='Ocupación previa de cada turno')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--iterations', type=int, default=100)
+    parser.add_argument('--warmup', type=int, default=10)
+    parser.add_argument('--output', default='benchmark_results.json')
+    parser.add_argument('--baseline',
+                        help='JSON de línea base contra el que comparar')
+    parser.add_argument('--tolerance', type=float, default=0.3)
+    parser.add_argument('--save-baseline',
+                        help='Guarda los resultados como nueva línea base')
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    params = {
+        key: value for key, value in vars(args).items()
+        if key not in ('output', 'baseline', 'save_baseline')
+    }
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as handle:
+            baseline = json.load(handle)
+        mismatches = param_mismatches(
+            params, baseline.get('meta', {}).get('params', {}))
+        if mismatches:
+            print('La línea base se generó con otros parámetros; '
+                  'no se compara:', file=sys.stderr)
+            for mismatch in mismatches:
+                print(f'  - {mismatch}', file=sys.stderr)
+            return 2
+
+    workdir = tempfile.mkdtemp(prefix='ecoharmony-bench-')
+    os.environ['ECOHARMONY_SQLALCHEMY_DATABASE_URI'] = (
+        'sqlite:///' + os.path.join(workdir, 'benchmark.db')
+    )
+    # Las advertencias de N+1 por petición ensuciarían la salida
+    os.environ.setdefault('ECOHARMONY_LOG_LEVEL', 'ERROR')
+    import app as app_module
+    from seed_data import generate_synthetic_data
+
+    try:
+        with app_module.app.app_context():
+            generate_synthetic_data(
+                activities=args.activities, days=args.days,
+                fill_ratio=args.fill_ratio, seed=args.seed, slots=args.slots,
+            )
+            schedules = app_module.generate_time_slots()[:args.slots]
+            results = run_benchmarks(app_module, schedules, args.activities,
+                                     args.iterations, args.warmup)
+            app_module.db.session.remove()
+            app_module.db.engine.dispose()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        'meta': {
+            'timestamp': datetime.now(timezone.utc).isoformat(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'params': params,
+        },
+        'results': results,
+    }
+    with open(args.output, 'w', encoding='utf-8') as handle:
+        json.dump(report, handle, indent=2)
+    for endpoint, summary in results.items():
+        print(f'{endpoint:18} {summary["throughput_ops"]:>10.1f} ops/s  '
+              f'p50 {summary["p50_ms"]:.2f} ms  p95 {summary["p95_ms"]:.2f} '
+              f'ms  p99 {summary["p99_ms"]:.2f} ms  '
+              f'{summary["queries_per_op"]:.1f} consultas/op')
+    if args.save_baseline:
+        with open(args.save_baseline, 'w', encoding='utf-8') as handle:
+            json.dump(report, handle, indent=2)
+
+    if baseline is not None:
+        regressions = compare(results, baseline['results'], args.tolerance)
+        if regressions:
+            print('\nRegresiones respecto a la línea base:')
+            for regression in regressions:
+                print(f'  - {regression}')
+            return 1
+        print('\nSin regresiones respecto a la línea base')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,111 @@
+"""Cachés en memoria de respuestas derivadas de la base.
+
+Cada entrada se guarda junto a la versión de los datos con la que se
+calculó (ver ``DataVersion`` en ``app.py``); una lectura con otra versión
+es un fallo de caché. Así no hace falta invalidar explícitamente: cualquier
+commit que toque los datos cambia la versión.
+
+``SingleFlight`` evita que varios hilos recalculen a la vez la misma
+entrada tras un cambio: el primero calcula y el resto espera su resultado.
+"""
+import threading
+
+from metrics import REGISTRY
+
+SINGLE_FLIGHT_CALLS = REGISTRY.counter(
+    'single_flight_calls_total',
+    'Cálculos por grupo y rol (leader calcula, coalesced espera su '
+    'resultado, timeout se cansó de esperar y calculó por su cuenta)',
+    ('group', 'role'),
+)
+
+
+class VersionedCache:
+    """Un valor por clave, válido solo para una versión de los datos."""
+
+    def __init__(self):
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, key, version):
+        """Devuelve el valor guardado para ``version`` o ``None``."""
+        entry = self._entries.get(key)
+        if entry is None or entry[0] != version:
+            return None
+        return entry[1]
+
+    def set(self, key, version, value):
+        with self._lock:
+            self._entries[key] = (version, value)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class _Call:
+    __slots__ = ('done', 'result', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Une cálculos idénticos concurrentes dentro de un proceso.
+
+    Args:
+        timeout: Segundos que un seguidor espera al líder; al vencer calcula
+            por su cuenta en lugar de fallar
+    """
+
+    def __init__(self, timeout: float = 5.0):
+        self.timeout = timeout
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: tuple, fn):
+        """Ejecuta ``fn`` una sola vez por ``key`` entre hilos concurrentes.
+
+        Args:
+            key: Tupla cuyo primer elemento es el grupo (etiqueta de métricas)
+            fn: Cálculo sin argumentos
+
+        Returns:
+            Resultado de ``fn``, propio o del líder
+
+        Raises:
+            La excepción del líder, también en los seguidores que lo esperaban
+        """
+        group = key[0]
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if leader:
+            SINGLE_FLIGHT_CALLS.inc(group, 'leader')
+            try:
+                call.result = fn()
+            except Exception as error:
+                call.error = error
+                raise
+            finally:
+                with self._lock:
+                    del self._calls[key]
+                call.done.set()
+            return call.result
+
+        if not call.done.wait(self.timeout):
+            SINGLE_FLIGHT_CALLS.inc(group, 'timeout')
+            return fn()
+        SINGLE_FLIGHT_CALLS.inc(group, 'coalesced')
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+    def in_flight(self) -> int:
+        """Cálculos en curso (para tests y diagnóstico)."""
+        return len(self._calls)
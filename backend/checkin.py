@@ -0,0 +1,248 @@
+"""Índice en memoria de los registros del día para el control de ingreso.
+
+En la entrada se escanean DNIs y hay que responder al instante qué
+actividad y horario reservó cada persona. ``CheckinIndex`` guarda los
+registros de hoy en un diccionario ``dni -> reservas`` y un filtro de Bloom
+con los DNIs: si el filtro dice que no, la respuesta "no registrado" sale
+sin tocar el diccionario (ni la base).
+
+Consistencia:
+    - Los registros y cancelaciones de este proceso dejan su cambio en la
+      sesión (``stage``) y se aplican en ``after_commit``; si la
+      transacción se revierte se descartan.
+    - Antes de cada búsqueda ``sync`` compara la versión de los datos (una
+      consulta por clave primaria). Si cambió (otro worker registró o
+      canceló) trae los registros nuevos por id y, si el conteo del día no
+      coincide (hubo cancelaciones), reconstruye el índice.
+    - Al cambiar el día local del parque (el mismo de rollups y calendario)
+      se reconstruye con los registros del nuevo día.
+"""
+import hashlib
+import math
+import threading
+from datetime import datetime, timezone
+
+from flask import current_app, has_app_context
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from logging_config import get_logger
+from metrics import REGISTRY
+from rollups import rollup_day
+
+logger = get_logger('checkin')
+
+_STAGED_KEY = 'checkin_changes'
+
+CHECKIN_LOOKUPS = REGISTRY.counter(
+    'checkin_lookups_total',
+    'Búsquedas de DNI en el ingreso por resultado',
+    ('result',),
+)
+
+
+class BloomFilter:
+    """Filtro de Bloom sobre un ``bytearray`` (sin falsos negativos).
+
+    Args:
+        capacity: Elementos previstos
+        error_rate: Tasa de falsos positivos buscada con ``capacity``
+    """
+
+    def __init__(self, capacity: int, error_rate: float = 0.01):
+        capacity = max(1, capacity)
+        bits = -capacity * math.log(error_rate) / (math.log(2) ** 2)
+        self.size = max(64, int(math.ceil(bits / 8)) * 8)
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.count = 0
+        self._bits = bytearray(self.size // 8)
+
+    def _positions(self, key: str):
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], 'little')
+        second = int.from_bytes(digest[8:], 'little') | 1
+        return [(first + i * second) % self.size for i in range(self.hashes)]
+
+    def add(self, key: str):
+        for position in self._positions(key):
+            self._bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, key: str) -> bool:
+        return all(self._bits[position >> 3] & (1 << (position & 7))
+                   for position in self._positions(key))
+
+
+class Booking:
+    """Reserva del día indexada por DNI."""
+
+    __slots__ = ('registration_id', 'dni', 'activity_id', 'schedule')
+
+    def __init__(self, registration_id: int, dni: str, activity_id: int,
+                 schedule: str):
+        self.registration_id = registration_id
+        self.dni = dni
+        self.activity_id = activity_id
+        self.schedule = schedule
+
+    def __repr__(self):
+        return (f'Booking({self.registration_id!r}, {self.dni!r}, '
+                f'{self.activity_id!r}, {self.schedule!r})')
+
+
+def today() -> datetime:
+    """Inicio del día local del parque (``rollup_day``) en UTC naive, como
+    ``registered_at``."""
+    midnight = datetime.combine(rollup_day(), datetime.min.time())
+    return midnight.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+class CheckinIndex:
+    """Reservas de hoy por DNI, con un filtro de Bloom delante.
+
+    Args:
+        load_rows: ``load_rows(day_start, after_id)`` devuelve tuplas
+            ``(registration_id, dni, activity_id, schedule)`` del día con
+            id mayor a ``after_id``
+        load_stats: ``load_stats(day_start)`` devuelve ``(cantidad, max_id)``
+            de los registros del día
+        read_version: Devuelve la versión actual de los datos
+        error_rate: Falsos positivos buscados en el filtro
+    """
+
+    def __init__(self, load_rows, load_stats, read_version,
+                 error_rate: float = 0.01):
+        self.load_rows = load_rows
+        self.load_stats = load_stats
+        self.read_version = read_version
+        self.error_rate = error_rate
+        self.day = None
+        self.version = None
+        self.max_id = 0
+        self._by_dni = {}
+        self._by_id = {}
+        self._filter = BloomFilter(1, error_rate)
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._by_id)
+
+    def rebuild(self, day=None, version=None):
+        """Carga desde cero los registros de ``day`` (por defecto hoy)."""
+        day = day or today()
+        rows = self.load_rows(day, 0)
+        with self._lock:
+            self.day = day
+            self.version = version
+            self._by_dni, self._by_id, self.max_id = {}, {}, 0
+            self._filter = BloomFilter(
+                max(1024, 2 * len(rows)), self.error_rate)
+            for row in rows:
+                self._add(Booking(*row))
+        logger.info('Índice de ingreso reconstruido',
+                    extra={'fields': {'bookings': len(rows)}})
+
+    def sync(self):
+        """Pone el índice al día con la base si la versión cambió."""
+        version = self.read_version()
+        day = today()
+        with self._lock:
+            if (self.day == day and version is not None
+                    and version == self.version):
+                return
+            if self.day != day:
+                self.rebuild(day, version)
+                return
+            count, max_id = self.load_stats(day)
+            if max_id and max_id > self.max_id:
+                for row in self.load_rows(day, self.max_id):
+                    if row[0] not in self._by_id:
+                        self._add(Booking(*row))
+            if count != len(self._by_id):
+                # Cancelaciones hechas por otro proceso
+                self.rebuild(day, version)
+                return
+            self.version = version
+
+    def lookup(self, dni: str) -> list:
+        """Reservas de hoy del DNI (lista vacía si no tiene)."""
+        self.sync()
+        with self._lock:
+            if dni not in self._filter:
+                CHECKIN_LOOKUPS.inc('filtered')
+                return []
+            bookings = sorted(self._by_dni.get(dni, ()),
+                              key=lambda booking: booking.schedule)
+        CHECKIN_LOOKUPS.inc('registered' if bookings else 'not_registered')
+        return bookings
+
+    def apply(self, added=(), removed=()):
+        """Aplica registros nuevos y cancelados ya confirmados."""
+        with self._lock:
+            if self.day is None:
+                return  # Se cargará completo en la primera búsqueda
+            for booking in added:
+                self._add(booking)
+            for registration_id in removed:
+                booking = self._by_id.pop(registration_id, None)
+                if booking is not None:
+                    self._by_dni[booking.dni].remove(booking)
+                    if not self._by_dni[booking.dni]:
+                        del self._by_dni[booking.dni]
+
+    def _add(self, booking: Booking):
+        if booking.registration_id in self._by_id:
+            return
+        self._by_id[booking.registration_id] = booking
+        self._by_dni.setdefault(booking.dni, []).append(booking)
+        self.max_id = max(self.max_id, booking.registration_id)
+        if self._filter.count >= self._filter.capacity:
+            # Filtro lleno: rehacerlo más grande con los DNIs actuales
+            self._filter = BloomFilter(
+                2 * self._filter.capacity, self.error_rate)
+            for dni in self._by_dni:
+                self._filter.add(dni)
+        else:
+            self._filter.add(booking.dni)
+
+
+def get_checkin_index():
+    """Índice de la aplicación actual, o ``None`` fuera de contexto."""
+    if not has_app_context():
+        return None
+    return current_app.extensions.get('checkin_index')
+
+
+def stage(session, added=(), removed=()):
+    """Deja cambios del índice para aplicarlos tras el commit."""
+    index = get_checkin_index()
+    if index is not None:
+        session.info.setdefault(_STAGED_KEY, []).append(
+            (index, tuple(added), tuple(removed)))
+
+
+@event.listens_for(Session, 'after_commit')
+def _apply_staged(session):
+    for index, added, removed in session.info.pop(_STAGED_KEY, ()):
+        index.apply(added, removed)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_staged(session):
+    session.info.pop(_STAGED_KEY, None)
+
+
+def init_checkin(app, load_rows, load_stats, read_version):
+    """Crea el índice de ingreso de ``app`` (se carga en la primera búsqueda).
+
+    Claves de configuración:
+        CHECKIN_BLOOM_ERROR_RATE: Falsos positivos del filtro (por defecto
+            0.01)
+    """
+    app.config.setdefault('CHECKIN_BLOOM_ERROR_RATE', 0.01)
+    index = CheckinIndex(load_rows, load_stats, read_version,
+                         app.config['CHECKIN_BLOOM_ERROR_RATE'])
+    app.extensions['checkin_index'] = index
+    return index
@@ -0,0 +1,173 @@
+"""Compresión de respuestas JSON negociada con ``Accept-Encoding``.
+
+Las respuestas JSON de al menos ``COMPRESSION_MIN_SIZE`` bytes se comprimen
+con brotli (si está instalado) o gzip, según lo que acepte el cliente, y
+llevan ``Vary: Accept-Encoding``. Si la respuesta trae un ``ETag`` fuerte
+el cuerpo comprimido se guarda por (ETag, codificación): mientras el
+contenido no cambie se comprime una sola vez.
+
+La variante comprimida lleva el ETag con sufijo (``"c12-gzip"``); usar
+``etag_matches`` para responder ``304`` a cualquiera de las variantes.
+"""
+import gzip
+import threading
+from collections import OrderedDict
+
+from flask import request
+
+from metrics import REGISTRY
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - dependencia opcional
+    brotli = None
+
+COMPRESSED_RESPONSES = REGISTRY.counter(
+    'http_compressed_responses_total',
+    'Respuestas comprimidas por codificación y uso de la caché',
+    ('encoding', 'cache'),
+)
+
+
+def supported_encodings() -> tuple:
+    """Codificaciones disponibles, en orden de preferencia."""
+    return ('br', 'gzip') if brotli is not None else ('gzip',)
+
+
+def negotiate(accept_encoding: str, available=None):
+    """Elige la codificación para un ``Accept-Encoding``.
+
+    Args:
+        accept_encoding: Valor de la cabecera (puede ser vacío)
+        available: Codificaciones posibles en orden de preferencia
+
+    Returns:
+        ``'br'``, ``'gzip'`` o ``None`` si no corresponde comprimir
+    """
+    available = available or supported_encodings()
+    weights = {}
+    for item in (accept_encoding or '').split(','):
+        coding, _, params = item.strip().partition(';')
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        quality = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        weights[coding] = quality
+    best, best_quality = None, 0.0
+    for coding in available:
+        quality = weights.get(coding, weights.get('*', 0.0))
+        if quality > best_quality:
+            best, best_quality = coding, quality
+    return best
+
+
+def compress(data: bytes, encoding: str, level: int = 6) -> bytes:
+    """Comprime ``data`` (gzip con ``mtime=0`` para salida estable)."""
+    if encoding == 'br':
+        return brotli.compress(data, quality=min(level, 11))
+    return gzip.compress(data, compresslevel=level, mtime=0)
+
+
+def variant_etag(etag: str, encoding: str) -> str:
+    return f'{etag}-{encoding}'
+
+
+def etag_matches(etag: str) -> bool:
+    """Indica si ``If-None-Match`` coincide con ``etag`` o sus variantes."""
+    if_none_match = request.if_none_match
+    if not if_none_match:
+        return False
+    if if_none_match.contains(etag) or if_none_match.star_tag:
+        return True
+    return any(if_none_match.contains(variant_etag(etag, encoding))
+               for encoding in supported_encodings())
+
+
+class CompressedBodyCache:
+    """LRU de cuerpos comprimidos por (ETag, codificación)."""
+
+    def __init__(self, max_entries: int = 64):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            body = self._entries.get(key)
+            if body is not None:
+                self._entries.move_to_end(key)
+            return body
+
+    def set(self, key, body: bytes):
+        with self._lock:
+            self._entries[key] = body
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+def _add_vary(response):
+    vary = response.vary
+    if 'accept-encoding' not in {value.lower() for value in vary}:
+        vary.add('Accept-Encoding')
+
+
+def init_compression(app):
+    """Registra la compresión de respuestas en ``app``.
+
+    Claves de configuración:
+        COMPRESSION_ENABLED: Activa la compresión (por defecto ``True``)
+        COMPRESSION_MIN_SIZE: Tamaño mínimo en bytes (por defecto 1024)
+        COMPRESSION_LEVEL: Nivel de gzip / calidad de brotli (por defecto 6)
+        COMPRESSION_CACHE_SIZE: Cuerpos comprimidos guardados por ETag
+    """
+    app.config.setdefault('COMPRESSION_ENABLED', True)
+    app.config.setdefault('COMPRESSION_MIN_SIZE', 1024)
+    app.config.setdefault('COMPRESSION_LEVEL', 6)
+    app.config.setdefault('COMPRESSION_CACHE_SIZE', 64)
+    cache = CompressedBodyCache(app.config['COMPRESSION_CACHE_SIZE'])
+    app.extensions['compressed_bodies'] = cache
+
+    @app.after_request
+    def _compress_response(response):
+        if (not app.config['COMPRESSION_ENABLED']
+                or response.mimetype != 'application/json'
+                or response.direct_passthrough or response.is_streamed
+                or response.status_code in (204, 304)
+                or 'Content-Encoding' in response.headers):
+            return response
+        body = response.get_data()
+        if len(body) < app.config['COMPRESSION_MIN_SIZE']:
+            return response
+        _add_vary(response)
+        encoding = negotiate(request.headers.get('Accept-Encoding', ''))
+        if encoding is None:
+            return response
+
+        etag, weak = response.get_etag()
+        key = (etag, encoding) if etag and not weak else None
+        compressed = cache.get(key) if key else None
+        COMPRESSED_RESPONSES.inc(
+            encoding,
+            'none' if key is None else 'hit' if compressed is not None
+            else 'miss'
+        )
+        if compressed is None:
+            compressed = compress(body, encoding,
+                                  app.config['COMPRESSION_LEVEL'])
+            if key:
+                cache.set(key, compressed)
+        response.set_data(compressed)
+        response.headers['Content-Encoding'] = encoding
+        if key:
+            response.set_etag(variant_etag(etag, encoding))
+        return response
@@ -0,0 +1,60 @@
+"""Configuración de la aplicación por entorno.
+
+``APP_ENV`` elige la clase (``development`` por defecto, ``production`` o
+``testing``). Cualquier clave puede sobrescribirse desde el entorno con el
+prefijo ``ECOHARMONY_`` (por ejemplo ``ECOHARMONY_LOG_LEVEL=DEBUG``).
+"""
+import os
+
+
+class Config:
+    """Valores comunes a todos los entornos."""
+
+    SQLALCHEMY_DATABASE_URI = os.environ.get(
+        'DATABASE_URL', 'sqlite:///activities.db'
+    )
+    SQLALCHEMY_TRACK_MODIFICATIONS = False
+    # Activa WAL y espera de bloqueo en SQLite (varios workers escribiendo)
+    SQLITE_WAL = False
+    SQLITE_BUSY_TIMEOUT_MS = 5000
+
+
+class DevelopmentConfig(Config):
+    """Servidor de desarrollo de Flask, un solo proceso."""
+
+
+class ProductionConfig(Config):
+    """Servidor WSGI con varios workers (ver ``gunicorn.conf.py``)."""
+
+    SQLITE_WAL = True
+    SQLITE_BUSY_TIMEOUT_MS = 15000
+    # Ocupación de turnos en memoria compartida entre workers
+    SHARED_OCCUPANCY = True
+    # Log de eventos: la ocupación se reconstruye desde él al arrancar
+    EVENT_LOG = True
+    LOG_LEVEL = 'INFO'
+
+
+class TestingConfig(Config):
+    """Base en memoria aislada por aplicación."""
+
+    TESTING = True
+    SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
+
+
+CONFIGS = {
+    'development': DevelopmentConfig,
+    'production': ProductionConfig,
+    'testing': TestingConfig,
+}
+
+
+def get_config(name: str = None):
+    """Devuelve la clase de configuración para ``name`` o ``APP_ENV``."""
+    name = name or os.environ.get('APP_ENV', 'development')
+    try:
+        return CONFIGS[name]
+    except KeyError:
+        raise ValueError(
+            f'Entorno desconocido: {name} (opciones: {", ".join(CONFIGS)})'
+        ) from None
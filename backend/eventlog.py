@@ -0,0 +1,589 @@
+#!/usr/bin/env python3
+"""Registro de eventos de solo agregado y reconstrucción de la ocupación.
+
+Cada registro, cancelación y cambio de actividad confirmado se agrega a un
+log binario en segmentos; cada tanto se guarda una instantánea de la
+ocupación por turno. Al arrancar, la ocupación se reconstruye con la
+última instantánea más la cola del log, sin recorrer ``Registration``.
+
+Formato (little-endian):
+    - Segmentos ``<primer seq>.log``: tramas ``<largo u32><crc32 u32>``
+      seguidas del cuerpo: ``seq u64, ts f64, tipo u8, actividad u32,
+      delta i16, horario 5s, n u16``, ``n`` pares ``(registro u32,
+      visitante u32)`` y, en los cambios de actividad, JSON con los datos.
+    - Índice ``<primer seq>.idx`` por segmento: pares ``(seq u64, offset
+      u64)`` cada ``INDEX_INTERVAL`` eventos, para saltar a un seq sin
+      leer el segmento entero.
+    - Instantáneas ``snapshot-<seq>.snap``: cabecera ``EVSN``, versión,
+      seq, ts, cantidad; entradas ``(actividad u32, horario 5s, n u32)`` y
+      crc32 al final. Se escriben en un temporal y se renombran.
+
+Los eventos se dejan en la sesión (``stage``) y se agregan en
+``after_commit``: una transacción revertida no escribe nada. Varios
+procesos agregan al mismo directorio bajo un ``flock``; una trama a medio
+escribir al final del último segmento se descarta al abrirlo.
+
+Uso para auditoría:
+    python eventlog.py instance/eventlog --activity 3 --after 1000
+"""
+import argparse
+import fcntl
+import json
+import os
+import struct
+import sys
+import threading
+import time
+import zlib
+from collections import namedtuple
+
+from flask import current_app, has_app_context
+from sqlalchemy import event, func
+from sqlalchemy.orm import Session
+
+from logging_config import get_logger
+
+logger = get_logger('eventlog')
+
+REGISTERED = 1
+CANCELLED = 2
+ACTIVITY_CREATED = 3
+ACTIVITY_UPDATED = 4
+ACTIVITY_DELETED = 5
+KIND_NAMES = {
+    REGISTERED: 'registered',
+    CANCELLED: 'cancelled',
+    ACTIVITY_CREATED: 'activity_created',
+    ACTIVITY_UPDATED: 'activity_updated',
+    ACTIVITY_DELETED: 'activity_deleted',
+}
+
+INDEX_INTERVAL = 64
+
+_FRAME = struct.Struct('<II')
+_HEAD = struct.Struct('<QdBIh5sH')
+_PAIR = struct.Struct('<II')
+_INDEX = struct.Struct('<QQ')
+_SNAP_HEAD = struct.Struct('<4sIQdI')
+_SNAP_ENTRY = struct.Struct('<I5sI')
+_SNAP_MAGIC = b'EVSN'
+_SNAP_VERSION = 1
+_STAGED_KEY = 'eventlog_events'
+
+Event = namedtuple('Event', ('seq', 'ts', 'kind', 'activity_id', 'schedule',
+                             'delta', 'ids', 'data'))
+Event.__doc__ = 'Evento leído del log (``ids``: pares registro/visitante).'
+
+
+def _encode(seq: int, ts: float, kind: int, activity_id: int, schedule: str,
+            delta: int, ids, data) -> bytes:
+    ids = tuple(ids or ())
+    body = [_HEAD.pack(seq, ts, kind, activity_id, delta,
+                       (schedule or '').encode('ascii'), len(ids))]
+    body.extend(_PAIR.pack(*pair) for pair in ids)
+    if data is not None:
+        body.append(json.dumps(data, separators=(',', ':'),
+                               default=str).encode())
+    body = b''.join(body)
+    return _FRAME.pack(len(body), zlib.crc32(body)) + body
+
+
+def _decode(body: bytes) -> Event:
+    (seq, ts, kind, activity_id, delta, schedule,
+     count) = _HEAD.unpack_from(body)
+    offset = _HEAD.size
+    ids = [_PAIR.unpack_from(body, offset + i * _PAIR.size)
+           for i in range(count)]
+    offset += count * _PAIR.size
+    data = json.loads(body[offset:]) if len(body) > offset else None
+    return Event(seq, ts, kind, activity_id,
+                 schedule.rstrip(b'\0').decode('ascii'), delta, ids, data)
+
+
+def _frames(handle, offset: int = 0):
+    """Recorre las tramas válidas desde ``offset``: ``(offset, cuerpo)``."""
+    handle.seek(offset)
+    while True:
+        header = handle.read(_FRAME.size)
+        if len(header) < _FRAME.size:
+            return
+        length, crc = _FRAME.unpack(header)
+        body = handle.read(length)
+        if len(body) < length or zlib.crc32(body) != crc:
+            return  # Trama incompleta o dañada: fin de los datos válidos
+        yield offset, body
+        offset += _FRAME.size + length
+
+
+class OccupancyState:
+    """Ocupación por turno que resulta de aplicar eventos en orden."""
+
+    def __init__(self, counts=None):
+        self.counts = dict(counts or {})
+
+    def apply(self, event_: Event):
+        key = (event_.activity_id, event_.schedule)
+        if event_.kind == REGISTERED:
+            self.counts[key] = self.counts.get(key, 0) + event_.delta
+        elif event_.kind == CANCELLED:
+            remaining = self.counts.get(key, 0) - event_.delta
+            if remaining > 0:
+                self.counts[key] = remaining
+            else:
+                self.counts.pop(key, None)
+        elif event_.kind == ACTIVITY_DELETED:
+            # Los registros de la actividad se borran con ella
+            stale_keys = [key for key in self.counts
+                          if key[0] == event_.activity_id]
+            for stale in stale_keys:
+                del self.counts[stale]
+
+    def total(self) -> int:
+        return sum(self.counts.values())
+
+
+class EventLog:
+    """Log de eventos en segmentos con índice e instantáneas.
+
+    Args:
+        directory: Directorio del log (se crea si falta)
+        segment_bytes: Tamaño a partir del cual se abre un segmento nuevo
+        snapshot_every: Eventos entre instantáneas automáticas (0 = nunca)
+        keep_snapshots: Instantáneas que se conservan
+        fsync: ``fsync`` tras cada escritura (más durable, más lento)
+    """
+
+    def __init__(self, directory: str, segment_bytes: int = 4 * 1024 * 1024,
+                 snapshot_every: int = 10000, keep_snapshots: int = 2,
+                 fsync: bool = False):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.snapshot_every = snapshot_every
+        self.keep_snapshots = keep_snapshots
+        self.fsync = fsync
+        os.makedirs(directory, exist_ok=True)
+        self._thread_lock = threading.Lock()
+        self._lock_file = open(os.path.join(directory, '.lock'), 'a+')
+        self._segment = None        # primer seq del segmento activo
+        self._size = 0              # tamaño conocido del segmento activo
+        self._last_seq = 0
+        self._since_index = 0
+        self._snapshot_seq = self._latest_snapshot_seq()
+        self._snapshotting = threading.Lock()
+        with self._locked():
+            self._recover()
+
+    # Archivos
+
+    def _path(self, first_seq: int, suffix: str) -> str:
+        return os.path.join(self.directory, f'{first_seq:020d}.{suffix}')
+
+    def segments(self) -> list:
+        """Primer seq de cada segmento, en orden."""
+        return sorted(int(name[:-4]) for name in os.listdir(self.directory)
+                      if name.endswith('.log') and name[:-4].isdigit())
+
+    def _snapshots(self) -> list:
+        return sorted(int(name[9:-5]) for name in os.listdir(self.directory)
+                      if name.startswith('snapshot-')
+                      and name.endswith('.snap'))
+
+    def _latest_snapshot_seq(self) -> int:
+        snapshots = self._snapshots()
+        return snapshots[-1] if snapshots else 0
+
+    def _index_entries(self, first_seq: int) -> list:
+        try:
+            with open(self._path(first_seq, 'idx'), 'rb') as handle:
+                raw = handle.read()
+        except FileNotFoundError:
+            return []
+        usable = len(raw) - len(raw) % _INDEX.size
+        return [_INDEX.unpack_from(raw, offset)
+                for offset in range(0, usable, _INDEX.size)]
+
+    def _locked(self):
+        return _FileLock(self._thread_lock, self._lock_file)
+
+    def _recover(self):
+        """Relee el final del log (escrito por este u otro proceso)."""
+        segments = self.segments()
+        if not segments:
+            self._segment, self._size = None, 0
+            self._last_seq, self._since_index = 0, 0
+            return
+        first = segments[-1]
+        path = self._path(first, 'log')
+        size = os.path.getsize(path)
+        entries = self._index_entries(first)
+        if entries and entries[-1][1] >= size:
+            # Índice más adelantado que el segmento: reescribirlo sin esas
+            # entradas
+            entries = [entry for entry in entries if entry[1] < size]
+            with open(self._path(first, 'idx'), 'wb') as handle:
+                handle.write(
+                    b''.join(_INDEX.pack(*entry) for entry in entries))
+        offset = entries[-1][1] if entries else 0
+        last_seq, end, since = first - 1, offset, 0
+        with open(path, 'rb') as handle:
+            for frame_offset, body in _frames(handle, offset):
+                last_seq = _HEAD.unpack_from(body)[0]
+                end = frame_offset + _FRAME.size + len(body)
+                since += 1
+        if end < size:
+            logger.warning('Trama incompleta al final del log descartada',
+                           extra={'fields': {'segment': first, 'offset': end}})
+            os.truncate(path, end)
+        self._segment, self._size = first, end
+        self._last_seq = max(last_seq, 0)
+        self._since_index = since
+
+    @property
+    def last_seq(self) -> int:
+        return self._last_seq
+
+    # Escritura
+
+    def append(self, events) -> int:
+        """Agrega eventos ``(ts, kind, activity_id, schedule, delta, ids,
+        data)`` y devuelve el seq del último."""
+        events = list(events)
+        if not events:
+            return self._last_seq
+        with self._locked():
+            if self._segment is None or self._stale():
+                self._recover()
+            if self._segment is None or self._size >= self.segment_bytes:
+                self._segment = self._last_seq + 1
+                self._size, self._since_index = 0, 0
+            chunks, index = [], []
+            offset = self._size
+            for ts, kind, activity_id, schedule, delta, ids, data in events:
+                self._last_seq += 1
+                if self._since_index % INDEX_INTERVAL == 0:
+                    index.append(_INDEX.pack(self._last_seq, offset))
+                self._since_index += 1
+                frame = _encode(self._last_seq, ts, kind, activity_id,
+                                schedule, delta, ids, data)
+                chunks.append(frame)
+                offset += len(frame)
+            self._write(self._path(self._segment, 'log'), b''.join(chunks))
+            if index:
+                self._write(self._path(self._segment, 'idx'), b''.join(index))
+            self._size = offset
+            last_seq = self._last_seq
+        if (self.snapshot_every
+                and last_seq - self._snapshot_seq >= self.snapshot_every):
+            self._snapshot_in_background()
+        return last_seq
+
+    def _stale(self) -> bool:
+        try:
+            size = os.path.getsize(self._path(self._segment, 'log'))
+            return size != self._size or self.segments()[-1] != self._segment
+        except (FileNotFoundError, IndexError):
+            return True
+
+    def _write(self, path: str, data: bytes):
+        fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, data)
+            if self.fsync:
+                os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    # Lectura
+
+    def read(self, after_seq: int = 0, activity_id=None):
+        """Eventos con seq mayor a ``after_seq`` (o de una sola actividad)."""
+        segments = self.segments()
+        start = 0
+        for position, first in enumerate(segments):
+            if first <= after_seq + 1:
+                start = position
+        for first in segments[start:]:
+            offset = 0
+            for seq, entry_offset in self._index_entries(first):
+                if seq > after_seq + 1:
+                    break
+                offset = entry_offset
+            with open(self._path(first, 'log'), 'rb') as handle:
+                for _, body in _frames(handle, offset):
+                    if _HEAD.unpack_from(body)[0] <= after_seq:
+                        continue
+                    event_ = _decode(body)
+                    if (activity_id is None
+                            or event_.activity_id == activity_id):
+                        yield event_
+
+    # Instantáneas
+
+    def load_snapshot(self):
+        """Última instantánea válida: ``(seq, OccupancyState)``.
+
+        Sin ninguna válida devuelve ``(0, OccupancyState())``.
+        """
+        for seq in reversed(self._snapshots()):
+            path = os.path.join(self.directory, f'snapshot-{seq:020d}.snap')
+            with open(path, 'rb') as handle:
+                raw = handle.read()
+            if len(raw) < _SNAP_HEAD.size + 4 or \
+                    zlib.crc32(raw[:-4]) != struct.unpack('<I', raw[-4:])[0]:
+                logger.warning('Instantánea dañada ignorada',
+                               extra={'fields': {'seq': seq}})
+                continue
+            magic, version, snap_seq, _, count = _SNAP_HEAD.unpack_from(raw)
+            if magic != _SNAP_MAGIC or version != _SNAP_VERSION:
+                continue
+            counts = {}
+            for i in range(count):
+                activity_id, schedule, n = _SNAP_ENTRY.unpack_from(
+                    raw, _SNAP_HEAD.size + i * _SNAP_ENTRY.size)
+                counts[activity_id, schedule.rstrip(b'\0').decode('ascii')] = n
+            return snap_seq, OccupancyState(counts)
+        return 0, OccupancyState()
+
+    def rebuild(self):
+        """Ocupación desde la última instantánea más la cola del log.
+
+        Returns:
+            ``(OccupancyState, seq del último evento, eventos reaplicados)``
+        """
+        seq, state = self.load_snapshot()
+        replayed = 0
+        for event_ in self.read(seq):
+            state.apply(event_)
+            seq = event_.seq
+            replayed += 1
+        return state, seq, replayed
+
+    def snapshot(self, state: OccupancyState = None, seq: int = None) -> int:
+        """Guarda una instantánea (por defecto del estado reconstruido).
+
+        Args:
+            state: Estado a guardar; si se pasa, corresponde a ``seq``
+            seq: Último evento incluido en ``state`` (por defecto el último
+                del log)
+        """
+        with self._snapshotting:
+            if state is None:
+                state, seq, _ = self.rebuild()
+            elif seq is None:
+                seq = self._last_seq
+            entries = sorted(state.counts.items())
+            parts = [_SNAP_HEAD.pack(_SNAP_MAGIC, _SNAP_VERSION, seq,
+                                     time.time(), len(entries))]
+            parts.extend(
+                _SNAP_ENTRY.pack(activity_id, schedule.encode('ascii'), count)
+                for (activity_id, schedule), count in entries)
+            raw = b''.join(parts)
+            raw += struct.pack('<I', zlib.crc32(raw))
+            path = os.path.join(self.directory, f'snapshot-{seq:020d}.snap')
+            temporary = f'{path}.{os.getpid()}.tmp'
+            with open(temporary, 'wb') as handle:
+                handle.write(raw)
+                handle.flush()
+                os.fsync(handle.fileno())
+            os.replace(temporary, path)
+            self._snapshot_seq = max(self._snapshot_seq, seq)
+            for old in self._snapshots()[:-self.keep_snapshots]:
+                try:
+                    os.remove(os.path.join(self.directory,
+                                           f'snapshot-{old:020d}.snap'))
+                except FileNotFoundError:
+                    pass
+        return seq
+
+    def checkpoint(self, load_counts) -> int:
+        """Guarda una instantánea con conteos que no salen del log.
+
+        Para cargas que escriben registros sin eventos (``seed_data.py``):
+        con el lock del log tomado relee su final (otro proceso pudo
+        agregar eventos), calcula los conteos y guarda la instantánea en
+        ese seq, así ningún evento queda entre ambos.
+
+        Args:
+            load_counts: Función sin argumentos que devuelve
+                ``{(actividad, horario): n}``
+
+        Returns:
+            Seq de la instantánea
+        """
+        with self._locked():
+            if self._segment is None or self._stale():
+                self._recover()
+            state = OccupancyState(load_counts())
+            return self.snapshot(state, self._last_seq)
+
+    def _snapshot_in_background(self):
+        if self._snapshotting.locked():
+            return
+        self._snapshot_seq = self._last_seq  # Evita lanzar otra mientras tanto
+
+        def run():
+            try:
+                self.snapshot()
+            except Exception:
+                logger.exception(
+                    'Error guardando la instantánea del log de eventos')
+        threading.Thread(target=run, name='eventlog-snapshot',
+                         daemon=True).start()
+
+    def close(self):
+        self._lock_file.close()
+
+
+class _FileLock:
+    __slots__ = ('_thread_lock', '_lock_file')
+
+    def __init__(self, thread_lock, lock_file):
+        self._thread_lock = thread_lock
+        self._lock_file = lock_file
+
+    def __enter__(self):
+        self._thread_lock.acquire()
+        fcntl.flock(self._lock_file, fcntl.LOCK_EX)
+
+    def __exit__(self, *exc):
+        fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+        self._thread_lock.release()
+
+
+def get_event_log():
+    """Log de la aplicación actual, o ``None`` si está desactivado."""
+    if not has_app_context():
+        return None
+    return current_app.extensions.get('event_log')
+
+
+def stage(session, kind: int, activity_id: int, schedule: str = '',
+          delta: int = 0, ids=(), data=None):
+    """Deja un evento en la sesión; se agrega al log tras el commit."""
+    log = get_event_log()
+    if log is not None:
+        event_ = (time.time(), kind, activity_id, schedule, delta,
+                  tuple(ids), data)
+        session.info.setdefault(_STAGED_KEY, []).append((log, event_))
+
+
+@event.listens_for(Session, 'after_commit')
+def _append_staged(session):
+    staged = session.info.pop(_STAGED_KEY, None)
+    if not staged:
+        return
+    by_log = {}
+    for log, event_ in staged:
+        by_log.setdefault(log, []).append(event_)
+    for log, events in by_log.items():
+        try:
+            log.append(events)
+        except Exception:
+            # El commit ya ocurrió: la verificación al arrancar lo detecta
+            logger.exception('Error agregando eventos al log')
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_staged(session):
+    session.info.pop(_STAGED_KEY, None)
+
+
+def load_counts(db, Registration) -> dict:
+    """Ocupación para la reconciliación de arranque (ver ``occupancy.py``).
+
+    Usa la instantánea más la cola del log y la verifica contra los
+    registros de la base por actividad (una consulta agrupada por
+    ``activity_id``, mucho más chica que la de turnos). Si no coinciden
+    (log nuevo sobre una base con datos, o eventos perdidos) vuelve a la
+    consulta agrupada por turno y guarda una instantánea con ese resultado
+    para el próximo arranque.
+
+    La verificación no detecta errores que se compensan entre turnos de
+    una misma actividad. Por eso ``reconcile`` carga estos conteos como no
+    verificados y el primer ciclo de ``OccupancyReconciler`` (en segundo
+    plano, poco después del arranque) los recalcula turno por turno.
+    """
+    from occupancy import count_registrations
+
+    log = get_event_log()
+    if log is None:
+        return count_registrations(db, Registration)
+    started = time.perf_counter()
+    state, seq, replayed = log.rebuild()
+    expected = dict(db.session.query(
+        Registration.activity_id, func.count(Registration.id)
+    ).group_by(Registration.activity_id).all())
+    logged = {}
+    for (activity_id, _), count in state.counts.items():
+        if count:
+            logged[activity_id] = logged.get(activity_id, 0) + count
+    if logged == expected:
+        logger.info('Ocupación reconstruida desde el log de eventos',
+                    extra={'fields': {
+                        'seq': seq, 'replayed': replayed,
+                        'ms': round((time.perf_counter() - started) * 1000, 2),
+                    }})
+        return state.counts
+    mismatched = sorted(
+        activity_id for activity_id in logged.keys() | expected.keys()
+        if logged.get(activity_id, 0) != expected.get(activity_id, 0))
+    logger.warning('El log de eventos no coincide con la base; se recalcula',
+                   extra={'fields': {
+                       'log_total': state.total(),
+                       'db_total': sum(expected.values()),
+                       'activities': mismatched[:10], 'seq': seq}})
+    counts = count_registrations(db, Registration)
+    log.snapshot(OccupancyState(counts), log.last_seq)
+    return counts
+
+
+def init_eventlog(app):
+    """Abre el log de eventos de ``app`` si está habilitado.
+
+    Claves de configuración:
+        EVENT_LOG: Activa el log (por defecto ``False``)
+        EVENT_LOG_DIR: Directorio (por defecto ``instance/eventlog``)
+        EVENT_LOG_SEGMENT_BYTES: Tamaño de cada segmento (4 MiB)
+        EVENT_LOG_SNAPSHOT_EVERY: Eventos entre instantáneas (10000)
+        EVENT_LOG_FSYNC: ``fsync`` tras cada escritura (por defecto ``False``)
+    """
+    app.config.setdefault('EVENT_LOG', False)
+    app.config.setdefault('EVENT_LOG_DIR',
+                          os.path.join(app.instance_path, 'eventlog'))
+    app.config.setdefault('EVENT_LOG_SEGMENT_BYTES', 4 * 1024 * 1024)
+    app.config.setdefault('EVENT_LOG_SNAPSHOT_EVERY', 10000)
+    app.config.setdefault('EVENT_LOG_FSYNC', False)
+    if not app.config['EVENT_LOG']:
+        return None
+    log = EventLog(
+        app.config['EVENT_LOG_DIR'],
+        segment_bytes=app.config['EVENT_LOG_SEGMENT_BYTES'],
+        snapshot_every=app.config['EVENT_LOG_SNAPSHOT_EVERY'],
+        fsync=app.config['EVENT_LOG_FSYNC'],
+    )
+    app.extensions['event_log'] = log
+    return log
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(
+        description='Lista eventos del log en JSON por línea')
+    parser.add_argument('directory')
+    parser.add_argument('--after', type=int, default=0,
+                        help='Eventos con seq mayor a este')
+    parser.add_argument('--activity', type=int,
+                        help='Solo eventos de esta actividad')
+    args = parser.parse_args(argv)
+    log = EventLog(args.directory, snapshot_every=0)
+    for event_ in log.read(args.after, args.activity):
+        print(json.dumps({
+            'seq': event_.seq, 'ts': event_.ts,
+            'kind': KIND_NAMES.get(event_.kind, event_.kind),
+            'activity_id': event_.activity_id, 'schedule': event_.schedule,
+            'delta': event_.delta, 'ids': event_.ids, 'data': event_.data,
+        }, ensure_ascii=False))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
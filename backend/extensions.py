@@ -0,0 +1,6 @@
+"""Extensiones de Flask compartidas, inicializadas por ``create_app``."""
+from flask_cors import CORS
+from flask_sqlalchemy import SQLAlchemy
+
+db = SQLAlchemy()
+cors = CORS()
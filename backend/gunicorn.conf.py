@@ -0,0 +1,33 @@
+"""Configuración de gunicorn para el modo de producción.
+
+Variables de entorno:
+    WEB_CONCURRENCY: Procesos worker (por defecto 2 × CPUs + 1)
+    WEB_THREADS: Hilos por worker (por defecto 4)
+    PORT: Puerto de escucha (por defecto 5000)
+"""
+import multiprocessing
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '5000')}"
+workers = int(os.environ.get(
+    'WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1
+))
+threads = int(os.environ.get('WEB_THREADS', 4))
+worker_class = 'gthread'
+preload_app = True
+timeout = 30
+keepalive = 5
+accesslog = None
+
+
+def post_fork(server, worker):
+    """Cada worker crea su propio pool de conexiones, de trabajos y su hilo
+    de reconciliación de la ocupación tras el fork."""
+    from extensions import db
+
+    application = server.app.wsgi()
+    with application.app_context():
+        db.engine.dispose(close=False)
+    application.extensions['job_queue'].start()
+    if 'occupancy_reconciler' in application.extensions:
+        application.extensions['occupancy_reconciler'].start()
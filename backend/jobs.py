@@ -0,0 +1,440 @@
+"""Trabajos en segundo plano con una tabla outbox transaccional.
+
+Los efectos secundarios de un registro (confirmación, lista de la
+actividad, auditoría) no se ejecutan en la petición: ``enqueue`` agrega
+filas a la tabla outbox en la misma sesión, así se confirman o revierten
+junto con el registro y no alargan el tiempo con el lock de escritura más
+que un ``INSERT``. Tras el commit se despierta al pool de hilos del
+proceso, que (con entrega al menos una vez):
+
+    1. reclama un lote en una transacción corta (``UPDATE`` de las filas
+       pendientes y vencidas, o ``running`` con el plazo vencido si un
+       proceso murió a mitad),
+    2. ejecuta cada trabajo fuera de la transacción con su handler, y
+    3. marca ``done``, reprograma con backoff exponencial o, agotados los
+       intentos, deja ``failed`` con el último error.
+
+Los handlers se registran con ``job_handler`` y reciben ``(payload,
+sink)``; el sink entrega los mensajes: ``FileSink`` (JSON por línea, para
+desarrollo y pruebas) o ``SMTPSink``.
+"""
+import json
+import os
+import random
+import smtplib
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from email.message import EmailMessage
+
+from flask import current_app, has_app_context
+from sqlalchemy import and_, delete, event, insert, or_, select, update
+from sqlalchemy.orm import Session
+
+from logging_config import get_logger, redact
+from metrics import REGISTRY
+
+logger = get_logger('jobs')
+
+_STAGED_KEY = 'jobs_enqueued'
+
+PENDING, RUNNING, DONE, FAILED = 'pending', 'running', 'done', 'failed'
+
+HANDLERS = {}
+
+JOBS_PROCESSED = REGISTRY.counter(
+    'jobs_processed_total',
+    'Trabajos en segundo plano ejecutados por tipo y resultado',
+    ('kind', 'outcome'),
+)
+
+
+def utcnow() -> datetime:
+    """Hora UTC naive, como las columnas de fecha de los modelos."""
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def job_handler(kind: str):
+    """Registra la función que ejecuta los trabajos de tipo ``kind``."""
+    def decorator(function):
+        HANDLERS[kind] = function
+        return function
+    return decorator
+
+
+class FileSink:
+    """Agrega cada mensaje como una línea JSON a ``path``.
+
+    Args:
+        path: Archivo de salida (se crea el directorio si falta)
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def deliver(self, channel: str, message: dict):
+        line = json.dumps({'channel': channel, **message}, ensure_ascii=False,
+                          default=str)
+        with self._lock:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)),
+                        exist_ok=True)
+            with open(self.path, 'a', encoding='utf-8') as handle:
+                handle.write(line + '\n')
+
+
+class SMTPSink:
+    """Envía cada mensaje como correo a un buzón del parque.
+
+    Args:
+        host: Servidor SMTP (p. ej. ``localhost`` con un servidor de prueba)
+        port: Puerto
+        sender: Remitente
+        recipient: Destinatario
+        timeout: Segundos de espera de la conexión
+    """
+
+    def __init__(self, host: str, port: int, sender: str, recipient: str,
+                 timeout: float = 10.0):
+        self.host = host
+        self.port = port
+        self.sender = sender
+        self.recipient = recipient
+        self.timeout = timeout
+
+    def deliver(self, channel: str, message: dict):
+        email = EmailMessage()
+        email['From'] = self.sender
+        email['To'] = self.recipient
+        email['Subject'] = message.get('subject') or f'[{channel}] EcoHarmony'
+        email.set_content(json.dumps(message, ensure_ascii=False, indent=2,
+                                     default=str))
+        with smtplib.SMTP(self.host, self.port,
+                          timeout=self.timeout) as client:
+            client.send_message(email)
+
+
+class JobQueue:
+    """Pool de hilos que vacía la tabla outbox.
+
+    Args:
+        app: Aplicación (cada lote corre en su contexto)
+        db: Extensión de SQLAlchemy
+        model: Modelo de la tabla outbox
+        sink: Destino de los mensajes de los handlers
+        workers: Hilos del pool (0 = solo ``run_pending`` manual)
+        batch_size: Trabajos reclamados por transacción
+        max_attempts: Intentos antes de marcar ``failed``
+        backoff_base: Segundos de espera tras el primer fallo (se duplica)
+        backoff_max: Tope de espera entre intentos
+        poll_interval: Segundos entre sondeos si nadie avisa
+        lease: Segundos tras los que un trabajo ``running`` se vuelve a
+            reclamar (proceso caído)
+        retention: Segundos que se conservan los trabajos ``done``
+    """
+
+    def __init__(self, app, db, model, sink, workers: int = 2,
+                 batch_size: int = 20, max_attempts: int = 5,
+                 backoff_base: float = 2.0,
+                 backoff_max: float = 300.0, poll_interval: float = 1.0,
+                 lease: float = 60.0, retention: float = 86400.0):
+        self.app = app
+        self.db = db
+        self.model = model
+        self.sink = sink
+        self.workers = workers
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.poll_interval = poll_interval
+        self.lease = lease
+        self.retention = retention
+        self._purged_at = 0.0
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._threads = []
+        self._pid = None
+        self._lock = threading.Lock()
+
+    # Ciclo de vida
+
+    def start(self):
+        """Arranca los hilos en este proceso (de nuevo tras un fork)."""
+        with self._lock:
+            if self.workers <= 0 or (
+                    self._pid == os.getpid() and self._threads):
+                return
+            self._pid = os.getpid()
+            self._stop.clear()
+            self._threads = [
+                threading.Thread(target=self._loop, name=f'jobs-{index}',
+                                 daemon=True)
+                for index in range(self.workers)
+            ]
+            for thread in self._threads:
+                thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        """Detiene los hilos tras el lote en curso."""
+        self._stop.set()
+        self._wake.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def notify(self):
+        """Avisa a los hilos (si corren) que hay trabajos confirmados."""
+        self._wake.set()
+
+    def _loop(self):
+        while not self._stop.is_set():
+            try:
+                processed = self.run_pending(self.batch_size)
+            except Exception:
+                logger.exception('Error reclamando trabajos en segundo plano')
+                processed = 0
+            if processed:
+                continue
+            if time.monotonic() - self._purged_at > 60:
+                self._purged_at = time.monotonic()
+                try:
+                    self.purge()
+                except Exception:
+                    logger.exception('Error purgando trabajos terminados')
+            self._wake.wait(self.poll_interval)
+            self._wake.clear()
+
+    # Ejecución
+
+    def run_pending(self, limit: int = None) -> int:
+        """Reclama y ejecuta un lote; devuelve cuántos trabajos corrió.
+
+        Ninguna transacción queda abierta mientras corren los handlers: el
+        reclamo y el resultado son escrituras cortas y separadas (en SQLite
+        pasar de lectura a escritura con otro worker escribiendo bloquea).
+        El resultado de cada trabajo se escribe apenas termina, junto con
+        lo que haya escrito su handler, y solo si el reclamo sigue siendo
+        de este lote: si el lease venció y otro worker lo reclamó, el
+        resultado de este se descarta.
+        """
+        model = self.model
+        with self.app.app_context():
+            session = self.db.session
+            try:
+                token, jobs = self._claim(limit or self.batch_size)
+                for job in jobs:
+                    values = self._run(job)
+                    written = session.execute(
+                        update(model)
+                        .where(model.id == job.id, model.claimed_by == token)
+                        .values(**values)
+                        .execution_options(synchronize_session=False)
+                    ).rowcount
+                    session.commit()
+                    if not written:
+                        logger.warning(
+                            'Trabajo %s reclamado por otro worker; se '
+                            'descarta su resultado', job.kind,
+                            extra={'fields': {'job_id': job.id}})
+                return len(jobs)
+            finally:
+                session.remove()
+
+    def purge(self) -> int:
+        """Borra los trabajos ``done`` más viejos que ``retention``."""
+        cutoff = utcnow() - timedelta(seconds=self.retention)
+        with self.app.app_context():
+            session = self.db.session
+            try:
+                deleted = session.execute(
+                    delete(self.model).where(self.model.status == DONE,
+                                             self.model.completed_at < cutoff)
+                ).rowcount
+                session.commit()
+                return deleted
+            finally:
+                session.remove()
+
+    def drain(self, max_batches: int = 100) -> int:
+        """Ejecuta lotes hasta que no quede nada listo (pruebas y CLI)."""
+        total = 0
+        for _ in range(max_batches):
+            processed = self.run_pending()
+            if not processed:
+                break
+            total += processed
+        return total
+
+    def _claim(self, limit: int) -> tuple:
+        """Reclama hasta ``limit`` trabajos; devuelve ``(token, trabajos)``."""
+        model, session = self.model, self.db.session
+        now = utcnow()
+        ready = select(model.id).where(or_(
+            and_(model.status == PENDING, model.available_at <= now),
+            and_(model.status == RUNNING, model.locked_until < now),
+        )).order_by(model.available_at, model.id).limit(limit)
+        token = uuid.uuid4().hex
+        claimed = session.execute(
+            update(model)
+            .where(model.id.in_(ready.scalar_subquery()))
+            .values(status=RUNNING, claimed_by=token,
+                    attempts=model.attempts + 1,
+                    locked_until=now + timedelta(seconds=self.lease))
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        if not claimed:
+            session.commit()
+            return token, []
+        jobs = session.execute(
+            select(model.id, model.kind, model.payload, model.attempts)
+            .where(model.claimed_by == token, model.status == RUNNING)
+            .order_by(model.id)
+        ).all()
+        session.commit()
+        return token, jobs
+
+    def _run(self, job) -> dict:
+        """Ejecuta el handler y devuelve las columnas a actualizar."""
+        handler = HANDLERS.get(job.kind)
+        try:
+            if handler is None:
+                raise LookupError(f'Tipo de trabajo desconocido: {job.kind}')
+            handler(job.payload or {}, self.sink)
+        except Exception as error:
+            self.db.session.rollback()
+            last_error = f'{type(error).__name__}: {redact(str(error))}'[:500]
+            if handler is None or job.attempts >= self.max_attempts:
+                JOBS_PROCESSED.inc(job.kind, 'failed')
+                logger.error('Trabajo %s agotó sus intentos', job.kind,
+                             extra={'fields': {'job_id': job.id,
+                                               'attempts': job.attempts}})
+                return {'status': FAILED, 'completed_at': utcnow(),
+                        'last_error': last_error}
+            JOBS_PROCESSED.inc(job.kind, 'retry')
+            delay = timedelta(seconds=self.backoff(job.attempts))
+            return {'status': PENDING, 'last_error': last_error,
+                    'available_at': utcnow() + delay}
+        JOBS_PROCESSED.inc(job.kind, 'done')
+        return {'status': DONE, 'completed_at': utcnow(), 'last_error': None}
+
+    def backoff(self, attempts: int) -> float:
+        """Espera antes del intento ``attempts + 1`` (exponencial, jitter)."""
+        delay = min(self.backoff_max, self.backoff_base * 2 ** (attempts - 1))
+        return delay * random.uniform(0.5, 1.0)
+
+
+def get_job_queue():
+    """Pool de trabajos de la aplicación actual, o ``None`` sin contexto."""
+    if not has_app_context():
+        return None
+    return current_app.extensions.get('job_queue')
+
+
+def enqueue(session, kinds, payload: dict, delay: float = 0) -> int:
+    """Inserta trabajos en la transacción de ``session``.
+
+    Todos los tipos comparten el payload y van en un solo ``INSERT``
+    (``executemany``); se confirman o revierten con la transacción.
+
+    Args:
+        session: Sesión del cambio que origina los trabajos
+        kinds: Tipo o tipos registrados con ``job_handler``
+        payload: Datos serializables a JSON para los handlers
+        delay: Segundos antes de que los trabajos estén listos
+
+    Returns:
+        Trabajos insertados (0 sin aplicación)
+    """
+    queue = get_job_queue()
+    if queue is None:
+        return 0
+    if isinstance(kinds, str):
+        kinds = (kinds,)
+    available_at = utcnow() + timedelta(seconds=delay)
+    session.execute(insert(queue.model), [
+        {'kind': kind, 'payload': payload, 'status': PENDING, 'attempts': 0,
+         'available_at': available_at, 'created_at': utcnow()}
+        for kind in kinds
+    ])
+    session.info[_STAGED_KEY] = queue
+    return len(kinds)
+
+
+@event.listens_for(Session, 'after_commit')
+def _notify_workers(session):
+    job_queue = session.info.pop(_STAGED_KEY, None)
+    if job_queue is not None:
+        job_queue.notify()
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_notification(session):
+    session.info.pop(_STAGED_KEY, None)
+
+
+def init_jobs(app, db, model):
+    """Crea el pool de trabajos de ``app``.
+
+    Los hilos no arrancan solos: lo hacen los puntos de entrada del
+    servidor (``app.py`` y ``post_fork`` en ``gunicorn.conf.py``); en
+    pruebas y benchmarks los trabajos quedan en la tabla hasta ``drain``.
+
+    Claves de configuración:
+        JOBS_WORKERS: Hilos por proceso (por defecto 2; 0 los desactiva)
+        JOBS_BATCH_SIZE: Trabajos por lote (20)
+        JOBS_MAX_ATTEMPTS: Intentos por trabajo (5)
+        JOBS_BACKOFF_SECONDS: Espera tras el primer fallo (2.0)
+        JOBS_BACKOFF_MAX_SECONDS: Tope de la espera (300)
+        JOBS_POLL_SECONDS: Sondeo de la tabla sin avisos (1.0)
+        JOBS_LEASE_SECONDS: Plazo de un trabajo ``running`` antes de que
+            otro worker lo reclame (60); debe superar lo que tarda el
+            trabajo más lento (p. ej. el timeout de SMTP)
+        JOBS_RETENTION_SECONDS: Conservación de los trabajos ``done`` (un día)
+        JOBS_SINK: ``file`` (por defecto) o ``smtp``
+        JOBS_SINK_PATH: Archivo del sink ``file`` (``instance/outbox.jsonl``)
+        JOBS_SMTP_HOST, JOBS_SMTP_PORT, JOBS_SMTP_SENDER,
+        JOBS_SMTP_RECIPIENT: Datos del sink ``smtp``
+    """
+    app.config.setdefault('JOBS_WORKERS', 2)
+    app.config.setdefault('JOBS_BATCH_SIZE', 20)
+    app.config.setdefault('JOBS_MAX_ATTEMPTS', 5)
+    app.config.setdefault('JOBS_BACKOFF_SECONDS', 2.0)
+    app.config.setdefault('JOBS_BACKOFF_MAX_SECONDS', 300.0)
+    app.config.setdefault('JOBS_POLL_SECONDS', 1.0)
+    app.config.setdefault('JOBS_LEASE_SECONDS', 60.0)
+    app.config.setdefault('JOBS_RETENTION_SECONDS', 86400.0)
+    app.config.setdefault('JOBS_SINK', 'file')
+    app.config.setdefault('JOBS_SINK_PATH',
+                          os.path.join(app.instance_path, 'outbox.jsonl'))
+    app.config.setdefault('JOBS_SMTP_HOST', 'localhost')
+    app.config.setdefault('JOBS_SMTP_PORT', 1025)
+    app.config.setdefault('JOBS_SMTP_SENDER', 'reservas@ecoharmony.local')
+    app.config.setdefault('JOBS_SMTP_RECIPIENT',
+                          'operaciones@ecoharmony.local')
+
+    if app.config['JOBS_SINK'] == 'smtp':
+        sink = SMTPSink(app.config['JOBS_SMTP_HOST'],
+                        app.config['JOBS_SMTP_PORT'],
+                        app.config['JOBS_SMTP_SENDER'],
+                        app.config['JOBS_SMTP_RECIPIENT'])
+    elif app.config['JOBS_SINK'] == 'file':
+        sink = FileSink(app.config['JOBS_SINK_PATH'])
+    else:
+        raise ValueError(f"JOBS_SINK desconocido: {app.config['JOBS_SINK']} "
+                         '(opciones: file, smtp)')
+
+    queue = JobQueue(
+        app, db, model, sink,
+        workers=app.config['JOBS_WORKERS'],
+        batch_size=app.config['JOBS_BATCH_SIZE'],
+        max_attempts=app.config['JOBS_MAX_ATTEMPTS'],
+        backoff_base=app.config['JOBS_BACKOFF_SECONDS'],
+        backoff_max=app.config['JOBS_BACKOFF_MAX_SECONDS'],
+        poll_interval=app.config['JOBS_POLL_SECONDS'],
+        lease=app.config['JOBS_LEASE_SECONDS'],
+        retention=app.config['JOBS_RETENTION_SECONDS'],
+    )
+    app.extensions['job_queue'] = queue
+    return queue
@@ -0,0 +1,350 @@
+#!/usr/bin/env python3
+"""
+Generador de carga local para reproducir la hora pico.
+
+Lanza muchos hilos (o procesos) que mezclan lecturas del catálogo, registros
+nuevos, intentos con DNI duplicado e intentos sobre turnos llenos. Al final
+informa p50/p95/p99, mezcla de errores y throughput, y verifica que ningún
+(actividad, horario) haya superado su cupo efectivo (``resolve_capacity``).
+
+Por defecto usa el cliente de pruebas de Flask sobre una base SQLite
+temporal sembrada con ``seed_data.generate_synthetic_data``. Con ``--url``
+ataca un servidor ya levantado (y con ``--database`` verifica la
+sobreventa en su base).
+
+Uso:
+    python loadtest.py --workers 16 --duration 20
+    python loadtest.py --mix catalog=6,register=3,duplicate=1,full=1
+    python loadtest.py --url http://localhost:5000 --database activities.db
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+from collections import Counter, defaultdict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from benchmark import percentile
+
+DEFAULT_MIX = {'catalog': 6, 'register': 3, 'duplicate': 1, 'full': 1}
+
+
+def parse_mix(spec: str) -> dict:
+    """Convierte ``"catalog=6,register=3"`` en pesos por operación."""
+    mix = {}
+    for item in spec.split(','):
+        kind, weight = item.split('=')
+        if kind not in DEFAULT_MIX:
+            raise ValueError(f'Operación desconocida: {kind}')
+        mix[kind] = float(weight)
+    return mix
+
+
+class HttpClient:
+    """Cliente mínimo con la misma interfaz que usa el generador."""
+
+    def __init__(self, base_url: str):
+        self.base_url = base_url.rstrip('/')
+
+    def request(self, method, path, payload=None):
+        data = json.dumps(payload).encode() if payload is not None else None
+        req = urllib.request.Request(
+            self.base_url + path, data=data, method=method,
+            headers={'Content-Type': 'application/json'},
+        )
+        try:
+            with urllib.request.urlopen(req, timeout=30) as response:
+                return response.status, response.read()
+        except urllib.error.HTTPError as error:
+            return error.code, error.read()
+
+
+class TestClientAdapter:
+    """Adapta el cliente de pruebas de Flask a la interfaz ``request``."""
+
+    def __init__(self, flask_app):
+        self.client = flask_app.test_client()
+
+    def request(self, method, path, payload=None):
+        response = self.client.open(path, method=method, json=payload)
+        return response.status_code, response.get_data()
+
+
+def _catalog_targets(client):
+    """Devuelve (turnos con cupo, turnos llenos) según el catálogo."""
+    status, body = client.request('GET', '/api/activities')
+    if status != 200:
+        raise RuntimeError(f'No se pudo leer el catálogo ({status})')
+    free, full = [], []
+    for activity in json.loads(body):
+        for schedule, info in activity['per_schedule_capacity'].items():
+            target = (activity['id'], schedule, activity['requires_clothing'])
+            (free if info['available_capacity'] > 0 else full).append(target)
+    return free, full
+
+
+def run_worker(options: dict) -> list:
+    """Ejecuta un worker y devuelve sus muestras.
+
+    Cada muestra es ``(operación, latencia_s, status, código_de_error)``.
+    """
+    if options['url']:
+        client = HttpClient(options['url'])
+    else:
+        import app as app_module
+
+        if os.getpid() != options['parent_pid']:
+            # Proceso hijo: no reutilizar conexiones heredadas del padre
+            with app_module.app.app_context():
+                app_module.db.engine.dispose(close=False)
+        client = TestClientAdapter(app_module.app)
+    rng = random.Random(options['seed'])
+    kinds = list(options['mix'])
+    weights = [options['mix'][kind] for kind in kinds]
+    free, full = options['free'], options['full']
+    booked = []  # (actividad, horario, dni) registrados por este worker
+    dni_base = options['dni_base']
+    samples = []
+    deadline = time.monotonic() + options['duration']
+    remaining = options['requests']
+
+    def participant(dni, clothing):
+        return {'name': 'Carga', 'dni': str(dni), 'age': 30,
+                'clothing_size': 'M' if clothing else None}
+
+    while time.monotonic() < deadline and remaining != 0:
+        remaining -= 1
+        kind = rng.choices(kinds, weights)[0]
+        if kind == 'duplicate' and not booked:
+            kind = 'register'
+        if kind == 'full' and not full:
+            kind = 'register'
+
+        if kind == 'catalog':
+            method, path, payload = 'GET', '/api/activities', None
+        else:
+            if kind == 'duplicate':
+                activity_id, schedule, dni = rng.choice(booked)
+                clothing = True
+            else:
+                activity_id, schedule, clothing = rng.choice(
+                    full if kind == 'full' else free)
+                dni_base += 1
+                dni = dni_base
+            method = 'POST'
+            path = f'/api/activities/{activity_id}/register'
+            payload = {
+                'participants': [participant(dni, clothing)],
+                'terms_accepted': True,
+                'schedule': schedule,
+                'current_time': '08:00',
+            }
+
+        started = time.perf_counter()
+        status, body = client.request(method, path, payload)
+        latency = time.perf_counter() - started
+        code = None
+        if status >= 400:
+            try:
+                code = json.loads(body).get('code')
+            except ValueError:
+                code = None
+        elif kind == 'register':
+            booked.append((activity_id, schedule, dni))
+        samples.append((kind, latency, status, code))
+    return samples
+
+
+def check_oversell(database_path: str) -> list:
+    """Lista los turnos cuya ocupación supera el cupo efectivo."""
+    from app import get_turn_capacity
+    from rules import resolve_capacity
+
+    with sqlite3.connect(database_path) as connection:
+        rows = connection.execute(
+            'SELECT a.id, a.name, a.capacity, r.schedule, COUNT(*), '
+            'o.capacity '
+            'FROM registration r '
+            'JOIN activity a ON a.id = r.activity_id '
+            'LEFT JOIN slot_override o '
+            'ON o.activity_id = a.id AND o.schedule = r.schedule '
+            'GROUP BY a.id, a.name, a.capacity, r.schedule, o.capacity'
+        ).fetchall()
+    slots = [
+        {'activity_id': activity_id, 'activity': name, 'schedule': schedule,
+         'registered': count,
+         'turn_capacity': resolve_capacity(capacity, get_turn_capacity(name),
+                                           override)}
+        for activity_id, name, capacity, schedule, count, override in rows
+    ]
+    return [slot for slot in slots
+            if slot['registered'] > slot['turn_capacity']]
+
+
+def build_report(samples, elapsed: float) -> dict:
+    """Agrega las muestras en latencias, mezcla de errores y throughput."""
+    by_kind = defaultdict(list)
+    errors = Counter()
+    statuses = Counter()
+    for kind, latency, status, code in samples:
+        by_kind[kind].append(latency)
+        statuses[status] += 1
+        if status >= 400:
+            errors[f'{kind}:{code or status}'] += 1
+    latency_ms = {
+        kind: {
+            'count': len(values),
+            'p50_ms': round(percentile(values, 50) * 1000, 3),
+            'p95_ms': round(percentile(values, 95) * 1000, 3),
+            'p99_ms': round(percentile(values, 99) * 1000, 3),
+        }
+        for kind, values in sorted(by_kind.items())
+    }
+    return {
+        'requests': len(samples),
+        'elapsed_s': round(elapsed, 3),
+        'throughput_rps': round(len(samples) / elapsed, 2) if elapsed else 0,
+        'latency': latency_ms,
+        'statuses': dict(sorted(statuses.items())),
+        'errors': dict(errors.most_common()),
+    }
+
+
+def _prepare_local_database(args):
+    """Siembra una base temporal y llena por completo algunos turnos."""
+    workdir = tempfile.mkdtemp(prefix='ecoharmony-load-')
+    database_path = os.path.join(workdir, 'loadtest.db')
+    os.environ['ECOHARMONY_SQLALCHEMY_DATABASE_URI'] = (
+        'sqlite:///' + database_path
+    )
+    os.environ.setdefault('ECOHARMONY_LOG_LEVEL', 'ERROR')
+    import app as app_module
+    from seed_data import generate_synthetic_data
+
+    with app_module.app.app_context():
+        generate_synthetic_data(activities=args.activities, days=1,
+                                fill_ratio=args.fill_ratio, seed=args.seed,
+                                slots=args.slots)
+        # El último horario de la primera actividad queda completo
+        activity = app_module.db.session.get(app_module.Activity, 1)
+        schedule = activity.schedules[-1]
+        taken = app_module.Registration.query.filter_by(
+            activity_id=1, schedule=schedule).count()
+        limit = app_module.resolve_capacity(
+            activity.capacity, app_module.get_turn_capacity(activity.name))
+        for n in range(limit - taken):
+            visitor = app_module.Visitor(
+                name='Completo', dni=str(30000000 + n), age=30,
+                clothing_size='M', terms_accepted=True)
+            app_module.db.session.add(visitor)
+            app_module.db.session.flush()
+            app_module.db.session.add(app_module.Registration(
+                activity_id=1, visitor_id=visitor.id, schedule=schedule))
+        app_module.db.session.commit()
+        app_module.db.engine.dispose()
+    return workdir, database_path
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--processes', action='store_true',
+                        help='Usar procesos en lugar de hilos')
+    parser.add_argument('--duration', type=float, default=10.0,
+                        help='Segundos de carga por worker')
+    parser.add_argument('--requests', type=int, default=-1,
+                        help='Máximo de peticiones por worker (-1 = sin '
+                             'límite)')
+    parser.add_argument('--mix', type=parse_mix, default=DEFAULT_MIX)
+    parser.add_argument('--url', help='Servidor a atacar en lugar del '
+                                      'cliente de pruebas')
+    parser.add_argument('--database',
+                        help='Base SQLite del servidor para verificar '
+                             'sobreventa (con --url)')
+    parser.add_argument('--activities', type=int, default=8)
+    parser.add_argument('--slots', type=int, default=6)
+    parser.add_argument('--fill-ratio', type=float, default=0.3)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help='Escribir el informe en JSON')
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    workdir = None
+    database_path = args.database
+    if not args.url:
+        workdir, database_path = _prepare_local_database(args)
+
+    try:
+        target = HttpClient(args.url) if args.url else None
+        if target is None:
+            import app as app_module
+
+            target = TestClientAdapter(app_module.app)
+        free, full = _catalog_targets(target)
+        worker_options = [
+            {
+                'url': args.url, 'mix': args.mix, 'seed': args.seed + index,
+                'duration': args.duration, 'requests': args.requests,
+                'free': free, 'full': full,
+                'dni_base': 40000000 + index * 1000000,
+                'parent_pid': os.getpid(),
+            }
+            for index in range(args.workers)
+        ]
+        executor_class = (ProcessPoolExecutor if args.processes
+                          else ThreadPoolExecutor)
+        started = time.perf_counter()
+        with executor_class(max_workers=args.workers) as executor:
+            samples = [
+                sample
+                for worker_samples in executor.map(run_worker,
+                                                   worker_options)
+                for sample in worker_samples
+            ]
+        elapsed = time.perf_counter() - started
+
+        report = build_report(samples, elapsed)
+        report['workers'] = args.workers
+        report['mode'] = 'processes' if args.processes else 'threads'
+        report['oversold'] = (check_oversell(database_path)
+                              if database_path else None)
+    finally:
+        if workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    print(f"{report['requests']} peticiones en {report['elapsed_s']} s "
+          f"({report['throughput_rps']} req/s, {args.workers} "
+          f"{report['mode']})")
+    for kind, stats in report['latency'].items():
+        print(f"  {kind:10} n={stats['count']:<6} p50 {stats['p50_ms']:.2f} "
+              f"ms  p95 {stats['p95_ms']:.2f} ms  p99 {stats['p99_ms']:.2f} "
+              f"ms")
+    print('  errores:', report['errors'] or 'ninguno')
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as handle:
+            json.dump(report, handle, indent=2)
+
+    if report['oversold'] is None:
+        print('  sobreventa: no verificada (falta --database)')
+        return 0
+    if report['oversold']:
+        print('  SOBREVENTA detectada:')
+        for slot in report['oversold']:
+            print(f"    - {slot['activity']} {slot['schedule']}: "
+                  f"{slot['registered']}/{slot['turn_capacity']}")
+        return 1
+    print('  sobreventa: ninguna')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
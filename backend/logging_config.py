@@ -0,0 +1,211 @@
+"""Logging estructurado, con niveles y no bloqueante para la API.
+
+Los registros se encolan desde el hilo de la petición y un ``QueueListener``
+se encarga de formatearlos (JSON) y escribirlos, de modo que ni el formateo
+ni la E/S ocurren mientras se atiende la petición. Cada registro lleva el id
+de correlación de la petición y los DNIs se enmascaran antes de escribirse.
+"""
+import atexit
+import contextvars
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import re
+import uuid
+from datetime import datetime, timezone
+
+from flask import g, request
+
+LOGGER_NAME = 'ecoharmony'
+REQUEST_ID_HEADER = 'X-Request-ID'
+
+# Estado por petición: id de correlación y si la petición fue muestreada
+request_id_var = contextvars.ContextVar('request_id', default=None)
+sampled_var = contextvars.ContextVar('log_sampled', default=True)
+
+_DNI_RE = re.compile(r'(?<!\d)\d{7,8}(?!\d)')
+_REQUEST_ID_RE = re.compile(r'^[A-Za-z0-9._-]{1,64}$')
+_SENSITIVE_KEYS = frozenset({'dni', 'dnis'})
+
+_listener = None
+_queue_handler = None
+
+
+def get_logger(name: str = None) -> logging.Logger:
+    """Devuelve el logger de la aplicación o uno de sus hijos.
+
+    Args:
+        name: Sufijo del logger hijo (por ejemplo ``'service'``)
+
+    Returns:
+        Logger ``ecoharmony`` o ``ecoharmony.<name>``
+    """
+    return logging.getLogger(f'{LOGGER_NAME}.{name}' if name else LOGGER_NAME)
+
+
+def mask_dni(value) -> str:
+    """Enmascara un DNI conservando solo sus dos últimos dígitos."""
+    text = str(value)
+    if len(text) <= 2:
+        return '*' * len(text)
+    return '*' * (len(text) - 2) + text[-2:]
+
+
+def redact_text(text: str) -> str:
+    """Enmascara cualquier secuencia de 7 u 8 dígitos (formato de DNI)."""
+    return _DNI_RE.sub(lambda match: mask_dni(match.group(0)), text)
+
+
+def redact(value):
+    """Enmascara DNIs en estructuras anidadas (dicts, listas, strings)."""
+    if isinstance(value, dict):
+        return {
+            key: (_redact_sensitive(item) if key in _SENSITIVE_KEYS
+                  else redact(item))
+            for key, item in value.items()
+        }
+    if isinstance(value, (list, tuple)):
+        return [redact(item) for item in value]
+    if isinstance(value, str):
+        return redact_text(value)
+    return value
+
+
+def _redact_sensitive(value):
+    if isinstance(value, (list, tuple)):
+        return [mask_dni(item) for item in value]
+    return mask_dni(value) if value is not None else None
+
+
+class JsonFormatter(logging.Formatter):
+    """Formatea registros como una línea JSON con los DNIs enmascarados."""
+
+    def format(self, record):
+        payload = {
+            'ts': datetime.fromtimestamp(
+                record.created, timezone.utc
+            ).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': redact_text(record.getMessage()),
+        }
+        request_id = getattr(record, 'request_id', None)
+        if request_id:
+            payload['request_id'] = request_id
+        fields = getattr(record, 'fields', None)
+        if fields:
+            payload.update(redact(fields))
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            payload['exc'] = redact_text(record.exc_text)
+        return json.dumps(payload, ensure_ascii=False, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """Descarta registros por debajo de WARNING en peticiones no muestreadas.
+
+    Las advertencias y errores siempre pasan; fuera de una petición todo pasa.
+    """
+
+    def filter(self, record):
+        return record.levelno >= logging.WARNING or sampled_var.get()
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """``QueueHandler`` que no formatea en el hilo de la petición.
+
+    ``prepare`` solo copia el registro y le adjunta el id de correlación; la
+    interpolación de argumentos y el JSON los hace el ``QueueListener``. Por
+    eso los argumentos de log deben ser valores inmutables. Si la cola está
+    llena el registro se descarta en lugar de bloquear la petición.
+    """
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        record = logging.makeLogRecord(record.__dict__)
+        record.request_id = request_id_var.get()
+        if record.exc_info:
+            # Las trazas referencian frames vivos: se renderizan ahora
+            record.exc_text = logging.Formatter().formatException(
+                record.exc_info
+            )
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def _configure_handlers(queue_size: int):
+    global _listener, _queue_handler
+    if _queue_handler is not None:
+        return _queue_handler
+
+    log_queue = queue.Queue(maxsize=queue_size)
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(JsonFormatter())
+
+    _queue_handler = NonBlockingQueueHandler(log_queue)
+    _queue_handler.addFilter(SamplingFilter())
+    _listener = logging.handlers.QueueListener(
+        log_queue, stream_handler, respect_handler_level=True
+    )
+    _listener.start()
+    atexit.register(_listener.stop)
+
+    logger = get_logger()
+    logger.addHandler(_queue_handler)
+    logger.propagate = False
+    return _queue_handler
+
+
+def init_logging(app):
+    """Configura el logging de la aplicación y los hooks por petición.
+
+    Claves de configuración:
+        LOG_LEVEL: Nivel mínimo (por defecto ``INFO``)
+        LOG_SAMPLE_RATE: Fracción de peticiones cuyos registros por debajo
+            de WARNING se emiten (por defecto ``1.0``)
+        LOG_QUEUE_SIZE: Capacidad de la cola antes de descartar registros
+    """
+    app.config.setdefault('LOG_LEVEL', 'INFO')
+    app.config.setdefault('LOG_SAMPLE_RATE', 1.0)
+    app.config.setdefault('LOG_QUEUE_SIZE', 10000)
+
+    _configure_handlers(app.config['LOG_QUEUE_SIZE'])
+    get_logger().setLevel(app.config['LOG_LEVEL'])
+
+    @app.before_request
+    def _bind_request_context():
+        incoming = request.headers.get(REQUEST_ID_HEADER, '')
+        request_id = (incoming if _REQUEST_ID_RE.match(incoming)
+                      else uuid.uuid4().hex)
+        rate = app.config['LOG_SAMPLE_RATE']
+        g.request_id = request_id
+        g._log_tokens = (
+            request_id_var.set(request_id),
+            sampled_var.set(rate >= 1.0 or random.random() < rate),
+        )
+
+    @app.after_request
+    def _add_request_id_header(response):
+        request_id = g.get('request_id')
+        if request_id:
+            response.headers[REQUEST_ID_HEADER] = request_id
+        return response
+
+    @app.teardown_request
+    def _unbind_request_context(exc):
+        tokens = g.pop('_log_tokens', None)
+        if tokens:
+            request_id_var.reset(tokens[0])
+            sampled_var.reset(tokens[1])
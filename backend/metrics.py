@@ -0,0 +1,266 @@
+"""Métricas en memoria expuestas en formato de texto de Prometheus.
+
+Contadores, gauges e histogramas con etiquetas, seguros para servidores
+multihilo (cada métrica protege sus series con un lock propio). Las métricas
+son por proceso: con varios workers cada uno expone las suyas.
+"""
+import threading
+import time
+from bisect import bisect_left
+
+from flask import Response, g, request
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+DEFAULT_LATENCY_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0
+)
+
+
+def _format_labels(names, values, extra=None):
+    pairs = list(zip(names, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ''
+    escaped = (
+        (name, str(value).replace('\\', r'\\').replace('"', r'\"')
+         .replace('\n', r'\n'))
+        for name, value in pairs
+    )
+    return '{' + ','.join(f'{name}="{value}"' for name, value in escaped) + '}'
+
+
+def _format_value(value) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    kind = 'untyped'
+
+    def __init__(self, name: str, documentation: str, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._series = {}
+
+    def _key(self, labels):
+        if len(labels) != len(self.labelnames):
+            raise ValueError(
+                f'{self.name} espera las etiquetas {self.labelnames}'
+            )
+        return tuple(str(value) for value in labels)
+
+    def clear(self):
+        with self._lock:
+            self._series.clear()
+
+    def render(self):
+        lines = [
+            f'# HELP {self.name} {self.documentation}',
+            f'# TYPE {self.name} {self.kind}',
+        ]
+        with self._lock:
+            series = sorted(self._series.items())
+            lines.extend(self._render_series(series))
+        return lines
+
+    def _render_series(self, series):
+        for labels, value in series:
+            yield (f'{self.name}{_format_labels(self.labelnames, labels)} '
+                   f'{_format_value(value)}')
+
+
+class Counter(_Metric):
+    """Contador monótono con etiquetas."""
+
+    kind = 'counter'
+
+    def inc(self, *labels, amount: float = 1):
+        key = self._key(labels)
+        with self._lock:
+            self._series[key] = self._series.get(key, 0) + amount
+
+    def value(self, *labels) -> float:
+        with self._lock:
+            return self._series.get(self._key(labels), 0)
+
+
+class Gauge(Counter):
+    """Valor que puede subir y bajar (por ejemplo, peticiones en curso)."""
+
+    kind = 'gauge'
+
+    def dec(self, *labels, amount: float = 1):
+        self.inc(*labels, amount=-amount)
+
+    def set(self, *labels, value: float):
+        key = self._key(labels)
+        with self._lock:
+            self._series[key] = value
+
+
+class Histogram(_Metric):
+    """Histograma acumulativo con buckets fijos."""
+
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(),
+                 buckets=DEFAULT_LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, *labels, value: float):
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                # [conteos por bucket (+ Inf), suma, total]
+                series = self._series[key] = [
+                    [0] * (len(self.buckets) + 1), 0.0, 0
+                ]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def count(self, *labels) -> int:
+        with self._lock:
+            series = self._series.get(self._key(labels))
+            return series[2] if series else 0
+
+    def _render_series(self, series):
+        bounds = self.buckets + (float('inf'),)
+        for labels, (counts, total, observations) in series:
+            cumulative = 0
+            for bound, bucket_count in zip(bounds, counts):
+                cumulative += bucket_count
+                label_str = _format_labels(
+                    self.labelnames, labels, ('le', _format_value(bound))
+                )
+                yield f'{self.name}_bucket{label_str} {cumulative}'
+            label_str = _format_labels(self.labelnames, labels)
+            yield f'{self.name}_sum{label_str} {_format_value(total)}'
+            yield f'{self.name}_count{label_str} {observations}'
+
+
+class Registry:
+    """Conjunto de métricas que se exponen juntas."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics = {}
+
+    def register(self, metric):
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(),
+                  buckets=DEFAULT_LATENCY_BUCKETS):
+        return self.register(
+            Histogram(name, documentation, labelnames, buckets)
+        )
+
+    def get(self, name):
+        return self._metrics.get(name)
+
+    def clear(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+        for metric in metrics:
+            metric.clear()
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = sorted(self._metrics.values(), key=lambda m: m.name)
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+REQUEST_LATENCY = REGISTRY.histogram(
+    'http_request_duration_seconds',
+    'Latencia de las peticiones HTTP por endpoint',
+    ('endpoint', 'method'),
+)
+REQUESTS_TOTAL = REGISTRY.counter(
+    'http_requests_total',
+    'Peticiones HTTP atendidas por endpoint y código de estado',
+    ('endpoint', 'method', 'status'),
+)
+REQUESTS_IN_FLIGHT = REGISTRY.gauge(
+    'http_requests_in_flight',
+    'Peticiones HTTP en curso por endpoint',
+    ('endpoint',),
+)
+REGISTRATION_OUTCOMES = REGISTRY.counter(
+    'registration_outcomes_total',
+    'Resultados de los intentos de registro por código',
+    ('outcome',),
+)
+ITINERARY_REQUESTS = REGISTRY.counter(
+    'itinerary_requests_total',
+    'Planes y reservas de itinerarios por resultado',
+    ('operation', 'outcome'),
+)
+REGISTRATIONS_CANCELLED = REGISTRY.counter(
+    'registrations_cancelled_total',
+    'Registros cancelados (cupos liberados) por modo',
+    ('mode',),
+)
+
+
+def init_metrics(app):
+    """Instrumenta las peticiones de ``app`` y expone ``/metrics``."""
+
+    @app.before_request
+    def _start_request_timer():
+        endpoint = request.endpoint or 'unmatched'
+        g._metrics_state = (endpoint, time.perf_counter())
+        REQUESTS_IN_FLIGHT.inc(endpoint)
+
+    @app.after_request
+    def _record_request(response):
+        state = g.pop('_metrics_state', None)
+        if state is not None:
+            _finish(state, response.status_code)
+        return response
+
+    @app.teardown_request
+    def _record_failed_request(exc):
+        # Solo queda estado si la petición terminó con una excepción
+        state = g.pop('_metrics_state', None)
+        if state is not None:
+            _finish(state, 500)
+
+    @app.route('/metrics', methods=['GET'])
+    def metrics():
+        return Response(REGISTRY.render(), content_type=CONTENT_TYPE)
+
+
+def _finish(state, status_code):
+    endpoint, started = state
+    method = request.method
+    REQUEST_LATENCY.observe(
+        endpoint, method, value=time.perf_counter() - started
+    )
+    REQUESTS_TOTAL.inc(endpoint, method, status_code)
+    REQUESTS_IN_FLIGHT.dec(endpoint)
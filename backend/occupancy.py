@@ -0,0 +1,365 @@
+"""Ocupación de turnos compartida entre procesos worker.
+
+Una matriz de tamaño fijo (actividades × horarios) de enteros de 32 bits en
+``multiprocessing.shared_memory``. Todos los workers leen de ella el catálogo
+y el rechazo temprano por falta de cupos, en lugar de contar ``Registration``.
+
+Consistencia:
+    - Los registros dejan su delta en la sesión (``stage``) y se aplica en
+      ``before_commit``, mientras la transacción tiene el lock de escritura
+      (ver ``ActivityService``); si el commit falla se revierte.
+    - ``reconcile`` recalcula la matriz desde la base con ese mismo lock. Se
+      ejecuta al crear la aplicación y luego cada
+      ``SHARED_OCCUPANCY_RECONCILE_SECONDS`` desde un hilo de fondo
+      (``OccupancyReconciler``), nunca dentro de una petición de lectura.
+    - Las escrituras en la matriz se serializan con un ``flock`` (entre
+      procesos) más un lock de hilo (dentro del proceso).
+"""
+import array
+import atexit
+import fcntl
+import hashlib
+import os
+import tempfile
+import threading
+import time
+from multiprocessing import resource_tracker, shared_memory
+
+from flask import current_app, has_app_context
+from sqlalchemy import event, func, update
+from sqlalchemy.orm import Session
+
+from logging_config import get_logger
+
+logger = get_logger('occupancy')
+
+_MAGIC = 0x0CC0
+# Cabecera: mágico, filas, columnas, generación, último reconcile (epoch s)
+_HEADER = 5
+_GENERATION = 3
+_RECONCILED_AT = 4
+_STAGED_KEY = 'occupancy_deltas'
+
+
+class SharedOccupancy:
+    """Matriz de ocupación en memoria compartida.
+
+    Args:
+        name: Nombre del segmento de memoria compartida
+        slots: Horarios que forman las columnas (orden fijo)
+        max_activities: Filas; las actividades con id mayor no se indexan
+    """
+
+    def __init__(self, name: str, slots, max_activities: int = 4096):
+        self.name = name
+        self.slots = tuple(slots)
+        self.slot_index = {slot: i for i, slot in enumerate(self.slots)}
+        self.max_activities = max_activities
+        size = (_HEADER + max_activities * len(self.slots)) * 4
+        self._owner_pid = None
+        try:
+            self._shm = shared_memory.SharedMemory(
+                name=name, create=True, size=size)
+            self._owner_pid = os.getpid()
+        except FileExistsError:
+            self._shm = shared_memory.SharedMemory(name=name)
+            # Al adjuntarse, el resource tracker lo borraría al salir
+            resource_tracker.unregister(self._shm._name, 'shared_memory')
+        self._cells = self._shm.buf.cast('i')
+        if self._owner_pid is not None:
+            self._cells[0:3] = array.array(
+                'i', (_MAGIC, max_activities, len(self.slots)))
+        elif (self._cells[0] != _MAGIC or self._cells[1] != max_activities
+              or self._cells[2] != len(self.slots)):
+            raise RuntimeError(
+                f'El segmento {name} tiene otra disposición; elimínelo o '
+                f'use otro SHARED_OCCUPANCY_NAME'
+            )
+        self._thread_lock = threading.Lock()
+        self._lock_path = os.path.join(tempfile.gettempdir(),
+                                       f'{name}.lock')
+        self._lock_file = open(self._lock_path, 'a+')
+
+    def _index(self, activity_id, schedule):
+        column = self.slot_index.get(schedule)
+        if column is None or not 1 <= activity_id <= self.max_activities:
+            return None
+        return _HEADER + (activity_id - 1) * len(self.slots) + column
+
+    def covers(self, activity_id, schedule) -> bool:
+        """Indica si el turno está representado en la matriz."""
+        return self._index(activity_id, schedule) is not None
+
+    def get(self, activity_id, schedule):
+        """Ocupación del turno, o ``None`` si no está representado."""
+        index = self._index(activity_id, schedule)
+        return None if index is None else self._cells[index]
+
+    @property
+    def generation(self) -> int:
+        """Contador que cambia con cada modificación de la matriz."""
+        return self._cells[_GENERATION]
+
+    @property
+    def reconciled_at(self) -> int:
+        return self._cells[_RECONCILED_AT]
+
+    def _locked(self):
+        return _CombinedLock(self._thread_lock, self._lock_file)
+
+    def add(self, activity_id, schedule, delta: int):
+        """Suma ``delta`` a la ocupación del turno de forma atómica."""
+        index = self._index(activity_id, schedule)
+        if index is None:
+            return
+        with self._locked():
+            self._cells[index] = max(0, self._cells[index] + delta)
+            self._cells[_GENERATION] += 1
+
+    def load(self, counts: dict, verified: bool = True):
+        """Reemplaza la matriz completa con ``{(actividad, horario): n}``.
+
+        Con ``verified=False`` (conteos que no salen de la base turno por
+        turno) la marca de reconciliación queda en 0: la próxima pasada de
+        ``OccupancyReconciler`` la recalcula sin esperar el intervalo.
+        """
+        with self._locked():
+            for index in range(_HEADER, len(self._cells)):
+                self._cells[index] = 0
+            for (activity_id, schedule), count in counts.items():
+                index = self._index(activity_id, schedule)
+                if index is not None:
+                    self._cells[index] = count
+            self._cells[_GENERATION] += 1
+            self._cells[_RECONCILED_AT] = int(time.time()) if verified else 0
+
+    def close(self, unlink: bool = False):
+        """Libera el segmento (y lo elimina si ``unlink``)."""
+        if self._lock_file.closed:
+            return
+        self._cells.release()
+        self._shm.close()
+        self._lock_file.close()
+        if unlink:
+            try:
+                self._shm.unlink()
+            except FileNotFoundError:
+                pass
+            try:
+                os.remove(self._lock_path)
+            except FileNotFoundError:
+                pass
+
+    def _close_at_exit(self):
+        # Los workers heredan los handlers de atexit del maestro: todos
+        # cierran su vista, pero solo el creador elimina el segmento
+        self.close(unlink=os.getpid() == self._owner_pid)
+
+
+class _CombinedLock:
+    __slots__ = ('_thread_lock', '_lock_file')
+
+    def __init__(self, thread_lock, lock_file):
+        self._thread_lock = thread_lock
+        self._lock_file = lock_file
+
+    def __enter__(self):
+        self._thread_lock.acquire()
+        fcntl.flock(self._lock_file, fcntl.LOCK_EX)
+
+    def __exit__(self, *exc):
+        fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+        self._thread_lock.release()
+
+
+def count_registrations(db, Registration) -> dict:
+    """Ocupación de todos los turnos con una sola consulta agrupada."""
+    rows = db.session.query(
+        Registration.activity_id, Registration.schedule,
+        func.count(Registration.id)
+    ).group_by(Registration.activity_id, Registration.schedule)
+    return {(activity_id, schedule): count
+            for activity_id, schedule, count in rows}
+
+
+def get_occupancy():
+    """Matriz de la aplicación actual, o ``None`` si está desactivada."""
+    if not has_app_context():
+        return None
+    return current_app.extensions.get('shared_occupancy')
+
+
+def stage(session, activity_id, schedule, delta: int):
+    """Deja un cambio de ocupación para aplicarlo con el commit."""
+    occupancy = get_occupancy()
+    if occupancy is not None:
+        session.info.setdefault(_STAGED_KEY, []).append(
+            (occupancy, activity_id, schedule, delta))
+
+
+@event.listens_for(Session, 'before_commit')
+def _apply_staged(session):
+    staged = session.info.pop(_STAGED_KEY, None)
+    if not staged:
+        return
+    for occupancy, activity_id, schedule, delta in staged:
+        occupancy.add(activity_id, schedule, delta)
+    session.info['occupancy_applied'] = staged
+
+
+@event.listens_for(Session, 'after_commit')
+def _forget_applied(session):
+    session.info.pop('occupancy_applied', None)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _revert_applied(session):
+    session.info.pop(_STAGED_KEY, None)
+    applied = session.info.pop('occupancy_applied', None)
+    for occupancy, activity_id, schedule, delta in applied or ():
+        occupancy.add(activity_id, schedule, -delta)
+
+
+def reconcile(db, Activity, Registration, load_counts=count_registrations):
+    """Recalcula la matriz desde la base con el lock de escritura tomado.
+
+    Args:
+        load_counts: Función ``(db, Registration) -> {(actividad, horario):
+            n}``; al arrancar puede reconstruir desde el log de eventos
+    """
+    occupancy = get_occupancy()
+    if occupancy is None:
+        return
+    try:
+        # Mismo lock que toman los registros: ningún delta queda a medias
+        db.session.execute(
+            update(Activity).values(id=Activity.id)
+            .execution_options(synchronize_session=False)
+        )
+        occupancy.load(load_counts(db, Registration),
+                       verified=load_counts is count_registrations)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    logger.info('Ocupación compartida reconciliada con la base')
+
+
+def maybe_reconcile(db, Activity, Registration) -> bool:
+    """Reconciliación periódica, si pasó el intervalo configurado.
+
+    La marca de la última reconciliación vive en el segmento compartido:
+    con varios workers solo uno reconcilia por intervalo.
+
+    Returns:
+        ``True`` si reconcilió
+    """
+    occupancy = get_occupancy()
+    if occupancy is None:
+        return False
+    interval = current_app.config['SHARED_OCCUPANCY_RECONCILE_SECONDS']
+    if time.time() - occupancy.reconciled_at < interval:
+        return False
+    reconcile(db, Activity, Registration)
+    return True
+
+
+class OccupancyReconciler:
+    """Hilo que reconcilia la matriz fuera de las peticiones.
+
+    ``reconcile`` toma el lock de escritura de la base; un hilo por proceso
+    lo hace cada ``interval`` segundos para que ninguna lectura del
+    catálogo espere por él.
+
+    Args:
+        app: Aplicación (cada pasada corre en su contexto)
+        db: Extensión de SQLAlchemy
+        Activity: Modelo de actividades
+        Registration: Modelo de registros
+        interval: Segundos entre comprobaciones
+    """
+
+    def __init__(self, app, db, Activity, Registration, interval: float):
+        self.app = app
+        self.db = db
+        self.Activity = Activity
+        self.Registration = Registration
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Arranca el hilo en este proceso (de nuevo tras un fork)."""
+        with self._lock:
+            if self._pid == os.getpid() and self._thread is not None:
+                return
+            self._pid = os.getpid()
+            self._stop.clear()
+            self._thread = threading.Thread(
+                target=self._loop, name='occupancy-reconciler', daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        """Detiene el hilo."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self._thread = None
+
+    def run_once(self) -> bool:
+        """Una comprobación; ``True`` si reconcilió."""
+        with self.app.app_context():
+            try:
+                return maybe_reconcile(self.db, self.Activity,
+                                       self.Registration)
+            finally:
+                self.db.session.remove()
+
+    def _loop(self):
+        while not self._stop.wait(max(1.0, self.interval)):
+            try:
+                self.run_once()
+            except Exception:
+                logger.exception('Error reconciliando la ocupación compartida')
+
+
+def init_occupancy(app, db, Activity, Registration, slots,
+                   load_counts=count_registrations):
+    """Crea o adjunta la matriz compartida si está habilitada.
+
+    ``load_counts`` se usa para la reconciliación de arranque (ver
+    ``reconcile``); las periódicas siempre consultan la base.
+
+    Claves de configuración:
+        SHARED_OCCUPANCY: Activa la matriz compartida (por defecto ``False``)
+        SHARED_OCCUPANCY_NAME: Nombre del segmento (por defecto derivado de
+            la URI de la base)
+        SHARED_OCCUPANCY_MAX_ACTIVITIES: Filas de la matriz
+        SHARED_OCCUPANCY_RECONCILE_SECONDS: Intervalo de reconciliación
+            (la hace ``OccupancyReconciler``, que arranca con el servidor)
+    """
+    app.config.setdefault('SHARED_OCCUPANCY', False)
+    app.config.setdefault('SHARED_OCCUPANCY_NAME', None)
+    app.config.setdefault('SHARED_OCCUPANCY_MAX_ACTIVITIES', 4096)
+    app.config.setdefault('SHARED_OCCUPANCY_RECONCILE_SECONDS', 60)
+    if not app.config['SHARED_OCCUPANCY']:
+        return None
+
+    name = app.config['SHARED_OCCUPANCY_NAME'] or 'ecoharmony_occ_' + (
+        hashlib.sha1(
+            app.config['SQLALCHEMY_DATABASE_URI'].encode()
+        ).hexdigest()[:12]
+    )
+    occupancy = SharedOccupancy(
+        name, slots, app.config['SHARED_OCCUPANCY_MAX_ACTIVITIES'])
+    atexit.register(occupancy._close_at_exit)
+    app.extensions['shared_occupancy'] = occupancy
+    app.extensions['occupancy_reconciler'] = OccupancyReconciler(
+        app, db, Activity, Registration,
+        app.config['SHARED_OCCUPANCY_RECONCILE_SECONDS'])
+    with app.app_context():
+        db.create_all()
+        reconcile(db, Activity, Registration, load_counts)
+    return occupancy
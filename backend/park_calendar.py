@@ -0,0 +1,247 @@
+"""Calendario del parque: turnos válidos de cada día, memorizados.
+
+Reglas, de menor a mayor prioridad:
+    - ``hours``: horario por día de la semana (lunes = 0) como
+      ``('09:00', '18:00')`` o ``None`` si el parque cierra; los días sin
+      regla abren de 09:00 a 18:00.
+    - ``seasons``: temporadas ``{'from': 'MM-DD', 'to': 'MM-DD', 'hours':
+      {...}}`` cuyo horario semanal reemplaza al general en esas fechas
+      (pueden cruzar el fin de año; los días que no definen usan el
+      general).
+    - ``closures``: fechas en que el parque no abre (feriados).
+
+Cada actividad usa turnos de ``interval`` minutos o los de
+``activity_intervals`` (clave buscada en el nombre, como las reglas de
+cupo y edad). Los turnos de un par (día, duración) se generan al pedirlos
+y quedan en un ``lru_cache`` acotado como ``frozenset``: validar un
+horario es una búsqueda en un conjunto.
+"""
+from collections import namedtuple
+from datetime import date, datetime
+from functools import lru_cache
+
+from flask import current_app, has_app_context
+
+DEFAULT_OPEN = '09:00'
+DEFAULT_CLOSE = '18:00'
+DEFAULT_INTERVAL = 30
+
+Slots = namedtuple('Slots', ('ordered', 'valid'))
+Slots.__doc__ = ('Turnos de un día: ``ordered`` (tupla) y ``valid`` '
+                 '(``frozenset``).')
+
+
+def to_minutes(value: str) -> int:
+    """Minutos desde la medianoche de un texto ``HH:MM``."""
+    hours, minutes = value.split(':')
+    hours, minutes = int(hours), int(minutes)
+    if (not (0 <= hours <= 24 and 0 <= minutes < 60)
+            or hours * 60 + minutes > 24 * 60):
+        raise ValueError(f'Hora inválida: {value}')
+    return hours * 60 + minutes
+
+
+def generate_slots(open_minute: int, close_minute: int, interval: int) -> list:
+    """Inicios ``HH:MM`` de los turnos que terminan antes del cierre."""
+    return ['%02d:%02d' % divmod(minute, 60)
+            for minute in range(open_minute, close_minute - interval + 1,
+                                interval)]
+
+
+def _to_date(value) -> date:
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return date.fromisoformat(value)
+
+
+def _month_day(value: str) -> tuple:
+    month, day = value.split('-')
+    return int(month), int(day)
+
+
+def _normalize_week(hours) -> dict:
+    """``{día: (apertura, cierre) en minutos o None}``."""
+    week = {}
+    for weekday, span in (hours or {}).items():
+        weekday = int(weekday)
+        if not 0 <= weekday <= 6:
+            raise ValueError(f'Día de la semana inválido: {weekday} '
+                             '(0 = lunes, 6 = domingo)')
+        if span is None:
+            week[weekday] = None
+            continue
+        opens, closes = (to_minutes(value) for value in span)
+        if opens >= closes:
+            raise ValueError(f'El horario del día {weekday} debe abrir '
+                             f'antes de cerrar: {span}')
+        week[weekday] = (opens, closes)
+    return week
+
+
+class ParkCalendar:
+    """Turnos válidos por día según horarios, temporadas y cierres.
+
+    Args:
+        hours: Horario semanal ``{día: (apertura, cierre) o None}``
+        seasons: Temporadas con su propio horario semanal
+        closures: Fechas cerradas (``date`` o ``YYYY-MM-DD``)
+        interval: Duración por defecto de un turno en minutos
+        activity_intervals: ``{nombre: minutos}`` por actividad
+        cache_size: Pares (día, duración) memorizados
+    """
+
+    def __init__(self, hours=None, seasons=(), closures=(),
+                 interval: int = DEFAULT_INTERVAL, activity_intervals=None,
+                 cache_size: int = 512):
+        self.default_hours = (to_minutes(DEFAULT_OPEN),
+                              to_minutes(DEFAULT_CLOSE))
+        self.hours = _normalize_week(hours)
+        self.seasons = []
+        for season in seasons or ():
+            self.seasons.append((_month_day(season['from']),
+                                 _month_day(season['to']),
+                                 _normalize_week(season.get('hours'))))
+        self.closures = frozenset(_to_date(value) for value in closures or ())
+        self.interval = self._check_interval(interval)
+        self.activity_intervals = {
+            name.lower(): self._check_interval(minutes)
+            for name, minutes in (activity_intervals or {}).items()
+        }
+        self._day_slots = lru_cache(maxsize=cache_size)(self._compute_day)
+        self._template = lru_cache(maxsize=None)(self._compute_template)
+
+    @staticmethod
+    def _check_interval(minutes) -> int:
+        if (not isinstance(minutes, int) or isinstance(minutes, bool)
+                or not 0 < minutes <= 24 * 60):
+            raise ValueError(f'Duración de turno inválida: {minutes}')
+        return minutes
+
+    def interval_for(self, activity_name=None) -> int:
+        """Duración en minutos de los turnos de la actividad."""
+        if activity_name:
+            name = activity_name.lower()
+            for key, minutes in self.activity_intervals.items():
+                if key in name:
+                    return minutes
+        return self.interval
+
+    def intervals(self) -> list:
+        """Duraciones de turno distintas configuradas."""
+        return sorted({self.interval, *self.activity_intervals.values()})
+
+    def hours_for(self, day: date):
+        """``(apertura, cierre)`` en minutos del día, o ``None`` si cierra."""
+        if day in self.closures:
+            return None
+        weekday = day.weekday()
+        key = (day.month, day.day)
+        for start, end, week in self.seasons:
+            if start <= end:
+                inside = start <= key <= end
+            else:
+                inside = key >= start or key <= end
+            if inside and weekday in week:
+                return week[weekday]
+        return self.hours.get(weekday, self.default_hours)
+
+    def _compute_day(self, day: date, interval: int) -> Slots:
+        span = self.hours_for(day)
+        ordered = ()
+        if span:
+            ordered = tuple(generate_slots(span[0], span[1], interval))
+        return Slots(ordered, frozenset(ordered))
+
+    def _compute_template(self, interval: int) -> Slots:
+        # Unión de todos los horarios semanales (generales y de temporada)
+        spans = {self.hours.get(weekday, self.default_hours)
+                 for weekday in range(7)}
+        for _, _, week in self.seasons:
+            spans.update(week.values())
+        valid = set()
+        for span in spans:
+            if span:
+                valid.update(generate_slots(span[0], span[1], interval))
+        return Slots(tuple(sorted(valid)), frozenset(valid))
+
+    def slots(self, day=None, activity=None) -> Slots:
+        """Turnos de ``day`` para la actividad.
+
+        Args:
+            day: Fecha; ``None`` para los turnos posibles en algún día
+            activity: Nombre de la actividad (define la duración)
+        """
+        interval = self.interval_for(activity)
+        if day is None:
+            return self._template(interval)
+        return self._day_slots(_to_date(day), interval)
+
+    def is_valid(self, time_str: str, day=None, activity=None) -> bool:
+        """Indica si ``time_str`` es un turno de ``day`` (O(1) memorizado)."""
+        return time_str in self.slots(day, activity).valid
+
+    def is_closed(self, time_str: str, day, activity=None) -> bool:
+        """Turno del calendario que ``day`` no habilita (feriado u horario).
+
+        Los horarios que no son turno de ningún día no cuentan como cerrados:
+        esos los rechaza la validación de la actividad.
+        """
+        slots = self.slots(activity=activity).valid
+        return (time_str in slots
+                and time_str not in self.slots(day, activity).valid)
+
+    def all_slots(self) -> tuple:
+        """Todos los horarios posibles con cualquier duración configurada."""
+        valid = set()
+        for interval in self.intervals():
+            valid.update(self._template(interval).valid)
+        return tuple(sorted(valid))
+
+    def cache_info(self):
+        """Estadísticas del ``lru_cache`` de turnos por día."""
+        return self._day_slots.cache_info()
+
+    @staticmethod
+    def today() -> date:
+        """Fecha local del parque (la del control de turnos pasados)."""
+        return date.today()
+
+
+DEFAULT_CALENDAR = ParkCalendar()
+
+
+def get_calendar() -> ParkCalendar:
+    """Calendario de la aplicación actual, o el predeterminado sin ella."""
+    if has_app_context():
+        return current_app.extensions.get('park_calendar', DEFAULT_CALENDAR)
+    return DEFAULT_CALENDAR
+
+
+def init_calendar(app) -> ParkCalendar:
+    """Crea el calendario del parque de ``app``.
+
+    Claves de configuración:
+        PARK_HOURS: ``{día: ["HH:MM", "HH:MM"] o null}`` (lunes = 0)
+        PARK_SEASONS: Lista de
+            ``{"from": "MM-DD", "to": "MM-DD", "hours": {...}}``
+        PARK_CLOSURES: Fechas cerradas ``YYYY-MM-DD``
+        SLOT_MINUTES: Duración por defecto de un turno (30)
+        ACTIVITY_SLOT_MINUTES: ``{nombre: minutos}`` por actividad
+        PARK_CALENDAR_CACHE_SIZE: Días memorizados (por defecto 512)
+    """
+    app.config.setdefault('PARK_HOURS', None)
+    app.config.setdefault('PARK_SEASONS', ())
+    app.config.setdefault('PARK_CLOSURES', ())
+    app.config.setdefault('SLOT_MINUTES', DEFAULT_INTERVAL)
+    app.config.setdefault('ACTIVITY_SLOT_MINUTES', None)
+    app.config.setdefault('PARK_CALENDAR_CACHE_SIZE', 512)
+    calendar = ParkCalendar(
+        app.config['PARK_HOURS'], app.config['PARK_SEASONS'],
+        app.config['PARK_CLOSURES'], app.config['SLOT_MINUTES'],
+        app.config['ACTIVITY_SLOT_MINUTES'],
+        app.config['PARK_CALENDAR_CACHE_SIZE'],
+    )
+    app.extensions['park_calendar'] = calendar
+    return calendar
@@ -0,0 +1,189 @@
+"""Búsqueda de itinerarios de varias actividades para un grupo.
+
+Cada actividad pedida ofrece turnos candidatos (horario y cupos libres);
+un itinerario asigna un turno a cada actividad de modo que:
+
+    - el grupo completo entre en el turno (cupos libres >= tamaño),
+    - ningún turno se superponga (``[inicio, inicio + duration)``) con
+      otro del itinerario ni con uno que algún DNI del grupo ya tiene
+      reservado (un turno por DNI), y
+    - una actividad termine (inicio + ``duration``) al menos ``min_gap``
+      minutos antes de que empiece la siguiente.
+
+La búsqueda es backtracking con la actividad más restringida primero
+(menos candidatos restantes) y chequeo hacia adelante: tras elegir un
+turno se quitan de las pendientes los turnos incompatibles y se descarta
+la rama si alguna se queda sin candidatos.
+``max_nodes`` acota el trabajo en catálogos grandes. Las soluciones se
+ordenan por preferencia (``earliest`` o ``compact``).
+
+No accede a la base: ``ItineraryService`` (``app.py``) arma las opciones
+con las reglas en caché y una consulta agrupada de ocupación.
+"""
+import heapq
+
+SLOT_MINUTES = 30
+PREFERENCES = ('earliest', 'compact')
+MAX_SOLUTIONS = 500
+
+
+def to_minutes(schedule: str) -> int:
+    hours, minutes = schedule.split(':')
+    return int(hours) * 60 + int(minutes)
+
+
+class ActivityOption:
+    """Actividad pedida, sus turnos candidatos ``{horario: cupos libres}`` y
+    la duración de un turno en minutos."""
+
+    __slots__ = ('activity_id', 'name', 'slots', 'duration')
+
+    def __init__(self, activity_id: int, name: str, slots: dict,
+                 duration: int = SLOT_MINUTES):
+        self.activity_id = activity_id
+        self.name = name
+        self.slots = dict(slots)
+        self.duration = duration
+
+    def __repr__(self):
+        return (f'ActivityOption({self.activity_id!r}, {self.name!r}, '
+                f'{len(self.slots)} turnos)')
+
+
+class PlanResult:
+    """Itinerarios encontrados y el trabajo que costó encontrarlos."""
+
+    __slots__ = ('plans', 'nodes', 'exhausted')
+
+    def __init__(self, plans, nodes: int, exhausted: bool):
+        self.plans = plans
+        self.nodes = nodes
+        self.exhausted = exhausted
+
+
+def _overlaps(start: int, duration: int, intervals) -> bool:
+    return any(start < end and begin < start + duration
+               for begin, end in intervals)
+
+
+def find_conflict(assignments, min_gap: int = 0):
+    """Primer par de turnos de un itinerario que no son compatibles.
+
+    Usa la misma regla que ``plan_itinerary``: una actividad termina al
+    menos ``min_gap`` minutos antes de que empiece la otra.
+
+    Args:
+        assignments: ``(horario, duración en minutos)`` de cada turno
+        min_gap: Minutos libres mínimos entre actividades
+
+    Returns:
+        Índices ``(i, j)`` con ``i < j`` del primer par incompatible, o
+        ``None``
+    """
+    starts = [(to_minutes(schedule), duration)
+              for schedule, duration in assignments]
+    for j, (start, duration) in enumerate(starts):
+        for i, (other, other_duration) in enumerate(starts[:j]):
+            if not (start >= other + other_duration + min_gap
+                    or other >= start + duration + min_gap):
+                return i, j
+    return None
+
+
+def _score(plan: dict, prefer: str) -> tuple:
+    starts = sorted(plan.values())
+    span = starts[-1] - starts[0]
+    if prefer == 'compact':
+        return (span, starts)
+    return (starts, span)
+
+
+def plan_itinerary(options, group_size: int, busy=(), min_gap: int = 0,
+                   prefer: str = 'earliest', max_plans: int = 3,
+                   max_nodes: int = 100000) -> PlanResult:
+    """Busca asignaciones de turnos factibles.
+
+    Args:
+        options: ``ActivityOption`` por actividad pedida
+        group_size: Personas del grupo
+        busy: Turnos ``(horario, duración en minutos)`` que algún DNI del
+            grupo ya tiene reservados; se descartan los candidatos que se
+            superponen con ellos
+        min_gap: Minutos libres mínimos entre actividades
+        prefer: ``earliest`` (empezar lo antes posible) o ``compact``
+            (menor tiempo entre la primera y la última)
+        max_plans: Itinerarios a devolver
+        max_nodes: Tope de nodos explorados
+
+    Returns:
+        ``PlanResult`` con los itinerarios (``{activity_id: horario}``)
+        mejor puntuados; ``exhausted`` indica que se recorrió todo el
+        espacio (y no que se cortó por ``max_nodes`` o ``MAX_SOLUTIONS``)
+    """
+    busy = [(to_minutes(schedule), to_minutes(schedule) + duration)
+            for schedule, duration in set(busy)]
+    durations = {option.activity_id: option.duration for option in options}
+    candidates = {}
+    for option in options:
+        times = sorted(
+            minute for minute in (
+                to_minutes(schedule)
+                for schedule, free in option.slots.items()
+                if free >= group_size
+            )
+            if not _overlaps(minute, option.duration, busy)
+        )
+        candidates[option.activity_id] = times
+        if not times:
+            return PlanResult([], 0, True)
+
+    solutions = []
+    chosen = {}
+    nodes = 0
+    cut = False
+
+    def search(domains: dict):
+        nonlocal nodes, cut
+        if not domains:
+            solutions.append(dict(chosen))
+            if len(solutions) >= MAX_SOLUTIONS:
+                cut = True
+            return
+        # La actividad pendiente con menos candidatos primero
+        activity_id = min(domains, key=lambda pending: len(domains[pending]))
+        rest = {pending: times for pending, times in domains.items()
+                if pending != activity_id}
+        for minute in domains[activity_id]:
+            if cut:
+                return
+            nodes += 1
+            if nodes > max_nodes:
+                cut = True
+                return
+            # Chequeo hacia adelante: quitar de las pendientes los turnos
+            # demasiado cercanos; si alguna se queda sin ninguno, podar
+            reduced = {}
+            # Las pendientes empiezan después de que esta termine o
+            # terminan antes de que empiece
+            after = minute + durations[activity_id] + min_gap
+            for pending, times in rest.items():
+                before = minute - durations[pending] - min_gap
+                kept = [other for other in times
+                        if other >= after or other <= before]
+                if not kept:
+                    break
+                reduced[pending] = kept
+            else:
+                chosen[activity_id] = minute
+                search(reduced)
+                del chosen[activity_id]
+
+    search(candidates)
+    best = heapq.nsmallest(max_plans, solutions,
+                           key=lambda solution: _score(solution, prefer))
+    plans = [
+        {activity_id: '%02d:%02d' % divmod(minute, 60)
+         for activity_id, minute in solution.items()}
+        for solution in best
+    ]
+    return PlanResult(plans, nodes, not cut)
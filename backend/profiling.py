@@ -0,0 +1,182 @@
+"""Perfilado bajo demanda de peticiones con cProfile.
+
+Una petición se perfila si trae la cabecera de administración con el token
+configurado o si cae en el muestreo. El resultado se guarda en
+``PROFILE_DIR`` como ``.pstats`` más un resumen ``.txt`` (con las mayores
+asignaciones de memoria si ``PROFILE_TRACEMALLOC`` está activo), etiquetados
+con la ruta y la latencia. Si el perfilado está desactivado el middleware ni
+siquiera se instala; las peticiones no perfiladas solo pagan una consulta a
+``environ``.
+"""
+import cProfile
+import hmac
+import io
+import os
+import pstats
+import random
+import re
+import threading
+import time
+import tracemalloc
+
+from logging_config import get_logger
+
+logger = get_logger('profiling')
+
+PROFILE_ID_HEADER = 'X-Profile-Id'
+
+_tracemalloc_lock = threading.Lock()
+_tracemalloc_users = 0
+
+
+def _route_tag(method: str, path: str) -> str:
+    tag = re.sub(r'[^A-Za-z0-9]+', '_', path).strip('_') or 'root'
+    return f'{method.lower()}_{tag}'[:80]
+
+
+def _start_tracemalloc():
+    global _tracemalloc_users
+    with _tracemalloc_lock:
+        if _tracemalloc_users == 0 and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        _tracemalloc_users += 1
+
+
+def _stop_tracemalloc():
+    global _tracemalloc_users
+    with _tracemalloc_lock:
+        snapshot = tracemalloc.take_snapshot()
+        _tracemalloc_users -= 1
+        if _tracemalloc_users == 0:
+            tracemalloc.stop()
+    return snapshot
+
+
+class ProfilingMiddleware:
+    """Middleware WSGI que perfila las peticiones seleccionadas.
+
+    Args:
+        wsgi_app: Aplicación WSGI envuelta
+        output_dir: Directorio donde se escriben los perfiles
+        token: Valor que debe traer la cabecera para forzar el perfilado;
+            si es ``None`` la cabecera se ignora
+        header: Nombre de la cabecera de administración
+        sample_rate: Fracción de peticiones perfiladas por muestreo
+        trace_memory: Incluir un resumen de asignaciones con tracemalloc
+    """
+
+    def __init__(self, wsgi_app, output_dir, token=None, header='X-Profile',
+                 sample_rate=0.0, trace_memory=False):
+        self.wsgi_app = wsgi_app
+        self.output_dir = output_dir
+        self.token = token
+        self.environ_key = 'HTTP_' + header.upper().replace('-', '_')
+        self.sample_rate = sample_rate
+        self.trace_memory = trace_memory
+
+    def should_profile(self, environ) -> bool:
+        if self.token:
+            supplied = environ.get(self.environ_key)
+            if supplied is not None and hmac.compare_digest(
+                supplied.encode(), self.token.encode()
+            ):
+                return True
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def __call__(self, environ, start_response):
+        if not self.should_profile(environ):
+            return self.wsgi_app(environ, start_response)
+        return self._profile(environ, start_response)
+
+    def _profile(self, environ, start_response):
+        method = environ.get('REQUEST_METHOD', 'GET')
+        tag = _route_tag(method, environ.get('PATH_INFO', ''))
+        stamp = time.strftime('%Y%m%dT%H%M%S')
+        captured = {}
+
+        def capture_start_response(status, headers, exc_info=None):
+            captured['status'] = status
+            captured['headers'] = headers
+            captured['exc_info'] = exc_info
+
+        if self.trace_memory:
+            _start_tracemalloc()
+        profiler = cProfile.Profile()
+        started = time.perf_counter()
+        profiler.enable()
+        try:
+            iterable = self.wsgi_app(environ, capture_start_response)
+            try:
+                body = list(iterable)
+            finally:
+                if hasattr(iterable, 'close'):
+                    iterable.close()
+        finally:
+            profiler.disable()
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            snapshot = _stop_tracemalloc() if self.trace_memory else None
+
+        name = f'{stamp}_{tag}_{elapsed_ms:.0f}ms_{os.getpid()}'
+        try:
+            self._write(name, profiler, snapshot, method, environ,
+                        captured.get('status'), elapsed_ms)
+        except OSError:
+            logger.exception('No se pudo guardar el perfil %s', name)
+
+        headers = list(captured['headers']) + [(PROFILE_ID_HEADER, name)]
+        start_response(captured['status'], headers, captured['exc_info'])
+        return body
+
+    def _write(self, name, profiler, snapshot, method, environ, status,
+               elapsed_ms):
+        os.makedirs(self.output_dir, exist_ok=True)
+        base = os.path.join(self.output_dir, name)
+        profiler.dump_stats(base + '.pstats')
+
+        summary = io.StringIO()
+        summary.write(
+            f'{method} {environ.get("PATH_INFO", "")} -> {status} '
+            f'en {elapsed_ms:.2f} ms\n\n'
+        )
+        stats = pstats.Stats(profiler, stream=summary)
+        stats.sort_stats('cumulative').print_stats(30)
+        if snapshot is not None:
+            summary.write('\nMayores asignaciones de memoria:\n')
+            for stat in snapshot.statistics('lineno')[:20]:
+                summary.write(f'{stat}\n')
+        with open(base + '.txt', 'w', encoding='utf-8') as handle:
+            handle.write(summary.getvalue())
+        logger.info(
+            'Perfil guardado', extra={'fields': {
+                'profile': name, 'latency_ms': round(elapsed_ms, 2),
+            }}
+        )
+
+
+def init_profiling(app):
+    """Instala el middleware de perfilado si está habilitado.
+
+    Claves de configuración:
+        PROFILE_ENABLED: Activa el modo de perfilado (por defecto ``False``)
+        PROFILE_TOKEN: Token que habilita la cabecera de administración
+        PROFILE_HEADER: Nombre de esa cabecera (por defecto ``X-Profile``)
+        PROFILE_SAMPLE_RATE: Fracción de peticiones perfiladas al azar
+        PROFILE_DIR: Directorio de salida (por defecto ``profiles``)
+        PROFILE_TRACEMALLOC: Incluir instantáneas de tracemalloc
+    """
+    app.config.setdefault('PROFILE_ENABLED', False)
+    app.config.setdefault('PROFILE_TOKEN', None)
+    app.config.setdefault('PROFILE_HEADER', 'X-Profile')
+    app.config.setdefault('PROFILE_SAMPLE_RATE', 0.0)
+    app.config.setdefault('PROFILE_DIR', 'profiles')
+    app.config.setdefault('PROFILE_TRACEMALLOC', False)
+    if not app.config['PROFILE_ENABLED']:
+        return
+    app.wsgi_app = ProfilingMiddleware(
+        app.wsgi_app,
+        output_dir=app.config['PROFILE_DIR'],
+        token=app.config['PROFILE_TOKEN'],
+        header=app.config['PROFILE_HEADER'],
+        sample_rate=float(app.config['PROFILE_SAMPLE_RATE']),
+        trace_memory=app.config['PROFILE_TRACEMALLOC'],
+    )
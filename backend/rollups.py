@@ -0,0 +1,235 @@
+"""Rollups de ocupación para la analítica de gestión.
+
+La tabla de rollups tiene una fila por día × actividad × turno × tamaño de
+grupo con ``groups`` (grupos registrados de ese tamaño) y ``people``
+(personas, neto de cancelaciones). Se actualiza dentro de la transacción
+de cada registro o cancelación con un único upsert, así que nunca se
+desfasa de ``Registration`` y un rechazo o rollback no la toca.
+
+Una cancelación no sabe de qué grupo venía el registro: resta personas en
+la fila de tamaño 0, que solo cuenta para la ocupación. La distribución de
+tamaños de grupo es la de los grupos reservados.
+
+``summarize`` arma la analítica a partir de las filas de un rango de días
+y de los cupos por turno, sin leer ``Registration``: el costo depende de
+días × actividades × turnos, no de la cantidad de registros.
+``recompute`` reconstruye la tabla desde ``Registration`` (backfill).
+"""
+from collections import namedtuple
+from datetime import datetime, timedelta, timezone
+
+from flask import current_app, has_app_context
+from sqlalchemy import delete, select
+
+from logging_config import get_logger
+
+logger = get_logger('rollups')
+
+WEEKDAYS = ('lunes', 'martes', 'miércoles', 'jueves', 'viernes', 'sábado',
+            'domingo')
+PEAK_HOURS = 3
+# Registros consecutivos del mismo turno a menos de esto son del mismo grupo
+GROUP_WINDOW = timedelta(seconds=1)
+
+SlotCapacity = namedtuple('SlotCapacity',
+                          ('activity_id', 'name', 'capacities'))
+SlotCapacity.__doc__ = ('Cupo de cada turno de una actividad '
+                        '(``{horario: cupo}``).')
+
+
+def rollup_day(moment: datetime = None):
+    """Día local del parque de un instante UTC (ahora si no se indica)."""
+    moment = moment or datetime.now(timezone.utc)
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return moment.astimezone().date()
+
+
+def enabled() -> bool:
+    return (has_app_context()
+            and current_app.config.get('ANALYTICS_ROLLUPS', False))
+
+
+def _upsert(session, model, rows):
+    table = model.__table__
+    dialect = session.get_bind().dialect.name
+    if dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        raise NotImplementedError(
+            f'Rollups de ocupación sin soporte para {dialect} '
+            f'(solo sqlite y postgresql); desactive ANALYTICS_ROLLUPS')
+    statement = insert(table)
+    session.execute(statement.on_conflict_do_update(
+        index_elements=[column.name for column in table.primary_key],
+        set_={'groups': table.c.groups + statement.excluded.groups,
+              'people': table.c.people + statement.excluded.people},
+    ), rows)
+
+
+def record_registration(session, model, activity_id, schedule,
+                        group_size: int):
+    """Suma un grupo de ``group_size`` personas al turno de hoy."""
+    if enabled():
+        _upsert(session, model, [{
+            'day': rollup_day(), 'activity_id': activity_id,
+            'schedule': schedule,
+            'group_size': group_size, 'groups': 1, 'people': group_size,
+        }])
+
+
+def record_cancellations(session, model, freed: dict):
+    """Resta personas canceladas.
+
+    Args:
+        freed: ``{(día, actividad, horario): personas}``; el día es el del
+            registro cancelado (ver ``rollup_day``)
+    """
+    if enabled() and freed:
+        _upsert(session, model, [
+            {'day': day, 'activity_id': activity_id, 'schedule': schedule,
+             'group_size': 0, 'groups': 0, 'people': -count}
+            for (day, activity_id, schedule), count in freed.items()
+        ])
+
+
+def recompute(session, model, Registration, batch_size: int = 5000) -> dict:
+    """Reconstruye los rollups desde ``Registration`` (sin commit).
+
+    Los grupos se infieren de registros consecutivos (por id) del mismo
+    turno creados con menos de ``GROUP_WINDOW`` de diferencia: así se
+    insertan los de un mismo pedido. Dos grupos del mismo turno
+    registrados en el mismo segundo se cuentan como uno.
+
+    Returns:
+        ``{'registrations': n, 'rows': filas escritas}``
+    """
+    rows = session.execute(
+        select(Registration.activity_id, Registration.schedule,
+               Registration.registered_at)
+        .order_by(Registration.id)
+        .execution_options(yield_per=batch_size)
+    )
+    totals = {}
+    current, size, last_at, registrations = None, 0, None, 0
+
+    def close_group():
+        if current is not None:
+            entry = totals.setdefault((*current, size), [0, 0])
+            entry[0] += 1
+            entry[1] += size
+
+    for activity_id, schedule, registered_at in rows:
+        registrations += 1
+        key = (rollup_day(registered_at), activity_id, schedule)
+        if key == current and last_at is not None \
+                and registered_at is not None \
+                and registered_at - last_at <= GROUP_WINDOW:
+            size += 1
+        else:
+            close_group()
+            current, size = key, 1
+        last_at = registered_at
+    close_group()
+
+    session.execute(delete(model))
+    values = [
+        {'day': day, 'activity_id': activity_id, 'schedule': schedule,
+         'group_size': group_size, 'groups': groups, 'people': people}
+        for (day, activity_id, schedule, group_size), (groups, people)
+        in totals.items()
+    ]
+    for start in range(0, len(values), batch_size):
+        session.execute(model.__table__.insert(),
+                        values[start:start + batch_size])
+    logger.info('Rollups de ocupación recalculados', extra={'fields': {
+        'registrations': registrations, 'rows': len(values)}})
+    return {'registrations': registrations, 'rows': len(values)}
+
+
+def _rate(people: int, capacity: int):
+    return round(people / capacity, 4) if capacity else None
+
+
+def summarize(rows, activities, start, end, open_slots) -> dict:
+    """Analítica de ocupación de ``start`` a ``end`` (inclusive).
+
+    Args:
+        rows: Filas ``(día, actividad, horario, tamaño, grupos, personas)``
+            de los rollups del rango
+        activities: ``SlotCapacity`` de cada actividad
+        start: Primer día
+        end: Último día
+        open_slots: Función ``(día, nombre) -> conjunto de horarios``
+            habilitados ese día (calendario del parque)
+
+    Returns:
+        Tasa de ocupación por actividad, turno y día de la semana, horas
+        pico y distribución de tamaños de grupo
+    """
+    people = {'activity': {}, 'slot': {}, 'weekday': {}, 'hour': {}}
+    group_sizes = {}
+    for day, activity_id, schedule, group_size, groups, count in rows:
+        for kind, key in (('activity', activity_id), ('slot', schedule),
+                          ('weekday', day.weekday()),
+                          ('hour', schedule[:2] + ':00')):
+            people[kind][key] = people[kind].get(key, 0) + count
+        if group_size:
+            group_sizes[group_size] = group_sizes.get(group_size, 0) + groups
+
+    capacity = {'activity': {}, 'slot': {}, 'weekday': {}}
+    days = (end - start).days + 1
+    for offset in range(days):
+        day = start + timedelta(days=offset)
+        for activity in activities:
+            available = open_slots(day, activity.name)
+            for schedule, seats in activity.capacities.items():
+                if schedule not in available:
+                    continue
+                for kind, key in (('activity', activity.activity_id),
+                                  ('slot', schedule),
+                                  ('weekday', day.weekday())):
+                    capacity[kind][key] = capacity[kind].get(key, 0) + seats
+
+    def entries(kind, keys, label, **extra):
+        return [dict({label: key, 'registered': people[kind].get(key, 0),
+                      'capacity': capacity[kind].get(key, 0),
+                      'fill_rate': _rate(people[kind].get(key, 0),
+                                         capacity[kind].get(key, 0))},
+                     **{name: values[key] for name, values in extra.items()})
+                for key in keys]
+
+    names = {activity.activity_id: activity.name for activity in activities}
+    hours = sorted(people['hour'].items(),
+                   key=lambda item: (-item[1], item[0]))
+    slots = sorted(set(capacity['slot']) | set(people['slot']))
+    return {
+        'from': start.isoformat(),
+        'to': end.isoformat(),
+        'days': days,
+        'activities': entries('activity', sorted(names), 'activity_id',
+                              name=names),
+        'slots': entries('slot', slots, 'schedule'),
+        'weekdays': entries('weekday', range(7), 'weekday',
+                            name=dict(enumerate(WEEKDAYS))),
+        'peak_hours': [{'hour': hour, 'registered': count}
+                       for hour, count in hours[:PEAK_HOURS] if count > 0],
+        'group_sizes': {str(size): group_sizes[size]
+                        for size in sorted(group_sizes)},
+    }
+
+
+def init_rollups(app):
+    """Configura los rollups de ocupación.
+
+    Claves de configuración:
+        ANALYTICS_ROLLUPS: Mantiene los rollups en cada registro y
+            cancelación (por defecto ``True``)
+        ANALYTICS_DEFAULT_DAYS: Días hacia atrás si no se indica rango (28)
+        ANALYTICS_MAX_DAYS: Rango máximo de una consulta (366)
+    """
+    app.config.setdefault('ANALYTICS_ROLLUPS', True)
+    app.config.setdefault('ANALYTICS_DEFAULT_DAYS', 28)
+    app.config.setdefault('ANALYTICS_MAX_DAYS', 366)
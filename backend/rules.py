@@ -0,0 +1,96 @@
+"""Reglas de actividad en caché para validar registros sin consultas.
+
+``ActivityRules`` reúne lo que la validación necesita de una actividad
+(horarios, cupos, talla, edad mínima); ``resolve_capacity`` define el cupo
+efectivo de cada turno. ``RulesCache`` las guarda por id:
+se invalidan con los eventos del ORM en este proceso y vencen a los
+``ttl`` segundos para recoger cambios hechos por otros workers. La etapa
+de base de datos del registro vuelve a comprobar que la actividad exista.
+"""
+import threading
+import time
+import weakref
+
+_caches = weakref.WeakSet()
+
+
+def invalidate_all_rules():
+    """Vacía todas las ``RulesCache`` del proceso (p. ej. tras drop_all)."""
+    for cache in list(_caches):
+        cache.invalidate()
+
+
+def resolve_capacity(capacity: int, turn_capacity: int, override=None) -> int:
+    """Cupo efectivo de un turno.
+
+    Args:
+        capacity: Capacidad de la actividad (tope de cualquier turno)
+        turn_capacity: Cupo por turno según la regla de la actividad
+        override: Cupo particular del turno (``SlotOverride``); reemplaza
+            la regla por turno, o ``None`` si no hay
+
+    Returns:
+        El menor entre la capacidad y el cupo del turno
+    """
+    limit = turn_capacity if override is None else override
+    return max(0, min(capacity, limit))
+
+
+class ActivityRules:
+    """Datos de una actividad usados por la validación de registros."""
+
+    __slots__ = ('activity_id', 'name', 'capacity', 'schedules',
+                 'requires_clothing', 'turn_capacity', 'min_age', 'overrides')
+
+    def __init__(self, activity_id, name, capacity, schedules,
+                 requires_clothing, turn_capacity, min_age, overrides=None):
+        self.activity_id = activity_id
+        self.name = name
+        self.capacity = capacity
+        self.schedules = frozenset(schedules)
+        self.requires_clothing = bool(requires_clothing)
+        self.turn_capacity = turn_capacity
+        self.min_age = min_age
+        self.overrides = dict(overrides or {})
+
+    def slot_capacity(self, schedule: str) -> int:
+        """Cupo efectivo del turno ``schedule``."""
+        return resolve_capacity(self.capacity, self.turn_capacity,
+                                self.overrides.get(schedule))
+
+
+class RulesCache:
+    """Caché de ``ActivityRules`` por id de actividad.
+
+    Args:
+        loader: Función ``loader(activity_id)`` que devuelve las reglas o
+            ``None`` si la actividad no existe
+        ttl: Segundos de validez de cada entrada
+    """
+
+    def __init__(self, loader, ttl: float = 30.0):
+        self.loader = loader
+        self.ttl = ttl
+        self._entries = {}
+        self._lock = threading.Lock()
+        _caches.add(self)
+
+    def get(self, activity_id):
+        """Reglas de la actividad (``None`` si no existe; no se cachea)."""
+        entry = self._entries.get(activity_id)
+        now = time.monotonic()
+        if entry is not None and entry[0] > now:
+            return entry[1]
+        rules = self.loader(activity_id)
+        if rules is not None:
+            with self._lock:
+                self._entries[activity_id] = (now + self.ttl, rules)
+        return rules
+
+    def invalidate(self, activity_id=None):
+        """Descarta una actividad o, sin argumento, todas."""
+        with self._lock:
+            if activity_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(activity_id, None)
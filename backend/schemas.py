@@ -0,0 +1,554 @@
+"""Decodificación tipada de los payloads de la API.
+
+``decode_registration`` convierte en una sola pasada el cuerpo de
+``POST /api/activities/<id>/register`` (formato ``participants`` o el
+antiguo ``visitor``) en objetos compactos con ``__slots__``, normalizando
+tipos (edad como entero, DNI como texto, talla vacía como ``None``) y
+juntando todos los errores de campo. No accede a la base: un payload mal
+formado se rechaza antes de cualquier consulta. ``decode_cancellations``,
+``decode_catalog_query`` y ``decode_itinerary`` hacen lo mismo con las
+cancelaciones masivas, los filtros del catálogo y los itinerarios.
+"""
+
+MAX_PARTICIPANTS = 10
+MAX_CANCELLATIONS = 1000
+DEFAULT_SCHEDULE = '09:00'
+
+
+class Participant:
+    """Participante ya validado y normalizado."""
+
+    __slots__ = ('name', 'dni', 'age', 'clothing_size')
+
+    def __init__(self, name: str, dni: str, age: int, clothing_size=None):
+        self.name = name
+        self.dni = dni
+        self.age = age
+        self.clothing_size = clothing_size
+
+    def __repr__(self):
+        return (f'Participant(name={self.name!r}, dni={self.dni!r}, '
+                f'age={self.age!r}, clothing_size={self.clothing_size!r})')
+
+
+class RegistrationRequest:
+    """Solicitud de registro decodificada."""
+
+    __slots__ = ('participants', 'terms_accepted', 'schedule', 'current_time')
+
+    def __init__(self, participants, terms_accepted: bool, schedule: str,
+                 current_time=None):
+        self.participants = tuple(participants)
+        self.terms_accepted = terms_accepted
+        self.schedule = schedule
+        self.current_time = current_time
+
+    @property
+    def dnis(self) -> list:
+        return [participant.dni for participant in self.participants]
+
+    def __repr__(self):
+        return (f'RegistrationRequest(schedule={self.schedule!r}, '
+                f'participants={len(self.participants)}, '
+                f'terms_accepted={self.terms_accepted!r})')
+
+
+class FieldError:
+    """Error de un campo del payload."""
+
+    __slots__ = ('code', 'message')
+
+    def __init__(self, code: str, message: str):
+        self.code = code
+        self.message = message
+
+    def __repr__(self):
+        return f'FieldError({self.code!r}, {self.message!r})'
+
+
+class ValidationError(Exception):
+    """Payload inválido; ``errors`` trae todos los errores encontrados."""
+
+    def __init__(self, errors):
+        self.errors = list(errors)
+        super().__init__(self.errors[0].message)
+
+    def to_result(self) -> dict:
+        """Resultado de servicio: el primer error y el detalle completo."""
+        return {
+            'success': False,
+            'error': self.errors[0].message,
+            'details': [error.message for error in self.errors],
+            'code': self.errors[0].code,
+        }
+
+
+def _coerce_age(value):
+    """Edad como entero, o ``None`` si no es convertible."""
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, int):
+        return value
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    if isinstance(value, str) and value.strip().lstrip('-').isdigit():
+        return int(value.strip())
+    return None
+
+
+def _coerce_bool(value):
+    if isinstance(value, bool):
+        return value
+    if value in (0, 1):
+        return bool(value)
+    if isinstance(value, str) and value.lower() in ('true', 'false'):
+        return value.lower() == 'true'
+    return None
+
+
+def _decode_participant(index: int, data, errors: list):
+    if not data or not isinstance(data, dict):
+        errors.append(FieldError(
+            'missing_data', f'Datos del participante {index} están vacíos'))
+        return None
+    failed = len(errors)
+
+    name = data.get('name')
+    if not isinstance(name, str) or not name.strip():
+        errors.append(FieldError(
+            'missing_data',
+            f'El nombre del participante {index} es obligatorio'))
+    else:
+        name = name.strip()
+
+    dni = data.get('dni')
+    if isinstance(dni, int) and not isinstance(dni, bool):
+        dni = str(dni)
+    if not isinstance(dni, str) or not dni.strip():
+        errors.append(FieldError(
+            'missing_data', f'El DNI del participante {index} es obligatorio'))
+    else:
+        dni = dni.strip()
+        if not dni.isdigit():
+            errors.append(FieldError(
+                'invalid_visitor',
+                f'El DNI del participante {index} debe contener solo números'))
+
+    raw_age = data.get('age')
+    age = _coerce_age(raw_age)
+    if not raw_age:
+        errors.append(FieldError(
+            'missing_data',
+            f'La edad del participante {index} es obligatoria'))
+    elif age is None:
+        errors.append(FieldError(
+            'invalid_visitor',
+            f'La edad del participante {index} debe ser un número entero'))
+    elif age <= 0:
+        errors.append(FieldError(
+            'invalid_visitor',
+            f'La edad del participante {index} debe ser un número positivo'))
+
+    clothing_size = data.get('clothing_size')
+    if clothing_size is not None and not isinstance(clothing_size, str):
+        errors.append(FieldError(
+            'invalid_visitor',
+            f'La talla del participante {index} debe ser un texto'))
+    elif clothing_size is not None:
+        clothing_size = clothing_size.strip() or None
+
+    if len(errors) > failed:
+        return None
+    return Participant(name, dni, age, clothing_size)
+
+
+def _decode_participants(raw_participants, errors: list) -> list:
+    participants = []
+    if not isinstance(raw_participants, list):
+        errors.append(FieldError(
+            'invalid_payload', 'participants debe ser una lista'))
+    elif not 1 <= len(raw_participants) <= MAX_PARTICIPANTS:
+        errors.append(FieldError(
+            'invalid_participant_count',
+            'Cantidad de participantes debe estar entre 1 y '
+            f'{MAX_PARTICIPANTS}'))
+    else:
+        for index, data in enumerate(raw_participants, start=1):
+            participant = _decode_participant(index, data, errors)
+            if participant is not None:
+                participants.append(participant)
+    return participants
+
+
+def decode_registration(payload, schedule: str = None) -> RegistrationRequest:
+    """Decodifica el payload de registro.
+
+    Args:
+        payload: Cuerpo JSON ya parseado (formato ``participants`` o
+            ``visitor``)
+        schedule: Horario que reemplaza al del payload (lo usa el servicio
+            cuando se llama directamente)
+
+    Returns:
+        Solicitud con participantes normalizados
+
+    Raises:
+        ValidationError: Con todos los errores de campo encontrados
+    """
+    if not isinstance(payload, dict):
+        raise ValidationError([FieldError(
+            'invalid_payload',
+            'El cuerpo de la solicitud debe ser un objeto JSON')])
+    errors = []
+
+    if 'visitor' in payload:
+        # Formato antiguo: un único visitante, términos dentro del visitante
+        visitor = payload['visitor']
+        raw_participants = [visitor]
+        raw_terms = (visitor.get('terms_accepted', True)
+                     if isinstance(visitor, dict) else True)
+        raw_schedule = payload.get('schedule')
+        if schedule is None and raw_schedule is None:
+            errors.append(
+                FieldError('missing_data', 'El horario es obligatorio'))
+    else:
+        raw_participants = payload.get('participants', [])
+        raw_terms = payload.get('terms_accepted', False)
+        raw_schedule = payload.get('schedule', DEFAULT_SCHEDULE)
+
+    if schedule is None:
+        schedule = raw_schedule
+    if schedule is not None and not isinstance(schedule, str):
+        errors.append(FieldError(
+            'invalid_payload', 'El horario debe ser un texto HH:MM'))
+
+    current_time = payload.get('current_time')
+    if current_time is not None and not isinstance(current_time, str):
+        errors.append(FieldError(
+            'invalid_payload', 'La hora actual debe ser un texto HH:MM'))
+
+    terms_accepted = _coerce_bool(raw_terms)
+    if terms_accepted is None:
+        errors.append(FieldError(
+            'invalid_payload', 'terms_accepted debe ser verdadero o falso'))
+
+    participants = _decode_participants(raw_participants, errors)
+
+    if errors:
+        raise ValidationError(errors)
+    return RegistrationRequest(
+        participants, terms_accepted, schedule, current_time)
+
+
+def decode_cancellations(payload) -> list:
+    """Decodifica el cuerpo de ``POST /api/registrations/cancel``.
+
+    Args:
+        payload: ``{"cancellations": [{"dni": ..., "schedule": ...}, ...]}``
+
+    Returns:
+        Pares ``(dni, horario)`` sin repetidos, en el orden recibido
+
+    Raises:
+        ValidationError: Con todos los errores de campo encontrados
+    """
+    if not isinstance(payload, dict):
+        raise ValidationError([FieldError(
+            'invalid_payload',
+            'El cuerpo de la solicitud debe ser un objeto JSON')])
+    items = payload.get('cancellations')
+    if not isinstance(items, list) or not 1 <= len(items) <= MAX_CANCELLATIONS:
+        raise ValidationError([FieldError(
+            'invalid_payload',
+            'cancellations debe ser una lista de 1 a '
+            f'{MAX_CANCELLATIONS} elementos')])
+
+    errors = []
+    pairs = {}
+    for index, item in enumerate(items, start=1):
+        if not isinstance(item, dict):
+            errors.append(FieldError(
+                'missing_data',
+                f'Datos de la cancelación {index} están vacíos'))
+            continue
+        dni = item.get('dni')
+        if isinstance(dni, int) and not isinstance(dni, bool):
+            dni = str(dni)
+        if not isinstance(dni, str) or not dni.strip().isdigit():
+            errors.append(FieldError(
+                'invalid_payload',
+                f'El DNI de la cancelación {index} debe contener '
+                'solo números'))
+            continue
+        schedule = item.get('schedule')
+        if not isinstance(schedule, str) or not schedule:
+            errors.append(FieldError(
+                'missing_data',
+                f'El horario de la cancelación {index} es obligatorio'))
+            continue
+        pairs[(dni.strip(), schedule)] = None
+
+    if errors:
+        raise ValidationError(errors)
+    return list(pairs)
+
+
+CATALOG_DEFAULT_LIMIT = 50
+CATALOG_MAX_LIMIT = 200
+CATALOG_PARAMS = ('from', 'to', 'min_seats', 'age', 'requires_clothing',
+                  'name', 'limit', 'after')
+
+
+class CatalogQuery:
+    """Filtros y página del catálogo (``GET /api/activities``)."""
+
+    __slots__ = ('start', 'end', 'min_seats', 'age', 'requires_clothing',
+                 'name_prefix', 'limit', 'after')
+
+    def __init__(self, start=None, end=None, min_seats=None, age=None,
+                 requires_clothing=None, name_prefix=None,
+                 limit: int = CATALOG_DEFAULT_LIMIT, after: int = 0):
+        self.start = start
+        self.end = end
+        self.min_seats = min_seats
+        self.age = age
+        self.requires_clothing = requires_clothing
+        self.name_prefix = name_prefix
+        self.limit = limit
+        self.after = after
+
+    def __repr__(self):
+        return (f'CatalogQuery(start={self.start!r}, end={self.end!r}, '
+                f'min_seats={self.min_seats!r}, age={self.age!r}, '
+                f'requires_clothing={self.requires_clothing!r}, '
+                f'name_prefix={self.name_prefix!r}, limit={self.limit!r}, '
+                f'after={self.after!r})')
+
+
+def _is_time(value: str) -> bool:
+    return (len(value) == 5 and value[2] == ':' and value[:2].isdigit()
+            and value[3:].isdigit() and int(value[:2]) < 24
+            and int(value[3:]) < 60)
+
+
+def _decode_int(args, key: str, minimum: int, errors: list, maximum=None):
+    raw = args.get(key)
+    if raw is None:
+        return None
+    if not raw.isdigit() or int(raw) < minimum or (
+            maximum is not None and int(raw) > maximum):
+        limit = f' y {maximum}' if maximum is not None else ''
+        errors.append(FieldError(
+            'invalid_query',
+            f'{key} debe ser un entero entre {minimum}{limit}' if limit
+            else f'{key} debe ser un entero mayor o igual a {minimum}'))
+        return None
+    return int(raw)
+
+
+def decode_catalog_query(args):
+    """Decodifica los parámetros de filtro y paginación del catálogo.
+
+    Args:
+        args: Parámetros de la URL (``request.args``)
+
+    Returns:
+        ``CatalogQuery``, o ``None`` si no se pidió ningún filtro (el
+        catálogo completo)
+
+    Raises:
+        ValidationError: Con todos los parámetros inválidos
+    """
+    if not any(key in args for key in CATALOG_PARAMS):
+        return None
+    errors = []
+
+    start, end = args.get('from'), args.get('to')
+    for key, value in (('from', start), ('to', end)):
+        if value is not None and not _is_time(value):
+            errors.append(FieldError(
+                'invalid_query', f'{key} debe tener formato HH:MM'))
+    if start and end and _is_time(start) and _is_time(end) and start > end:
+        errors.append(FieldError(
+            'invalid_query', 'from debe ser anterior a to'))
+
+    min_seats = _decode_int(args, 'min_seats', 1, errors)
+    age = _decode_int(args, 'age', 1, errors)
+    limit = _decode_int(args, 'limit', 1, errors, CATALOG_MAX_LIMIT)
+    after = _decode_int(args, 'after', 0, errors)
+
+    requires_clothing = args.get('requires_clothing')
+    if requires_clothing is not None:
+        requires_clothing = _coerce_bool(requires_clothing)
+        if requires_clothing is None:
+            errors.append(FieldError(
+                'invalid_query', 'requires_clothing debe ser true o false'))
+
+    name_prefix = args.get('name')
+    if name_prefix is not None and not 1 <= len(name_prefix) <= 100:
+        errors.append(FieldError(
+            'invalid_query', 'name debe tener entre 1 y 100 caracteres'))
+
+    if errors:
+        raise ValidationError(errors)
+    return CatalogQuery(start, end, min_seats, age, requires_clothing,
+                        name_prefix, limit or CATALOG_DEFAULT_LIMIT,
+                        after or 0)
+
+
+MAX_ITINERARY_ACTIVITIES = 6
+MAX_PLANS = 10
+
+
+class ItineraryRequest:
+    """Pedido de plan (``activity_ids``) o de reserva (``assignments``)."""
+
+    __slots__ = ('participants', 'terms_accepted', 'activity_ids',
+                 'assignments', 'start', 'end', 'min_gap', 'prefer',
+                 'max_plans', 'current_time')
+
+    def __init__(self, participants, terms_accepted=False, activity_ids=(),
+                 assignments=(), start=None, end=None, min_gap: int = 0,
+                 prefer: str = 'earliest', max_plans: int = 3,
+                 current_time=None):
+        self.participants = tuple(participants)
+        self.terms_accepted = terms_accepted
+        self.activity_ids = tuple(activity_ids)
+        self.assignments = tuple(assignments)
+        self.start = start
+        self.end = end
+        self.min_gap = min_gap
+        self.prefer = prefer
+        self.max_plans = max_plans
+        self.current_time = current_time
+
+    @property
+    def dnis(self) -> list:
+        return [participant.dni for participant in self.participants]
+
+    def registration(self, schedule: str) -> RegistrationRequest:
+        """Solicitud de registro del grupo para un turno."""
+        return RegistrationRequest(self.participants, self.terms_accepted,
+                                   schedule, self.current_time)
+
+    def __repr__(self):
+        return (f'ItineraryRequest(participants={len(self.participants)}, '
+                f'activity_ids={self.activity_ids!r}, '
+                f'assignments={self.assignments!r})')
+
+
+def _is_id(value) -> bool:
+    return isinstance(value, int) and not isinstance(value, bool) and value > 0
+
+
+def decode_itinerary(payload, commit: bool = False) -> ItineraryRequest:
+    """Decodifica ``POST /api/itineraries/plan`` o ``.../commit``.
+
+    Args:
+        payload: Cuerpo JSON ya parseado
+        commit: ``False`` para un plan (``activities``, ventana ``from``/
+            ``to``, ``min_gap_minutes``, ``prefer``, ``max_plans``);
+            ``True`` para reservar (``assignments`` con ``activity_id`` y
+            ``schedule``, más ``terms_accepted`` y el mismo
+            ``min_gap_minutes`` del plan)
+
+    Returns:
+        ``ItineraryRequest`` con participantes normalizados
+
+    Raises:
+        ValidationError: Con todos los errores de campo encontrados
+    """
+    if not isinstance(payload, dict):
+        raise ValidationError([FieldError(
+            'invalid_payload',
+            'El cuerpo de la solicitud debe ser un objeto JSON')])
+    errors = []
+    participants = _decode_participants(
+        payload.get('participants', []), errors)
+
+    current_time = payload.get('current_time')
+    if current_time is not None and (
+            not isinstance(current_time, str) or not _is_time(current_time)):
+        errors.append(FieldError(
+            'invalid_payload', 'La hora actual debe ser un texto HH:MM'))
+
+    min_gap = payload.get('min_gap_minutes', 0)
+    if (not isinstance(min_gap, int) or isinstance(min_gap, bool)
+            or not 0 <= min_gap <= 240):
+        errors.append(FieldError(
+            'invalid_payload',
+            'min_gap_minutes debe ser un entero entre 0 y 240'))
+
+    if commit:
+        terms_accepted = _coerce_bool(payload.get('terms_accepted', False))
+        if terms_accepted is None:
+            errors.append(FieldError(
+                'invalid_payload',
+                'terms_accepted debe ser verdadero o falso'))
+        raw = payload.get('assignments')
+        assignments = []
+        if (not isinstance(raw, list)
+                or not 1 <= len(raw) <= MAX_ITINERARY_ACTIVITIES):
+            errors.append(FieldError(
+                'invalid_payload',
+                'assignments debe ser una lista de 1 a '
+                f'{MAX_ITINERARY_ACTIVITIES} elementos'))
+        else:
+            for index, item in enumerate(raw, start=1):
+                if (not isinstance(item, dict)
+                        or not _is_id(item.get('activity_id'))
+                        or not isinstance(item.get('schedule'), str)
+                        or not _is_time(item['schedule'])):
+                    errors.append(FieldError(
+                        'invalid_payload',
+                        f'La asignación {index} debe tener activity_id y '
+                        'schedule HH:MM'))
+                else:
+                    assignments.append((item['activity_id'], item['schedule']))
+            schedules = [schedule for _, schedule in assignments]
+            if len(set(schedules)) != len(schedules):
+                errors.append(FieldError(
+                    'overlapping_schedules',
+                    'Los horarios del itinerario deben ser distintos'))
+        if errors:
+            raise ValidationError(errors)
+        return ItineraryRequest(participants, terms_accepted,
+                                assignments=assignments, min_gap=min_gap,
+                                current_time=current_time)
+
+    activity_ids = payload.get('activities')
+    if (not isinstance(activity_ids, list)
+            or not 1 <= len(activity_ids) <= MAX_ITINERARY_ACTIVITIES
+            or not all(_is_id(activity_id) for activity_id in activity_ids)):
+        errors.append(FieldError(
+            'invalid_payload',
+            'activities debe ser una lista de 1 a '
+            f'{MAX_ITINERARY_ACTIVITIES} ids'))
+        activity_ids = []
+    elif len(set(activity_ids)) != len(activity_ids):
+        errors.append(FieldError(
+            'invalid_payload', 'activities no debe repetir actividades'))
+
+    start, end = payload.get('from'), payload.get('to')
+    for key, value in (('from', start), ('to', end)):
+        if value is not None and (
+                not isinstance(value, str) or not _is_time(value)):
+            errors.append(FieldError(
+                'invalid_payload', f'{key} debe tener formato HH:MM'))
+
+    prefer = payload.get('prefer', 'earliest')
+    if prefer not in ('earliest', 'compact'):
+        errors.append(FieldError(
+            'invalid_payload', 'prefer debe ser earliest o compact'))
+    max_plans = payload.get('max_plans', 3)
+    if not _is_id(max_plans) or max_plans > MAX_PLANS:
+        errors.append(FieldError(
+            'invalid_payload',
+            f'max_plans debe ser un entero entre 1 y {MAX_PLANS}'))
+
+    if errors:
+        raise ValidationError(errors)
+    return ItineraryRequest(participants, activity_ids=activity_ids,
+                            start=start, end=end, min_gap=min_gap,
+                            prefer=prefer, max_plans=max_plans,
+                            current_time=current_time)
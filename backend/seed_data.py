@@ -1,65 +1,352 @@
 #!/usr/bin/env python3
 """
 Script para poblar la base de datos con datos de ejemplo
+
+Sin argumentos crea las cuatro actividades de demostración. Con
+``--synthetic`` genera además un volumen configurable de visitantes y
+registros realistas (determinista para una semilla dada), por ejemplo:
+
+    python seed_data.py --synthetic --activities 100 --days 365 \\
+        --fill-ratio 0.7 --seed 42
+
+Por defecto agrega los datos a los existentes; ``--reset`` borra y
+recrea las tablas antes de cargar.
+
+El volumen crece con las actividades, no con los días: cada turno se llena
+una sola vez. Con los valores por defecto son unos 110 registros (y otros
+tantos visitantes) por actividad; para millones de filas use
+``--activities 10000`` o más (alrededor de un minuto).
 """
 
-from app import app, db, Activity, generate_time_slots
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+
+from app import (
+    app, db, Activity, OccupancyRollup, Registration, bump_data_version,
+    generate_time_slots, get_min_age, get_turn_capacity, resolve_capacity
+)
+from eventlog import get_event_log
+from occupancy import count_registrations, reconcile
+from rollups import recompute as recompute_rollups
+
+# Actividades de ejemplo según los criterios de aceptación
+DEMO_ACTIVITIES = [
+    {
+        'name': "Tirolesa",
+        'capacity': 10,
+        'requirements': {"nivel": "intermedio",
+                         "equipamiento": "arnés y casco"},
+        'requires_clothing': True
+    },
+    {
+        'name': "Safari",
+        'capacity': 8,
+        'requirements': {"nivel": "todos", "equipamiento": "binoculares"},
+        'requires_clothing': False
+    },
+    {
+        'name': "Palestra",
+        'capacity': 12,
+        'requirements': {"nivel": "principiante",
+                         "equipamiento": "zapatos de escalada"},
+        'requires_clothing': True
+    },
+    {
+        'name': "Jardinería",
+        'capacity': 12,
+        'requirements': {"nivel": "todos",
+                         "equipamiento": "guantes y herramientas"},
+        'requires_clothing': False
+    },
+]
+
+# Distribución por defecto del tamaño de grupo (tamaño: probabilidad)
+DEFAULT_GROUP_SIZES = {1: 0.30, 2: 0.30, 3: 0.15, 4: 0.15, 5: 0.05, 6: 0.05}
+
+FIRST_NAMES = ('Ana', 'Juan', 'María', 'Pedro', 'Lucía', 'Martín', 'Sofía',
+               'Diego', 'Valentina', 'Tomás', 'Camila', 'Mateo', 'Julieta',
+               'Lautaro', 'Florencia', 'Nicolás')
+LAST_NAMES = ('García', 'Pérez', 'González', 'Rodríguez', 'Fernández',
+              'López', 'Martínez', 'Sánchez', 'Romero', 'Díaz', 'Torres',
+              'Álvarez', 'Ruiz', 'Gómez', 'Acosta', 'Benítez')
+CLOTHING_SIZES = ('XS', 'S', 'M', 'L', 'XL')
+
+BATCH_SIZE = 20000
+
 
 def seed_data():
     """Poblar la base de datos con actividades de ejemplo"""
     with app.app_context():
         # Crear la base de datos si no existe
         db.create_all()
-        
+
         # Verificar si ya hay datos
         if Activity.query.count() > 0:
             print("La base de datos ya contiene datos. Saltando...")
             return
-        
-        # Crear actividades de ejemplo según los criterios de aceptación
+
         # Slots de 30 minutos entre 09:00 y 18:00
         slots = generate_time_slots()
 
         # Todas las actividades con todos los slots del día
         activities = [
-            Activity(
-                name="Tirolesa",
-                capacity=10,
-                schedules=slots,
-                requirements={"nivel": "intermedio", "equipamiento": "arnés y casco"},
-                requires_clothing=True
-            ),
-            Activity(
-                name="Safari",
-                capacity=8,
-                schedules=slots,
-                requirements={"nivel": "todos", "equipamiento": "binoculares"},
-                requires_clothing=False
-            ),
-            Activity(
-                name="Palestra",
-                capacity=12,
-                schedules=slots,
-                requirements={"nivel": "principiante", "equipamiento": "zapatos de escalada"},
-                requires_clothing=True
-            ),
-            Activity(
-                name="Jardinería",
-                capacity=12,
-                schedules=slots,
-                requirements={"nivel": "todos", "equipamiento": "guantes y herramientas"},
-                requires_clothing=False
-            )
+            Activity(schedules=slots, **template)
+            for template in DEMO_ACTIVITIES
         ]
-        
+
         for activity in activities:
             db.session.add(activity)
-        
+
         db.session.commit()
         print(f"Se crearon {len(activities)} actividades de ejemplo")
         print("\nActividades creadas:")
         for activity in activities:
             print(f"  - {activity.name} (Cupos: {activity.capacity})")
 
+
+def parse_group_sizes(spec: str) -> dict:
+    """Convierte ``"1:0.4,2:0.3,4:0.3"`` en ``{1: 0.4, 2: 0.3, 4: 0.3}``."""
+    sizes = {}
+    for item in spec.split(','):
+        size, weight = item.split(':')
+        sizes[int(size)] = float(weight)
+    if not sizes or min(sizes) < 1 or max(sizes) > 10:
+        raise ValueError('Los tamaños de grupo deben estar entre 1 y 10')
+    return sizes
+
+
+def _new_person(rng, next_dni, min_age):
+    name = f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}'
+    # Un cuarto de los visitantes son menores, respetando la edad mínima
+    if rng.random() < 0.25:
+        age = rng.randint(max(min_age, 6), 17)
+    else:
+        age = rng.randint(18, 70)
+    return (name, str(next_dni), age, rng.choice(CLOTHING_SIZES))
+
+
+def generate_synthetic_data(activities: int = 20, days: int = 30,
+                            fill_ratio: float = 0.6, group_sizes=None,
+                            repeat_visitor_ratio: float = 0.1,
+                            seed: int = 42, slots: int = None,
+                            start_date: str = '2024-01-01',
+                            batch_size: int = BATCH_SIZE,
+                            reset: bool = False) -> dict:
+    """Carga actividades, visitantes y registros sintéticos en bloque.
+
+    Cada horario de cada actividad se llena una sola vez hasta
+    ``fill_ratio`` de su cupo efectivo (``resolve_capacity``) con grupos
+    cuyo tamaño sigue ``group_sizes``: ``Registration`` no tiene fecha, así
+    que el cupo y el DNI único por horario valen para toda la carga. Los
+    días solo reparten la fecha de reserva (``registered_at``). Con
+    probabilidad ``repeat_visitor_ratio`` un visitante es alguien ya
+    generado (mismo DNI), nunca dos veces en el mismo horario. La salida es
+    idéntica para la misma semilla. Debe llamarse dentro de un contexto de
+    aplicación.
+
+    Registros ≈ actividades × horarios × cupo efectivo × ``fill_ratio``
+    (unos 110 por actividad con los valores por defecto).
+
+    La carga escribe directo con ``executemany``, sin pasar por el ORM, así
+    que al terminar reconstruye el estado derivado: rollups, ocupación
+    compartida, una instantánea del log de eventos y la versión de datos
+    (que invalida cachés e índice de check-in). Otros procesos que ya
+    estaban corriendo recién ven la ocupación nueva en su próxima
+    reconciliación.
+
+    Args:
+        activities: Cantidad de actividades (rotando las de ejemplo)
+        days: Días entre los que se reparten las fechas de reserva
+        fill_ratio: Ocupación objetivo de cada turno (0 a 1)
+        group_sizes: Distribución ``{tamaño: probabilidad}``
+        repeat_visitor_ratio: Fracción de visitantes que repiten
+        seed: Semilla del generador aleatorio
+        slots: Horarios por actividad (por defecto todos)
+        start_date: Primer día generado (YYYY-MM-DD)
+        batch_size: Filas por ``executemany``
+        reset: Borrar y recrear las tablas antes de cargar (si no, agrega)
+
+    Returns:
+        Conteo de filas insertadas por tabla
+    """
+    rng = random.Random(seed)
+    group_sizes = group_sizes or DEFAULT_GROUP_SIZES
+    size_values = list(group_sizes)
+    size_weights = [group_sizes[size] for size in size_values]
+    schedules = generate_time_slots()
+    if slots:
+        schedules = schedules[:slots]
+    first_day = datetime.strptime(start_date, '%Y-%m-%d')
+
+    if reset:
+        db.drop_all()
+    db.create_all()
+
+    templates = [
+        dict(DEMO_ACTIVITIES[i % len(DEMO_ACTIVITIES)])
+        for i in range(activities)
+    ]
+    for i, template in enumerate(templates):
+        if activities > len(DEMO_ACTIVITIES):
+            template['name'] = f"{template['name']} {i + 1}"
+    activity_rows = [
+        Activity(schedules=list(schedules), **template)
+        for template in templates
+    ]
+    db.session.add_all(activity_rows)
+    db.session.commit()
+    plan = [
+        (activity.id,
+         resolve_capacity(activity.capacity, get_turn_capacity(activity.name)),
+         get_min_age(activity.name), activity.requires_clothing)
+        for activity in activity_rows
+    ]
+
+    connection = db.engine.raw_connection()
+    try:
+        cursor = connection.cursor()
+        pragmas = {}
+        if db.engine.dialect.name == 'sqlite':
+            # Sin fsync durante la carga; se restauran al terminar porque la
+            # conexión vuelve al pool
+            for pragma, value in (('synchronous', 'OFF'),
+                                  ('journal_mode', 'MEMORY')):
+                pragmas[pragma] = cursor.execute(
+                    f'PRAGMA {pragma}').fetchone()[0]
+                cursor.execute(f'PRAGMA {pragma} = {value}')
+        visitor_id = _max_id(cursor, 'visitor')
+        registration_id = _max_id(cursor, 'registration')
+        next_dni = max(20000000, _max_dni(cursor))
+        people = []  # Personas ya generadas, que pueden repetir
+        visitors, registrations = [], []
+        totals = {'activities': len(activity_rows), 'visitors': 0,
+                  'registrations': 0}
+
+        def flush():
+            cursor.executemany(
+                'INSERT INTO visitor (id, name, dni, age, clothing_size, '
+                'terms_accepted, created_at) VALUES (?, ?, ?, ?, ?, ?, ?)',
+                visitors
+            )
+            cursor.executemany(
+                'INSERT INTO registration (id, activity_id, visitor_id, '
+                'schedule, registered_at) VALUES (?, ?, ?, ?, ?)',
+                registrations
+            )
+            totals['visitors'] += len(visitors)
+            totals['registrations'] += len(registrations)
+            visitors.clear()
+            registrations.clear()
+
+        for schedule in schedules:
+            hour, minute = map(int, schedule.split(':'))
+            seen = set()  # Un DNI no puede repetirse en el mismo horario
+            for activity_id, capacity, min_age, clothing in plan:
+                target = int(round(capacity * fill_ratio))
+                filled = 0
+                while filled < target:
+                    size = min(rng.choices(size_values, size_weights)[0],
+                               target - filled)
+                    # Reservado algún día del período, antes del turno
+                    day = first_day + timedelta(days=rng.randrange(days))
+                    slot_start = day.replace(hour=hour, minute=minute)
+                    booked_at = (slot_start - timedelta(
+                        minutes=rng.randint(5, hour * 60))).isoformat(' ')
+                    for _ in range(size):
+                        person = None
+                        if people and rng.random() < repeat_visitor_ratio:
+                            person = rng.choice(people)
+                            if person[1] in seen or person[2] < min_age:
+                                person = None
+                        if person is None:
+                            next_dni += 1
+                            person = _new_person(rng, next_dni, min_age)
+                            people.append(person)
+                        seen.add(person[1])
+                        visitor_id += 1
+                        registration_id += 1
+                        visitors.append((
+                            visitor_id, person[0], person[1], person[2],
+                            person[3] if clothing else None, 1, booked_at
+                        ))
+                        registrations.append((
+                            registration_id, activity_id, visitor_id,
+                            schedule, booked_at
+                        ))
+                    filled += size
+                    if len(registrations) >= batch_size:
+                        flush()
+        flush()
+        connection.commit()
+        for pragma, value in pragmas.items():
+            cursor.execute(f'PRAGMA {pragma} = {value}')
+        cursor.close()
+    finally:
+        connection.close()
+    # La carga directa no pasa por el ORM: estado derivado a mano
+    recompute_rollups(db.session, OccupancyRollup, Registration)
+    bump_data_version(db.session.connection())
+    db.session.commit()
+    reconcile(db, Activity, Registration)
+    log = get_event_log()
+    if log is not None:
+        # Los registros cargados no tienen eventos: la instantánea los cubre
+        log.checkpoint(lambda: count_registrations(db, Registration))
+    return totals
+
+
+def _max_id(cursor, table):
+    cursor.execute(f'SELECT COALESCE(MAX(id), 0) FROM {table}')
+    return cursor.fetchone()[0]
+
+
+def _max_dni(cursor):
+    cursor.execute('SELECT dni FROM visitor')
+    return max((int(dni) for dni, in cursor if dni.isdigit()), default=0)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Poblar la base de datos')
+    parser.add_argument('--synthetic', action='store_true',
+                        help='Generar visitantes y registros sintéticos')
+    parser.add_argument('--activities', type=int, default=20,
+                        help='Actividades; el volumen escala con ellas '
+                             '(~110 registros por actividad con los '
+                             'valores por defecto: 10000 ≈ 1,1 M)')
+    parser.add_argument('--days', type=int, default=30,
+                        help='Días en que se reparten las fechas de '
+                             'reserva (no agrega registros)')
+    parser.add_argument('--slots', type=int, default=None,
+                        help='Horarios por actividad (por defecto todos)')
+    parser.add_argument('--fill-ratio', type=float, default=0.6)
+    parser.add_argument('--group-sizes', type=parse_group_sizes,
+                        default=DEFAULT_GROUP_SIZES,
+                        help='Distribución, p. ej. "1:0.4,2:0.3,4:0.3"')
+    parser.add_argument('--repeat-visitor-ratio', type=float, default=0.1)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--start-date', default='2024-01-01')
+    parser.add_argument('--reset', action='store_true',
+                        help='Borrar y recrear las tablas antes de cargar')
+    return parser.parse_args(argv)
+
+
 if __name__ == "__main__":
-    seed_data()
\ No newline at end of file
+    args = parse_args()
+    if not args.synthetic:
+        seed_data()
+    else:
+        started = time.perf_counter()
+        with app.app_context():
+            totals = generate_synthetic_data(
+                activities=args.activities, days=args.days,
+                fill_ratio=args.fill_ratio, group_sizes=args.group_sizes,
+                repeat_visitor_ratio=args.repeat_visitor_ratio,
+                seed=args.seed, slots=args.slots,
+                start_date=args.start_date, reset=args.reset,
+            )
+        elapsed = time.perf_counter() - started
+        print(f"Datos sintéticos generados en {elapsed:.1f} s:")
+        for table, count in totals.items():
+            print(f"  - {table}: {count}")
@@ -0,0 +1,234 @@
+"""Serialización JSON de respuestas, compatible byte a byte con ``jsonify``.
+
+``jsonify`` arma diccionarios con ``to_dict()`` y los pasa por
+``json.dumps(sort_keys=True, ensure_ascii=True)`` con separadores compactos
+y un salto de línea final. Este módulo produce exactamente esos bytes
+escribiendo las filas directamente como texto JSON:
+
+    - Las claves van en orden alfabético fijo dentro de plantillas.
+    - Los strings se escapan con ``encode_basestring_ascii`` (la misma
+      función en C que usa ``json``).
+    - Los campos estáticos de cada actividad (nombre, requisitos, horarios)
+      se codifican una vez y se reutilizan mientras no cambien.
+
+Con ``JSON_BACKEND = 'orjson'`` (y orjson instalado) ``dumps`` usa orjson
+para los cuerpos genéricos, escapando luego lo que no sea ASCII. Si Flask
+está configurado para indentar (modo debug) se delega en ``jsonify``.
+"""
+import copy
+import json
+import re
+import threading
+from json.encoder import encode_basestring_ascii as encode_string
+
+from flask import current_app, jsonify
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - dependencia opcional
+    orjson = None
+
+# ``json`` con ensure_ascii también escapa DEL (0x7f); orjson no
+_NON_ASCII = re.compile('[^\x00-\x7e]')
+_LITERALS = {True: 'true', False: 'false', None: 'null'}
+_MAX_CACHED_ACTIVITIES = 10000
+
+_settings = {'backend': 'stdlib'}
+
+
+def _escape_non_ascii(match) -> str:
+    code = ord(match.group())
+    if code < 0x10000:
+        return '\\u%04x' % code
+    code -= 0x10000
+    return '\\u%04x\\u%04x' % (0xd800 | (code >> 10), 0xdc00 | (code & 0x3ff))
+
+
+def _stdlib_dumps(obj) -> str:
+    return json.dumps(obj, ensure_ascii=True, sort_keys=True,
+                      separators=(',', ':'))
+
+
+def _orjson_dumps(obj) -> str:
+    try:
+        raw = orjson.dumps(obj, option=orjson.OPT_SORT_KEYS
+                           | orjson.OPT_NON_STR_KEYS)
+    except TypeError:
+        return _stdlib_dumps(obj)
+    if raw.isascii() and b'\x7f' not in raw:
+        return raw.decode()
+    return _NON_ASCII.sub(_escape_non_ascii, raw.decode())
+
+
+def dumps(obj) -> str:
+    """Serializa ``obj`` igual que ``jsonify`` (sin el salto final).
+
+    Con orjson los floats se formatean distinto que en ``json``; los
+    cuerpos que pasan por aquí (resultados y errores) no los contienen.
+    """
+    if _settings['backend'] == 'orjson':
+        return _orjson_dumps(obj)
+    return _stdlib_dumps(obj)
+
+
+def _compact() -> bool:
+    provider = current_app.json
+    compact = getattr(provider, 'compact', None)
+    return compact is True or (compact is None and not current_app.debug)
+
+
+def json_response(body: str, status: int = 200):
+    """Respuesta JSON con un cuerpo ya serializado (sin salto final)."""
+    if not _compact():
+        # Salida indentada de jsonify; solo en desarrollo
+        response = jsonify(json.loads(body))
+        response.status_code = status
+        return response
+    return current_app.response_class(
+        body + '\n', status=status, mimetype=current_app.json.mimetype
+    )
+
+
+def jsonify_fast(obj, status: int = 200):
+    """Equivalente a ``jsonify(obj)`` usando el backend configurado."""
+    if not _compact():
+        response = jsonify(obj)
+        response.status_code = status
+        return response
+    return json_response(dumps(obj), status)
+
+
+# Catálogo de actividades
+
+_slot_prefixes = {}
+
+
+def _slot_prefix(schedule) -> str:
+    prefix = _slot_prefixes.get(schedule)
+    if prefix is None:
+        prefix = (encode_string(schedule)
+                  + ':{"available_capacity":')
+        if len(_slot_prefixes) < 4096:
+            _slot_prefixes[schedule] = prefix
+    return prefix
+
+
+class _ActivityFragments:
+    """Partes estáticas ya codificadas de una actividad."""
+
+    __slots__ = ('source', 'head', 'tail')
+
+    def __init__(self, source, head, tail):
+        self.source = source
+        self.head = head
+        self.tail = tail
+
+
+_activity_cache = {}
+_activity_cache_lock = threading.Lock()
+
+
+def _activity_source(activity) -> tuple:
+    return (activity.name, activity.capacity, activity.requires_clothing,
+            activity.schedules, activity.requirements)
+
+
+def _activity_fragments(activity) -> _ActivityFragments:
+    source = _activity_source(activity)
+    fragments = _activity_cache.get(activity.id)
+    if fragments is not None and fragments.source == source:
+        return fragments
+    name, capacity, requires_clothing, schedules, requirements = source
+    head = (
+        '{"capacity":' + _stdlib_dumps(capacity)
+        + ',"id":' + _stdlib_dumps(activity.id)
+        + ',"name":' + _stdlib_dumps(name)
+        + ',"per_schedule_capacity":{'
+    )
+    tail = (
+        '},"requirements":' + _stdlib_dumps(requirements)
+        + ',"requires_clothing":' + _stdlib_dumps(requires_clothing)
+        + ',"schedules":' + _stdlib_dumps(schedules)
+        + ',"turn_capacity":'
+    )
+    fragments = _ActivityFragments(copy.deepcopy(source), head, tail)
+    with _activity_cache_lock:
+        if len(_activity_cache) >= _MAX_CACHED_ACTIVITIES:
+            _activity_cache.clear()
+        _activity_cache[activity.id] = fragments
+    return fragments
+
+
+def encode_activity(activity, counts: dict, limits: dict,
+                    turn_capacity: int) -> str:
+    """Codifica una actividad del catálogo.
+
+    Equivale a ``to_dict()`` más ``per_schedule_capacity`` y
+    ``turn_capacity`` tal como los arma ``get_activities``.
+
+    Args:
+        activity: Instancia de ``Activity``
+        counts: Registrados por horario (``{horario: cantidad}``)
+        limits: Cupo efectivo por horario (``{horario: cupo}``)
+        turn_capacity: Cupo por turno de la actividad
+    """
+    fragments = _activity_fragments(activity)
+    slots = ','.join([
+        f'{_slot_prefix(schedule)}'
+        f'{max(0, limits[schedule] - counts[schedule])}'
+        f',"registered_count":{counts[schedule]},'
+        f'"turn_capacity":{limits[schedule]}}}'
+        for schedule in sorted(counts)
+    ])
+    return f'{fragments.head}{slots}{fragments.tail}{turn_capacity}}}'
+
+
+def encode_activities(entries) -> str:
+    """Codifica el catálogo desde ``(actividad, conteos, cupos, cupo)``."""
+    return '[' + ','.join([
+        encode_activity(activity, counts, limits, turn_capacity)
+        for activity, counts, limits, turn_capacity in entries
+    ]) + ']'
+
+
+# Listado de visitantes
+
+def encode_visitor_rows(rows) -> str:
+    """Codifica filas ``(id, name, dni, age, clothing_size, terms_accepted)``.
+
+    El resultado coincide con ``[visitor.to_dict() ...]`` serializado.
+    """
+    return '[' + ','.join([
+        f'{{"age":{_scalar(age)},"clothing_size":{_scalar(clothing_size)},'
+        f'"dni":{_scalar(dni)},"id":{visitor_id},"name":{_scalar(name)},'
+        f'"terms_accepted":{_scalar(terms)}}}'
+        for visitor_id, name, dni, age, clothing_size, terms in rows
+    ]) + ']'
+
+
+def _scalar(value) -> str:
+    if value.__class__ is str:
+        return encode_string(value)
+    if value is None or value is True or value is False:
+        return _LITERALS[value]
+    if value.__class__ is int:
+        return int.__repr__(value)
+    return _stdlib_dumps(value)
+
+
+def init_serialization(app):
+    """Elige el backend de ``dumps``.
+
+    Claves de configuración:
+        JSON_BACKEND: ``stdlib`` (por defecto), ``orjson`` o ``auto``
+            (orjson si está instalado)
+    """
+    app.config.setdefault('JSON_BACKEND', 'stdlib')
+    backend = app.config['JSON_BACKEND']
+    if backend == 'auto':
+        backend = 'orjson' if orjson is not None else 'stdlib'
+    if backend not in ('stdlib', 'orjson'):
+        raise ValueError(f'JSON_BACKEND desconocido: {backend}')
+    if backend == 'orjson' and orjson is None:
+        raise ValueError('JSON_BACKEND=orjson requiere instalar orjson')
+    _settings['backend'] = backend
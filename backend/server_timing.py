@@ -0,0 +1,102 @@
+"""Desglose de tiempos por etapa en la cabecera ``Server-Timing``.
+
+El código del servicio marca el final de cada etapa con ``stage_timer()``.
+Si ``SERVER_TIMING`` está desactivado (por defecto), ``stage_timer()``
+devuelve un temporizador nulo compartido y cada marca es una llamada vacía.
+"""
+import contextvars
+import time
+
+from flask import g, request
+
+from metrics import REGISTRY
+
+STAGE_DURATION = REGISTRY.histogram(
+    'request_stage_duration_seconds',
+    'Duración de cada etapa instrumentada por endpoint',
+    ('endpoint', 'stage'),
+)
+
+# Duraciones acumuladas por etapa de la petición actual, o None si el
+# desglose está desactivado
+_stages = contextvars.ContextVar('server_timing_stages', default=None)
+
+
+class _NullTimer:
+    __slots__ = ()
+
+    def mark(self, stage: str):
+        pass
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class StageTimer:
+    """Mide el tiempo transcurrido entre marcas consecutivas."""
+
+    __slots__ = ('_stages', '_last')
+
+    def __init__(self, stages: dict):
+        self._stages = stages
+        self._last = time.perf_counter()
+
+    def mark(self, stage: str):
+        """Atribuye a ``stage`` el tiempo desde la marca anterior."""
+        now = time.perf_counter()
+        self._stages[stage] = self._stages.get(stage, 0.0) + now - self._last
+        self._last = now
+
+
+def stage_timer():
+    """Devuelve un temporizador de etapas para la petición actual."""
+    stages = _stages.get()
+    if stages is None:
+        return _NULL_TIMER
+    return StageTimer(stages)
+
+
+def format_header(stages: dict) -> str:
+    """Construye el valor de ``Server-Timing`` (duraciones en ms)."""
+    return ', '.join(
+        f'{stage};dur={duration * 1000:.2f}'
+        for stage, duration in stages.items()
+    )
+
+
+def init_server_timing(app):
+    """Registra los hooks de ``Server-Timing`` en ``app``.
+
+    Claves de configuración:
+        SERVER_TIMING: Activa el desglose por etapas (por defecto ``False``)
+        SERVER_TIMING_METRICS: Agrega además las duraciones en el histograma
+            ``request_stage_duration_seconds`` de ``/metrics``
+    """
+    app.config.setdefault('SERVER_TIMING', False)
+    app.config.setdefault('SERVER_TIMING_METRICS', False)
+
+    @app.before_request
+    def _start_stages():
+        if app.config['SERVER_TIMING']:
+            g._server_timing = _stages.set({})
+
+    @app.after_request
+    def _emit_stages(response):
+        token = g.pop('_server_timing', None)
+        if token is None:
+            return response
+        stages = _stages.get()
+        _stages.reset(token)
+        if stages:
+            response.headers['Server-Timing'] = format_header(stages)
+            if app.config['SERVER_TIMING_METRICS']:
+                endpoint = request.endpoint or 'unmatched'
+                for stage, duration in stages.items():
+                    STAGE_DURATION.observe(endpoint, stage, value=duration)
+        return response
+
+    @app.teardown_request
+    def _discard_stages(exc):
+        token = g.pop('_server_timing', None)
+        if token is not None:
+            _stages.reset(token)
@@ -0,0 +1,501 @@
+#!/usr/bin/env python3
+"""Simulación de demanda para planificar cupos y turnos.
+
+Simula días del parque antes de cambiar ``get_turn_capacity`` o
+``generate_time_slots``: llegan grupos según una tasa por hora (Poisson),
+con tamaños y edades sorteados y una actividad elegida por preferencia.
+Cada grupo, en orden de llegada, reserva el primer turno posterior a su
+llegada con cupo para todos, como hace el registro (un turno pasado o sin
+cupo para el grupo entero se rechaza). Un grupo con algún integrante bajo
+la edad mínima de la actividad se rechaza.
+
+Informa la tasa de rechazo (por cupo y por edad), la ocupación de cada
+turno y la espera hasta el turno asignado.
+
+Con numpy (opcional) los días se simulan a la vez: cada llegada es una
+operación sobre una matriz días × turnos, y miles de días tardan
+milisegundos. Sin numpy corre un bucle equivalente en Python, más lento
+pero con los mismos resultados esperados (los sorteos difieren).
+
+Uso:
+    python simulation.py --days 5000 --seed 1
+    python simulation.py --turn-capacity safari=6,8,10 --close 20:00
+"""
+import argparse
+import json
+import math
+import random
+import sys
+import time
+from bisect import bisect_right
+from collections import namedtuple
+from itertools import accumulate
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - dependencia opcional
+    np = None
+
+from park_calendar import (
+    DEFAULT_CLOSE, DEFAULT_OPEN, generate_slots, to_minutes,
+)
+from rules import resolve_capacity
+
+# Grupos por hora de llegada (media de una Poisson)
+DEFAULT_ARRIVALS = {9: 18, 10: 26, 11: 30, 12: 22, 13: 18, 14: 22, 15: 18,
+                    16: 10, 17: 4}
+DEFAULT_GROUP_SIZES = {1: 0.3, 2: 0.35, 3: 0.15, 4: 0.15, 5: 0.05}
+# Edad de cada integrante
+DEFAULT_AGES = {6: 0.08, 10: 0.1, 14: 0.1, 25: 0.35, 40: 0.3, 65: 0.07}
+
+ActivitySpec = namedtuple('ActivitySpec', ('name', 'seats', 'min_age'))
+ActivitySpec.__doc__ = ('Actividad simulada: cupo de cada turno '
+                        '``{horario: cupo}`` y edad mínima.')
+
+
+def _weights(mapping: dict, what: str) -> tuple:
+    keys = list(mapping)
+    weights = [float(mapping[key]) for key in keys]
+    if not keys or any(weight < 0 for weight in weights) or sum(weights) <= 0:
+        raise ValueError(f'Distribución inválida de {what}')
+    total = sum(weights)
+    return keys, [weight / total for weight in weights]
+
+
+class Scenario:
+    """Demanda de un día del parque.
+
+    Args:
+        arrivals: Grupos por hora de llegada ``{hora: media}``
+        group_sizes: Distribución de tamaños ``{tamaño: peso}``
+        ages: Distribución de edades de cada integrante ``{edad: peso}``
+        preferences: Peso de cada actividad ``{nombre: peso}`` (coincide
+            por subcadena, sin mayúsculas); por defecto todas iguales
+        max_wait: Minutos que un grupo acepta esperar hasta su turno
+            (``None``: cualquier turno del día)
+    """
+
+    def __init__(self, arrivals=None, group_sizes=None, ages=None,
+                 preferences=None, max_wait=None):
+        self.arrivals = dict(DEFAULT_ARRIVALS if arrivals is None
+                             else arrivals)
+        if any(rate < 0 for rate in self.arrivals.values()) or \
+                any(not 0 <= int(hour) < 24 for hour in self.arrivals):
+            raise ValueError('Tasas de llegada inválidas')
+        self.group_sizes = _weights(group_sizes or DEFAULT_GROUP_SIZES,
+                                    'tamaños de grupo')
+        if any(int(size) < 1 for size in self.group_sizes[0]):
+            raise ValueError('Los grupos tienen al menos una persona')
+        self.ages = _weights(ages or DEFAULT_AGES, 'edades')
+        self.preferences = dict(preferences or {})
+        if max_wait is not None and max_wait < 0:
+            raise ValueError('La espera máxima no puede ser negativa')
+        self.max_wait = max_wait
+
+    def activity_weights(self, activities) -> list:
+        """Probabilidad de elegir cada actividad de ``activities``."""
+        if not self.preferences:
+            return [1 / len(activities)] * len(activities)
+        weights = []
+        for activity in activities:
+            name = activity.name.lower()
+            weights.append(sum(float(weight)
+                               for key, weight in self.preferences.items()
+                               if key.lower() in name))
+        return _weights(dict(enumerate(weights)), 'preferencias')[1]
+
+
+def activities_from_catalog(rows, turn_capacity, min_age, overrides=None,
+                            schedules=None):
+    """Arma las actividades simuladas con las reglas reales.
+
+    Args:
+        rows: ``(id, nombre, capacidad, horarios)`` de cada actividad
+        turn_capacity: Función ``nombre -> cupo por turno``
+            (``get_turn_capacity`` o una variante a evaluar)
+        min_age: Función ``nombre -> edad mínima`` (``get_min_age``)
+        overrides: Cupos particulares ``{(actividad, horario): cupo}``
+        schedules: Horarios que reemplazan a los de cada actividad (p. ej.
+            otro ``generate_time_slots``)
+    """
+    overrides = overrides or {}
+    return [
+        ActivitySpec(name, {
+            schedule: resolve_capacity(capacity, turn_capacity(name),
+                                       overrides.get((activity_id, schedule)))
+            for schedule in (schedules or activity_schedules)
+        }, min_age(name))
+        for activity_id, name, capacity, activity_schedules in rows
+    ]
+
+
+class _Model:
+    """Matrices compartidas por los dos motores."""
+
+    def __init__(self, scenario: Scenario, activities):
+        if not activities:
+            raise ValueError('No hay actividades para simular')
+        self.activities = list(activities)
+        self.schedules = sorted({schedule for activity in activities
+                                 for schedule in activity.seats},
+                                key=to_minutes)
+        self.starts = [to_minutes(schedule) for schedule in self.schedules]
+        self.seats = [[activity.seats.get(schedule, 0)
+                       for schedule in self.schedules]
+                      for activity in activities]
+        self.min_age = [activity.min_age for activity in activities]
+        self.hours = sorted(int(hour) for hour in scenario.arrivals)
+        arrivals = scenario.arrivals
+        self.rates = [float(arrivals.get(hour, arrivals.get(str(hour), 0)))
+                      for hour in self.hours]
+        self.sizes, self.size_weights = scenario.group_sizes
+        self.ages, self.age_weights = scenario.ages
+        self.activity_weights = scenario.activity_weights(activities)
+        self.max_wait = (math.inf if scenario.max_wait is None
+                         else scenario.max_wait)
+
+
+class _Totals:
+    """Acumuladores por actividad y turno."""
+
+    def __init__(self, model: _Model, days: int):
+        activities, slots = len(model.activities), len(model.schedules)
+        self.days = days
+        self.groups = [0] * activities
+        self.people = [0] * activities
+        self.served = [0] * activities
+        self.rejected_capacity = [0] * activities
+        self.rejected_age = [0] * activities
+        self.filled = [[0] * slots for _ in range(activities)]
+        self.waits = []
+
+
+def _poisson(rng: random.Random, mean: float) -> int:
+    if mean <= 0:
+        return 0
+    if mean > 30:
+        return max(0, round(rng.gauss(mean, math.sqrt(mean))))
+    limit, count, product = math.exp(-mean), 0, rng.random()
+    while product > limit:
+        count += 1
+        product *= rng.random()
+    return count
+
+
+def _simulate_python(model: _Model, days: int, seed) -> _Totals:
+    rng = random.Random(seed)
+    totals = _Totals(model, days)
+    activity_indexes = range(len(model.activities))
+    slots = len(model.starts)
+    activity_cum = list(accumulate(model.activity_weights))
+    size_cum = list(accumulate(model.size_weights))
+    age_cum = list(accumulate(model.age_weights))
+    for _ in range(days):
+        remaining = [row[:] for row in model.seats]
+        arrivals = sorted(
+            hour * 60 + rng.random() * 60
+            for hour, rate in zip(model.hours, model.rates)
+            for _ in range(_poisson(rng, rate))
+        )
+        chosen = rng.choices(activity_indexes, cum_weights=activity_cum,
+                             k=len(arrivals))
+        sizes = rng.choices(model.sizes, cum_weights=size_cum,
+                            k=len(arrivals))
+        for minute, activity, size in zip(arrivals, chosen, sizes):
+            size = int(size)
+            totals.groups[activity] += 1
+            totals.people[activity] += size
+            ages = rng.choices(model.ages, cum_weights=age_cum, k=size)
+            if min(ages) < model.min_age[activity]:
+                totals.rejected_age[activity] += 1
+                continue
+            row = remaining[activity]
+            slot = bisect_right(model.starts, minute)
+            limit = minute + model.max_wait
+            while (slot < slots and model.starts[slot] <= limit
+                   and row[slot] < size):
+                slot += 1
+            if slot == slots or model.starts[slot] > limit:
+                totals.rejected_capacity[activity] += 1
+                continue
+            row[slot] -= size
+            totals.served[activity] += 1
+            totals.waits.append(model.starts[slot] - minute)
+        for activity, row in enumerate(remaining):
+            filled = totals.filled[activity]
+            for slot, seats in enumerate(model.seats[activity]):
+                filled[slot] += seats - row[slot]
+    return totals
+
+
+def _simulate_numpy(model: _Model, days: int, seed) -> _Totals:
+    rng = np.random.default_rng(seed)
+    totals = _Totals(model, days)
+    activity_count = len(model.activities)
+    starts = np.array(model.starts, dtype=float)
+    seats = np.array(model.seats, dtype=np.int64)
+    min_age = np.array(model.min_age)
+
+    # Llegadas de todos los días, ordenadas por día y minuto
+    counts = rng.poisson(model.rates, size=(days, len(model.hours)))
+    per_day = counts.sum(axis=1)
+    total = int(per_day.sum())
+    day_of = np.repeat(np.arange(days), per_day)
+    hour_of = np.repeat(np.tile(np.array(model.hours), days), counts.ravel())
+    minutes = hour_of * 60 + rng.uniform(0, 60, total)
+    order = np.lexsort((minutes, day_of))
+    minutes = minutes[order]
+    position = np.arange(total) - np.repeat(np.cumsum(per_day) - per_day,
+                                            per_day)
+    activity_of = rng.choice(activity_count, size=total,
+                             p=model.activity_weights)
+    size_of = rng.choice(np.array(model.sizes, dtype=np.int64), size=total,
+                         p=model.size_weights)
+    largest = int(max(model.sizes))
+    ages = rng.choice(np.array(model.ages, dtype=float),
+                      size=(total, largest), p=model.age_weights)
+    ages[np.arange(largest) >= size_of[:, None]] = np.inf
+    youngest = ages.min(axis=1)
+
+    # Matrices días × llegadas (la k-ésima llegada de cada día)
+    width = int(per_day.max()) if days else 0
+    shape = (days, width)
+    minute_at = np.full(shape, np.inf)
+    activity_at = np.zeros(shape, dtype=np.int64)
+    size_at = np.zeros(shape, dtype=np.int64)
+    youngest_at = np.zeros(shape)
+    minute_at[day_of, position] = minutes
+    activity_at[day_of, position] = activity_of
+    size_at[day_of, position] = size_of
+    youngest_at[day_of, position] = youngest
+
+    totals.groups = np.bincount(activity_of, minlength=activity_count).tolist()
+    totals.people = np.bincount(activity_of, weights=size_of,
+                                minlength=activity_count).astype(int).tolist()
+    rejected_age = np.zeros(activity_count, dtype=np.int64)
+    rejected_capacity = np.zeros(activity_count, dtype=np.int64)
+    served = np.zeros(activity_count, dtype=np.int64)
+    remaining = np.broadcast_to(seats, (days, *seats.shape)).copy()
+    waits = []
+    for k in range(width):
+        day = np.nonzero(per_day > k)[0]
+        activity, size = activity_at[day, k], size_at[day, k]
+        minute = minute_at[day, k]
+        age_ok = youngest_at[day, k] >= min_age[activity]
+        rejected_age += np.bincount(activity[~age_ok],
+                                    minlength=activity_count)
+        day, activity = day[age_ok], activity[age_ok]
+        size, minute = size[age_ok], minute[age_ok]
+        fits = ((remaining[day, activity] >= size[:, None])
+                & (starts > minute[:, None])
+                & (starts <= minute[:, None] + model.max_wait))
+        found = fits.any(axis=1)
+        slot = fits.argmax(axis=1)
+        rejected_capacity += np.bincount(activity[~found],
+                                         minlength=activity_count)
+        day, activity = day[found], activity[found]
+        size, slot = size[found], slot[found]
+        remaining[day, activity, slot] -= size
+        served += np.bincount(activity, minlength=activity_count)
+        waits.append(starts[slot] - minute[found])
+
+    totals.rejected_age = rejected_age.tolist()
+    totals.rejected_capacity = rejected_capacity.tolist()
+    totals.served = served.tolist()
+    totals.filled = (seats * days - remaining.sum(axis=0)).tolist()
+    totals.waits = np.concatenate(waits).tolist() if waits else []
+    return totals
+
+
+def _rate(part, whole):
+    return round(part / whole, 4) if whole else None
+
+
+def _percentile(ordered: list, fraction: float):
+    if not ordered:
+        return None
+    index = min(len(ordered) - 1, int(fraction * len(ordered)))
+    return round(ordered[index], 1)
+
+
+def _report(model: _Model, totals: _Totals) -> dict:
+    groups = sum(totals.groups)
+    waits = sorted(totals.waits)
+    activities = []
+    slots = {}
+    for index, activity in enumerate(model.activities):
+        capacity = sum(model.seats[index]) * totals.days
+        filled = sum(totals.filled[index])
+        rejected = totals.rejected_capacity[index] + totals.rejected_age[index]
+        activities.append({
+            'name': activity.name,
+            'groups': totals.groups[index],
+            'people': totals.people[index],
+            'served_groups': totals.served[index],
+            'rejected_capacity': totals.rejected_capacity[index],
+            'rejected_min_age': totals.rejected_age[index],
+            'rejection_rate': _rate(rejected, totals.groups[index]),
+            'utilization': _rate(filled, capacity),
+        })
+        slots[activity.name] = {
+            schedule: _rate(totals.filled[index][slot],
+                            model.seats[index][slot] * totals.days)
+            for slot, schedule in enumerate(model.schedules)
+            if model.seats[index][slot]
+        }
+    rejected_capacity = sum(totals.rejected_capacity)
+    rejected_age = sum(totals.rejected_age)
+    return {
+        'days': totals.days,
+        'groups': groups,
+        'groups_per_day': round(groups / totals.days, 2) if totals.days else 0,
+        'served_groups': sum(totals.served),
+        'rejection_rate': _rate(rejected_capacity + rejected_age, groups),
+        'rejected': {'capacity': rejected_capacity, 'min_age': rejected_age},
+        'wait_minutes': {
+            'mean': round(sum(waits) / len(waits), 1) if waits else None,
+            'p50': _percentile(waits, 0.5),
+            'p90': _percentile(waits, 0.9),
+        },
+        'activities': activities,
+        'slots': slots,
+    }
+
+
+def simulate(scenario: Scenario, activities, days: int = 1000, seed=None,
+             backend: str = 'auto') -> dict:
+    """Simula ``days`` días independientes.
+
+    Args:
+        scenario: Demanda (``Scenario``)
+        activities: ``ActivitySpec`` (ver ``activities_from_catalog``)
+        days: Días a simular
+        seed: Semilla; con la misma semilla y motor el resultado se repite
+        backend: ``numpy``, ``python`` o ``auto`` (numpy si está instalado)
+
+    Returns:
+        Tasas de rechazo, ocupación por actividad y turno y espera en minutos
+    """
+    if days < 1:
+        raise ValueError('Hay que simular al menos un día')
+    if backend == 'auto':
+        backend = 'numpy' if np is not None else 'python'
+    if backend == 'numpy' and np is None:
+        raise ValueError('numpy no está instalado')
+    if backend not in ('numpy', 'python'):
+        raise ValueError(f'Motor desconocido: {backend}')
+    model = _Model(scenario, activities)
+    started = time.perf_counter()
+    engine = _simulate_numpy if backend == 'numpy' else _simulate_python
+    report = _report(model, engine(model, days, seed))
+    report['backend'] = backend
+    report['seconds'] = round(time.perf_counter() - started, 3)
+    return report
+
+
+def sweep(scenario: Scenario, variants: dict, days: int = 1000, seed=None,
+          backend: str = 'auto') -> dict:
+    """Simula cada variante ``{etiqueta: actividades}`` con la misma semilla.
+
+    Con la misma semilla todas las variantes ven la misma demanda, así las
+    diferencias se deben a los cupos y turnos y no al azar.
+    """
+    return {label: simulate(scenario, activities, days, seed, backend)
+            for label, activities in variants.items()}
+
+
+def _parse_capacities(text: str):
+    name, _, values = text.partition('=')
+    try:
+        capacities = [int(value) for value in values.split(',')]
+        return name.strip().lower(), capacities
+    except ValueError:
+        raise argparse.ArgumentTypeError(
+            f'Formato esperado nombre=N[,N...]: {text}')
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--days', type=int, default=2000)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--backend', choices=('auto', 'numpy', 'python'),
+                        default='auto')
+    parser.add_argument('--arrivals', type=json.loads,
+                        help='Grupos por hora, p. ej. \'{"9": 20, "10": 30}\'')
+    parser.add_argument('--group-sizes', type=json.loads,
+                        help='p. ej. \'{"1": 0.5, "4": 0.5}\'')
+    parser.add_argument('--ages', type=json.loads,
+                        help='p. ej. \'{"8": 0.2, "30": 0.8}\'')
+    parser.add_argument('--preferences', type=json.loads,
+                        help='p. ej. \'{"safari": 2}\'')
+    parser.add_argument('--max-wait', type=int,
+                        help='Minutos de espera aceptados')
+    parser.add_argument('--turn-capacity', type=_parse_capacities,
+                        action='append', default=[],
+                        help='Cupos por turno a comparar, '
+                             'p. ej. safari=6,8,10')
+    parser.add_argument('--open',
+                        help='Apertura para turnos nuevos (con --close)')
+    parser.add_argument('--close', help='Cierre para turnos nuevos')
+    parser.add_argument('--slot-minutes', type=int, default=30)
+    args = parser.parse_args(argv)
+
+    from app import (
+        Activity, SlotOverride, create_app, db, get_min_age, get_turn_capacity,
+    )
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        rows = db.session.query(Activity.id, Activity.name, Activity.capacity,
+                                Activity.schedules).all()
+        query = db.session.query(SlotOverride.activity_id,
+                                 SlotOverride.schedule, SlotOverride.capacity)
+        overrides = {(activity_id, schedule): capacity
+                     for activity_id, schedule, capacity in query}
+    if not rows:
+        print('No hay actividades: ejecutá seed_data.py', file=sys.stderr)
+        return 1
+
+    def as_int_keys(mapping):
+        if not mapping:
+            return None
+        return {int(key): value for key, value in mapping.items()}
+
+    scenario = Scenario(as_int_keys(args.arrivals),
+                        as_int_keys(args.group_sizes),
+                        as_int_keys(args.ages), args.preferences,
+                        args.max_wait)
+    schedules = None
+    if args.open or args.close:
+        schedules = generate_slots(to_minutes(args.open or DEFAULT_OPEN),
+                                   to_minutes(args.close or DEFAULT_CLOSE),
+                                   args.slot_minutes)
+
+    variants = {'actual': activities_from_catalog(
+        rows, get_turn_capacity, get_min_age, overrides, schedules)}
+    for key, values in args.turn_capacity:
+        for value in values:
+            def turn_capacity(name, key=key, value=value):
+                if key in name.lower():
+                    return value
+                return get_turn_capacity(name)
+            variants[f'{key}={value}'] = activities_from_catalog(
+                rows, turn_capacity, get_min_age, overrides, schedules)
+
+    results = sweep(scenario, variants, args.days, args.seed, args.backend)
+    for label, result in results.items():
+        wait = result['wait_minutes']
+        rejected = result['rejected']
+        print(f"{label:<16} rechazo {result['rejection_rate'] or 0:.1%} "
+              f"(cupo {rejected['capacity']}, edad {rejected['min_age']})  "
+              f"espera media {wait['mean']} min, p90 {wait['p90']} min  "
+              f"[{result['backend']}, {result['seconds']} s]")
+        for activity in result['activities']:
+            print(f"    {activity['name']:<20} "
+                  f"ocupación {activity['utilization'] or 0:.1%}  "
+                  f"rechazo {activity['rejection_rate'] or 0:.1%}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,194 @@
+"""Instrumentación de las consultas SQL por petición.
+
+Hooks de eventos del ``Engine`` de SQLAlchemy que cuentan sentencias y
+tiempo de base de datos por petición, registran las consultas lentas (con
+sus parámetros y los DNIs enmascarados) y advierten cuando la misma forma de
+sentencia se ejecuta demasiadas veces en una petición (patrón N+1).
+"""
+import contextvars
+import logging
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+from flask import g, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from logging_config import get_logger, redact
+from metrics import REGISTRY
+
+logger = get_logger('sql')
+
+QUERIES_PER_REQUEST = REGISTRY.histogram(
+    'db_queries_per_request',
+    'Sentencias SQL ejecutadas por petición',
+    ('endpoint',),
+    buckets=(1, 2, 5, 10, 20, 50, 100, 250),
+)
+DB_TIME_PER_REQUEST = REGISTRY.histogram(
+    'db_time_per_request_seconds',
+    'Tiempo total en base de datos por petición',
+    ('endpoint',),
+)
+
+_settings = {
+    'slow_query_ms': 100.0,
+    'n_plus_one_threshold': 10,
+}
+
+_current_stats = contextvars.ContextVar('query_stats', default=None)
+
+
+class QueryStats:
+    """Acumula las sentencias ejecutadas en un ámbito (petición o test).
+
+    Los ámbitos se anidan: cada sentencia se registra también en el ámbito
+    padre, de modo que un test puede medir las consultas de las peticiones
+    que hace a través del cliente de pruebas. Solo los ámbitos con
+    ``detect_n_plus_one`` advierten de sentencias repetidas.
+    """
+
+    def __init__(self, parent=None, label=None, detect_n_plus_one=True):
+        self.parent = parent
+        self.label = label
+        self.detect_n_plus_one = detect_n_plus_one
+        self.count = 0
+        self.total_time = 0.0
+        self.statements = []
+        self.shapes = Counter()
+        self._warned = set()
+
+    def record(self, statement: str, duration: float):
+        self.count += 1
+        self.total_time += duration
+        self.statements.append(statement)
+        self.shapes[statement] += 1
+        executions = self.shapes[statement]
+        threshold = _settings['n_plus_one_threshold']
+        if (self.detect_n_plus_one and executions > threshold
+                and statement not in self._warned):
+            self._warned.add(statement)
+            logger.warning(
+                'Posible N+1: la misma sentencia se ejecutó más de %d veces',
+                threshold,
+                extra={'fields': {
+                    'statement': statement,
+                    'scope': self.label,
+                }}
+            )
+        if self.parent is not None:
+            self.parent.record(statement, duration)
+
+
+def current_stats():
+    """Devuelve las estadísticas del ámbito activo, o ``None``."""
+    return _current_stats.get()
+
+
+def _normalize(statement: str) -> str:
+    return ' '.join(statement.split())
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context,
+                           executemany):
+    conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context,
+                          executemany):
+    duration = time.perf_counter() - conn.info['query_start'].pop()
+    stats = _current_stats.get()
+    if stats is not None:
+        stats.record(_normalize(statement), duration)
+    if duration * 1000 >= _settings['slow_query_ms']:
+        logger.warning(
+            'Consulta lenta (%.1f ms)', duration * 1000,
+            extra={'fields': {
+                'statement': _normalize(statement),
+                'parameters': redact(parameters),
+            }}
+        )
+
+
+def install_engine_hooks():
+    """Registra los hooks en todos los engines (idempotente)."""
+    if not event.contains(Engine, 'before_cursor_execute',
+                          _before_cursor_execute):
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+
+
+def init_sql_instrumentation(app):
+    """Activa la instrumentación SQL por petición para ``app``.
+
+    Claves de configuración:
+        SQL_SLOW_QUERY_MS: Umbral para registrar una consulta como lenta
+        SQL_N_PLUS_ONE_THRESHOLD: Ejecuciones de la misma sentencia en una
+            petición a partir de las cuales se advierte un posible N+1
+    """
+    app.config.setdefault('SQL_SLOW_QUERY_MS', 100.0)
+    app.config.setdefault('SQL_N_PLUS_ONE_THRESHOLD', 10)
+    _settings['slow_query_ms'] = float(app.config['SQL_SLOW_QUERY_MS'])
+    _settings['n_plus_one_threshold'] = int(
+        app.config['SQL_N_PLUS_ONE_THRESHOLD']
+    )
+    install_engine_hooks()
+
+    @app.before_request
+    def _start_query_stats():
+        stats = QueryStats(parent=_current_stats.get(),
+                           label=request.endpoint)
+        g._query_stats = (stats, _current_stats.set(stats))
+
+    @app.teardown_request
+    def _finish_query_stats(exc):
+        state = g.pop('_query_stats', None)
+        if state is None:
+            return
+        stats, token = state
+        _current_stats.reset(token)
+        endpoint = request.endpoint or 'unmatched'
+        QUERIES_PER_REQUEST.observe(endpoint, value=stats.count)
+        DB_TIME_PER_REQUEST.observe(endpoint, value=stats.total_time)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(
+                'Consultas de la petición: %d (%.1f ms)',
+                stats.count, stats.total_time * 1000,
+                extra={'fields': {'endpoint': endpoint}}
+            )
+
+
+@contextmanager
+def count_queries(label: str = None):
+    """Cuenta las sentencias ejecutadas dentro del bloque.
+
+    Incluye las de las peticiones hechas con el cliente de pruebas.
+
+    Yields:
+        ``QueryStats`` con ``count``, ``total_time`` y ``statements``
+    """
+    install_engine_hooks()
+    stats = QueryStats(parent=_current_stats.get(), label=label,
+                       detect_n_plus_one=False)
+    token = _current_stats.set(stats)
+    try:
+        yield stats
+    finally:
+        _current_stats.reset(token)
+
+
+@contextmanager
+def assert_max_queries(limit: int, label: str = None):
+    """Falla si el bloque ejecuta más de ``limit`` sentencias SQL."""
+    with count_queries(label) as stats:
+        yield stats
+    if stats.count > limit:
+        listing = '\n'.join(
+            f'  {executions}x {statement}'
+            for statement, executions in stats.shapes.most_common()
+        )
+        raise AssertionError(
+            f'Se esperaban como máximo {limit} consultas y se ejecutaron '
+            f'{stats.count}:\n{listing}'
+        )
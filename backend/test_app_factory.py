@@ -0,0 +1,57 @@
+import sys
+import os
+
+import pytest
+
+# Agregar el directorio padre al path para importar los modelos
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app import Activity, create_app, db
+from config import ProductionConfig, get_config
+
+
+class TestAppFactory:
+    """Tests de la fábrica de aplicaciones y la configuración por entorno"""
+
+    def test_testing_app_should_use_isolated_memory_database(self):
+        """Cada app de testing tiene su propia base en memoria"""
+        first = create_app('testing')
+        second = create_app('testing')
+
+        with first.app_context():
+            db.create_all()
+            db.session.add(Activity('Safari', 8, ['10:00']))
+            db.session.commit()
+        with second.app_context():
+            db.create_all()
+            assert Activity.query.count() == 0
+
+        response = first.test_client().get('/api/activities')
+        assert [item['name'] for item in response.get_json()] == ['Safari']
+
+    def test_environment_should_override_config(self, monkeypatch):
+        """Las variables ECOHARMONY_* sobrescriben la configuración"""
+        monkeypatch.setenv('ECOHARMONY_SQL_SLOW_QUERY_MS', '250')
+
+        app = create_app('testing')
+
+        assert app.config['SQL_SLOW_QUERY_MS'] == 250
+        assert app.config['TESTING'] is True
+
+    def test_production_should_enable_wal_on_file_databases(self, tmp_path):
+        """En producción las conexiones SQLite usan WAL"""
+        app = create_app('production', {
+            'SQLALCHEMY_DATABASE_URI': f'sqlite:///{tmp_path / "prod.db"}'
+        })
+
+        with app.app_context():
+            with db.engine.connect() as connection:
+                mode = connection.exec_driver_sql(
+                    'PRAGMA journal_mode').scalar()
+        assert mode == 'wal'
+        assert get_config('production') is ProductionConfig
+
+    def test_unknown_environment_should_fail(self):
+        """Un APP_ENV desconocido es un error explícito"""
+        with pytest.raises(ValueError, match='Entorno desconocido'):
+            get_config('staging')
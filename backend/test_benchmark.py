@@ -0,0 +1,59 @@
+import sys
+import os
+
+# Agregar el directorio padre al path para importar los modelos
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from benchmark import compare, param_mismatches, percentile, summarize
+
+
+class TestBenchmarkReport:
+    """Tests del cálculo y la comparación de resultados de benchmark"""
+
+    def test_percentile_should_use_nearest_rank(self):
+        """Percentiles por rango más cercano"""
+        samples = list(range(1, 101))
+        assert percentile(samples, 50) == 50
+        assert percentile(samples, 95) == 95
+        assert percentile(samples, 99) == 99
+        assert percentile([], 50) == 0.0
+
+    def test_summarize_should_report_throughput_and_queries(self):
+        """El resumen incluye throughput y consultas por operación"""
+        summary = summarize([0.01] * 10, elapsed=0.1, queries=30)
+
+        assert summary['throughput_ops'] == 100.0
+        assert summary['p50_ms'] == 10.0
+        assert summary['queries_per_op'] == 3.0
+
+    def test_compare_should_flag_regressions_beyond_tolerance(self):
+        """Se informan regresiones de latencia, throughput y consultas"""
+        baseline = {'get_activities': {
+            'p50_ms': 10.0, 'p95_ms': 20.0, 'throughput_ops': 100.0,
+            'queries_per_op': 2.0,
+        }}
+        within = {'get_activities': {
+            'p50_ms': 11.0, 'p95_ms': 21.0, 'throughput_ops': 90.0,
+            'queries_per_op': 2.0,
+        }}
+        worse = {'get_activities': {
+            'p50_ms': 15.0, 'p95_ms': 21.0, 'throughput_ops': 60.0,
+            'queries_per_op': 3.0,
+        }}
+
+        assert compare(within, baseline, tolerance=0.2) == []
+        regressions = compare(worse, baseline, tolerance=0.2)
+        assert len(regressions) == 3
+        assert any('queries_per_op' in item for item in regressions)
+
+    def test_param_mismatches_should_block_incomparable_runs(self):
+        """Solo se comparan corridas con los mismos parámetros"""
+        reference = {'iterations': 100, 'activities': 20, 'tolerance': 0.3}
+
+        assert param_mismatches(
+            {'iterations': 100, 'activities': 20, 'tolerance': 0.1},
+            reference) == []
+        mismatches = param_mismatches(
+            {'iterations': 20, 'activities': 20, 'seed': 7}, reference)
+        assert mismatches == ['iterations: 20 (línea base: 100)',
+                              'seed: 7 (línea base: None)']
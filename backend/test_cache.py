@@ -0,0 +1,187 @@
+import sys
+import os
+import threading
+import time
+
+# Agregar el directorio padre al path para importar los modelos
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app import Activity, Visitor, create_app, db
+from cache import SINGLE_FLIGHT_CALLS, SingleFlight, VersionedCache
+
+
+def _run_concurrently(count, target):
+    """Lanza ``count`` hilos que arrancan juntos y devuelve sus resultados"""
+    barrier = threading.Barrier(count)
+    results = [None] * count
+
+    def worker(index):
+        barrier.wait()
+        try:
+            results[index] = target()
+        except Exception as error:
+            results[index] = error
+
+    threads = [threading.Thread(target=worker, args=(i,))
+               for i in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(10)
+    return results
+
+
+class TestVersionedCache:
+    """Tests de la caché por versión de datos"""
+
+    def test_should_miss_on_other_version(self):
+        """Una entrada solo vale para la versión con la que se guardó"""
+        cache = VersionedCache()
+        cache.set('activities', 1, 'body')
+
+        assert cache.get('activities', 1) == 'body'
+        assert cache.get('activities', 2) is None
+        assert cache.get('visitors', 1) is None
+
+
+class TestSingleFlight:
+    """Tests de la unión de cálculos concurrentes"""
+
+    def test_concurrent_calls_should_compute_once(self):
+        """Solo un hilo calcula; el resto recibe su resultado"""
+        flight = SingleFlight(timeout=5)
+        calls = []
+        coalesced = SINGLE_FLIGHT_CALLS.value('test_once', 'coalesced')
+
+        def slow():
+            calls.append(1)
+            time.sleep(0.2)
+            return 'body'
+
+        results = _run_concurrently(
+            8, lambda: flight.do(('test_once', 1), slow))
+
+        assert results == ['body'] * 8
+        assert len(calls) == 1
+        assert SINGLE_FLIGHT_CALLS.value(
+            'test_once', 'coalesced') == coalesced + 7
+        assert flight.in_flight() == 0
+
+    def test_leader_error_should_reach_waiters(self):
+        """Si el líder falla, los que esperaban reciben el mismo error"""
+        flight = SingleFlight(timeout=5)
+
+        def failing():
+            time.sleep(0.2)
+            raise RuntimeError('base caída')
+
+        results = _run_concurrently(
+            4, lambda: flight.do(('test_error', 1), failing))
+
+        assert all(isinstance(result, RuntimeError) for result in results)
+        assert flight.in_flight() == 0
+        # El error no queda guardado: el próximo intento vuelve a calcular
+        assert flight.do(('test_error', 1), lambda: 'ok') == 'ok'
+
+    def test_waiter_should_compute_itself_after_timeout(self):
+        """Un seguidor que espera demasiado calcula por su cuenta"""
+        flight = SingleFlight(timeout=0.05)
+        release = threading.Event()
+        started = threading.Event()
+
+        def stuck():
+            started.set()
+            release.wait(5)
+            return 'leader'
+
+        leader = threading.Thread(
+            target=lambda: flight.do(('test_timeout', 1), stuck))
+        leader.start()
+        started.wait(5)
+        before = SINGLE_FLIGHT_CALLS.value('test_timeout', 'timeout')
+        try:
+            result = flight.do(('test_timeout', 1), lambda: 'own')
+        finally:
+            release.set()
+            leader.join(5)
+
+        assert result == 'own'
+        assert SINGLE_FLIGHT_CALLS.value(
+            'test_timeout', 'timeout') == before + 1
+
+    def test_different_keys_should_not_wait_each_other(self):
+        """Claves distintas se calculan en paralelo"""
+        flight = SingleFlight(timeout=5)
+
+        results = _run_concurrently(
+            2, lambda: flight.do(('test_keys', threading.get_ident()),
+                                 threading.get_ident))
+
+        assert results[0] != results[1]
+
+
+class TestCachedEndpoints:
+    """Tests de los GET cacheados por versión de datos"""
+
+    def setup_method(self):
+        """Configuración antes de cada test"""
+        self.app = create_app('testing')
+        self.client = self.app.test_client()
+        with self.app.app_context():
+            db.create_all()
+            db.session.add(Activity('Safari', 8, ['10:00', '11:00']))
+            db.session.add(Visitor('Ana', '12345678', 30))
+            db.session.commit()
+
+    def test_concurrent_catalog_misses_should_build_once(self):
+        """Varias peticiones simultáneas arman el catálogo una sola vez"""
+        leaders = SINGLE_FLIGHT_CALLS.value('activities', 'leader')
+        coalesced = SINGLE_FLIGHT_CALLS.value('activities', 'coalesced')
+        flight = self.app.extensions['single_flight']
+        original_do = flight.do
+
+        def slow_do(key, fn):
+            def slow():
+                time.sleep(0.2)
+                return fn()
+            return original_do(key, slow)
+
+        flight.do = slow_do
+        responses = _run_concurrently(
+            6, lambda: self.app.test_client().get('/api/activities'))
+
+        bodies = {response.get_data() for response in responses}
+        assert len(bodies) == 1
+        assert all(response.status_code == 200 for response in responses)
+        built = SINGLE_FLIGHT_CALLS.value('activities', 'leader') - leaders
+        waited = SINGLE_FLIGHT_CALLS.value(
+            'activities', 'coalesced') - coalesced
+        assert built + waited == 6
+        assert built < 6
+
+    def test_visitors_should_be_cached_until_data_changes(self):
+        """El listado de visitantes se recalcula solo si cambian los datos"""
+        first = self.client.get('/api/visitors')
+        not_modified = self.client.get('/api/visitors', headers={
+            'If-None-Match': first.headers['ETag']})
+        with self.app.app_context():
+            db.session.add(Visitor('Juan', '87654321', 25))
+            db.session.commit()
+        second = self.client.get('/api/visitors')
+
+        assert not_modified.status_code == 304
+        assert second.headers['ETag'] != first.headers['ETag']
+        dnis = [v['dni'] for v in second.get_json()]
+        assert dnis == ['12345678', '87654321']
+
+    def test_one_version_bump_per_transaction(self):
+        """Varios flush en una transacción incrementan la versión una vez"""
+        with self.app.app_context():
+            from app import read_data_version
+            before = read_data_version()
+            db.session.add(Visitor('Juan', '87654321', 25))
+            db.session.flush()
+            db.session.add(Visitor('Eva', '11111111', 40))
+            db.session.flush()
+            db.session.commit()
+            assert read_data_version() == before + 1
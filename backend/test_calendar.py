@@ -0,0 +1,198 @@
+import sys
+import os
+from datetime import date
+
+import pytest
+
+# Agregar el directorio padre al path para importar los modelos
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app import (
+    Activity, Registration, create_app, db, generate_time_slots,
+    is_valid_slot
+)
+from park_calendar import ParkCalendar
+from planner import ActivityOption, find_conflict, plan_itinerary
+
+MONDAY = date(2026, 10, 19)
+SUNDAY = date(2026, 10, 25)
+
+
+class TestParkCalendar:
+    """Tests de los turnos por día del calendario del parque"""
+
+    def test_default_should_match_generated_slots(self):
+        """Sin reglas: todos los días de 09:00 a 18:00 cada 30 minutos"""
+        calendar = ParkCalendar()
+        assert list(calendar.slots(MONDAY).ordered) == generate_time_slots()
+        assert calendar.slots(SUNDAY).valid == calendar.slots().valid
+
+    def test_should_apply_weekday_hours_and_closed_days(self):
+        """Horario distinto el lunes y cerrado el domingo"""
+        calendar = ParkCalendar(hours={0: ('10:00', '12:00'), 6: None})
+        assert calendar.slots(MONDAY).ordered == (
+            '10:00', '10:30', '11:00', '11:30')
+        assert calendar.slots(SUNDAY).ordered == ()
+        # El resto de la semana conserva el horario por defecto
+        assert calendar.is_valid('09:00', date(2026, 10, 20))
+
+    def test_should_close_on_holidays(self):
+        """Un feriado no tiene turnos, aunque el horario sea válido otro día"""
+        calendar = ParkCalendar(closures=['2026-10-19'])
+        assert not calendar.is_valid('10:00', MONDAY)
+        assert calendar.is_closed('10:00', MONDAY)
+        # No es turno de ningún día
+        assert not calendar.is_closed('07:00', MONDAY)
+
+    def test_seasons_should_override_hours_across_year_end(self):
+        """Una temporada de verano que cruza el fin de año amplía el horario"""
+        summer = {day: ('08:00', '20:00') for day in range(7)}
+        calendar = ParkCalendar(seasons=[
+            {'from': '12-15', 'to': '02-28', 'hours': summer},
+        ])
+        assert calendar.is_valid('19:30', date(2027, 1, 10))
+        assert not calendar.is_valid('19:30', MONDAY)
+        # Un horario de temporada es válido para la actividad en algún día
+        assert calendar.is_valid('19:30')
+
+    def test_should_use_activity_slot_length(self):
+        """Turnos de 60 minutos para las actividades configuradas"""
+        calendar = ParkCalendar(activity_intervals={'safari': 60})
+        assert calendar.interval_for('Safari nocturno') == 60
+        assert calendar.slots(MONDAY, 'Safari').ordered[:3] == (
+            '09:00', '10:00', '11:00')
+        assert not calendar.is_valid('17:30', MONDAY, 'Safari')
+        assert calendar.is_valid('17:30', MONDAY, 'Palestra')
+        assert calendar.all_slots() == tuple(generate_time_slots())
+
+    def test_should_memoize_days_with_bounded_cache(self):
+        """Cada día se calcula una vez y la caché no crece sin límite"""
+        calendar = ParkCalendar(cache_size=2)
+        for _ in range(100):
+            calendar.is_valid('10:00', MONDAY)
+        info = calendar.cache_info()
+        assert info.misses == 1 and info.hits == 99
+        calendar.is_valid('10:00', date(2026, 10, 20))
+        calendar.is_valid('10:00', date(2026, 10, 21))
+        assert calendar.cache_info().currsize == 2
+
+    def test_should_reject_invalid_rules(self):
+        """Horarios que cierran antes de abrir o duraciones no positivas"""
+        with pytest.raises(ValueError):
+            ParkCalendar(hours={0: ('18:00', '09:00')})
+        with pytest.raises(ValueError):
+            ParkCalendar(activity_intervals={'safari': 0})
+
+    def test_planner_should_respect_slot_length(self):
+        """Una actividad de 60 minutos ocupa también el turno siguiente"""
+        options = [
+            ActivityOption(1, 'Safari', {'10:00': 5}, duration=60),
+            ActivityOption(2, 'Palestra', {'10:30': 5, '11:00': 5}),
+        ]
+        assert plan_itinerary(options, 1).plans == [{1: '10:00', 2: '11:00'}]
+
+    def test_conflict_should_use_slot_length(self):
+        """Un turno de 60 minutos choca con el que empieza 30 después"""
+        assert find_conflict([('10:00', 60), ('10:30', 30)]) == (0, 1)
+        assert find_conflict([('10:00', 60), ('11:00', 30)]) is None
+        assert find_conflict([('11:00', 30), ('10:00', 60)]) is None
+
+
+class TestCalendarIntegration:
+    """Tests del calendario configurado en la aplicación"""
+
+    def setup_method(self):
+        """Configuración antes de cada test"""
+        self.today = ParkCalendar.today()
+        self.app = create_app('testing', {
+            'PARK_CLOSURES': [self.today.isoformat()],
+            'ACTIVITY_SLOT_MINUTES': {'safari': 60},
+        })
+        self.client = self.app.test_client()
+        with self.app.app_context():
+            db.create_all()
+            activity = Activity('Safari', 8, ['10:00', '11:00'])
+            db.session.add(activity)
+            db.session.commit()
+            self.activity_id = activity.id
+
+    def test_validate_should_use_activity_slot_length(self):
+        """Activity.validate rechaza turnos de otra duración que la suya"""
+        with self.app.app_context():
+            assert Activity('Safari', 8, ['10:00']).validate() == []
+            errors = Activity('Safari', 8, ['10:30']).validate()
+            assert errors and '60 minutos' in errors[0]
+            assert is_valid_slot('10:30')
+            assert not is_valid_slot('10:30', activity='Safari')
+
+    def test_registration_should_be_rejected_on_closed_day(self):
+        """Un feriado rechaza el registro en la etapa de reglas"""
+        payload = {
+            'participants': [{'name': 'Ana', 'dni': '12345678', 'age': 30}],
+            'terms_accepted': True,
+            'schedule': '10:00',
+            'current_time': '08:00',
+        }
+        response = self.client.post(
+            f'/api/activities/{self.activity_id}/register', json=payload)
+        data = response.get_json()
+        assert data['code'] == 'slot_closed'
+        assert data['stage'] == 'rules'
+
+    def test_default_schedules_should_follow_calendar(self):
+        """Una actividad creada sin horarios recibe turnos de su duración"""
+        response = self.client.post(
+            '/api/activities', json={'name': 'Safari 2', 'capacity': 8})
+        assert response.status_code == 201
+        assert response.get_json()['schedules'][:2] == ['09:00', '10:00']
+
+
+class TestSlotLengthItineraries:
+    """Tests de itinerarios con actividades de distinta duración"""
+
+    def setup_method(self):
+        """Configuración antes de cada test"""
+        self.app = create_app(
+            'testing', {'ACTIVITY_SLOT_MINUTES': {'safari': 60}})
+        self.client = self.app.test_client()
+        with self.app.app_context():
+            db.create_all()
+            activities = [
+                Activity('Safari', 8, ['10:00', '11:00']),
+                Activity('Palestra', 12, ['10:00', '10:30', '11:00']),
+            ]
+            db.session.add_all(activities)
+            db.session.commit()
+            self.safari, self.palestra = (
+                activity.id for activity in activities)
+
+    def _group(self, **extra):
+        participants = [{'name': 'Ana', 'dni': '30000000', 'age': 30}]
+        return dict({'participants': participants, 'current_time': '08:00',
+                     'terms_accepted': True}, **extra)
+
+    def test_commit_should_reject_overlapping_intervals(self):
+        """Safari 10:00 dura hasta las 11:00: Palestra 10:30 se superpone"""
+        assignments = [{'activity_id': self.safari, 'schedule': '10:00'},
+                       {'activity_id': self.palestra, 'schedule': '10:30'}]
+        response = self.client.post(
+            '/api/itineraries/commit',
+            json=self._group(assignments=assignments))
+        data = response.get_json()
+        assert response.status_code == 400
+        assert data['code'] == 'overlapping_schedules'
+        assert data['assignment'] == 2
+        with self.app.app_context():
+            assert db.session.query(Registration).count() == 0
+
+    def test_plan_should_skip_slots_overlapping_existing_bookings(self):
+        """Con Safari 10:00 (60 min) no se ofrece Palestra 10:00 ni 10:30"""
+        response = self.client.post(f'/api/activities/{self.safari}/register',
+                                    json=self._group(schedule='10:00'))
+        assert response.status_code == 200
+        response = self.client.post(
+            '/api/itineraries/plan',
+            json=self._group(activities=[self.palestra]))
+        plans = response.get_json()['plans']
+        schedules = [plan['assignments'][0]['schedule'] for plan in plans]
+        assert schedules == ['11:00']
@@ -0,0 +1,206 @@
+import sys
+import os
+import uuid
+
+# Agregar el directorio padre al path para importar los modelos
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app import Activity, Registration, Visitor, create_app, db
+from metrics import REGISTRATIONS_CANCELLED
+from sql_instrumentation import count_queries
+
+
+class TestCancellation:
+    """Tests de cancelación de registros y liberación de cupos"""
+
+    def setup_method(self):
+        """Configuración antes de cada test"""
+        self.app = create_app('testing', {
+            'SHARED_OCCUPANCY': True,
+            'SHARED_OCCUPANCY_NAME': f'ecoharmony_test_{uuid.uuid4().hex[:8]}',
+            'SHARED_OCCUPANCY_MAX_ACTIVITIES': 16,
+        })
+        self.occupancy = self.app.extensions['shared_occupancy']
+        self.client = self.app.test_client()
+        with self.app.app_context():
+            activity = Activity('Safari', 2, ['10:00', '11:00'])
+            db.session.add(activity)
+            db.session.commit()
+            self.activity_id = activity.id
+
+    def teardown_method(self):
+        """Limpieza después de cada test"""
+        self.occupancy.close(unlink=True)
+
+    def _register(self, dni, schedule='10:00'):
+        return self.client.post(
+            f'/api/activities/{self.activity_id}/register',
+            json={
+                'participants': [{'name': 'Ana', 'dni': dni, 'age': 30}],
+                'terms_accepted': True,
+                'schedule': schedule,
+                'current_time': '08:00',
+            },
+        )
+
+    def _registration_id(self, dni):
+        with self.app.app_context():
+            return db.session.execute(
+                db.select(Registration.id).join(Visitor)
+                .where(Visitor.dni == dni)
+            ).scalar_one()
+
+    def _slot(self, schedule='10:00'):
+        catalog = self.client.get('/api/activities').get_json()
+        return catalog[0]['per_schedule_capacity'][schedule]
+
+    def test_should_free_seat_of_full_slot(self):
+        """Cancelar un registro de un turno lleno permite volver a registrar"""
+        self._register('11111111')
+        self._register('22222222')
+        assert self._register('33333333').get_json()['code'] == 'no_capacity'
+        assert self._slot()['available_capacity'] == 0
+
+        response = self.client.delete(
+            f'/api/registrations/{self._registration_id("11111111")}')
+
+        assert response.status_code == 200
+        assert response.get_json()['cancelled'] == 1
+        assert self.occupancy.get(self.activity_id, '10:00') == 1
+        assert self._slot()['available_capacity'] == 1
+        assert self._register('33333333').status_code == 200
+
+    def test_should_return_404_for_unknown_registration(self):
+        """Un id inexistente responde 404 sin tocar la ocupación"""
+        self._register('11111111')
+
+        response = self.client.delete('/api/registrations/9999')
+
+        assert response.status_code == 404
+        assert response.get_json()['code'] == 'registration_not_found'
+        assert self.occupancy.get(self.activity_id, '10:00') == 1
+
+    def test_should_invalidate_cached_catalog(self):
+        """La cancelación cambia la versión de los datos y el ETag"""
+        self._register('11111111')
+        before = self.client.get('/api/activities')
+
+        self.client.delete(
+            f'/api/registrations/{self._registration_id("11111111")}')
+        after = self.client.get(
+            '/api/activities',
+            headers={'If-None-Match': before.headers['ETag']})
+
+        assert after.status_code == 200
+        assert after.headers['ETag'] != before.headers['ETag']
+
+    def test_bulk_cancel_by_dni_and_slot(self):
+        """La cancelación masiva libera solo los pares pedidos"""
+        self._register('11111111', '10:00')
+        self._register('11111111', '11:00')
+        self._register('22222222', '10:00')
+        before = REGISTRATIONS_CANCELLED.value('bulk')
+
+        response = self.client.post('/api/registrations/cancel', json={
+            'cancellations': [
+                {'dni': '11111111', 'schedule': '10:00'},
+                {'dni': '22222222', 'schedule': '10:00'},
+                {'dni': '22222222', 'schedule': '10:00'},
+                {'dni': '99999999', 'schedule': '11:00'},
+            ]
+        })
+
+        data = response.get_json()
+        assert response.status_code == 200
+        assert (data['cancelled'], data['not_found']) == (2, 1)
+        assert REGISTRATIONS_CANCELLED.value('bulk') - before == 2
+        assert self.occupancy.get(self.activity_id, '10:00') == 0
+        assert self.occupancy.get(self.activity_id, '11:00') == 1
+        with self.app.app_context():
+            assert Registration.query.count() == 1
+            # Los visitantes se conservan
+            assert Visitor.query.count() == 3
+
+    def test_bulk_cancel_should_use_constant_queries(self):
+        """Cientos de cancelaciones se resuelven en pocas sentencias"""
+        with self.app.app_context():
+            activity = db.session.get(Activity, self.activity_id)
+            activity.capacity = 400
+            for index in range(300):
+                visitor = Visitor('Cierre', str(40000000 + index), 30)
+                db.session.add(visitor)
+                db.session.flush()
+                db.session.add(Registration(
+                    activity_id=self.activity_id, visitor_id=visitor.id,
+                    schedule='11:00'))
+            db.session.commit()
+        cancellations = [{'dni': str(40000000 + index), 'schedule': '11:00'}
+                         for index in range(300)]
+
+        with count_queries() as stats:
+            response = self.client.post('/api/registrations/cancel',
+                                        json={'cancellations': cancellations})
+
+        assert response.get_json()['cancelled'] == 300
+        # Visitantes por DNI, DELETE ... RETURNING, ingresos de esos
+        # registros, rollups y la versión
+        assert stats.count == 5, stats.statements
+
+    def test_bulk_cancel_should_count_matched_pairs(self):
+        """Un par que borra varios registros cuenta una vez como encontrado"""
+        with self.app.app_context():
+            other = Activity('Palestra', 4, ['10:00'])
+            db.session.add(other)
+            db.session.flush()
+            for activity_id in (self.activity_id, other.id):
+                visitor = Visitor('Ana', '11111111', 30)
+                db.session.add(visitor)
+                db.session.flush()
+                db.session.add(Registration(
+                    activity_id=activity_id, visitor_id=visitor.id,
+                    schedule='10:00'))
+            db.session.commit()
+
+        response = self.client.post('/api/registrations/cancel', json={
+            'cancellations': [
+                {'dni': '11111111', 'schedule': '10:00'},
+                {'dni': '11111111', 'schedule': '11:00'},
+            ]
+        })
+
+        data = response.get_json()
+        assert (data['cancelled'], data['not_found']) == (2, 1)
+
+    def test_bulk_cancel_should_use_indexes(self):
+        """DNI y visitor_id se resuelven por índice, sin recorrer la tabla"""
+        queries = (
+            "SELECT id, dni FROM visitor WHERE dni IN ('1', '2')",
+            "DELETE FROM registration WHERE visitor_id IN (1, 2) "
+            "AND (visitor_id, schedule) IN "
+            "(VALUES (1, '10:00'), (2, '10:00'))",
+        )
+        with self.app.app_context():
+            plans = [
+                db.session.execute(db.text(f'EXPLAIN QUERY PLAN {query}'))
+                .all()
+                for query in queries
+            ]
+
+        visitor, registration = ([row[-1] for row in plan] for plan in plans)
+        assert any('ix_visitor_dni' in detail for detail in visitor)
+        assert any('ix_registration_visitor_id' in detail
+                   for detail in registration)
+        assert not any(detail.startswith('SCAN registration')
+                       for detail in registration)
+
+    def test_bulk_cancel_should_reject_invalid_payload(self):
+        """Un cuerpo inválido se rechaza con 400 y todos los errores"""
+        response = self.client.post('/api/registrations/cancel', json={
+            'cancellations': [{'dni': 'abc', 'schedule': '10:00'},
+                              {'dni': '1'}]
+        })
+
+        data = response.get_json()
+        assert response.status_code == 400
+        assert data['code'] == 'invalid_payload'
+        assert len(data['details']) == 2
@@ -0,0 +1,116 @@
+import sys
+import os
+
+# Agregar el directorio padre al path para importar los modelos
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app import Activity, Registration, Visitor, create_app, db
+from sql_instrumentation import count_queries
+
+
+class TestCatalogQuery:
+    """Tests de los filtros y la paginación del catálogo"""
+
+    def setup_method(self):
+        """Configuración antes de cada test"""
+        self.app = create_app('testing')
+        self.client = self.app.test_client()
+        with self.app.app_context():
+            db.create_all()
+            slots = ['10:00', '14:00', '14:30', '16:00']
+            activities = [
+                Activity('Safari', 8, slots),                       # 1
+                Activity('Tirolesa', 10, slots,
+                         requires_clothing=True),                   # 2 (8+)
+                Activity('Palestra', 12, slots,
+                         requires_clothing=True),                   # 3 (12+)
+                Activity('Jardinería', 12, ['09:00', '10:00']),     # 4
+                Activity('Safari nocturno', 8, ['16:00']),          # 5
+            ]
+            db.session.add_all(activities)
+            db.session.commit()
+            # Safari 14:00 con 5 de 8 ocupados: quedan 3
+            for index in range(5):
+                visitor = Visitor('Ana', str(30000000 + index), 30)
+                db.session.add(visitor)
+                db.session.flush()
+                db.session.add(Registration(
+                    activity_id=1, visitor_id=visitor.id, schedule='14:00'))
+            db.session.commit()
+
+    def get(self, **params):
+        return self.client.get('/api/activities', query_string=params)
+
+    def test_should_filter_by_window_seats_and_age(self):
+        """"Al menos 4 cupos después de las 14:00 para 10 años" """
+        response = self.get(**{'from': '14:00', 'min_seats': 4, 'age': 10})
+
+        catalog = response.get_json()
+        assert response.status_code == 200
+        # Palestra pide 12 años; Jardinería no tiene turnos tras las 14:00
+        assert [a['name'] for a in catalog] == [
+            'Safari', 'Tirolesa', 'Safari nocturno']
+        schedules = sorted(catalog[0]['per_schedule_capacity'])
+        assert schedules == ['14:30', '16:00']
+        assert 'X-Next-Cursor' not in response.headers
+
+    def test_should_filter_by_name_prefix_and_clothing(self):
+        """Prefijo de nombre y talla se filtran en SQL"""
+        by_name = [a['name'] for a in self.get(name='Safari').get_json()]
+        with_clothing = [
+            a['name'] for a in self.get(requires_clothing='true').get_json()]
+        without = [
+            a['id'] for a in self.get(requires_clothing='false').get_json()]
+
+        assert by_name == ['Safari', 'Safari nocturno']
+        assert with_clothing == ['Tirolesa', 'Palestra']
+        assert without == [1, 4, 5]
+
+    def test_should_keep_full_slots_without_min_seats(self):
+        """Sin min_seats no se ocultan turnos"""
+        catalog = self.get(to='14:00').get_json()
+
+        assert [a['id'] for a in catalog] == [1, 2, 3, 4]
+        assert catalog[0]['per_schedule_capacity']['14:00'][
+            'available_capacity'] == 3
+
+    def test_should_paginate_with_cursor_header(self):
+        """La paginación por clave recorre todo sin repetir"""
+        first = self.get(limit=2)
+        cursor = first.headers['X-Next-Cursor']
+        second = self.get(limit=2, after=cursor)
+        third = self.get(limit=2, after=second.headers['X-Next-Cursor'])
+
+        ids = [a['id'] for page in (first, second, third)
+               for a in page.get_json()]
+        assert ids == [1, 2, 3, 4, 5]
+        assert f'after={cursor}' in first.headers['Link']
+        assert 'rel="next"' in first.headers['Link']
+        assert 'X-Next-Cursor' not in third.headers
+
+    def test_filtered_page_should_use_constant_queries(self):
+        """Una página filtrada lee actividades, cupos particulares y conteos"""
+        with count_queries() as stats:
+            self.get(**{'from': '14:00', 'min_seats': 1})
+
+        assert stats.count == 3, stats.statements
+
+    def test_name_prefix_should_use_index(self):
+        """El prefijo de nombre se resuelve con el índice de activity.name"""
+        with self.app.app_context():
+            plan = db.session.execute(db.text(
+                "EXPLAIN QUERY PLAN SELECT id FROM activity "
+                "WHERE name >= 'Saf' AND name < 'Saf\U0010ffff' ORDER BY id"
+            )).all()
+
+        assert any('ix_activity_name' in row[-1] for row in plan)
+
+    def test_should_reject_invalid_parameters(self):
+        """Parámetros inválidos responden 400 con todos los errores"""
+        response = self.get(
+            **{'from': '25:00', 'min_seats': 'x', 'limit': 500})
+
+        data = response.get_json()
+        assert response.status_code == 400
+        assert data['code'] == 'invalid_query'
+        assert len(data['details']) == 3
@@ -0,0 +1,186 @@
+import sys
+import os
+import time
+from datetime import datetime, timedelta, timezone
+
+# Agregar el directorio padre al path para importar los modelos
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app import (
+    Activity, CheckIn, Registration, Visitor, create_app, db,
+    mark_data_changed
+)
+from checkin import CHECKIN_LOOKUPS, BloomFilter, today
+from rollups import rollup_day
+from sql_instrumentation import count_queries
+
+
+class TestBloomFilter:
+    """Tests del filtro de pertenencia de DNIs"""
+
+    def test_should_have_no_false_negatives(self):
+        """Todo lo agregado se encuentra"""
+        bloom = BloomFilter(1000, 0.01)
+        for dni in range(30000000, 30001000):
+            bloom.add(str(dni))
+
+        assert all(str(dni) in bloom for dni in range(30000000, 30001000))
+
+    def test_false_positive_rate_should_stay_near_target(self):
+        """Con la capacidad prevista los falsos positivos rondan la tasa"""
+        bloom = BloomFilter(1000, 0.01)
+        for dni in range(30000000, 30001000):
+            bloom.add(str(dni))
+
+        false_positives = sum(str(dni) in bloom
+                              for dni in range(40000000, 40010000))
+        assert false_positives < 300
+
+
+class TestToday:
+    """Tests del inicio del día del índice de ingreso"""
+
+    def test_should_use_local_day_of_the_park(self, monkeypatch):
+        """El día es el local (como rollups y calendario), expresado en UTC"""
+        monkeypatch.setenv('TZ', 'America/Argentina/Buenos_Aires')
+        time.tzset()
+        try:
+            start = today()
+            assert (start.hour, start.minute) == (3, 0)
+            assert rollup_day(start) == rollup_day()
+            assert rollup_day(start - timedelta(seconds=1)) < rollup_day()
+        finally:
+            monkeypatch.undo()
+            time.tzset()
+
+
+class TestCheckin:
+    """Tests del control de ingreso por DNI"""
+
+    def setup_method(self):
+        """Configuración antes de cada test"""
+        self.app = create_app('testing')
+        self.client = self.app.test_client()
+        with self.app.app_context():
+            db.create_all()
+            activity = Activity('Safari', 8, ['10:00', '11:00'])
+            db.session.add(activity)
+            db.session.commit()
+            self.activity_id = activity.id
+
+    def _register(self, dni, schedule='10:00'):
+        return self.client.post(
+            f'/api/activities/{self.activity_id}/register',
+            json={
+                'participants': [{'name': 'Ana', 'dni': dni, 'age': 30}],
+                'terms_accepted': True,
+                'schedule': schedule,
+                'current_time': '08:00',
+            },
+        )
+
+    def test_should_find_bookings_registered_after_startup(self):
+        """Los registros confirmados entran al índice y se hallan por DNI"""
+        self.client.get('/api/checkin/11111111')
+        self._register('11111111', '11:00')
+        self._register('11111111', '10:00')
+
+        response = self.client.get('/api/checkin/11111111')
+
+        data = response.get_json()
+        assert response.status_code == 200
+        assert [b['schedule'] for b in data['bookings']] == ['10:00', '11:00']
+        assert data['bookings'][0]['activity'] == 'Safari'
+        assert data['bookings'][0]['checked_in_at'] is None
+
+    def test_unknown_dni_should_answer_from_memory(self):
+        """Un DNI sin reservas se responde con la sola consulta de versión"""
+        self._register('11111111')
+        self.client.get('/api/checkin/11111111')
+        before = (CHECKIN_LOOKUPS.value('filtered')
+                  + CHECKIN_LOOKUPS.value('not_registered'))
+
+        with count_queries() as stats:
+            response = self.client.get('/api/checkin/99999999')
+
+        assert response.status_code == 404
+        assert response.get_json()['code'] == 'not_registered'
+        assert stats.count == 1, stats.statements
+        after = (CHECKIN_LOOKUPS.value('filtered')
+                 + CHECKIN_LOOKUPS.value('not_registered'))
+        assert after - before == 1
+
+    def test_should_ignore_bookings_of_previous_days(self):
+        """Solo se indexan los registros de hoy"""
+        with self.app.app_context():
+            visitor = Visitor('Ayer', '22222222', 30)
+            db.session.add(visitor)
+            db.session.flush()
+            db.session.add(Registration(
+                activity_id=self.activity_id, visitor_id=visitor.id,
+                schedule='10:00',
+                registered_at=datetime.now(timezone.utc) - timedelta(days=1)))
+            db.session.commit()
+
+        assert self.client.get('/api/checkin/22222222').status_code == 404
+
+    def test_should_see_changes_made_outside_this_process(self):
+        """Registros y cancelaciones sin pasar por el índice se sincronizan"""
+        self._register('11111111')
+        self.client.get('/api/checkin/11111111')
+        with self.app.app_context():
+            # Como si otro worker registrara y cancelara
+            visitor = Visitor('Otro', '33333333', 30)
+            db.session.add(visitor)
+            db.session.flush()
+            db.session.add(Registration(
+                activity_id=self.activity_id, visitor_id=visitor.id,
+                schedule='11:00'))
+            db.session.commit()
+            found = self.client.get('/api/checkin/33333333').status_code
+            db.session.execute(db.delete(Registration).where(
+                Registration.visitor_id != visitor.id))
+            mark_data_changed(db.session)
+            db.session.commit()
+
+        assert found == 200
+        assert self.client.get('/api/checkin/11111111').status_code == 404
+
+    def test_post_should_record_check_in_once(self):
+        """El ingreso se registra una vez; repetirlo responde 409"""
+        self._register('11111111', '10:00')
+        self._register('11111111', '11:00')
+
+        first = self.client.post('/api/checkin/11111111',
+                                 json={'schedule': '10:00'})
+        second = self.client.post('/api/checkin/11111111',
+                                  json={'schedule': '10:00'})
+        status = self.client.get('/api/checkin/11111111').get_json()
+
+        assert first.status_code == 200
+        bookings = first.get_json()['bookings']
+        assert [b['schedule'] for b in bookings] == ['10:00']
+        assert second.status_code == 409
+        assert second.get_json()['code'] == 'already_checked_in'
+        assert status['bookings'][0]['checked_in_at'] is not None
+        assert status['bookings'][1]['checked_in_at'] is None
+
+    def test_cancellation_should_leave_index_and_check_ins(self):
+        """Cancelar saca la reserva del índice y borra su ingreso"""
+        self._register('11111111')
+        self.client.post('/api/checkin/11111111')
+        registration_id = self.client.get('/api/checkin/11111111').get_json()[
+            'bookings'][0]['registration_id']
+
+        self.client.delete(f'/api/registrations/{registration_id}')
+
+        assert self.client.get('/api/checkin/11111111').status_code == 404
+        with self.app.app_context():
+            assert CheckIn.query.count() == 0
+
+    def test_should_reject_invalid_dni(self):
+        """El DNI debe ser numérico"""
+        response = self.client.get('/api/checkin/abc')
+
+        assert response.status_code == 400
+        assert response.get_json()['code'] == 'invalid_dni'
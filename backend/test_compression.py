@@ -0,0 +1,112 @@
+import sys
+import os
+import gzip
+
+# Agregar el directorio padre al path para importar los modelos
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app import (
+    Activity, Registration, Visitor, create_app, db, generate_time_slots
+)
+from compression import COMPRESSED_RESPONSES, negotiate
+from sql_instrumentation import count_queries
+
+
+class TestNegotiation:
+    """Tests de la negociación de Accept-Encoding"""
+
+    def test_should_pick_by_quality_and_preference(self):
+        """Se elige la codificación aceptada con mayor calidad"""
+        assert negotiate('gzip, deflate', ('br', 'gzip')) == 'gzip'
+        assert negotiate('gzip;q=0.5, br', ('br', 'gzip')) == 'br'
+        assert negotiate('br;q=0.2, gzip;q=0.8', ('br', 'gzip')) == 'gzip'
+        assert negotiate('*', ('br', 'gzip')) == 'br'
+
+    def test_should_reject_identity_only_or_zero_quality(self):
+        """Sin codificaciones aceptables no se comprime"""
+        assert negotiate('', ('gzip',)) is None
+        assert negotiate('identity', ('gzip',)) is None
+        assert negotiate('gzip;q=0', ('gzip',)) is None
+        assert negotiate('*;q=0', ('gzip',)) is None
+
+
+class TestCatalogCompression:
+    """Tests de la compresión y la caché del catálogo"""
+
+    def setup_method(self):
+        """Configuración antes de cada test"""
+        self.app = create_app('testing')
+        self.client = self.app.test_client()
+        with self.app.app_context():
+            db.create_all()
+            for name in ('Tirolesa', 'Safari', 'Palestra', 'Jardinería'):
+                db.session.add(Activity(name, 10, generate_time_slots()))
+            db.session.commit()
+
+    def test_large_catalog_should_be_gzipped(self):
+        """El catálogo se comprime si el cliente acepta gzip"""
+        plain = self.client.get('/api/activities')
+        compressed = self.client.get('/api/activities',
+                                     headers={'Accept-Encoding': 'gzip'})
+
+        assert 'Content-Encoding' not in plain.headers
+        assert compressed.headers['Content-Encoding'] == 'gzip'
+        assert 'Accept-Encoding' in compressed.headers['Vary']
+        assert gzip.decompress(compressed.get_data()) == plain.get_data()
+        etag = plain.headers['ETag']
+        assert compressed.headers['ETag'] == etag[:-1] + '-gzip"'
+
+    def test_small_responses_should_not_be_compressed(self):
+        """Por debajo del umbral la respuesta va sin comprimir"""
+        response = self.client.get('/api/visitors',
+                                   headers={'Accept-Encoding': 'gzip'})
+
+        assert 'Content-Encoding' not in response.headers
+
+    def test_compressed_body_should_be_reused_until_data_changes(self):
+        """Se comprime una vez por versión del catálogo"""
+        headers = {'Accept-Encoding': 'gzip'}
+        hits = COMPRESSED_RESPONSES.value('gzip', 'hit')
+        misses = COMPRESSED_RESPONSES.value('gzip', 'miss')
+
+        first = self.client.get('/api/activities', headers=headers)
+        with count_queries() as stats:
+            second = self.client.get('/api/activities', headers=headers)
+        with self.app.app_context():
+            visitor = Visitor('Ana', '12345678', 30)
+            db.session.add(visitor)
+            db.session.flush()
+            db.session.add(Registration(activity_id=1, visitor_id=visitor.id,
+                                        schedule='10:00'))
+            db.session.commit()
+        third = self.client.get('/api/activities', headers=headers)
+
+        assert second.get_data() == first.get_data()
+        assert stats.count == 1  # solo la lectura de la versión
+        assert COMPRESSED_RESPONSES.value('gzip', 'hit') == hits + 1
+        assert COMPRESSED_RESPONSES.value('gzip', 'miss') == misses + 2
+        assert third.headers['ETag'] != first.headers['ETag']
+        catalog = gzip.decompress(third.get_data())
+        assert b'"registered_count":1' in catalog
+
+    def test_matching_etag_should_return_not_modified(self):
+        """Con If-None-Match vigente (cualquier variante) se responde 304"""
+        plain = self.client.get('/api/activities')
+        compressed = self.client.get('/api/activities',
+                                     headers={'Accept-Encoding': 'gzip'})
+
+        for etag in (plain.headers['ETag'], compressed.headers['ETag']):
+            response = self.client.get('/api/activities', headers={
+                'If-None-Match': etag, 'Accept-Encoding': 'gzip'})
+            assert response.status_code == 304
+            assert response.get_data() == b''
+
+    def test_disabled_compression_should_send_plain_json(self):
+        """COMPRESSION_ENABLED=False desactiva la compresión"""
+        self.app.config['COMPRESSION_ENABLED'] = False
+
+        response = self.client.get('/api/activities',
+                                   headers={'Accept-Encoding': 'gzip'})
+
+        assert 'Content-Encoding' not in response.headers
+        assert response.get_json()[0]['name'] == 'Tirolesa'
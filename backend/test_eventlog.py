@@ -0,0 +1,249 @@
+import sys
+import os
+import json
+import uuid
+
+import pytest
+from sqlalchemy import update
+
+# Agregar el directorio padre al path para importar los modelos
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import occupancy
+from app import Activity, Registration, SlotOverride, create_app, db
+from eventlog import (
+    ACTIVITY_CREATED, ACTIVITY_UPDATED, CANCELLED, INDEX_INTERVAL, REGISTERED,
+    EventLog, main
+)
+
+
+def _registered(activity_id, schedule, *ids):
+    return (0.0, REGISTERED, activity_id, schedule, len(ids), ids, None)
+
+
+class TestEventLog:
+    """Tests del formato del log, los segmentos y las instantáneas"""
+
+    def test_append_and_read(self, tmp_path):
+        """Los eventos vuelven en orden con sus ids y datos"""
+        log = EventLog(str(tmp_path))
+        assert log.append([
+            _registered(1, '10:00', (5, 50), (6, 60)),
+            (0.0, ACTIVITY_UPDATED, 1, '', 0, (), {'capacity': 9}),
+        ]) == 2
+        events = list(log.read())
+        assert [event.seq for event in events] == [1, 2]
+        assert events[0].schedule == '10:00'
+        assert events[0].ids == [(5, 50), (6, 60)]
+        assert events[1].data == {'capacity': 9}
+        assert [event.seq for event in log.read(after_seq=1)] == [2]
+
+    def test_checkpoint_should_include_other_processes(self, tmp_path):
+        """La instantánea externa toma el seq actual del log, no uno viejo"""
+        log = EventLog(str(tmp_path))
+        log.append([_registered(1, '10:00', (1, 1))])
+        EventLog(str(tmp_path)).append([_registered(1, '10:00', (2, 2))])
+        assert log.checkpoint(lambda: {(1, '10:00'): 7}) == 2
+        state, seq, replayed = log.rebuild()
+        assert (state.counts, seq, replayed) == ({(1, '10:00'): 7}, 2, 0)
+
+    def test_should_roll_segments_and_seek_with_index(self, tmp_path):
+        """Segmentos chicos: la lectura desde un seq salta por el índice"""
+        log = EventLog(str(tmp_path), segment_bytes=2048)
+        for index in range(500):
+            log.append([_registered(index % 7 + 1, '10:00', (index, index))])
+        assert len(log.segments()) > 3
+        seqs = [event.seq for event in log.read(after_seq=300)]
+        assert seqs[:2] == [301, 302]
+        assert len(list(log.read(activity_id=1))) == 72
+        # Un segundo proceso continúa la secuencia
+        other = EventLog(str(tmp_path))
+        assert other.append([_registered(1, '10:00', (1, 1))]) == 501
+        assert log.append([_registered(1, '10:00', (2, 2))]) == 502
+
+    def test_should_discard_torn_tail(self, tmp_path):
+        """Una trama a medio escribir se descarta al abrir el log"""
+        log = EventLog(str(tmp_path))
+        log.append([_registered(1, '10:00', (1, 1))
+                    for _ in range(INDEX_INTERVAL + 3)])
+        path = os.path.join(str(tmp_path), f'{log.segments()[-1]:020d}.log')
+        with open(path, 'ab') as handle:
+            handle.write(b'\x30\x00\x00\x00garbage')
+        reopened = EventLog(str(tmp_path))
+        assert reopened.last_seq == INDEX_INTERVAL + 3
+        last = reopened.append([_registered(1, '10:00', (2, 2))])
+        assert last == INDEX_INTERVAL + 4
+        assert len(list(reopened.read())) == INDEX_INTERVAL + 4
+
+    def test_rebuild_should_use_snapshot_and_tail(self, tmp_path):
+        """La ocupación es la instantánea más los eventos posteriores"""
+        log = EventLog(str(tmp_path), keep_snapshots=2)
+        log.append([_registered(1, '10:00', (1, 1), (2, 2)),
+                    _registered(2, '11:00', (3, 3))])
+        assert log.snapshot() == 2
+        log.append([(0.0, CANCELLED, 1, '10:00', 1, [(1, 1)], None)])
+        state, seq, replayed = log.rebuild()
+        assert state.counts == {(1, '10:00'): 1, (2, '11:00'): 1}
+        assert (seq, replayed) == (3, 1)
+        log.snapshot()
+        log.snapshot(state, 3)
+        snapshots = [name for name in os.listdir(str(tmp_path))
+                     if name.endswith('.snap')]
+        assert len(snapshots) <= 2
+
+    def test_should_skip_corrupt_snapshot(self, tmp_path):
+        """Una instantánea dañada se ignora y se reaplica el log entero"""
+        log = EventLog(str(tmp_path))
+        log.append([_registered(1, '10:00', (1, 1))])
+        log.snapshot()
+        snapshot = [name for name in os.listdir(str(tmp_path))
+                    if name.endswith('.snap')][0]
+        with open(os.path.join(str(tmp_path), snapshot), 'r+b') as handle:
+            handle.seek(30)
+            handle.write(b'\xff')
+        state, _, replayed = log.rebuild()
+        assert state.counts == {(1, '10:00'): 1} and replayed == 1
+
+    def test_audit_cli_should_print_json_lines(self, tmp_path, capsys):
+        """La herramienta de auditoría lista los eventos filtrados"""
+        EventLog(str(tmp_path)).append([_registered(1, '10:00', (1, 1)),
+                                        _registered(2, '10:00', (2, 2))])
+        assert main([str(tmp_path), '--activity', '2']) == 0
+        out = capsys.readouterr().out
+        lines = [json.loads(line) for line in out.splitlines()]
+        assert [(line['seq'], line['kind']) for line in lines] == [
+            (2, 'registered')]
+
+
+class TestEventLogIntegration:
+    """Tests del log de eventos con la aplicación"""
+
+    @pytest.fixture(autouse=True)
+    def _paths(self, tmp_path):
+        self.database = f'sqlite:///{tmp_path / "events.db"}'
+        self.directory = str(tmp_path / 'eventlog')
+        self.apps = []
+        yield
+        for app in self.apps:
+            app.extensions['shared_occupancy'].close(unlink=True)
+
+    def _app(self, **overrides):
+        app = create_app('testing', dict({
+            'SQLALCHEMY_DATABASE_URI': self.database,
+            'SHARED_OCCUPANCY': True,
+            'SHARED_OCCUPANCY_NAME': f'ecoharmony_test_{uuid.uuid4().hex[:8]}',
+            'SHARED_OCCUPANCY_MAX_ACTIVITIES': 16,
+            'EVENT_LOG': True,
+            'EVENT_LOG_DIR': self.directory,
+            'JOBS_WORKERS': 0,
+        }, **overrides))
+        self.apps.append(app)
+        return app
+
+    def _register(self, client, activity_id, *dnis, schedule='10:00'):
+        return client.post(f'/api/activities/{activity_id}/register', json={
+            'participants': [{'name': 'Ana', 'dni': dni, 'age': 30}
+                             for dni in dnis],
+            'terms_accepted': True,
+            'schedule': schedule,
+            'current_time': '08:00',
+        })
+
+    def _seed(self, app):
+        with app.app_context():
+            activity = Activity('Safari', 8, ['10:00', '11:00'])
+            db.session.add(activity)
+            db.session.commit()
+            db.session.add(SlotOverride(
+                activity_id=activity.id, schedule='11:00', capacity=2))
+            db.session.commit()
+            return activity.id
+
+    def test_should_log_committed_changes_only(self):
+        """Registros, cancelaciones y cambios de catálogo; un rechazo no"""
+        app = self._app()
+        activity_id = self._seed(app)
+        client = app.test_client()
+        response = self._register(client, activity_id, '11111111', '22222222')
+        assert response.status_code == 200
+        response = self._register(client, activity_id, '11111111')
+        assert response.status_code == 400
+        with app.app_context():
+            registration_id = db.session.query(Registration.id).first()[0]
+        client.delete(f'/api/registrations/{registration_id}')
+
+        events = list(app.extensions['event_log'].read())
+        assert [event.kind for event in events] == [
+            ACTIVITY_CREATED, ACTIVITY_UPDATED, REGISTERED, CANCELLED]
+        assert events[0].data['name'] == 'Safari'
+        assert events[1].data == {'slot_override': 2}
+        assert (events[2].delta, len(events[2].ids)) == (2, 2)
+        assert events[3].ids[0][0] == registration_id
+
+    def test_startup_should_rebuild_from_log(self, monkeypatch):
+        """Al arrancar la ocupación sale del log sin la consulta agrupada"""
+        app = self._app()
+        activity_id = self._seed(app)
+        client = app.test_client()
+        self._register(client, activity_id, '11111111', '22222222')
+        self._register(client, activity_id, '33333333', schedule='11:00')
+        app.extensions['event_log'].snapshot()
+        self._register(client, activity_id, '44444444', schedule='11:00')
+
+        def fail(*args):
+            raise AssertionError('no debería recorrer Registration')
+        monkeypatch.setattr(occupancy, 'count_registrations', fail)
+        restarted = self._app()
+        shared = restarted.extensions['shared_occupancy']
+        assert shared.get(activity_id, '10:00') == 2
+        assert shared.get(activity_id, '11:00') == 2
+
+    def test_startup_should_fall_back_when_log_is_behind(self, monkeypatch):
+        """Un log que no coincide con la base se reemplaza por instantánea"""
+        app = self._app(EVENT_LOG=False)
+        activity_id = self._seed(app)
+        self._register(app.test_client(), activity_id, '11111111', '22222222')
+
+        shared = self._app().extensions['shared_occupancy']
+        assert shared.get(activity_id, '10:00') == 2
+        # La instantánea de arranque alcanza para el siguiente
+        monkeypatch.setattr(occupancy, 'count_registrations', None)
+        shared = self._app().extensions['shared_occupancy']
+        assert shared.get(activity_id, '10:00') == 2
+
+    def test_startup_should_detect_offsetting_errors(self):
+        """Mismo total pero repartido en otras actividades: se recalcula"""
+        app = self._app()
+        first = self._seed(app)
+        second = self._seed(app)
+        client = app.test_client()
+        self._register(client, first, '11111111')
+        self._register(client, second, '22222222')
+        with app.app_context():
+            # Cambio fuera del log: el total de registros no cambia
+            db.session.execute(update(Registration).values(activity_id=first))
+            db.session.commit()
+
+        shared = self._app().extensions['shared_occupancy']
+        assert shared.get(first, '10:00') == 2
+        assert shared.get(second, '10:00') == 0
+
+    def test_reconciler_should_verify_log_per_slot(self):
+        """El reconciliador corrige errores entre turnos de una actividad"""
+        app = self._app()
+        activity_id = self._seed(app)
+        client = app.test_client()
+        self._register(client, activity_id, '11111111')
+        self._register(client, activity_id, '22222222', schedule='11:00')
+        with app.app_context():
+            # Mismo total por actividad, otro turno
+            db.session.execute(update(Registration).values(schedule='10:00'))
+            db.session.commit()
+
+        restarted = self._app()
+        shared = restarted.extensions['shared_occupancy']
+        assert shared.get(activity_id, '10:00') == 1
+        assert shared.reconciled_at == 0
+        assert restarted.extensions['occupancy_reconciler'].run_once()
+        assert shared.get(activity_id, '10:00') == 2
+        assert shared.get(activity_id, '11:00') == 0
@@ -0,0 +1,260 @@
+import sys
+import os
+import json
+import shutil
+import tempfile
+import time
+from datetime import timedelta
+
+# Agregar el directorio padre al path para importar los modelos
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app import Activity, OutboxJob, create_app, db
+from jobs import (
+    HANDLERS, JOBS_PROCESSED, SMTPSink, enqueue, job_handler, utcnow
+)
+
+_failures = {'remaining': 0}
+
+
+@job_handler('test.flaky')
+def _flaky(payload, sink):
+    if _failures['remaining'] > 0:
+        _failures['remaining'] -= 1
+        raise RuntimeError('falla transitoria')
+    sink.deliver('test', payload)
+
+
+_seen = []
+
+
+@job_handler('test.ordered')
+def _ordered(payload, sink):
+    # Estado de los trabajos del lote al ejecutar cada uno
+    statuses = db.session.query(OutboxJob.status)
+    _seen.append(sorted(status for status, in statuses))
+
+
+@job_handler('test.stolen')
+def _stolen(payload, sink):
+    # Como si el lease venciera y otro worker lo reclamara mientras corre
+    db.session.query(OutboxJob).update({'claimed_by': 'otro-worker'})
+
+
+class TestJobQueue:
+    """Tests de la outbox transaccional y el pool de trabajos"""
+
+    def setup_method(self):
+        """Configuración antes de cada test"""
+        self.tmpdir = tempfile.mkdtemp(prefix='ecoharmony-jobs-')
+        self.sink_path = os.path.join(self.tmpdir, 'outbox.jsonl')
+        self.app = create_app('testing', {
+            'JOBS_WORKERS': 0,
+            'JOBS_SINK_PATH': self.sink_path,
+            'JOBS_BACKOFF_SECONDS': 0,
+            'JOBS_MAX_ATTEMPTS': 3,
+        })
+        self.queue = self.app.extensions['job_queue']
+        self.client = self.app.test_client()
+        with self.app.app_context():
+            db.create_all()
+            activity = Activity('Safari', 1, ['10:00', '11:00'])
+            db.session.add(activity)
+            db.session.commit()
+            self.activity_id = activity.id
+
+    def teardown_method(self):
+        """Limpieza después de cada test"""
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+
+    def _register(self, dni, schedule='10:00'):
+        return self.client.post(
+            f'/api/activities/{self.activity_id}/register', json={
+                'participants': [{'name': 'Ana', 'dni': dni, 'age': 30}],
+                'terms_accepted': True,
+                'schedule': schedule,
+                'current_time': '08:00',
+            })
+
+    def _jobs(self):
+        with self.app.app_context():
+            jobs = db.session.query(OutboxJob).order_by(OutboxJob.id)
+            return [(job.kind, job.status, job.attempts) for job in jobs]
+
+    def _delivered(self):
+        with open(self.sink_path, encoding='utf-8') as handle:
+            return [json.loads(line) for line in handle]
+
+    def _enqueue(self, kind, payload=None):
+        with self.app.app_context():
+            enqueue(db.session, kind, payload or {})
+            db.session.commit()
+
+    def test_registration_should_enqueue_jobs_in_same_commit(self):
+        """El registro confirma sus trabajos; uno rechazado no deja ninguno"""
+        assert self._register('11111111').status_code == 200
+        assert self._register('22222222').get_json()['code'] == 'no_capacity'
+        assert self._jobs() == [
+            ('registration.confirmation', 'pending', 0),
+            ('roster.refresh', 'pending', 0),
+            ('registration.audit', 'pending', 0),
+        ]
+
+    def test_drain_should_deliver_messages_to_sink(self):
+        """Confirmación, lista y auditoría llegan al sink, DNI enmascarado"""
+        self._register('11111111')
+        assert self.queue.drain() == 3
+        delivered = {message['channel']: message
+                     for message in self._delivered()}
+        confirmation = delivered['confirmation']
+        assert confirmation['activity'] == 'Safari'
+        assert confirmation['participants'][0]['dni'] == '******11'
+        assert delivered['roster']['registered'] == 1
+        assert delivered['audit']['dnis'] == ['******11']
+        assert {status for _, status, _ in self._jobs()} == {'done'}
+        assert self.queue.drain() == 0
+
+    def test_should_retry_with_backoff_until_success(self):
+        """Un fallo transitorio se reintenta y termina en done"""
+        _failures['remaining'] = 2
+        before = JOBS_PROCESSED.value('test.flaky', 'retry')
+        self._enqueue('test.flaky', {'n': 1})
+        self.queue.drain()
+        assert self._jobs() == [('test.flaky', 'done', 3)]
+        assert JOBS_PROCESSED.value('test.flaky', 'retry') - before == 2
+
+    def test_should_fail_after_max_attempts(self):
+        """Agotados los intentos el trabajo queda failed con el último error"""
+        _failures['remaining'] = 10
+        self._enqueue('test.flaky')
+        self.queue.drain()
+        assert self._jobs() == [('test.flaky', 'failed', 3)]
+        with self.app.app_context():
+            job = db.session.query(OutboxJob).one()
+            assert 'falla transitoria' in job.last_error
+        _failures['remaining'] = 0
+
+    def test_unknown_kind_should_fail_without_retry(self):
+        """Un tipo sin handler no se reintenta"""
+        self._enqueue('test.unknown')
+        self.queue.drain()
+        assert self._jobs() == [('test.unknown', 'failed', 1)]
+
+    def test_backoff_should_wait_before_retry(self):
+        """Con backoff el trabajo fallido no se vuelve a reclamar enseguida"""
+        self.queue.backoff_base = 60
+        assert 30 <= self.queue.backoff(1) <= 60
+        assert self.queue.backoff(20) <= self.queue.backoff_max
+        _failures['remaining'] = 1
+        self._enqueue('test.flaky')
+        assert self.queue.drain() == 1
+        assert self._jobs() == [('test.flaky', 'pending', 1)]
+        _failures['remaining'] = 0
+
+    def test_should_reclaim_jobs_with_expired_lease(self):
+        """Un trabajo running de un proceso caído se vuelve a ejecutar"""
+        self._enqueue('test.flaky')
+        with self.app.app_context():
+            job = db.session.query(OutboxJob).one()
+            job.status, job.claimed_by = 'running', 'otro-proceso'
+            job.locked_until = utcnow() - timedelta(seconds=1)
+            db.session.commit()
+        assert self.queue.drain() == 1
+        assert self._jobs()[0][1] == 'done'
+
+    def test_should_write_each_result_before_next_job(self):
+        """El resultado se confirma apenas termina cada trabajo del lote"""
+        _seen.clear()
+        self._enqueue('test.ordered')
+        self._enqueue('test.ordered')
+        assert self.queue.run_pending() == 2
+        assert _seen == [['running', 'running'], ['done', 'running']]
+
+    def test_should_not_overwrite_job_reclaimed_by_other_worker(self):
+        """Con el lease vencido y reclamado, el resultado viejo se descarta"""
+        self._enqueue('test.stolen')
+        assert self.queue.run_pending() == 1
+        with self.app.app_context():
+            job = db.session.query(OutboxJob).one()
+            assert (job.status, job.claimed_by) == ('running', 'otro-worker')
+
+    def test_lease_should_be_configurable(self):
+        """JOBS_LEASE_SECONDS llega al pool"""
+        app = create_app(
+            'testing', {'JOBS_WORKERS': 0, 'JOBS_LEASE_SECONDS': 300})
+        assert app.extensions['job_queue'].lease == 300
+
+    def test_purge_should_remove_old_done_jobs(self):
+        """Los trabajos terminados se borran pasada la retención"""
+        self._register('11111111')
+        self.queue.drain()
+        self.queue.retention = 3600
+        assert self.queue.purge() == 0
+        self.queue.retention = -1
+        assert self.queue.purge() == 3
+        assert self._jobs() == []
+
+    def test_smtp_sink_should_send_message(self, monkeypatch):
+        """El sink SMTP envía un correo por mensaje"""
+        sent = []
+
+        class FakeSMTP:
+            def __init__(self, host, port, timeout):
+                sent.append((host, port))
+
+            def __enter__(self):
+                return self
+
+            def __exit__(self, *exc):
+                return False
+
+            def send_message(self, message):
+                sent.append(message)
+
+        monkeypatch.setattr('jobs.smtplib.SMTP', FakeSMTP)
+        sink = SMTPSink('localhost', 1025, 'a@x', 'b@x')
+        sink.deliver('confirmation', {'subject': 'Hola'})
+        assert sent[0] == ('localhost', 1025)
+        assert sent[1]['Subject'] == 'Hola'
+
+    def test_registered_handlers(self):
+        """Los trabajos de registro tienen handler"""
+        for kind in ('registration.confirmation', 'roster.refresh',
+                     'registration.audit'):
+            assert kind in HANDLERS
+
+
+class TestJobWorkers:
+    """Tests del pool de hilos sobre una base en archivo"""
+
+    def test_workers_should_drain_after_commit(self, tmp_path):
+        """Los hilos despiertan con el commit y vacían la outbox"""
+        app = create_app('testing', {
+            'SQLALCHEMY_DATABASE_URI': f'sqlite:///{tmp_path / "jobs.db"}',
+            'JOBS_WORKERS': 2,
+            'JOBS_POLL_SECONDS': 5,
+            'JOBS_SINK_PATH': str(tmp_path / 'outbox.jsonl'),
+        })
+        queue = app.extensions['job_queue']
+        with app.app_context():
+            db.create_all()
+        queue.start()
+        try:
+            with app.app_context():
+                for index in range(5):
+                    enqueue(db.session, 'test.flaky', {'n': index})
+                db.session.commit()
+            deadline = time.monotonic() + 5
+            while time.monotonic() < deadline:
+                with app.app_context():
+                    done = db.session.query(OutboxJob).filter_by(
+                        status='done').count()
+                    if done == 5:
+                        break
+                time.sleep(0.05)
+        finally:
+            queue.stop()
+        sink = tmp_path / 'outbox.jsonl'
+        lines = sink.read_text(encoding='utf-8').splitlines()
+        numbers = sorted(json.loads(line)['n'] for line in lines)
+        assert numbers == [0, 1, 2, 3, 4]
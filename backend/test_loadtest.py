@@ -0,0 +1,62 @@
+import sqlite3
+import sys
+import os
+
+import pytest
+
+# Agregar el directorio padre al path para importar los modelos
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from loadtest import build_report, check_oversell, parse_mix
+
+
+class TestLoadTestReport:
+    """Tests del informe del generador de carga"""
+
+    def test_report_should_aggregate_latency_and_error_mix(self):
+        """El informe agrupa latencias por operación y errores por código"""
+        samples = [
+            ('catalog', 0.010, 200, None),
+            ('catalog', 0.020, 200, None),
+            ('register', 0.030, 200, None),
+            ('full', 0.005, 400, 'no_capacity'),
+            ('duplicate', 0.004, 400, 'duplicate_dni'),
+        ]
+
+        report = build_report(samples, elapsed=0.5)
+
+        assert report['requests'] == 5
+        assert report['throughput_rps'] == 10.0
+        assert report['latency']['catalog']['p95_ms'] == 20.0
+        assert report['errors'] == {
+            'full:no_capacity': 1, 'duplicate:duplicate_dni': 1
+        }
+        assert report['statuses'] == {200: 3, 400: 2}
+
+    def test_should_detect_oversold_slots(self, tmp_path):
+        """Se detectan turnos por encima del cupo efectivo por turno"""
+        database = str(tmp_path / 'load.db')
+        with sqlite3.connect(database) as connection:
+            connection.execute('CREATE TABLE activity (id, name, capacity)')
+            connection.execute(
+                'CREATE TABLE registration (activity_id, schedule)')
+            connection.execute(
+                'CREATE TABLE slot_override (activity_id, schedule, capacity)')
+            connection.execute("INSERT INTO activity VALUES (1, 'Safari', 20)")
+            connection.execute(
+                "INSERT INTO slot_override VALUES (1, '11:00', 5)")
+            connection.executemany(
+                'INSERT INTO registration VALUES (1, ?)',
+                [('10:00',)] * 9 + [('10:30',)] * 8 + [('11:00',)] * 6
+            )
+
+        oversold = check_oversell(database)
+
+        assert [(slot['schedule'], slot['registered']) for slot in oversold] \
+            == [('10:00', 9), ('11:00', 6)]
+
+    def test_parse_mix_should_reject_unknown_operations(self):
+        """La mezcla solo admite operaciones conocidas"""
+        assert parse_mix('catalog=1,full=2') == {'catalog': 1.0, 'full': 2.0}
+        with pytest.raises(ValueError):
+            parse_mix('delete=1')
@@ -0,0 +1,90 @@
+import json
+import logging
+import sys
+import os
+
+# Agregar el directorio padre al path para importar los modelos
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app import app
+from logging_config import (
+    JsonFormatter, NonBlockingQueueHandler, SamplingFilter,
+    REQUEST_ID_HEADER, mask_dni, redact, request_id_var, sampled_var,
+)
+
+
+def make_record(msg, *args, level=logging.DEBUG, fields=None):
+    record = logging.LogRecord(
+        'ecoharmony.service', level, __file__, 1, msg, args, None
+    )
+    if fields is not None:
+        record.fields = fields
+    return record
+
+
+class TestStructuredLogging:
+    """Tests del logging estructurado"""
+
+    def test_should_mask_dni_keeping_last_digits(self):
+        """Los DNIs se enmascaran conservando los dos últimos dígitos"""
+        assert mask_dni('12345678') == '******78'
+        assert redact({'dni': '12345678', 'name': 'Ana'}) == {
+            'dni': '******78', 'name': 'Ana'
+        }
+
+    def test_formatter_should_redact_dnis_in_message_and_fields(self):
+        """El formateador emite JSON sin DNIs en claro"""
+        record = make_record(
+            'DNI %s duplicado', '12345678', fields={'dnis': ['87654321']}
+        )
+        record.request_id = 'abc'
+
+        payload = json.loads(JsonFormatter().format(record))
+
+        assert payload['msg'] == 'DNI ******78 duplicado'
+        assert payload['dnis'] == ['******21']
+        assert payload['request_id'] == 'abc'
+        assert payload['level'] == 'DEBUG'
+
+    def test_handler_should_not_format_in_request_thread(self):
+        """El handler encola el registro sin interpolar sus argumentos"""
+        import queue
+
+        log_queue = queue.Queue(maxsize=1)
+        handler = NonBlockingQueueHandler(log_queue)
+        token = request_id_var.set('req-1')
+        try:
+            handler.handle(make_record('hola %s', 'mundo'))
+            handler.handle(make_record('descartado'))
+        finally:
+            request_id_var.reset(token)
+
+        queued = log_queue.get_nowait()
+        assert queued.args == ('mundo',)
+        assert queued.request_id == 'req-1'
+        assert handler.dropped == 1
+
+    def test_sampling_should_keep_warnings_of_unsampled_requests(self):
+        """Las peticiones no muestreadas solo emiten WARNING o superior"""
+        sampling = SamplingFilter()
+        token = sampled_var.set(False)
+        try:
+            assert not sampling.filter(make_record('debug'))
+            assert sampling.filter(make_record('warn', level=logging.WARNING))
+        finally:
+            sampled_var.reset(token)
+
+    def test_response_should_carry_correlation_id(self):
+        """La respuesta propaga el id de correlación recibido o generado"""
+        client = app.test_client()
+        with app.app_context():
+            from app import db
+            db.create_all()
+
+        response = client.get(
+            '/api/visitors', headers={REQUEST_ID_HEADER: 'kiosco-7'}
+        )
+        assert response.headers[REQUEST_ID_HEADER] == 'kiosco-7'
+
+        generated = client.get('/api/visitors').headers[REQUEST_ID_HEADER]
+        assert len(generated) == 32
@@ -0,0 +1,127 @@
+import json
+import sys
+import os
+import threading
+
+# Agregar el directorio padre al path para importar los modelos
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app import Activity, db, app
+from metrics import (
+    Histogram, Registry, REGISTRATION_OUTCOMES, REQUEST_LATENCY,
+    REQUESTS_IN_FLIGHT, REQUESTS_TOTAL,
+)
+
+
+class TestMetricPrimitives:
+    """Tests de las primitivas de métricas"""
+
+    def test_histogram_should_render_cumulative_buckets(self):
+        """El histograma expone buckets acumulados, suma y total"""
+        histogram = Histogram('latency', 'Latencia', ('endpoint',),
+                              buckets=(0.1, 1.0))
+        histogram.observe('a', value=0.05)
+        histogram.observe('a', value=0.5)
+        histogram.observe('a', value=5)
+
+        lines = histogram.render()
+
+        assert 'latency_bucket{endpoint="a",le="0.1"} 1' in lines
+        assert 'latency_bucket{endpoint="a",le="1"} 2' in lines
+        assert 'latency_bucket{endpoint="a",le="+Inf"} 3' in lines
+        assert 'latency_count{endpoint="a"} 3' in lines
+
+    def test_counter_should_be_thread_safe(self):
+        """Incrementos concurrentes no pierden actualizaciones"""
+        counter = Registry().counter('hits_total', 'Aciertos', ('k',))
+
+        def work():
+            for _ in range(1000):
+                counter.inc('x')
+
+        threads = [threading.Thread(target=work) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert counter.value('x') == 8000
+
+
+class TestMetricsEndpoint:
+    """Tests de la instrumentación HTTP y del endpoint /metrics"""
+
+    def setup_method(self):
+        """Configuración antes de cada test"""
+        self.app = app
+        self.app.config['TESTING'] = True
+        self.client = self.app.test_client()
+
+        with self.app.app_context():
+            db.create_all()
+            activity = Activity(
+                name="Safari",
+                capacity=1,
+                schedules=["15:00"],
+                requirements={},
+                requires_clothing=False
+            )
+            db.session.add(activity)
+            db.session.commit()
+            self.activity_id = activity.id
+
+    def teardown_method(self):
+        """Limpieza después de cada test"""
+        with self.app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def register(self, dni):
+        return self.client.post(
+            f'/api/activities/{self.activity_id}/register',
+            data=json.dumps({
+                'participants': [{'name': 'Ana', 'dni': dni, 'age': 30}],
+                'terms_accepted': True,
+                'schedule': '15:00',
+                'current_time': '08:30'
+            }),
+            content_type='application/json'
+        )
+
+    def test_should_record_latency_and_status_per_endpoint(self):
+        """Cada petición queda registrada con su endpoint y código"""
+        before = REQUEST_LATENCY.count('get_activities', 'GET')
+        ok_before = REQUESTS_TOTAL.value('get_activities', 'GET', 200)
+
+        self.client.get('/api/activities')
+
+        assert REQUEST_LATENCY.count('get_activities', 'GET') == before + 1
+        assert REQUESTS_TOTAL.value(
+            'get_activities', 'GET', 200) == ok_before + 1
+        assert REQUESTS_IN_FLIGHT.value('get_activities') == 0
+
+    def test_should_count_registration_outcomes_by_error_type(self):
+        """Los registros se cuentan por resultado (éxito, sin cupos...)"""
+        success = REGISTRATION_OUTCOMES.value('success')
+        no_capacity = REGISTRATION_OUTCOMES.value('no_capacity')
+
+        assert self.register('12345678').status_code == 200
+        response = self.register('87654321')
+
+        assert response.status_code == 400
+        assert response.get_json()['code'] == 'no_capacity'
+        assert REGISTRATION_OUTCOMES.value('success') == success + 1
+        assert REGISTRATION_OUTCOMES.value('no_capacity') == no_capacity + 1
+
+    def test_metrics_endpoint_should_expose_prometheus_text(self):
+        """/metrics devuelve el formato de texto de Prometheus"""
+        self.client.get('/api/visitors')
+
+        response = self.client.get('/metrics')
+        body = response.get_data(as_text=True)
+
+        assert response.status_code == 200
+        assert response.content_type.startswith('text/plain; version=0.0.4')
+        assert '# TYPE http_request_duration_seconds histogram' in body
+        assert 'http_requests_total{endpoint="get_visitors",' in body
+        assert '# TYPE registration_outcomes_total counter' in body
@@ -0,0 +1,158 @@
+import sys
+import os
+import multiprocessing
+import uuid
+
+import pytest
+
+# Agregar el directorio padre al path para importar los modelos
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app import (
+    Activity, Registration, Visitor, create_app, db, generate_time_slots
+)
+from occupancy import SharedOccupancy, reconcile, stage
+from sql_instrumentation import count_queries
+
+
+def _increment_in_child(name, slots):
+    occupancy = SharedOccupancy(name, slots, max_activities=16)
+    occupancy.add(1, '10:00', 3)
+    occupancy.close()
+
+
+class TestSharedOccupancy:
+    """Tests de la ocupación compartida entre workers"""
+
+    def setup_method(self):
+        """Configuración antes de cada test"""
+        self.app = create_app('testing', {
+            'SHARED_OCCUPANCY': True,
+            'SHARED_OCCUPANCY_NAME': f'ecoharmony_test_{uuid.uuid4().hex[:8]}',
+            'SHARED_OCCUPANCY_MAX_ACTIVITIES': 16,
+        })
+        self.occupancy = self.app.extensions['shared_occupancy']
+        self.client = self.app.test_client()
+        with self.app.app_context():
+            activity = Activity('Safari', 8, ['10:00', '11:00'])
+            db.session.add(activity)
+            db.session.commit()
+            self.activity_id = activity.id
+
+    def teardown_method(self):
+        """Limpieza después de cada test"""
+        self.occupancy.close(unlink=True)
+
+    def _register(self, dni, schedule='10:00'):
+        return self.client.post(
+            f'/api/activities/{self.activity_id}/register',
+            json={
+                'participants': [{'name': 'Ana', 'dni': dni, 'age': 30}],
+                'terms_accepted': True,
+                'schedule': schedule,
+                'current_time': '08:00',
+            },
+        )
+
+    def test_commit_should_update_shared_counts(self):
+        """Un registro confirmado suma su grupo al turno"""
+        generation = self.occupancy.generation
+
+        response = self._register('12345678')
+
+        assert response.status_code == 200
+        assert self.occupancy.get(self.activity_id, '10:00') == 1
+        assert self.occupancy.get(self.activity_id, '11:00') == 0
+        assert self.occupancy.generation > generation
+
+    def test_failed_commit_should_revert_staged_delta(self):
+        """Si el commit falla la matriz vuelve a su valor"""
+        with self.app.app_context():
+            db.session.add(Registration(activity_id=self.activity_id,
+                                        visitor_id=None, schedule='10:00'))
+            stage(db.session, self.activity_id, '10:00', 1)
+            with pytest.raises(Exception):
+                db.session.commit()
+            db.session.rollback()
+
+        assert self.occupancy.get(self.activity_id, '10:00') == 0
+
+    def test_catalog_and_early_rejection_should_read_shared_counts(self):
+        """El catálogo y el rechazo por cupos usan la matriz"""
+        self.occupancy.add(self.activity_id, '10:00', 8)
+
+        catalog = self.client.get('/api/activities').get_json()
+        response = self._register('12345678')
+
+        slot = catalog[0]['per_schedule_capacity']['10:00']
+        assert slot['registered_count'] == 8
+        assert slot['available_capacity'] == 0
+        assert response.status_code == 400
+        assert response.get_json()['code'] == 'no_capacity'
+        with self.app.app_context():
+            assert Visitor.query.count() == 0
+
+    def test_reconcile_should_fix_drift(self):
+        """La reconciliación reemplaza la matriz por los conteos reales"""
+        self._register('12345678')
+        self.occupancy.add(self.activity_id, '10:00', 5)
+        self.occupancy.add(self.activity_id, '11:00', 2)
+
+        with self.app.app_context():
+            reconcile(db, Activity, Registration)
+
+        assert self.occupancy.get(self.activity_id, '10:00') == 1
+        assert self.occupancy.get(self.activity_id, '11:00') == 0
+
+    def test_catalog_should_not_reconcile(self):
+        """El catálogo solo lee: no toma el lock de escritura"""
+        self.app.config['SHARED_OCCUPANCY_RECONCILE_SECONDS'] = 0
+        self.occupancy.add(self.activity_id, '10:00', 4)
+
+        with count_queries() as stats:
+            catalog = self.client.get('/api/activities').get_json()
+
+        slot = catalog[0]['per_schedule_capacity']['10:00']
+        assert slot['registered_count'] == 4
+        assert not any(sql.lstrip().upper().startswith('UPDATE')
+                       for sql in stats.statements)
+
+    def test_reconciler_should_fix_drift_when_due(self):
+        """El hilo de fondo reconcilia solo cuando vence el intervalo"""
+        reconciler = self.app.extensions['occupancy_reconciler']
+        self.occupancy.add(self.activity_id, '10:00', 4)
+
+        assert reconciler.run_once() is False
+        self.app.config['SHARED_OCCUPANCY_RECONCILE_SECONDS'] = 0
+        assert reconciler.run_once() is True
+        assert self.occupancy.get(self.activity_id, '10:00') == 0
+
+    def test_reconciler_should_start_once_per_process(self):
+        """Arrancar dos veces no duplica el hilo; se detiene limpio"""
+        reconciler = self.app.extensions['occupancy_reconciler']
+        reconciler.start()
+        thread = reconciler._thread
+        reconciler.start()
+        try:
+            assert reconciler._thread is thread and thread.is_alive()
+        finally:
+            reconciler.stop()
+        assert not thread.is_alive()
+
+    def test_other_process_should_see_same_segment(self):
+        """Otro proceso adjunta el mismo segmento y sus cambios se ven"""
+        context = multiprocessing.get_context('spawn')
+        child = context.Process(
+            target=_increment_in_child,
+            args=(self.occupancy.name, generate_time_slots()),
+        )
+        child.start()
+        child.join(30)
+
+        assert child.exitcode == 0
+        assert self.occupancy.get(1, '10:00') == 3
+
+    def test_unindexed_slots_should_fall_back_to_database(self):
+        """Horarios fuera de la matriz se cuentan en la base"""
+        assert self.occupancy.get(self.activity_id, '10:15') is None
+        assert self.occupancy.get(99, '10:00') is None
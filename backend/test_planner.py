@@ -0,0 +1,213 @@
+import sys
+import os
+import time
+
+# Agregar el directorio padre al path para importar los modelos
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app import Activity, Registration, SlotOverride, create_app, db
+from planner import ActivityOption, plan_itinerary, to_minutes
+from sql_instrumentation import count_queries
+
+HOURS = [f'{h:02d}:{m:02d}' for h in range(9, 18) for m in (0, 30)]
+
+
+class TestPlanner:
+    """Tests de la búsqueda de itinerarios (sin base de datos)"""
+
+    def test_should_not_overlap_slots(self):
+        """Cada actividad recibe un turno distinto y separado"""
+        options = [
+            ActivityOption(1, 'Safari', {'10:00': 5, '11:00': 5}),
+            ActivityOption(2, 'Palestra', {'10:00': 5}),
+        ]
+        result = plan_itinerary(options, 2)
+        assert result.plans == [{1: '11:00', 2: '10:00'}]
+        assert result.exhausted
+
+    def test_should_skip_slots_without_room_for_group(self):
+        """Un turno con menos cupos que el grupo no es candidato"""
+        options = [ActivityOption(1, 'Safari', {'10:00': 2, '11:00': 4})]
+        assert plan_itinerary(options, 3).plans == [{1: '11:00'}]
+
+    def test_should_skip_busy_slots_and_respect_gap(self):
+        """Turnos ya reservados por el grupo y el margen entre actividades"""
+        options = [
+            ActivityOption(1, 'Safari', {'09:00': 5, '10:00': 5}),
+            ActivityOption(2, 'Palestra', {'09:30': 5, '11:00': 5}),
+        ]
+        result = plan_itinerary(options, 1, busy={('09:00', 30)}, min_gap=30)
+        assert result.plans == [{1: '10:00', 2: '11:00'}]
+
+    def test_should_order_plans_by_preference(self):
+        """earliest empieza antes; compact minimiza la duración total"""
+        options = [
+            ActivityOption(1, 'Safari', {'09:00': 5, '12:00': 5}),
+            ActivityOption(2, 'Palestra', {'12:30': 5}),
+        ]
+        assert plan_itinerary(options, 1).plans[0] == {1: '09:00', 2: '12:30'}
+        compact = plan_itinerary(options, 1, prefer='compact')
+        assert compact.plans[0] == {1: '12:00', 2: '12:30'}
+
+    def test_should_report_no_plan_when_activity_has_no_slots(self):
+        """Sin candidatos para una actividad no hay búsqueda"""
+        options = [ActivityOption(1, 'Safari', {'10:00': 0}),
+                   ActivityOption(2, 'Palestra', {'11:00': 5})]
+        result = plan_itinerary(options, 1)
+        assert result.plans == [] and result.nodes == 0
+
+    def test_should_stop_at_node_limit(self):
+        """max_nodes corta la búsqueda y lo informa"""
+        options = [ActivityOption(i, f'A{i}', {h: 50 for h in HOURS})
+                   for i in range(1, 7)]
+        result = plan_itinerary(options, 1, max_nodes=200)
+        assert result.nodes <= 201
+        assert not result.exhausted
+        assert result.plans
+
+    def test_should_prune_large_infeasible_catalog_quickly(self):
+        """El chequeo hacia adelante poda sin recorrer cada combinación"""
+        # Cinco actividades compiten por dos turnos: imposible
+        options = [ActivityOption(i, f'A{i}', {'10:00': 9, '10:30': 9})
+                   for i in range(1, 6)]
+        options.append(ActivityOption(6, 'Amplia', {h: 9 for h in HOURS}))
+        started = time.perf_counter()
+        result = plan_itinerary(options, 1)
+        assert result.plans == []
+        assert result.exhausted
+        assert result.nodes < 50
+        assert time.perf_counter() - started < 1
+
+    def test_to_minutes(self):
+        """Conversión de HH:MM a minutos"""
+        assert to_minutes('09:30') == 570
+
+
+class TestItineraryEndpoints:
+    """Tests de /api/itineraries/plan y /api/itineraries/commit"""
+
+    def setup_method(self):
+        """Configuración antes de cada test"""
+        self.app = create_app('testing')
+        self.client = self.app.test_client()
+        with self.app.app_context():
+            db.create_all()
+            activities = [
+                Activity('Safari', 4, ['10:00', '11:00']),
+                Activity('Palestra', 12, ['10:00', '12:00']),
+                Activity('Tirolesa', 10, ['11:00', '13:00'],
+                         requires_clothing=True),
+            ]
+            db.session.add_all(activities)
+            db.session.commit()
+            self.safari, self.palestra, self.tirolesa = (
+                a.id for a in activities)
+
+    def _group(self, *ages, **extra):
+        participants = [
+            {'name': f'P{i}', 'dni': f'{30000000 + i}', 'age': age,
+             'clothing_size': 'M'}
+            for i, age in enumerate(ages)
+        ]
+        return dict({'participants': participants, 'current_time': '08:00'},
+                    **extra)
+
+    def _post(self, action, payload):
+        return self.client.post(f'/api/itineraries/{action}', json=payload)
+
+    def _registered(self):
+        with self.app.app_context():
+            return db.session.query(Registration).count()
+
+    def test_plan_should_return_feasible_assignments(self):
+        """El plan asigna un turno por actividad respetando cupos"""
+        with self.app.app_context():
+            db.session.add(SlotOverride(
+                activity_id=self.safari, schedule='10:00', capacity=1))
+            db.session.commit()
+        response = self._post('plan', self._group(
+            30, 20, activities=[self.safari, self.palestra]))
+        assert response.status_code == 200
+        data = response.get_json()
+        assert data['complete']
+        best = {a['activity_id']: a['schedule']
+                for a in data['plans'][0]['assignments']}
+        assert best == {self.safari: '11:00', self.palestra: '10:00'}
+
+    def test_plan_should_cost_constant_queries(self):
+        """Reglas en caché: una consulta de cupos y una de turnos ocupados"""
+        payload = self._group(
+            30, activities=[self.safari, self.palestra, self.tirolesa])
+        self._post('plan', payload)
+        with count_queries() as counter:
+            self._post('plan', payload)
+        assert counter.count <= 2
+
+    def test_plan_should_report_min_age(self):
+        """Un menor bajo la edad mínima descarta la actividad con su motivo"""
+        response = self._post('plan', self._group(
+            30, 10, activities=[self.safari, self.palestra]))
+        data = response.get_json()
+        assert data['code'] == 'no_feasible_plan'
+        assert 'edad mínima' in data['reasons'][str(self.palestra)]
+
+    def test_plan_should_return_404_for_unknown_activity(self):
+        """Actividad inexistente"""
+        response = self._post('plan', self._group(
+            30, activities=[self.safari, 999]))
+        assert response.status_code == 404
+
+    def test_commit_should_register_all_assignments(self):
+        """La reserva registra al grupo en todos los turnos"""
+        response = self._post('commit', self._group(
+            30, 20, terms_accepted=True, assignments=[
+                {'activity_id': self.safari, 'schedule': '10:00'},
+                {'activity_id': self.tirolesa, 'schedule': '11:00'},
+            ]))
+        assert response.status_code == 200
+        assert self._registered() == 4
+
+    def test_commit_should_be_atomic(self):
+        """Si un turno no tiene cupo no se reserva ninguno"""
+        with self.app.app_context():
+            db.session.add(SlotOverride(
+                activity_id=self.tirolesa, schedule='13:00', capacity=1))
+            db.session.commit()
+        response = self._post('commit', self._group(
+            30, 20, terms_accepted=True, assignments=[
+                {'activity_id': self.safari, 'schedule': '10:00'},
+                {'activity_id': self.tirolesa, 'schedule': '13:00'},
+            ]))
+        data = response.get_json()
+        assert response.status_code == 400
+        assert data['code'] == 'no_capacity'
+        assert data['assignment'] == 2
+        assert self._registered() == 0
+
+    def test_commit_should_reject_overlapping_schedules(self):
+        """Un DNI no puede quedar en dos actividades a la misma hora"""
+        response = self._post('commit', self._group(
+            30, terms_accepted=True, assignments=[
+                {'activity_id': self.safari, 'schedule': '10:00'},
+                {'activity_id': self.palestra, 'schedule': '10:00'},
+            ]))
+        assert response.get_json()['code'] == 'overlapping_schedules'
+        assert self._registered() == 0
+
+    def test_commit_should_respect_min_gap(self):
+        """La reserva aplica el mismo margen entre actividades que el plan"""
+        assignments = [{'activity_id': self.safari, 'schedule': '11:00'},
+                       {'activity_id': self.palestra, 'schedule': '12:00'}]
+        response = self._post('commit', self._group(
+            30, terms_accepted=True, assignments=assignments,
+            min_gap_minutes=120))
+        data = response.get_json()
+        assert response.status_code == 400
+        assert data['code'] == 'overlapping_schedules'
+        assert data['assignment'] == 2
+        assert self._registered() == 0
+
+        response = self._post('commit', self._group(
+            30, terms_accepted=True, assignments=assignments,
+            min_gap_minutes=30))
+        assert response.status_code == 200
@@ -0,0 +1,69 @@
+import os
+import sys
+
+from werkzeug.test import Client
+
+# Agregar el directorio padre al path para importar los modelos
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app import db, app
+from profiling import PROFILE_ID_HEADER, ProfilingMiddleware
+
+
+class TestProfiling:
+    """Tests del perfilado bajo demanda"""
+
+    def setup_method(self):
+        """Configuración antes de cada test"""
+        with app.app_context():
+            db.create_all()
+
+    def teardown_method(self):
+        """Limpieza después de cada test"""
+        with app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def make_client(self, tmp_path, **options):
+        middleware = ProfilingMiddleware(
+            app.wsgi_app, output_dir=str(tmp_path), **options
+        )
+        return Client(middleware)
+
+    def test_should_profile_request_with_admin_token(self, tmp_path):
+        """Con la cabecera y el token correctos se guarda el perfil"""
+        client = self.make_client(tmp_path, token='secreto',
+                                  trace_memory=True)
+
+        response = client.get('/api/visitors',
+                              headers={'X-Profile': 'secreto'})
+
+        name = response.headers[PROFILE_ID_HEADER]
+        assert response.status_code == 200
+        assert 'get_api_visitors' in name
+        assert (tmp_path / f'{name}.pstats').exists()
+        summary = (tmp_path / f'{name}.txt').read_text(encoding='utf-8')
+        assert 'GET /api/visitors -> 200 OK' in summary
+        assert 'Mayores asignaciones de memoria' in summary
+
+    def test_should_ignore_wrong_token(self, tmp_path):
+        """Un token incorrecto no activa el perfilado"""
+        client = self.make_client(tmp_path, token='secreto')
+
+        response = client.get('/api/visitors', headers={'X-Profile': 'otro'})
+
+        assert PROFILE_ID_HEADER not in response.headers
+        assert list(tmp_path.iterdir()) == []
+
+    def test_should_profile_sampled_requests(self, tmp_path):
+        """Con muestreo total todas las peticiones se perfilan"""
+        client = self.make_client(tmp_path, sample_rate=1.0)
+
+        response = client.get('/api/activities')
+
+        assert PROFILE_ID_HEADER in response.headers
+        assert len(list(tmp_path.glob('*.pstats'))) == 1
+
+    def test_should_not_wrap_app_when_disabled(self):
+        """Desactivado, el middleware no se instala"""
+        assert not isinstance(app.wsgi_app, ProfilingMiddleware)
@@ -0,0 +1,171 @@
+import sys
+import os
+from datetime import date
+from types import SimpleNamespace
+
+import pytest
+
+# Agregar el directorio padre al path para importar los modelos
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app import Activity, OccupancyRollup, create_app, db
+from rollups import SlotCapacity, _upsert, rollup_day, summarize
+from sql_instrumentation import count_queries
+
+MONDAY = date(2026, 10, 19)
+TUESDAY = date(2026, 10, 20)
+
+
+class TestSummarize:
+    """Tests de la analítica a partir de filas de rollup (sin base de datos)"""
+
+    def test_should_compute_fill_rates_peaks_and_group_sizes(self):
+        """Tasas por actividad, turno y día de la semana sobre los cupos"""
+        rows = [
+            (MONDAY, 1, '10:00', 2, 2, 4),
+            (MONDAY, 1, '10:00', 0, 0, -1),   # Una cancelación
+            (MONDAY, 2, '11:00', 3, 1, 3),
+            (TUESDAY, 1, '11:00', 1, 2, 2),
+        ]
+        activities = [SlotCapacity(1, 'Safari', {'10:00': 8, '11:00': 8}),
+                      SlotCapacity(2, 'Palestra', {'11:00': 12})]
+        result = summarize(rows, activities, MONDAY, TUESDAY,
+                           lambda day, name: {'10:00', '11:00'})
+
+        safari, palestra = result['activities']
+        assert (safari['registered'], safari['capacity'],
+                safari['fill_rate']) == (5, 32, 0.1562)
+        assert palestra['name'] == 'Palestra'
+        assert palestra['fill_rate'] == 0.125
+        slots = {slot['schedule']: slot for slot in result['slots']}
+        assert slots['10:00']['registered'] == 3
+        assert slots['11:00']['capacity'] == 40
+        monday = result['weekdays'][0]
+        assert (monday['name'], monday['registered'],
+                monday['capacity']) == ('lunes', 6, 28)
+        assert result['weekdays'][6]['fill_rate'] is None
+        assert result['peak_hours'] == [{'hour': '11:00', 'registered': 5},
+                                        {'hour': '10:00', 'registered': 3}]
+        assert result['group_sizes'] == {'1': 2, '2': 2, '3': 1}
+
+    def test_closed_days_should_not_add_capacity(self):
+        """Un turno cerrado ese día no cuenta en el denominador"""
+        activities = [SlotCapacity(1, 'Safari', {'10:00': 8})]
+        result = summarize(
+            [], activities, MONDAY, TUESDAY,
+            lambda day, name: set() if day == MONDAY else {'10:00'})
+        assert result['activities'][0]['capacity'] == 8
+        assert result['peak_hours'] == []
+
+
+class TestUpsert:
+    """Tests del upsert de rollups por dialecto"""
+
+    def test_should_reject_unsupported_dialect(self):
+        """Un motor sin ON CONFLICT falla con un error claro"""
+        bind = SimpleNamespace(dialect=SimpleNamespace(name='mysql'))
+        session = SimpleNamespace(get_bind=lambda: bind)
+        with pytest.raises(NotImplementedError, match='mysql'):
+            _upsert(session, OccupancyRollup, [])
+
+
+class TestAnalyticsEndpoint:
+    """Tests de /api/analytics/occupancy y del mantenimiento de los rollups"""
+
+    def setup_method(self):
+        """Configuración antes de cada test"""
+        self.app = create_app('testing')
+        self.client = self.app.test_client()
+        with self.app.app_context():
+            db.create_all()
+            activity = Activity('Safari', 8, ['10:00', '11:00'])
+            db.session.add(activity)
+            db.session.commit()
+            self.activity_id = activity.id
+        self.today = rollup_day().isoformat()
+
+    def _register(self, *dnis, schedule='10:00'):
+        return self.client.post(
+            f'/api/activities/{self.activity_id}/register', json={
+                'participants': [{'name': 'Ana', 'dni': dni, 'age': 30}
+                                 for dni in dnis],
+                'terms_accepted': True,
+                'schedule': schedule,
+                'current_time': '08:00',
+            })
+
+    def _rollups(self):
+        with self.app.app_context():
+            return sorted(
+                (row.schedule, row.group_size, row.groups, row.people)
+                for row in db.session.query(OccupancyRollup))
+
+    def _analytics(self, **params):
+        params.setdefault('from', self.today)
+        params.setdefault('to', self.today)
+        return self.client.get('/api/analytics/occupancy',
+                               query_string=params)
+
+    def test_should_maintain_rollups_on_register_and_cancel(self):
+        """Registros suman grupos; cancelaciones y rechazos no dejan grupos"""
+        self._register('11111111', '22222222')
+        self._register('33333333', schedule='11:00')
+        self._register('11111111')  # DNI repetido: rechazado
+        self.client.post('/api/registrations/cancel', json={
+            'cancellations': [{'dni': '22222222', 'schedule': '10:00'}]})
+        assert self._rollups() == [('10:00', 0, 0, -1), ('10:00', 2, 1, 2),
+                                   ('11:00', 1, 1, 1)]
+
+        data = self._analytics().get_json()
+        activity = data['activities'][0]
+        assert (activity['registered'], activity['capacity']) == (2, 16)
+        assert data['group_sizes'] == {'1': 1, '2': 1}
+
+    def test_analytics_should_cost_constant_queries(self):
+        """La consulta no depende de la cantidad de registros"""
+        for index in range(6):
+            self._register(str(40000000 + index),
+                           schedule=('10:00', '11:00')[index % 2])
+        with count_queries() as few:
+            self._analytics()
+        for index in range(6, 12):
+            self._register(str(40000000 + index),
+                           schedule=('10:00', '11:00')[index % 2])
+        with count_queries() as more:
+            data = self._analytics().get_json()
+            assert data['activities'][0]['registered'] == 12
+        assert few.count == more.count <= 4
+
+    def test_should_answer_304_for_same_version(self):
+        """ETag por versión de datos y rango"""
+        response = self._analytics()
+        etag = response.headers['ETag']
+        again = self.client.get(
+            '/api/analytics/occupancy',
+            query_string={'from': self.today, 'to': self.today},
+            headers={'If-None-Match': etag})
+        assert again.status_code == 304
+        self._register('11111111')
+        assert self._analytics().headers['ETag'] != etag
+
+    def test_recompute_should_match_incremental(self):
+        """El backfill desde Registration reproduce los rollups"""
+        self._register('11111111', '22222222', '33333333')
+        self._register('44444444', schedule='11:00')
+        incremental = self._rollups()
+        with self.app.app_context():
+            db.session.query(OccupancyRollup).delete()
+            db.session.commit()
+        response = self.client.post('/api/analytics/rollups/recompute')
+        assert response.get_json()['registrations'] == 4
+        assert self._rollups() == incremental
+
+    def test_should_reject_invalid_range(self):
+        """Fechas mal formadas, invertidas o un rango demasiado largo"""
+        assert self._analytics(**{'from': 'ayer'}).status_code == 400
+        response = self._analytics(
+            **{'from': '2026-10-20', 'to': '2026-10-19'})
+        assert response.status_code == 400
+        response = self._analytics(
+            **{'from': '2020-01-01', 'to': '2026-01-01'})
+        assert response.get_json()['code'] == 'invalid_range'
@@ -0,0 +1,232 @@
+import sys
+import os
+
+# Agregar el directorio padre al path para importar los modelos
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app import Activity, ActivityService, SlotOverride, db, app
+from rules import ActivityRules, RulesCache, resolve_capacity
+from sql_instrumentation import count_queries
+
+
+class TestCapacityResolver:
+    """Tests del cupo efectivo por turno"""
+
+    def test_should_take_the_lowest_limit(self):
+        """El cupo es el menor entre la capacidad y la regla por turno"""
+        assert resolve_capacity(10, 8) == 8
+        assert resolve_capacity(6, 8) == 6
+        assert resolve_capacity(-1, 8) == 0
+
+    def test_override_should_replace_turn_rule(self):
+        """El cupo particular reemplaza la regla, con la capacidad como tope"""
+        assert resolve_capacity(20, 8, 12) == 12
+        assert resolve_capacity(10, 8, 12) == 10
+        assert resolve_capacity(10, 8, 0) == 0
+
+    def test_rules_should_resolve_per_slot(self):
+        """ActivityRules aplica el cupo particular solo a su horario"""
+        rules = ActivityRules(1, 'Safari', 10, ['15:00', '15:30'], False, 8, 0,
+                              {'15:30': 2})
+
+        assert rules.slot_capacity('15:00') == 8
+        assert rules.slot_capacity('15:30') == 2
+
+
+class TestRulesCache:
+    """Tests de la caché de reglas de actividad"""
+
+    def setup_method(self):
+        """Configuración antes de cada test"""
+        self.calls = []
+
+        def loader(activity_id):
+            self.calls.append(activity_id)
+            if activity_id == 99:
+                return None
+            return ActivityRules(
+                activity_id, 'Safari', 8, ['15:00'], False, 8, 0)
+
+        self.cache = RulesCache(loader, ttl=60)
+
+    def test_should_load_once_while_fresh(self):
+        """Dentro del ttl no se vuelve a llamar al loader"""
+        first = self.cache.get(1)
+        second = self.cache.get(1)
+
+        assert first is second
+        assert self.calls == [1]
+        assert first.schedules == frozenset({'15:00'})
+
+    def test_should_not_cache_missing_activities(self):
+        """Una actividad inexistente se vuelve a buscar"""
+        assert self.cache.get(99) is None
+        assert self.cache.get(99) is None
+        assert self.calls == [99, 99]
+
+    def test_should_reload_after_invalidate_or_expiry(self):
+        """invalidate y el vencimiento del ttl fuerzan la recarga"""
+        self.cache.get(1)
+        self.cache.invalidate(1)
+        self.cache.get(1)
+        self.cache.ttl = 0
+        self.cache.invalidate()
+        self.cache.get(1)
+        self.cache.get(1)
+
+        assert self.calls == [1, 1, 1, 1]
+
+
+class TestRegistrationStages:
+    """Tests del orden de validación del registro"""
+
+    def setup_method(self):
+        """Configuración antes de cada test"""
+        self.app = app
+        self.app.config['TESTING'] = True
+
+        with self.app.app_context():
+            db.create_all()
+            activity = Activity(
+                name="Tirolesa",
+                capacity=10,
+                schedules=["15:00", "15:30"],
+                requirements={},
+                requires_clothing=True
+            )
+            db.session.add(activity)
+            db.session.commit()
+            self.activity_id = activity.id
+
+    def teardown_method(self):
+        """Limpieza después de cada test"""
+        with self.app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def payload(self, **overrides):
+        data = {
+            'participants': [
+                {'name': 'Ana', 'dni': '12345678', 'age': 30,
+                 'clothing_size': 'M'}
+            ],
+            'terms_accepted': True,
+            'schedule': '15:00',
+            'current_time': '08:30'
+        }
+        data.update(overrides)
+        return data
+
+    def register(self, data):
+        return ActivityService.register_visitor(self.activity_id, data)
+
+    def test_invalid_payloads_should_run_zero_queries(self):
+        """Los rechazos de la etapa payload no consultan la base"""
+        invalid = [
+            None,
+            self.payload(participants=[]),
+            self.payload(
+                participants=[{'name': 'Ana', 'dni': 'abc', 'age': 30}]),
+            self.payload(terms_accepted=False),
+            self.payload(current_time='16:00'),
+        ]
+        with self.app.app_context():
+            for data in invalid:
+                with count_queries() as stats:
+                    result = self.register(data)
+
+                assert result['success'] is False
+                assert result['stage'] == 'payload'
+                assert stats.count == 0, stats.statements
+
+    def test_rule_checks_should_not_query_with_warm_cache(self):
+        """Con las reglas en caché la etapa rules no consulta la base"""
+        with self.app.app_context():
+            self.register(self.payload(schedule='15:45'))
+            young = self.payload(participants=[
+                {'name': 'Leo', 'dni': '87654321', 'age': 5,
+                 'clothing_size': 'S'}
+            ])
+            for data, code in [
+                (self.payload(schedule='15:45'), 'schedule_unavailable'),
+                (self.payload(
+                    participants=[{'name': 'Ana', 'dni': '1', 'age': 30}]),
+                 'clothing_size_required'),
+                (young, 'min_age'),
+            ]:
+                with count_queries() as stats:
+                    result = self.register(data)
+
+                assert (result['code'], result['stage']) == (code, 'rules')
+                assert stats.count == 0, stats.statements
+
+    def test_should_report_database_stage_for_duplicates(self):
+        """Capacidad y DNIs duplicados se resuelven en la etapa database"""
+        with self.app.app_context():
+            assert self.register(self.payload())['success'] is True
+
+            result = self.register(self.payload())
+
+            assert result['code'] == 'duplicate_dni'
+            assert result['stage'] == 'database'
+            # El lock se liberó: otro registro puede escribir
+            result = self.register(self.payload(schedule='15:30'))
+            assert result['success'] is True
+
+    def test_should_report_missing_activity_from_rules(self):
+        """Una actividad inexistente se rechaza en la etapa rules"""
+        with self.app.app_context():
+            result = ActivityService.register_visitor(9999, self.payload())
+
+        assert result['code'] == 'activity_not_found'
+        assert result['stage'] == 'rules'
+
+    def test_should_invalidate_rules_when_activity_changes(self):
+        """Editar la actividad descarta sus reglas en caché"""
+        with self.app.app_context():
+            self.register(self.payload(schedule='15:45'))
+            activity = db.session.get(Activity, self.activity_id)
+            activity.schedules = ["15:00", "15:30", "15:45"]
+            db.session.commit()
+
+            result = self.register(self.payload(schedule='15:45'))
+
+        assert result['success'] is True
+
+    def test_slot_override_should_limit_registrations(self):
+        """Un cupo particular limita el turno y se refleja en el catálogo"""
+        with self.app.app_context():
+            db.session.add(SlotOverride(activity_id=self.activity_id,
+                                        schedule='15:30', capacity=1))
+            db.session.commit()
+            result = self.register(self.payload(schedule='15:30'))
+            assert result['success'] is True
+
+            second = self.payload(schedule='15:30', participants=[
+                {'name': 'Leo', 'dni': '87654321', 'age': 30,
+                 'clothing_size': 'S'}
+            ])
+            result = self.register(second)
+
+        assert result['code'] == 'no_capacity'
+        assert 'Quedan 0 cupos' in result['error']
+        slots = self.app.test_client().get('/api/activities').get_json()[0][
+            'per_schedule_capacity']
+        assert slots['15:30'] == {'available_capacity': 0,
+                                  'registered_count': 1, 'turn_capacity': 1}
+        assert slots['15:00']['turn_capacity'] == 10
+
+    def test_cold_catalog_should_not_query_per_slot(self):
+        """El catálogo sin caché usa consultas constantes, no una por turno"""
+        client = self.app.test_client()
+        with self.app.app_context():
+            for index in range(5):
+                db.session.add(Activity(f'Safari {index}', 8,
+                                        ['09:00', '09:30', '10:00', '10:30']))
+            db.session.commit()
+
+        with count_queries() as stats:
+            client.get('/api/activities')
+
+        # Versión, actividades, cupos particulares y conteo agrupado
+        assert stats.count == 4, stats.statements
@@ -0,0 +1,171 @@
+import sys
+import os
+import json
+
+import pytest
+
+# Agregar el directorio padre al path para importar los modelos
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app import Activity, ActivityService, create_app, db
+from schemas import (
+    Participant, RegistrationRequest, ValidationError, decode_registration
+)
+from sql_instrumentation import count_queries
+
+
+class TestDecodeRegistration:
+    """Tests del decoder del payload de registro"""
+
+    def test_should_decode_and_coerce_types(self):
+        """Normaliza edad, DNI y talla en una pasada"""
+        registration = decode_registration({
+            'participants': [
+                {'name': ' Ana ', 'dni': 12345678, 'age': '30',
+                 'clothing_size': ''},
+                {'name': 'Juan', 'dni': '87654321', 'age': 9.0,
+                 'clothing_size': 'M'},
+            ],
+            'terms_accepted': True,
+            'schedule': '15:00',
+            'current_time': '08:30',
+        })
+
+        assert isinstance(registration, RegistrationRequest)
+        first, second = registration.participants
+        assert isinstance(first, Participant)
+        assert (first.name, first.dni, first.age, first.clothing_size) == (
+            'Ana', '12345678', 30, None)
+        assert (second.age, second.clothing_size) == (9, 'M')
+        assert registration.dnis == ['12345678', '87654321']
+        assert registration.schedule == '15:00'
+        assert registration.current_time == '08:30'
+        assert not hasattr(first, '__dict__')
+
+    def test_should_accept_legacy_visitor_format(self):
+        """El formato antiguo 'visitor' se convierte en un participante"""
+        registration = decode_registration({
+            'visitor': {'name': 'Ana', 'dni': '12345678', 'age': 30},
+            'schedule': '10:00',
+        })
+
+        assert len(registration.participants) == 1
+        assert registration.terms_accepted is True
+        assert registration.schedule == '10:00'
+
+    def test_should_collect_all_field_errors(self):
+        """Todos los errores de todos los participantes en un solo rechazo"""
+        with pytest.raises(ValidationError) as raised:
+            decode_registration({
+                'participants': [
+                    {'name': '', 'dni': '', 'age': 0},
+                    {'name': 'Juan', 'dni': 'ABC', 'age': 'diez'},
+                    None,
+                ],
+                'terms_accepted': 'quizás',
+            })
+
+        result = raised.value.to_result()
+        assert result['success'] is False
+        assert result['code'] == 'invalid_payload'
+        assert result['details'] == [
+            'terms_accepted debe ser verdadero o falso',
+            'El nombre del participante 1 es obligatorio',
+            'El DNI del participante 1 es obligatorio',
+            'La edad del participante 1 es obligatoria',
+            'El DNI del participante 2 debe contener solo números',
+            'La edad del participante 2 debe ser un número entero',
+            'Datos del participante 3 están vacíos',
+        ]
+
+    def test_should_reject_participant_count_out_of_range(self):
+        """Entre 1 y 10 participantes"""
+        for participants in ([], [{'name': 'A', 'dni': '1', 'age': 20}] * 11):
+            with pytest.raises(ValidationError) as raised:
+                decode_registration({'participants': participants,
+                                     'terms_accepted': True})
+            assert raised.value.errors[0].code == 'invalid_participant_count'
+
+    def test_should_reject_non_object_payload(self):
+        """Un cuerpo que no es un objeto JSON es inválido"""
+        for payload in (None, [], 'texto'):
+            with pytest.raises(ValidationError) as raised:
+                decode_registration(payload)
+            assert raised.value.errors[0].code == 'invalid_payload'
+
+    def test_legacy_format_should_require_schedule(self):
+        """El formato antiguo exige el horario en el payload"""
+        with pytest.raises(ValidationError, match='El horario es obligatorio'):
+            decode_registration(
+                {'visitor': {'name': 'Ana', 'dni': '1', 'age': 30}})
+
+
+class TestServiceWithSchemas:
+    """Tests del servicio de registro con payloads decodificados"""
+
+    def setup_method(self):
+        """Configuración antes de cada test"""
+        self.app = create_app('testing')
+        self.client = self.app.test_client()
+        with self.app.app_context():
+            db.create_all()
+            activity = Activity('Safari', 8, ['15:00'])
+            db.session.add(activity)
+            db.session.commit()
+            self.activity_id = activity.id
+
+    def test_malformed_payload_should_not_touch_database(self):
+        """Un payload mal formado se rechaza sin consultas"""
+        with self.app.app_context():
+            with count_queries() as stats:
+                result = ActivityService.register_visitor(
+                    self.activity_id,
+                    {'participants': [{'name': '', 'dni': 'x', 'age': -1}],
+                     'terms_accepted': True},
+                    '15:00',
+                )
+
+        assert result['code'] == 'missing_data'
+        assert len(result['details']) == 3
+        assert stats.count == 0
+
+    def test_service_should_accept_decoded_request(self):
+        """El servicio acepta un RegistrationRequest ya decodificado"""
+        registration = decode_registration({
+            'participants': [{'name': 'Ana', 'dni': '12345678', 'age': 30}],
+            'terms_accepted': True,
+            'schedule': '15:00',
+            'current_time': '08:00',
+        })
+
+        with self.app.app_context():
+            result = ActivityService.register_visitor(
+                self.activity_id, registration)
+
+        assert result == {'success': True, 'message': 'Registro exitoso'}
+
+    def test_endpoint_should_reject_non_json_body(self):
+        """Un cuerpo que no es JSON devuelve 400 con el error decodificado"""
+        response = self.client.post(
+            f'/api/activities/{self.activity_id}/register',
+            data='no es json', content_type='text/plain')
+
+        assert response.status_code == 400
+        assert response.get_json()['code'] == 'invalid_payload'
+
+    def test_endpoint_should_coerce_string_age(self):
+        """Una edad enviada como texto se registra como entero"""
+        response = self.client.post(
+            f'/api/activities/{self.activity_id}/register',
+            data=json.dumps({
+                'participants': [
+                    {'name': 'Ana', 'dni': '12345678', 'age': '30'}],
+                'terms_accepted': True,
+                'schedule': '15:00',
+                'current_time': '08:00',
+            }),
+            content_type='application/json')
+
+        assert response.status_code == 200
+        visitors = self.client.get('/api/visitors').get_json()
+        assert visitors[0]['age'] == 30
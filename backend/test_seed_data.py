@@ -0,0 +1,107 @@
+import sys
+import os
+import uuid
+
+# Agregar el directorio padre al path para importar los modelos
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app import (
+    Activity, Registration, Visitor, create_app, db, app, get_min_age,
+    get_turn_capacity, resolve_capacity
+)
+from occupancy import count_registrations
+from seed_data import generate_synthetic_data, parse_group_sizes
+
+
+class TestSyntheticData:
+    """Tests del generador de datos sintéticos"""
+
+    def teardown_method(self):
+        """Limpieza después de cada test"""
+        with app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def snapshot(self):
+        return [
+            (r.activity_id, r.schedule, r.visitor.dni, r.visitor.age)
+            for r in Registration.query.order_by(Registration.id)
+        ]
+
+    def test_should_be_deterministic_for_a_seed(self):
+        """La misma semilla produce exactamente los mismos datos"""
+        with app.app_context():
+            options = dict(activities=3, days=2, slots=4, reset=True)
+            generate_synthetic_data(seed=7, **options)
+            first = self.snapshot()
+            generate_synthetic_data(seed=7, **options)
+            assert self.snapshot() == first
+            generate_synthetic_data(seed=8, **options)
+            assert self.snapshot() != first
+
+    def test_should_fill_slots_respecting_rules(self):
+        """Se respeta ocupación, edad mínima y DNI único por horario"""
+        with app.app_context():
+            totals = generate_synthetic_data(
+                activities=4, days=3, slots=6, fill_ratio=0.5,
+                repeat_visitor_ratio=0.5, seed=1, reset=True
+            )
+
+            # 4 actividades con cupos 10, 8, 12, 12 al 50 % en 6 horarios,
+            # una sola vez aunque las reservas se repartan en 3 días
+            assert totals['registrations'] == (5 + 4 + 6 + 6) * 6
+            assert Visitor.query.count() == totals['visitors']
+            for activity in Activity.query.all():
+                min_age = get_min_age(activity.name)
+                for registration in activity.registrations:
+                    assert registration.visitor.age >= min_age
+
+            per_slot, per_schedule_dni, days = {}, {}, set()
+            for registration in Registration.query.all():
+                slot = (registration.activity_id, registration.schedule)
+                per_slot[slot] = per_slot.get(slot, 0) + 1
+                key = (registration.schedule, registration.visitor.dni)
+                per_schedule_dni[key] = per_schedule_dni.get(key, 0) + 1
+                days.add(registration.registered_at.date())
+            for activity in Activity.query.all():
+                limit = resolve_capacity(activity.capacity,
+                                         get_turn_capacity(activity.name))
+                for schedule in activity.schedules:
+                    assert per_slot.get((activity.id, schedule), 0) <= limit
+            assert max(per_schedule_dni.values()) == 1
+            assert len(days) > 1
+
+    def test_should_append_without_reset(self):
+        """Sin reset se agregan datos sin pisar DNIs existentes"""
+        with app.app_context():
+            options = dict(activities=2, days=1, slots=2, seed=3)
+            generate_synthetic_data(reset=True, **options)
+            before = Registration.query.count()
+            highest = max(int(visitor.dni) for visitor in Visitor.query)
+            totals = generate_synthetic_data(**options)
+            assert Activity.query.count() == 4
+            assert Registration.query.count() == (
+                before + totals['registrations'])
+            added = Visitor.query.order_by(Visitor.id.desc()).limit(
+                totals['visitors'])
+            assert all(int(visitor.dni) > highest for visitor in added)
+
+    def test_should_rebuild_shared_occupancy(self):
+        """La carga directa deja la ocupación compartida al día"""
+        name = f'test_seed_{uuid.uuid4().hex[:8]}'
+        seeded = create_app('testing', {'SHARED_OCCUPANCY': True,
+                                        'SHARED_OCCUPANCY_NAME': name})
+        try:
+            with seeded.app_context():
+                db.create_all()
+                generate_synthetic_data(activities=2, days=1, slots=2, seed=5)
+                occupancy = seeded.extensions['shared_occupancy']
+                for (activity_id, schedule), count in count_registrations(
+                        db, Registration).items():
+                    assert occupancy.get(activity_id, schedule) == count
+        finally:
+            seeded.extensions['shared_occupancy'].close(unlink=True)
+
+    def test_parse_group_sizes(self):
+        """La distribución de grupos se lee desde la línea de comandos"""
+        assert parse_group_sizes('1:0.5,4:0.5') == {1: 0.5, 4: 0.5}
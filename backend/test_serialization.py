@@ -0,0 +1,139 @@
+import sys
+import os
+
+import pytest
+from flask import jsonify
+
+# Agregar el directorio padre al path para importar los modelos
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app import (
+    Activity, Registration, Visitor, create_app, db, get_turn_capacity
+)
+from rules import resolve_capacity
+import serialization
+from serialization import dumps, encode_activities, encode_visitor_rows
+
+TRICKY_NAMES = ['Tirolesa', 'Jardinería "Ñandú"', 'Safari \\ 🦁',
+                'Tab\tNew\nline\x01']
+
+
+def _reference_catalog():
+    """Catálogo armado como antes: to_dict() y jsonify"""
+    payload = []
+    for activity in Activity.query.all():
+        turn_capacity = resolve_capacity(activity.capacity,
+                                         get_turn_capacity(activity.name))
+        per_schedule = {}
+        for s in activity.schedules:
+            reg = Registration.query.filter_by(
+                activity_id=activity.id, schedule=s).count()
+            per_schedule[s] = {
+                'registered_count': reg,
+                'available_capacity': max(0, turn_capacity - reg),
+                'turn_capacity': turn_capacity
+            }
+        activity_dict = activity.to_dict()
+        activity_dict['per_schedule_capacity'] = per_schedule
+        activity_dict['turn_capacity'] = turn_capacity
+        payload.append(activity_dict)
+    return jsonify(payload).get_data()
+
+
+class TestSerialization:
+    """Tests de la serialización compatible byte a byte con jsonify"""
+
+    def setup_method(self):
+        """Configuración antes de cada test"""
+        self.app = create_app('testing')
+        self.client = self.app.test_client()
+        with self.app.app_context():
+            db.create_all()
+            for index, name in enumerate(TRICKY_NAMES):
+                db.session.add(Activity(
+                    name, 10 + index, ['11:00', '09:30', '11:00', '17:30'],
+                    requirements={'nivel': 'todos', 'peso': 80.5,
+                                  'equipo': ['casco', 'arnés'],
+                                  'notas': {'b': None, 'a': True}},
+                    requires_clothing=bool(index % 2),
+                ))
+            db.session.add(
+                Visitor('Ana "la" Pérez', '12345678', 30, 'M', True))
+            db.session.add(Visitor('Zoë 🦁', '87654321', 9, None, False))
+            db.session.commit()
+            for visitor_id in (1, 2):
+                db.session.add(Registration(
+                    activity_id=2, visitor_id=visitor_id, schedule='09:30'))
+            db.session.commit()
+
+    def test_catalog_should_match_jsonify_bytes(self):
+        """El catálogo es idéntico al que producía jsonify"""
+        response = self.client.get('/api/activities')
+
+        with self.app.app_context():
+            expected = _reference_catalog()
+        assert response.get_data() == expected
+        assert response.mimetype == 'application/json'
+
+    def test_catalog_fragments_should_follow_changes(self):
+        """Si cambia un campo estático, el fragmento se recalcula"""
+        self.client.get('/api/activities')
+        with self.app.app_context():
+            activity = db.session.get(Activity, 1)
+            activity.requirements = {'nivel': 'avanzado'}
+            activity.name = 'Tirolesa nocturna'
+            db.session.commit()
+
+        response = self.client.get('/api/activities')
+
+        with self.app.app_context():
+            expected = _reference_catalog()
+        assert response.get_data() == expected
+        assert b'Tirolesa nocturna' in response.get_data()
+
+    def test_visitors_should_match_jsonify_bytes(self):
+        """El listado de visitantes es idéntico al de to_dict() + jsonify"""
+        response = self.client.get('/api/visitors')
+
+        with self.app.app_context():
+            expected = jsonify(
+                [v.to_dict() for v in Visitor.query.all()]).get_data()
+        assert response.get_data() == expected
+
+    def test_debug_mode_should_keep_indented_output(self):
+        """En modo debug se conserva la salida indentada de jsonify"""
+        self.app.debug = True
+        response = self.client.get('/api/visitors')
+
+        with self.app.app_context():
+            expected = jsonify(
+                [v.to_dict() for v in Visitor.query.all()]).get_data()
+        assert response.get_data() == expected
+        assert b'\n  ' in expected
+
+    def test_encoders_should_handle_empty_input(self):
+        """Listas vacías se codifican como []"""
+        assert encode_activities([]) == '[]'
+        assert encode_visitor_rows([]) == '[]'
+
+    @pytest.mark.skipif(serialization.orjson is None,
+                        reason='orjson no instalado')
+    def test_orjson_backend_should_match_stdlib(self):
+        """El backend orjson produce los mismos bytes que json"""
+        payload = {
+            'success': False, 'code': 'min_age', 'n': 3,
+            'error': 'La edad mínima para Palestra es 12 años',
+            'details': ['Ñandú "x"', 'emoji 🦁', 'ctl \x01\x1f\x7f', '\\/'],
+        }
+        previous = serialization._settings['backend']
+        try:
+            serialization._settings['backend'] = 'orjson'
+            fast = dumps(payload)
+        finally:
+            serialization._settings['backend'] = previous
+        assert fast == dumps(payload)
+
+    def test_unknown_backend_should_fail(self):
+        """Un JSON_BACKEND desconocido es un error explícito"""
+        with pytest.raises(ValueError, match='JSON_BACKEND'):
+            create_app('testing', {'JSON_BACKEND': 'ujson'})
@@ -0,0 +1,89 @@
+import json
+import sys
+import os
+
+# Agregar el directorio padre al path para importar los modelos
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app import Activity, db, app
+from server_timing import STAGE_DURATION, format_header, stage_timer
+
+
+class TestServerTiming:
+    """Tests del desglose de etapas en Server-Timing"""
+
+    def setup_method(self):
+        """Configuración antes de cada test"""
+        self.app = app
+        self.app.config['TESTING'] = True
+        self.client = self.app.test_client()
+
+        with self.app.app_context():
+            db.create_all()
+            activity = Activity(
+                name="Safari",
+                capacity=8,
+                schedules=["15:00"],
+                requirements={},
+                requires_clothing=False
+            )
+            db.session.add(activity)
+            db.session.commit()
+            self.activity_id = activity.id
+
+    def teardown_method(self):
+        """Limpieza después de cada test"""
+        self.app.config['SERVER_TIMING'] = False
+        self.app.config['SERVER_TIMING_METRICS'] = False
+        with self.app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def register(self):
+        return self.client.post(
+            f'/api/activities/{self.activity_id}/register',
+            data=json.dumps({
+                'participants': [
+                    {'name': 'Ana', 'dni': '12345678', 'age': 30}
+                ],
+                'terms_accepted': True,
+                'schedule': '15:00',
+                'current_time': '08:30'
+            }),
+            content_type='application/json'
+        )
+
+    def test_should_not_emit_header_when_disabled(self):
+        """Por defecto no hay cabecera y el temporizador es nulo"""
+        response = self.register()
+
+        assert 'Server-Timing' not in response.headers
+        assert stage_timer() is stage_timer()
+
+    def test_should_report_registration_stages(self):
+        """El registro informa cada etapa en Server-Timing"""
+        self.app.config['SERVER_TIMING'] = True
+
+        response = self.register()
+
+        header = response.headers['Server-Timing']
+        stages = [part.split(';')[0] for part in header.split(', ')]
+        assert stages == [
+            'payload', 'rules', 'database', 'visitors', 'commit'
+        ]
+
+    def test_should_aggregate_catalog_stages_into_metrics(self):
+        """Con SERVER_TIMING_METRICS las etapas llegan al histograma"""
+        self.app.config['SERVER_TIMING'] = True
+        self.app.config['SERVER_TIMING_METRICS'] = True
+        before = STAGE_DURATION.count('get_activities', 'occupancy')
+
+        response = self.client.get('/api/activities')
+
+        assert 'occupancy;dur=' in response.headers['Server-Timing']
+        assert STAGE_DURATION.count(
+            'get_activities', 'occupancy') == before + 1
+
+    def test_format_header_should_use_milliseconds(self):
+        """Las duraciones se expresan en milisegundos"""
+        assert format_header({'db': 0.0125}) == 'db;dur=12.50'
@@ -0,0 +1,134 @@
+import sys
+import os
+
+import pytest
+
+# Agregar el directorio padre al path para importar los modelos
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app import generate_time_slots, get_min_age, get_turn_capacity
+from simulation import (
+    ActivitySpec, Scenario, activities_from_catalog, simulate, sweep,
+)
+
+SLOTS = generate_time_slots()
+ADULTS = {30: 1}
+
+
+def _activity(name='Safari', seats=8, min_age=0, slots=SLOTS):
+    return ActivitySpec(name, {schedule: seats for schedule in slots}, min_age)
+
+
+def _simulate(scenario, activities, days, seed):
+    return simulate(scenario, activities, days=days, seed=seed,
+                    backend='python')
+
+
+class TestSimulation:
+    """Tests de la simulación de demanda (motor en Python)"""
+
+    def test_should_be_deterministic_for_seed(self):
+        """Misma semilla, mismo resultado"""
+        activities = [_activity(), _activity('Palestra', 12, 12)]
+        first = _simulate(Scenario(), activities, 50, 3)
+        again = _simulate(Scenario(), activities, 50, 3)
+        first.pop('seconds'), again.pop('seconds')
+        assert first == again
+        assert first['groups'] == sum(a['groups'] for a in first['activities'])
+
+    def test_ample_capacity_should_not_reject(self):
+        """Con cupo de sobra y llegadas tempranas nadie queda afuera"""
+        scenario = Scenario(arrivals={9: 10}, ages=ADULTS)
+        result = _simulate(scenario, [_activity(seats=1000)], 20, 1)
+        assert result['rejection_rate'] == 0
+        assert result['wait_minutes']['p90'] <= 30
+
+    def test_scarce_capacity_should_fill_slots_and_reject(self):
+        """Con un cupo por turno los turnos se llenan y el resto se rechaza"""
+        scenario = Scenario(arrivals={9: 60}, group_sizes={1: 1}, ages=ADULTS)
+        result = _simulate(scenario, [_activity(seats=1)], 30, 2)
+        assert result['rejected']['capacity'] > 0
+        slots = result['slots']['Safari']
+        assert slots['17:30'] == 1.0
+        assert result['wait_minutes']['mean'] > 60
+
+    def test_group_should_need_seats_for_everyone(self):
+        """Un grupo más grande que el cupo del turno nunca entra"""
+        scenario = Scenario(arrivals={9: 5}, group_sizes={4: 1}, ages=ADULTS)
+        result = _simulate(scenario, [_activity(seats=3)], 10, 1)
+        assert result['rejection_rate'] == 1.0
+        assert result['activities'][0]['utilization'] == 0
+
+    def test_min_age_should_reject_groups_with_children(self):
+        """Un integrante bajo la edad mínima descarta al grupo"""
+        scenario = Scenario(arrivals={9: 10}, ages={6: 1})
+        result = _simulate(scenario, [_activity(min_age=8)], 10, 1)
+        assert result['rejected']['capacity'] == 0
+        assert result['rejected']['min_age'] == result['groups'] > 0
+
+    def test_max_wait_should_bound_waits(self):
+        """Un grupo no acepta turnos más allá de su espera máxima"""
+        scenario = Scenario(arrivals={9: 40}, group_sizes={2: 1},
+                            ages=ADULTS, max_wait=45)
+        result = _simulate(scenario, [_activity(seats=4)], 20, 5)
+        assert result['wait_minutes']['p90'] <= 45
+        assert result['rejected']['capacity'] > 0
+
+    def test_preferences_should_weight_activities(self):
+        """Las preferencias reparten los grupos entre actividades"""
+        scenario = Scenario(preferences={'safari': 3, 'palestra': 1},
+                            ages=ADULTS)
+        result = _simulate(scenario, [_activity(), _activity('Palestra', 12)],
+                           50, 4)
+        safari, palestra = (a['groups'] for a in result['activities'])
+        assert 2 < safari / palestra < 4
+
+    def test_sweep_should_share_demand_across_variants(self):
+        """Cada variante ve la misma demanda; más cupo, menos rechazo"""
+        scenario = Scenario(arrivals={9: 30, 10: 30}, ages=ADULTS)
+        variants = {'chico': [_activity(seats=2)],
+                    'grande': [_activity(seats=12)]}
+        results = sweep(scenario, variants, days=30, seed=9, backend='python')
+        small, large = results['chico'], results['grande']
+        assert small['groups'] == large['groups']
+        assert small['rejection_rate'] > large['rejection_rate']
+
+    def test_catalog_should_apply_real_rules(self):
+        """Cupo efectivo y edad mínima de las reglas de la aplicación"""
+        rows = [(1, 'Safari', 8, ['10:00', '11:00']),
+                (2, 'Palestra', 20, ['10:00'])]
+        safari, palestra = activities_from_catalog(
+            rows, get_turn_capacity, get_min_age, overrides={(1, '11:00'): 3})
+        assert safari.seats == {'10:00': 8, '11:00': 3}
+        assert (palestra.seats, palestra.min_age) == ({'10:00': 12}, 12)
+        wider = activities_from_catalog(rows, lambda name: 20, get_min_age,
+                                        schedules=['09:00', '09:30'])
+        assert wider[1].seats == {'09:00': 20, '09:30': 20}
+
+    def test_should_reject_invalid_scenarios(self):
+        """Distribuciones vacías o negativas y motores desconocidos"""
+        with pytest.raises(ValueError):
+            Scenario(group_sizes={0: 1})
+        with pytest.raises(ValueError):
+            Scenario(arrivals={9: -1})
+        with pytest.raises(ValueError):
+            scenario = Scenario(preferences={'tirolesa': 1})
+            scenario.activity_weights([_activity()])
+        with pytest.raises(ValueError):
+            simulate(Scenario(), [_activity()], days=1, backend='gpu')
+
+    def test_numpy_should_match_python(self):
+        """Ambos motores dan las mismas tasas esperadas"""
+        pytest.importorskip('numpy')
+        activities = [_activity(seats=4), _activity('Tirolesa', 10, 8)]
+        fast = simulate(Scenario(), activities, days=3000, seed=1,
+                        backend='numpy')
+        slow = _simulate(Scenario(), activities, 3000, 1)
+        assert fast['backend'] == 'numpy'
+        assert abs(fast['groups_per_day'] - slow['groups_per_day']) < 2
+        assert abs(fast['rejection_rate'] - slow['rejection_rate']) < 0.02
+        pairs = zip(fast['activities'], slow['activities'])
+        for fast_activity, slow_activity in pairs:
+            difference = (fast_activity['utilization']
+                          - slow_activity['utilization'])
+            assert abs(difference) < 0.02
@@ -0,0 +1,104 @@
+import json
+import logging
+import sys
+import os
+
+import pytest
+
+# Agregar el directorio padre al path para importar los modelos
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app import Activity, db, app
+from sql_instrumentation import assert_max_queries, count_queries
+
+
+class TestSqlInstrumentation:
+    """Tests de la instrumentación de consultas SQL"""
+
+    def setup_method(self):
+        """Configuración antes de cada test"""
+        self.app = app
+        self.app.config['TESTING'] = True
+        self.client = self.app.test_client()
+
+        with self.app.app_context():
+            db.create_all()
+            activity = Activity(
+                name="Safari",
+                capacity=8,
+                schedules=["15:00", "15:30", "16:00"],
+                requirements={},
+                requires_clothing=False
+            )
+            db.session.add(activity)
+            db.session.commit()
+            self.activity_id = activity.id
+
+    def teardown_method(self):
+        """Limpieza después de cada test"""
+        with self.app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def test_should_count_queries_of_test_client_requests(self):
+        """Las consultas de las peticiones cuentan en el ámbito del test"""
+        with count_queries() as stats:
+            self.client.get('/api/visitors')
+
+        # Versión de los datos más el listado
+        assert stats.count == 2
+        assert all(sql.startswith('SELECT') for sql in stats.statements)
+
+    def test_assert_max_queries_should_fail_above_limit(self):
+        """El helper falla listando las sentencias si se supera el límite"""
+        with pytest.raises(AssertionError, match='como máximo 1 consultas'):
+            with assert_max_queries(1):
+                self.client.get('/api/activities')
+
+    def test_register_endpoint_should_stay_under_query_budget(self):
+        """El registro de un participante ejecuta un número acotado de SQL"""
+        with assert_max_queries(10):
+            response = self.client.post(
+                f'/api/activities/{self.activity_id}/register',
+                data=json.dumps({
+                    'participants': [
+                        {'name': 'Ana', 'dni': '12345678', 'age': 30}
+                    ],
+                    'terms_accepted': True,
+                    'schedule': '15:00',
+                    'current_time': '08:30'
+                }),
+                content_type='application/json'
+            )
+        assert response.status_code == 200
+
+    def test_should_warn_on_repeated_statement_shape(self, caplog):
+        """Se advierte un posible N+1 al repetir la misma sentencia"""
+        from sql_instrumentation import _settings
+        previous = _settings['n_plus_one_threshold']
+        _settings['n_plus_one_threshold'] = 2
+        logger = logging.getLogger('ecoharmony')
+        logger.propagate = True
+        try:
+            with caplog.at_level(logging.WARNING, logger='ecoharmony.sql'):
+                # Un INSERT por visitante
+                self.client.post(
+                    f'/api/activities/{self.activity_id}/register',
+                    data=json.dumps({
+                        'participants': [
+                            {'name': 'Ana', 'dni': '12345678', 'age': 30},
+                            {'name': 'Luis', 'dni': '23456789', 'age': 31},
+                            {'name': 'Eva', 'dni': '34567890', 'age': 32}
+                        ],
+                        'terms_accepted': True,
+                        'schedule': '15:00',
+                        'current_time': '08:30'
+                    }),
+                    content_type='application/json'
+                )
+        finally:
+            logger.propagate = False
+            _settings['n_plus_one_threshold'] = previous
+
+        assert any('Posible N+1' in record.getMessage()
+                   for record in caplog.records)
@@ -0,0 +1,20 @@
+"""Punto de entrada WSGI para producción.
+
+    gunicorn -c gunicorn.conf.py wsgi:application
+
+Con ``preload_app`` la aplicación se crea una sola vez en el proceso maestro
+y los workers la heredan al hacer fork; ``gunicorn.conf.py`` descarta las
+conexiones heredadas para que cada worker abra las suyas. El índice de
+ingreso se carga aquí, así los workers arrancan con él ya armado.
+"""
+import os
+
+from app import create_app, ensure_indexes
+from extensions import db
+
+application = create_app(os.environ.get('APP_ENV', 'production'))
+
+with application.app_context():
+    db.create_all()
+    ensure_indexes()
+    application.extensions['checkin_index'].sync()